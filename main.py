@@ -1,6 +1,92 @@
+import os
+import sys
+import argparse
+import logging
+
+from src.pipeline.runner import STAGE_ORDER, resolve_stages, run_pipeline
+from src.store.signal_query import add_query_arguments, run_query
+from src.store.event_index import add_events_arguments, run_events
+from src.benchmark.suite import add_benchmark_arguments, run_benchmark
+from src.stream.ingest import add_stream_arguments, run_stream
+
+
 def main():
-    print("Hello from tesla-fsd-benchmark!")
+    parser = argparse.ArgumentParser(prog="tesla-fsd-benchmark")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="run pipeline stages as a DAG")
+    run.add_argument("--from", dest="start", choices=STAGE_ORDER,
+                     help="run only this stage and the stages downstream of it")
+    run.add_argument("--to", dest="end", choices=STAGE_ORDER,
+                     help="run only this stage and the stages it depends on")
+    run.add_argument("--stages", nargs="+", choices=STAGE_ORDER,
+                     help="run exactly these stages (instead of --from / --to)")
+    run.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                     help="process pool size shared by all stages (default: all cores)")
+    run.add_argument("--force", action="store_true", help="ignore the manifest and rebuild everything")
+    run.add_argument("--engine", choices=["vector", "cantools"], default="vector", help="decode engine")
+    run.add_argument("--dbc-groups", type=int, default=1, help="DBC shards per MF4 decode job")
+    run.add_argument("--layout", choices=["wide", "long"], default="wide",
+                     help="decoded layout: one row per frame, or one (time, value) series per signal")
+    run.add_argument("--profile", action="store_true",
+                     help="also run every unit under cProfile and dump one pstats file per stage")
+
+    query = commands.add_parser("query", help="query signals on demand from raw / decoded logs")
+    add_query_arguments(query)
+
+    events = commands.add_parser("events", help="query the FSD event index built by the events stage")
+    add_events_arguments(events)
+
+    benchmark = commands.add_parser("benchmark", help="benchmark the stages on synthetic logs against a baseline")
+    add_benchmark_arguments(benchmark)
+
+    stream = commands.add_parser("stream", help="decode live CAN traffic into rolling window aggregates")
+    add_stream_arguments(stream)
+
+    args = parser.parse_args()
+    if args.command == "run" and args.layout == "long" and args.engine != "vector":
+        parser.error("--layout long requires --engine vector")
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s — %(levelname)s — %(message)s",
+        handlers=[logging.StreamHandler()]
+    )
+
+    if args.command == "run":
+        # Only the arguments are usage errors: whatever fails while running fails its unit
+        try:
+            stages = resolve_stages(args.start, args.end, args.stages)
+        except ValueError as e:
+            parser.error(str(e))
+        if args.workers < 1:
+            parser.error("--workers must be at least 1")
+        runner = run_pipeline(stages=stages, workers=args.workers, force=args.force, engine=args.engine,
+                              dbc_groups=args.dbc_groups, layout=args.layout, profile=args.profile)
+        if runner.failed:
+            logging.error(f"❌ {runner.failed} unit(s) failed")
+            return 1
+    elif args.command == "query":
+        try:
+            run_query(args)
+        except ValueError as e:
+            parser.error(str(e))
+    elif args.command == "events":
+        try:
+            run_events(args)
+        except ValueError as e:
+            parser.error(str(e))
+    elif args.command == "stream":
+        try:
+            run_stream(args)
+        except ValueError as e:
+            parser.error(str(e))
+    elif args.command == "benchmark":
+        try:
+            return run_benchmark(args)
+        except ValueError as e:
+            parser.error(str(e))
+    return 0
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+"""
+src/benchmark/suite.py
+
+Reproducible pipeline benchmark on synthetic logs (src/benchmark/synthetic_mf4.py):
+
+    python main.py benchmark                       # default scenario vs the stored baseline
+    python main.py benchmark --scenario smoke laptop --repeat 3
+    python main.py benchmark --save-baseline       # accept the current numbers
+
+- Each scenario gets its own data tree, data/benchmark/<scenario>/, with the
+  generated logs in raw/ (regenerated only when the scenario changes)
+- Every BENCH_STAGES stage runs as its own `main.py run --from S --to S`
+  process (FSD_DATA_DIR → the scenario tree), so each stage gets a fresh
+  process pool and its peak RSS is its own
+- Timings come from the stage's run report (src/utils/profiling.py):
+  throughput is input frames (and MF4 MB) per second of stage wall time; with
+  --repeat the fastest run of each stage counts, and the largest peak RSS
+- Results are written to data/benchmark/results/<run>.json and compared with
+  config/benchmark/baseline.json: a stage slower than THROUGHPUT_TOLERANCE (and
+  by more than MIN_SLOWDOWN_S) or larger than MEMORY_TOLERANCE is a regression
+  (exit code 1)
+
+Baselines only compare like with like: a scenario whose parameters or worker
+count differ from its baseline entry, or that runs on another machine
+(machine_info()), is reported but not judged.
+"""
+
+import os
+import sys
+import json
+import argparse
+import shutil
+import logging
+import platform
+import subprocess
+import time
+from dataclasses import dataclass, asdict
+from pathlib import Path
+
+# ─── Force src/ to be discoverable ─────────────────────────────
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from src.utils.paths import BENCHMARK_DIR, BENCHMARK_BASELINE_PATH
+from src.utils.profiling import run_id, write_run_report
+from src.benchmark.synthetic_mf4 import DEFAULT_SEED, LogSpec, write_logs
+
+# ─── Config ─────────────────────────────────────────────────────
+@dataclass(frozen=True)
+class Scenario:
+    logs: int                   # drives
+    duration_s: float           # per log
+    bus_load: float             # fraction of the bus bit rate
+    compression: int = 0        # MF4 compression level
+    mf4_layout: str = "sorted"  # synthetic_mf4.MF4_LAYOUTS
+    seed: int = DEFAULT_SEED
+
+
+# Sized for a laptop: a few minutes of logs per scenario, a few hundred MB per worker
+SCENARIOS = {
+    "smoke": Scenario(logs=1, duration_s=60, bus_load=0.2),
+    "laptop": Scenario(logs=2, duration_s=120, bus_load=0.25),
+    "busy": Scenario(logs=1, duration_s=60, bus_load=0.8, compression=2),
+    # logger layout: an unsorted data group per bus channel, payloads in VLSD records
+    "canedge": Scenario(logs=1, duration_s=120, bus_load=0.4, compression=1, mf4_layout="unsorted"),
+}
+DEFAULT_SCENARIO = "laptop"
+BENCH_STAGES = ["decode", "downsample", "clean", "merge", "analyze"]
+WORKERS = 2                     # fixed, so results do not depend on the core count
+
+THROUGHPUT_TOLERANCE = 0.20     # allowed drop in frames/s against the baseline
+MEMORY_TOLERANCE = 0.25         # allowed growth of peak RSS against the baseline
+MIN_SLOWDOWN_S = 0.5            # sub-second stages are noisy: smaller wall time losses never count
+
+GENERATOR_VERSION = 1           # bump when synthetic_mf4 writes different frames for the same spec
+SPEC_FILE = "synthetic.json"
+RESULTS_DIR = BENCHMARK_DIR / "results"
+BASELINE_VERSION = 1
+
+
+# ─── Synthetic Logs ─────────────────────────────────────────────
+def scenario_dir(name: str) -> Path:
+    return BENCHMARK_DIR / name
+
+
+def prepare_logs(name: str, scenario: Scenario) -> dict:
+    """
+    Generates the scenario's logs unless raw/ already holds them.
+    Returns {"frames": total frames, "mf4_bytes": total size}.
+    """
+    root = scenario_dir(name)
+    spec_path = root / SPEC_FILE
+    wanted = {"generator": GENERATOR_VERSION, **asdict(scenario)}
+    if spec_path.exists():
+        with open(spec_path) as f:
+            spec = json.load(f)
+        files = [root / "raw" / file for file in spec.get("files", [])]
+        if spec.get("scenario") == wanted and files and all(p.exists() for p in files):
+            logging.info(f"⏭️ {name}: reusing {len(files)} synthetic log(s)")
+            return {"frames": spec["frames"], "mf4_bytes": sum(p.stat().st_size for p in files)}
+
+    shutil.rmtree(root / "raw", ignore_errors=True)
+    logging.info(f"🧪 {name}: generating {scenario.logs} × {scenario.duration_s:.0f} s "
+                 f"at {scenario.bus_load:.0%} bus load ...")
+    spec = LogSpec(scenario.duration_s, scenario.bus_load, scenario.seed, scenario.compression,
+                   scenario.mf4_layout)
+    written = write_logs(root / "raw", spec, scenario.logs)
+
+    root.mkdir(parents=True, exist_ok=True)
+    with open(spec_path, "w") as f:
+        json.dump({"scenario": wanted, "files": [p.name for p in written],
+                   "frames": sum(written.values())}, f, indent=2)
+    return {"frames": sum(written.values()), "mf4_bytes": sum(p.stat().st_size for p in written)}
+
+
+def reset_outputs(name: str) -> None:
+    """Removes everything a pipeline run wrote to the scenario tree; raw/ stays."""
+    for path in scenario_dir(name).iterdir():
+        if path.name in ("raw", SPEC_FILE):
+            continue
+        if path.is_dir():
+            shutil.rmtree(path)
+        else:
+            path.unlink()
+
+
+# ─── Stage Runs ─────────────────────────────────────────────────
+def run_stage(name: str, stage: str, workers: int, engine: str, layout: str) -> dict:
+    """
+    Runs one stage on the scenario tree in a fresh process.
+    Returns the stage entry of its run report plus the process wall time.
+    """
+    root = scenario_dir(name)
+    report_dir = root / "catalog" / "run_reports"
+    log_path = root / "logs" / f"{stage}.log"
+    log_path.parent.mkdir(parents=True, exist_ok=True)
+    shutil.rmtree(report_dir, ignore_errors=True)
+
+    cmd = [sys.executable, str(PROJECT_ROOT / "main.py"), "run", "--from", stage, "--to", stage,
+           "--force", "--workers", str(workers), "--engine", engine, "--layout", layout]
+    env = {**os.environ, "FSD_DATA_DIR": str(root)}
+    started = time.perf_counter()
+    with open(log_path, "w") as log:
+        proc = subprocess.run(cmd, cwd=PROJECT_ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+    elapsed = time.perf_counter() - started
+
+    reports = sorted(report_dir.glob("*.json"))
+    if proc.returncode != 0 or not reports:
+        raise RuntimeError(f"{stage} failed on {name} (exit code {proc.returncode}), see {log_path}")
+    with open(reports[-1]) as f:
+        entry = json.load(f)["stages"][stage]
+    if entry["failed"]:
+        raise RuntimeError(f"{stage}: {entry['failed']} unit(s) failed on {name}, see {log_path}")
+    return {**entry, "process_s": elapsed}
+
+
+def stage_metrics(entry: dict, inputs: dict) -> dict:
+    wall = entry["wall_s"]
+    return {
+        "wall_s": wall,
+        "busy_s": entry["busy_s"],
+        "cpu_s": entry["cpu_s"],
+        "process_s": entry["process_s"],
+        "units": entry["units"],
+        "frames_per_s": inputs["frames"] / wall if wall > 0 else None,
+        "mf4_mb_per_s": inputs["mf4_bytes"] / 1e6 / wall if wall > 0 else None,
+        "peak_rss_mb": entry["peak_rss_bytes"] / 2**20 if entry["peak_rss_bytes"] else None,
+        "phases": entry["phases"],
+    }
+
+
+def _best(runs: list[dict]) -> dict:
+    """Fastest run of a stage, with the largest peak RSS seen over all runs."""
+    best = dict(min(runs, key=lambda m: m["wall_s"]))
+    peaks = [m["peak_rss_mb"] for m in runs if m["peak_rss_mb"] is not None]
+    best["peak_rss_mb"] = max(peaks) if peaks else None
+    best["runs"] = len(runs)
+    return best
+
+
+def run_scenario(name: str, scenario: Scenario, repeat: int, workers: int, engine: str, layout: str) -> dict:
+    inputs = prepare_logs(name, scenario)
+    runs = {stage: [] for stage in BENCH_STAGES}
+    for i in range(repeat):
+        reset_outputs(name)
+        for stage in BENCH_STAGES:
+            metrics = stage_metrics(run_stage(name, stage, workers, engine, layout), inputs)
+            runs[stage].append(metrics)
+            logging.info(f"    ⏱️ {name} [{i + 1}/{repeat}] {stage}: {metrics['wall_s']:.2f} s, "
+                         f"{metrics['frames_per_s'] or 0:,.0f} frames/s")
+    return {
+        "params": {"scenario": asdict(scenario), "workers": workers, "engine": engine, "layout": layout},
+        "inputs": inputs,
+        "stages": {stage: _best(stage_runs) for stage, stage_runs in runs.items()},
+    }
+
+
+# ─── Baseline ───────────────────────────────────────────────────
+def machine_info() -> dict:
+    return {"platform": platform.platform(), "python": platform.python_version(),
+            "cpu_count": os.cpu_count(), "processor": platform.processor() or platform.machine()}
+
+
+def load_baseline(path: Path = BENCHMARK_BASELINE_PATH) -> dict:
+    if not path.exists():
+        return {"version": BASELINE_VERSION, "scenarios": {}}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baseline(results: dict, path: Path = BENCHMARK_BASELINE_PATH) -> Path:
+    """Replaces the baseline entries of the scenarios in `results`; others are kept."""
+    baseline = load_baseline(path)
+    for name, result in results["scenarios"].items():
+        baseline["scenarios"][name] = {
+            "machine": results["machine"],
+            "params": result["params"],
+            "stages": {stage: {key: m[key] for key in ("frames_per_s", "mf4_mb_per_s", "peak_rss_mb", "wall_s")}
+                       for stage, m in result["stages"].items()},
+        }
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp, "w") as f:
+        json.dump(baseline, f, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+    return path
+
+
+def _change(value, reference) -> float | None:
+    if value is None or not reference:
+        return None
+    return value / reference - 1
+
+
+def compare(name: str, result: dict, baseline: dict, machine: dict) -> list[str]:
+    """Logs a per-stage comparison; returns the regressions."""
+    entry = baseline["scenarios"].get(name)
+    if entry is None:
+        logging.info(f"📭 {name}: no baseline entry")
+    elif entry["params"] != result["params"]:
+        logging.warning(f"⚠️ {name}: baseline was measured with {entry['params']}, not compared")
+        entry = None
+    elif entry.get("machine") != machine:
+        logging.warning(f"⚠️ {name}: baseline was measured on {entry.get('machine')}, not compared")
+        entry = None
+
+    regressions = []
+    logging.info(f"📊 {name}: {result['inputs']['frames']:,} frames, {result['inputs']['mf4_bytes'] / 1e6:.0f} MB MF4")
+    logging.info(f"    {'stage':<12}{'wall s':>9}{'frames/s':>12}{'vs base':>9}{'peak MB':>9}{'vs base':>9}")
+    for stage, m in result["stages"].items():
+        base = entry["stages"].get(stage) if entry else None
+        speed = _change(m["frames_per_s"], base["frames_per_s"]) if base else None
+        memory = _change(m["peak_rss_mb"], base["peak_rss_mb"]) if base else None
+
+        flags = []
+        if speed is not None and speed < -THROUGHPUT_TOLERANCE and m["wall_s"] - base["wall_s"] > MIN_SLOWDOWN_S:
+            flags.append(f"{stage} throughput {speed:+.0%}")
+        if memory is not None and memory > MEMORY_TOLERANCE:
+            flags.append(f"{stage} peak RSS {memory:+.0%}")
+        regressions += [f"{name}: {flag}" for flag in flags]
+
+        speed_s = f"{speed:+.0%}" if speed is not None else "-"
+        memory_s = f"{memory:+.0%}" if memory is not None else "-"
+        peak_s = f"{m['peak_rss_mb']:.0f}" if m["peak_rss_mb"] else "-"
+        logging.info(f"    {stage:<12}{m['wall_s']:>9.2f}{m['frames_per_s'] or 0:>12,.0f}{speed_s:>9}"
+                     f"{peak_s:>9}{memory_s:>9}{'  ❌' if flags else ''}")
+    return regressions
+
+
+# ─── CLI ────────────────────────────────────────────────────────
+def add_benchmark_arguments(parser) -> None:
+    parser.add_argument("--scenario", nargs="+", choices=sorted(SCENARIOS), default=[DEFAULT_SCENARIO],
+                        help=f"scenarios to run (default: {DEFAULT_SCENARIO})")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per stage; the fastest counts")
+    parser.add_argument("--workers", type=int, default=WORKERS, help=f"process pool size (default: {WORKERS})")
+    parser.add_argument("--engine", choices=["vector", "cantools"], default="vector", help="decode engine")
+    parser.add_argument("--layout", choices=["wide", "long"], default="wide", help="decoded layout")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help=f"store the results as the new baseline ({BENCHMARK_BASELINE_PATH.relative_to(PROJECT_ROOT)})")
+
+
+def run_benchmark(args) -> int:
+    """Runs the selected scenarios; returns 1 if any stage regressed against the baseline."""
+    if args.repeat < 1:
+        raise ValueError("--repeat must be at least 1")
+    if args.layout == "long" and args.engine != "vector":
+        raise ValueError("--layout long requires --engine vector")
+
+    name = run_id()
+    results = {"run_id": name, "machine": machine_info(), "scenarios": {}}
+    for scenario in args.scenario:
+        logging.info(f"🏁 Benchmark {scenario}: {SCENARIOS[scenario]}")
+        results["scenarios"][scenario] = run_scenario(scenario, SCENARIOS[scenario], args.repeat,
+                                                      args.workers, args.engine, args.layout)
+
+    baseline = load_baseline()
+    regressions = []
+    for scenario, result in results["scenarios"].items():
+        regressions += compare(scenario, result, baseline, results["machine"])
+    results["regressions"] = regressions
+    logging.info(f"📝 Results: {write_run_report(results, name, RESULTS_DIR)}")
+
+    if args.save_baseline:
+        logging.info(f"📌 Baseline saved: {save_baseline(results)}")
+        return 0
+    for regression in regressions:
+        logging.error(f"❌ Regression: {regression}")
+    return 1 if regressions else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline stages on synthetic CAN logs")
+    add_benchmark_arguments(parser)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s — %(levelname)s — %(message)s")
+    try:
+        return run_benchmark(args)
+    except ValueError as e:
+        parser.error(str(e))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
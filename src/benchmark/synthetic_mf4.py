@@ -0,0 +1,523 @@
+#!/usr/bin/env python3
+"""
+src/benchmark/synthetic_mf4.py
+
+Synthetic CAN logs for benchmarking: MF4 files (as read by
+src/decode/mf4_reader.py) whose frames are encoded from the DBCs in
+config/dbc/, so every stage has real signals to decode, resample, label and
+merge. Two MF4 layouts:
+
+  sorted    python-can MF4Writer: one sorted data group, fixed 64-byte payloads
+  unsorted  the CANedge layout: one unsorted data group per bus channel with
+            record IDs, DataBytes in a VLSD channel group written ahead of
+            each frame record, and data blocks cut every DT_BLOCK_BYTES
+            regardless of record boundaries (deflated with compression > 0)
+
+- Every DBC message is sent periodically on the bus its DBC name starts with
+  (can1-* → channel 1, can9-* → channel 9); a frame ID defined by several
+  DBCs of one bus is sent once, with the layout of the first DBC
+- Periods come from PERIODS_MS (the DBCs carry no cycle times) and are scaled
+  per bus so the frames fill `bus_load` of BITRATE_BPS
+- Multiplexers cycle through their selector values, and only the signals of
+  the selected branch are written
+- Enum signals hold one of their choice codes for ENUM_DWELL_S at a time;
+  physical signals follow a slow sine between their DBC minimum and maximum
+- Every value is a function of (seed, message, signal, time), so a log does not
+  depend on CHUNK_SECONDS and the same spec always writes the same frames
+
+    python src/benchmark/synthetic_mf4.py data/raw --logs 2 --duration 600 --bus-load 0.4
+    python src/benchmark/synthetic_mf4.py data/raw --mf4-layout unsorted --compression 1
+"""
+
+import sys
+import struct
+import zlib
+import argparse
+import logging
+from dataclasses import dataclass, replace
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import can
+from can.io.mf4 import STD_DTYPE
+
+# ─── Force src/ to be discoverable ─────────────────────────────
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from src.utils.paths import DBC_DIR
+from src.decode.dbc_registry import SignalMeta, load_compiled_set
+from src.decode.vector_decode import MessageLayout, SignalLayout
+
+# ─── Config ─────────────────────────────────────────────────────
+BITRATE_BPS = 500_000
+PERIODS_MS = (10, 20, 50, 100, 100, 200, 1000)     # drawn per message; 100 ms is the most common
+JITTER = 0.02                                       # ± fraction of the period
+ENUM_DWELL_S = (0.5, 20.0)                          # an enum holds its value this long
+WAVE_PERIOD_S = (5.0, 120.0)                        # period of the physical-signal sine
+CHUNK_SECONDS = 30                                  # frames generated and appended per step
+START_TIME = datetime(2025, 3, 8, 8, 5, 9, tzinfo=timezone.utc)
+DEFAULT_SEED = 20250308
+MF4_LAYOUTS = ("sorted", "unsorted")
+DT_BLOCK_BYTES = 1 << 20                            # data block size of unsorted logs
+
+# Stuffed bit count of a classic data frame: 47 framing bits + data, ~20% stuff bits
+FRAME_OVERHEAD_BITS = 47
+STUFFING = 1.2
+
+
+@dataclass(frozen=True)
+class LogSpec:
+    duration_s: float
+    bus_load: float = 0.4               # fraction of BITRATE_BPS per bus
+    seed: int = DEFAULT_SEED
+    compression: int = 0                # MF4Writer level: 0 none, 1 deflate, 2 transposed deflate
+    mf4_layout: str = "sorted"          # one of MF4_LAYOUTS
+
+
+@dataclass(frozen=True)
+class _Message:
+    channel: int
+    layout: MessageLayout
+    meta: dict[str, SignalMeta]
+    period_s: float
+    phase_s: float
+
+
+# ─── Deterministic Noise ────────────────────────────────────────
+_M1, _M2 = np.uint64(0xBF58476D1CE4E5B9), np.uint64(0x94D049BB133111EB)
+
+
+def _mix(x: np.ndarray) -> np.ndarray:
+    """splitmix64 finalizer: a well-spread uint64 hash of each element."""
+    x = np.asarray(x, dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        x = (x ^ (x >> np.uint64(30))) * _M1
+        x = (x ^ (x >> np.uint64(27))) * _M2
+    return x ^ (x >> np.uint64(31))
+
+
+def _unit(*keys: int) -> float:
+    """Deterministic float in [0, 1) for a tuple of integer keys."""
+    h = np.uint64(0)
+    for key in keys:
+        h = _mix(np.uint64(h ^ np.uint64(key & 0xFFFFFFFFFFFFFFFF)))
+    return float(h >> np.uint64(11)) / 2.0 ** 53
+
+
+def _units(seed: int, index: np.ndarray) -> np.ndarray:
+    """Deterministic floats in [0, 1), one per int64 index."""
+    with np.errstate(over="ignore"):
+        h = _mix(index.astype(np.uint64) + _mix(np.uint64(seed)))
+    return (h >> np.uint64(11)).astype(np.float64) / 2.0 ** 53
+
+
+def _name_key(name: str) -> int:
+    return int.from_bytes(name.encode()[:8].ljust(8, b"\0"), "little") ^ len(name)
+
+
+# ─── Bus Plan ───────────────────────────────────────────────────
+def bus_channel(dbc_name: str) -> int:
+    """CAN channel of a DBC from its name prefix: "can9-internal" → 9."""
+    prefix = dbc_name.split("-", 1)[0]
+    if not prefix.startswith("can") or not prefix[3:].isdigit():
+        raise ValueError(f"DBC name {dbc_name!r} does not start with can<channel>-")
+    return int(prefix[3:])
+
+
+def frame_bits(length: int) -> float:
+    return (FRAME_OVERHEAD_BITS + 8 * length) * STUFFING
+
+
+def plan_messages(dbc_files: list[Path], spec: LogSpec) -> list[_Message]:
+    """Every message to send with its channel, period and phase."""
+    compiled = load_compiled_set(dbc_files)
+    per_bus: dict[int, dict[int, tuple[MessageLayout, dict[str, SignalMeta]]]] = {}
+    for name in sorted(compiled):
+        dbc = compiled[name]
+        bus = per_bus.setdefault(bus_channel(name), {})
+        for frame_id, layout in dbc.layouts.items():
+            if frame_id not in bus:
+                meta = {sig.name: sig for sig in dbc.signals if sig.frame_id == frame_id}
+                bus[frame_id] = (layout, meta)
+
+    messages = []
+    for channel, bus in sorted(per_bus.items()):
+        periods = {fid: PERIODS_MS[int(_unit(spec.seed, channel, fid) * len(PERIODS_MS))] / 1000
+                   for fid in bus}
+        bits_per_s = sum(frame_bits(layout.length) / periods[fid] for fid, (layout, _) in bus.items())
+        scale = bits_per_s / (spec.bus_load * BITRATE_BPS)
+        for fid, (layout, meta) in sorted(bus.items()):
+            period = periods[fid] * scale
+            messages.append(_Message(channel, layout, meta, period, _unit(spec.seed, channel, fid, 1) * period))
+    return messages
+
+
+# ─── Signal Values ──────────────────────────────────────────────
+def _raw_limits(sig: SignalLayout) -> tuple[float, float]:
+    bits = min(sig.length, 53)
+    if sig.is_signed:
+        return -(2.0 ** (bits - 1)), 2.0 ** (bits - 1) - 1
+    return 0.0, 2.0 ** bits - 1
+
+
+def _physical_range(sig: SignalLayout, meta: SignalMeta | None) -> tuple[float, float]:
+    if meta is not None and meta.minimum is not None and meta.maximum is not None \
+            and meta.maximum > meta.minimum:
+        return meta.minimum, meta.maximum
+    if sig.is_float:
+        return -1000.0, 1000.0
+    lo, hi = _raw_limits(sig)
+    ends = sorted((lo * sig.scale + sig.offset, hi * sig.scale + sig.offset))
+    return ends[0], ends[1]
+
+
+def _to_raw(sig: SignalLayout, physical: np.ndarray) -> np.ndarray:
+    """Physical values → unsigned raw bits as uint64."""
+    if sig.is_float:
+        if sig.length == 64:
+            return physical.astype(np.float64).view(np.uint64)
+        if sig.length == 32:
+            return physical.astype(np.float32).view(np.uint32).astype(np.uint64)
+        return physical.astype(np.float16).view(np.uint16).astype(np.uint64)
+    lo, hi = _raw_limits(sig)
+    raw = np.clip(np.round((physical - sig.offset) / sig.scale), lo, hi).astype(np.int64)
+    return _code_bits(sig, raw)
+
+
+def _code_bits(sig: SignalLayout, raw: np.ndarray) -> np.ndarray:
+    """Integer raw values (two's complement if signed) → their sig.length low bits."""
+    mask = np.uint64((1 << sig.length) - 1) if sig.length < 64 else np.uint64(0xFFFFFFFFFFFFFFFF)
+    return raw.astype(np.int64).view(np.uint64) & mask
+
+
+def _signal_bits(sig: SignalLayout, meta: SignalMeta | None, seed: int, times: np.ndarray,
+                 counter: np.ndarray) -> np.ndarray:
+    """Raw bits of one signal at `times`; `counter` is the frame index of the message."""
+    key = _name_key(sig.name)
+
+    if sig.is_multiplexer and sig.mux_ids:
+        ids = np.asarray(sig.mux_ids, dtype=np.int64)
+        selected = ids[counter % len(ids)]
+        if sig.choices or (sig.scale == 1 and sig.offset == 0):
+            return _code_bits(sig, selected)
+        return _to_raw(sig, selected.astype(np.float64))
+
+    if sig.choices:
+        codes = np.asarray(sig.choices, dtype=np.int64)
+        lo, hi = ENUM_DWELL_S
+        dwell = lo + (hi - lo) * _unit(seed, key, 2)
+        segment = np.floor(times / dwell).astype(np.int64)
+        pick = (_units(seed ^ key, segment) * len(codes)).astype(np.int64)
+        return _code_bits(sig, codes[pick])
+
+    lo, hi = _physical_range(sig, meta)
+    p_lo, p_hi = WAVE_PERIOD_S
+    period = p_lo + (p_hi - p_lo) * _unit(seed, key, 3)
+    phase = 2 * np.pi * _unit(seed, key, 4)
+    wave = 0.5 + 0.45 * np.sin(2 * np.pi * times / period + phase)
+    noise = 0.05 * (_units(seed ^ key ^ 0x5A5A, counter) - 0.5)
+    return _to_raw(sig, lo + (hi - lo) * (wave + noise))
+
+
+# ─── Frame Encoding ─────────────────────────────────────────────
+def _insert(sig: SignalLayout, bits: np.ndarray, rows: np.ndarray, payload: np.ndarray) -> None:
+    """ORs the raw bits of `sig` into payload[rows] (the inverse of vector_decode._extract_raw)."""
+    length = payload.shape[1]
+    if sig.byte_order == "little_endian":
+        order, position = "little", sig.start
+    else:
+        order, position = "big", 8 * (sig.start // 8) + (7 - sig.start % 8)
+
+    if length == 8:
+        if order == "little":
+            word = bits << np.uint64(position)
+            payload[rows] |= word.astype("<u8").view(np.uint8).reshape(-1, 8)
+        else:
+            word = bits << np.uint64(64 - position - sig.length)
+            payload[rows] |= word.astype(">u8").view(np.uint8).reshape(-1, 8)
+        return
+
+    # Other lengths: place the bits in an unpacked bit matrix
+    shifts = np.arange(sig.length, dtype=np.uint64)
+    if order == "little":
+        values = ((bits[:, None] >> shifts) & np.uint64(1)).astype(np.uint8)
+    else:
+        values = ((bits[:, None] >> shifts[::-1]) & np.uint64(1)).astype(np.uint8)
+    matrix = np.zeros((len(bits), 8 * length), dtype=np.uint8)
+    matrix[:, position:position + sig.length] = values
+    payload[rows] |= np.packbits(matrix, axis=1, bitorder=order)
+
+
+def encode_frames(message: _Message, seed: int, times: np.ndarray, counter: np.ndarray) -> np.ndarray:
+    """uint8 payloads (n, length) of one message at `times`."""
+    layout = message.layout
+    n = len(times)
+    width = 8 if layout.length <= 8 else layout.length
+    payload = np.zeros((n, width), dtype=np.uint8)
+    mux_values: dict[str, np.ndarray] = {}
+    present: dict[str, np.ndarray] = {}
+    # A branch of a multiplexer cycling through k values gets every k-th frame:
+    # counter // divisor numbers the frames of a branch consecutively
+    divisor: dict[str | None, int] = {None: 1}
+    msg_seed = seed ^ (message.channel << 32) ^ layout.frame_id
+
+    for sig in layout.signals:   # multiplexers come first
+        if sig.multiplexer_signal is None:
+            rows = np.ones(n, dtype=bool)
+        elif sig.multiplexer_ids is None or sig.multiplexer_signal not in mux_values:
+            continue
+        else:
+            rows = present[sig.multiplexer_signal] & np.isin(mux_values[sig.multiplexer_signal],
+                                                             sig.multiplexer_ids)
+        index = np.flatnonzero(rows)
+        if not len(index):
+            continue
+
+        own_counter = counter[index] // divisor[sig.multiplexer_signal]
+        bits = _signal_bits(sig, message.meta.get(sig.name), msg_seed, times[index], own_counter)
+        _insert(sig, bits, index, payload)
+
+        if sig.is_multiplexer:
+            values = np.zeros(n, dtype=np.int64)
+            ids = np.asarray(sig.mux_ids, dtype=np.int64)
+            values[index] = ids[own_counter % len(ids)] if len(ids) else 0
+            mux_values[sig.name], present[sig.name] = values, rows
+            divisor[sig.name] = divisor[sig.multiplexer_signal] * max(len(ids), 1)
+
+    return payload[:, :layout.length]
+
+
+def _message_frames(message: _Message, seed: int, t0: float, t1: float):
+    """(times, counter) of the frames of one message sent in [t0, t1)."""
+    period = message.period_s
+    first = max(0, int(np.ceil((t0 - message.phase_s) / period)) - 1)
+    last = int(np.ceil((t1 - message.phase_s) / period)) + 1
+    counter = np.arange(first, last, dtype=np.int64)
+    jitter = (_units(seed ^ message.layout.frame_id ^ (message.channel << 40), counter) - 0.5) * 2 * JITTER
+    times = message.phase_s + (counter + jitter) * period
+    keep = (times >= t0) & (times < t1)
+    return times[keep], counter[keep]
+
+
+def frame_records(messages: list[_Message], spec: LogSpec, t0: float, t1: float) -> tuple[np.ndarray, np.ndarray]:
+    """(relative timestamps, MF4Writer CAN_DataFrame records) of [t0, t1), sorted by time."""
+    times, parts = [], []
+    for message in messages:
+        t, counter = _message_frames(message, spec.seed, t0, t1)
+        if not len(t):
+            continue
+        payload = encode_frames(message, spec.seed, t, counter)
+        records = np.zeros(len(t), dtype=STD_DTYPE)
+        fid = message.layout.frame_id
+        records["CAN_DataFrame.BusChannel"] = message.channel
+        records["CAN_DataFrame.ID"] = fid
+        records["CAN_DataFrame.IDE"] = int(fid > 0x7FF)
+        records["CAN_DataFrame.DLC"] = message.layout.length if message.layout.length <= 8 else can.util.len2dlc(message.layout.length)
+        records["CAN_DataFrame.DataLength"] = message.layout.length
+        records["CAN_DataFrame.DataBytes"][:, :payload.shape[1]] = payload
+        records["CAN_DataFrame.EDL"] = int(message.layout.length > 8)
+        times.append(t)
+        parts.append(records)
+
+    if not parts:
+        return np.empty(0), np.zeros(0, dtype=STD_DTYPE)
+    times = np.concatenate(times)
+    order = np.argsort(times, kind="stable")
+    return times[order], np.concatenate(parts)[order]
+
+
+# ─── Unsorted MF4 Output ────────────────────────────────────────
+FRAME_RECORD_ID, VLSD_RECORD_ID = 1, 2
+# CAN_DataFrame record after its record ID; DataBytes is an offset into the VLSD stream
+FRAME_RECORD = np.dtype([("time", "<f8"), ("channel", "u1"), ("id", "<u4"), ("dlc", "u1"),
+                         ("length", "u1"), ("data", "<u8")], align=False)
+# (name, cn_type, data type, byte offset, bit offset, bit count) of the CAN_DataFrame children
+FRAME_CHILDREN = [
+    ("CAN_DataFrame.BusChannel", 0, 0, 8, 0, 8),
+    ("CAN_DataFrame.ID", 0, 0, 9, 0, 29),
+    ("CAN_DataFrame.IDE", 0, 0, 12, 7, 1),
+    ("CAN_DataFrame.DLC", 0, 0, 13, 0, 4),
+    ("CAN_DataFrame.DataLength", 0, 0, 14, 0, 8),
+    ("CAN_DataFrame.DataBytes", 1, 10, 15, 0, 64),
+]
+
+
+class UnsortedMF4Writer:
+    """
+    Minimal MDF 4.1 writer for the CANedge layout (see the module docstring).
+    Data blocks are written as frames arrive; the block tree describing them
+    (DG / CG / CN / DL) is appended by stop().
+    """
+
+    def __init__(self, path: Path, start_time: datetime, compression: int = 0):
+        self.file = open(path, "wb")
+        self.compression = compression
+        self.groups: dict[int, dict] = {}
+        self.file.write(b"MDF     4.10    synth   " + bytes(4) + struct.pack("<H", 410) + bytes(34))
+        start_ns = int(start_time.timestamp()) * 1_000_000_000
+        self.hd = self._block(b"##HD", [0] * 6, struct.pack("<QhhBBBxdd", start_ns, 0, 0, 0, 0, 0, 0.0, 0.0))
+
+    def _block(self, block_id: bytes, links: list[int], data: bytes = b"") -> int:
+        address = self.file.seek(0, 2)
+        length = 24 + 8 * len(links) + len(data)
+        self.file.write(struct.pack(f"<4s4xQQ{len(links)}Q", block_id, length, len(links), *links) + data)
+        self.file.write(bytes(-length % 8))
+        return address
+
+    def _text(self, text: str) -> int:
+        return self._block(b"##TX", [], text.encode() + b"\0")
+
+    def _data_block(self, data: bytes) -> int:
+        if not self.compression:
+            return self._block(b"##DT", [], data)
+        packed = zlib.compress(data)
+        return self._block(b"##DZ", [], struct.pack("<2sBxIQQ", b"DT", 0, 0, len(data), len(packed)) + packed)
+
+    def append(self, times: np.ndarray, records: np.ndarray) -> None:
+        """Appends MF4Writer CAN_DataFrame records (STD_DTYPE) at relative `times`, sorted by time."""
+        for channel in np.unique(records["CAN_DataFrame.BusChannel"]):
+            rows = records["CAN_DataFrame.BusChannel"] == channel
+            group = self.groups.setdefault(int(channel), {"stream": bytearray(), "blocks": [], "offsets": [],
+                                                          "written": 0, "frames": 0, "vlsd_bytes": 0})
+            group["stream"] += self._records(group, times[rows], records[rows])
+            while len(group["stream"]) >= DT_BLOCK_BYTES:
+                self._flush(group, DT_BLOCK_BYTES)
+
+    def _records(self, group: dict, times: np.ndarray, records: np.ndarray) -> bytes:
+        """Each frame as a VLSD record (ID, uint32 length, payload) followed by its frame record."""
+        lengths = records["CAN_DataFrame.DataLength"].astype(np.int64)
+        entry = 4 + lengths
+        frame = np.zeros(len(records), dtype=FRAME_RECORD)
+        frame["time"] = times
+        frame["channel"] = records["CAN_DataFrame.BusChannel"]
+        frame["id"] = records["CAN_DataFrame.ID"] | (records["CAN_DataFrame.IDE"].astype(np.uint32) << 31)
+        frame["dlc"] = records["CAN_DataFrame.DLC"]
+        frame["length"] = lengths
+        frame["data"] = group["vlsd_bytes"] + np.cumsum(entry) - entry
+        group["vlsd_bytes"] += int(entry.sum())
+        group["frames"] += len(records)
+
+        size = 1 + entry + 1 + FRAME_RECORD.itemsize
+        starts = np.cumsum(size) - size
+        out = np.zeros(int(size.sum()), dtype=np.uint8)
+        out[starts] = VLSD_RECORD_ID
+        out[starts[:, None] + 1 + np.arange(4)] = lengths.astype("<u4").view(np.uint8).reshape(-1, 4)
+        width = records["CAN_DataFrame.DataBytes"].shape[1]
+        used = np.arange(width) < lengths[:, None]
+        out[(starts[:, None] + 5 + np.arange(width))[used]] = records["CAN_DataFrame.DataBytes"][used]
+        at = starts + 5 + lengths
+        out[at] = FRAME_RECORD_ID
+        out[at[:, None] + 1 + np.arange(FRAME_RECORD.itemsize)] = frame.view(np.uint8).reshape(len(frame), -1)
+        return out.tobytes()
+
+    def _flush(self, group: dict, size: int) -> None:
+        data = bytes(group["stream"][:size])
+        del group["stream"][:size]
+        group["blocks"].append(self._data_block(data))
+        group["offsets"].append(group["written"])
+        group["written"] += len(data)
+
+    def _channel(self, name: str, cn_type: int, data_type: int, byte_offset: int, bit_offset: int,
+                 bit_count: int, next_cn: int = 0, composition: int = 0, data: int = 0, sync: int = 0) -> int:
+        fields = struct.pack("<BBBBIIIIBBH6d", cn_type, sync, data_type, bit_offset, byte_offset, bit_count,
+                             0, 0, 0, 0, 0, *[0.0] * 6)
+        return self._block(b"##CN", [next_cn, composition, self._text(name), 0, 0, data, 0, 0], fields)
+
+    def stop(self) -> None:
+        next_dg = 0
+        for channel, group in sorted(self.groups.items(), reverse=True):
+            if group["stream"]:
+                self._flush(group, len(group["stream"]))
+            vlsd_bytes = group["vlsd_bytes"]
+            vlsd_cg = self._block(b"##CG", [0] * 6, struct.pack("<QQHH4xII", VLSD_RECORD_ID, group["frames"], 0x01, 0,
+                                                               vlsd_bytes & 0xFFFFFFFF, vlsd_bytes >> 32))
+            child = 0
+            for name, cn_type, data_type, byte_offset, bit_offset, bit_count in reversed(FRAME_CHILDREN):
+                child = self._channel(name, cn_type, data_type, byte_offset, bit_offset, bit_count, next_cn=child,
+                                      data=vlsd_cg if cn_type == 1 else 0)
+            frame = self._channel("CAN_DataFrame", 0, 10, 8, 0, 8 * (FRAME_RECORD.itemsize - 8), composition=child)
+            time = self._channel("Timestamp", 2, 4, 0, 0, 64, next_cn=frame, sync=1)
+            frame_cg = self._block(b"##CG", [vlsd_cg, time, self._text(f"CAN{channel}"), 0, 0, 0],
+                                   struct.pack("<QQHH4xII", FRAME_RECORD_ID, group["frames"], 0, 0,
+                                               FRAME_RECORD.itemsize, 0))
+            count = len(group["blocks"])
+            data_list = self._block(b"##DL", [0, *group["blocks"]],
+                                    struct.pack(f"<B3xI{count}Q", 0, count, *group["offsets"])) if count else 0
+            next_dg = self._block(b"##DG", [next_dg, frame_cg, data_list, 0], struct.pack("<B7x", 1))
+        self.file.seek(self.hd + 24)
+        self.file.write(struct.pack("<Q", next_dg))
+        self.file.close()
+
+
+# ─── MF4 Output ─────────────────────────────────────────────────
+def write_log(out_path: Path, spec: LogSpec, dbc_files: list[Path] | None = None, index: int = 0) -> int:
+    """
+    Writes one synthetic log; `index` makes the logs of one spec differ.
+    Returns the number of frames.
+    """
+    if dbc_files is None:
+        dbc_files = sorted(DBC_DIR.glob("*.dbc"))
+    spec = replace(spec, seed=spec.seed + index)
+    messages = plan_messages(dbc_files, spec)
+
+    out_path = Path(out_path)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = out_path.with_name(f".{out_path.name}.tmp")
+    frames = 0
+    try:
+        if spec.mf4_layout == "unsorted":
+            writer = UnsortedMF4Writer(tmp, START_TIME, spec.compression)
+            append = writer.append
+        else:
+            writer = can.MF4Writer(str(tmp), compression_level=spec.compression)
+            # MF4Writer stamps the wall clock; pin it so the same spec writes the same file
+            writer._mdf.header.start_time = START_TIME
+            append = lambda times, records: writer._mdf.extend(0, [(times, None), (records, None)])
+        t0 = 0.0
+        while t0 < spec.duration_s:
+            t1 = min(t0 + CHUNK_SECONDS, spec.duration_s)
+            times, records = frame_records(messages, spec, t0, t1)
+            if len(times):
+                append(times, records)   # data frame group(s)
+            frames += len(times)
+            t0 = t1
+        writer.stop()
+        tmp.replace(out_path)
+    finally:
+        tmp.unlink(missing_ok=True)
+
+    logging.info(f"🧪 {out_path.name}: {frames} frames, {spec.duration_s:.0f} s at {spec.bus_load:.0%} bus load "
+                 f"({spec.mf4_layout})")
+    return frames
+
+
+def write_logs(out_dir: Path, spec: LogSpec, logs: int = 1, dbc_files: list[Path] | None = None) -> dict[Path, int]:
+    """Writes <out_dir>/00000001.MF4 ... (one drive per log); returns {path: frames}."""
+    return {Path(out_dir) / f"{i + 1:08d}.MF4": write_log(Path(out_dir) / f"{i + 1:08d}.MF4", spec, dbc_files, i)
+            for i in range(logs)}
+
+
+# ─── Main ──────────────────────────────────────────────────────
+def main():
+    parser = argparse.ArgumentParser(description="Write synthetic MF4 CAN logs from the DBCs in config/dbc/")
+    parser.add_argument("out_dir", type=Path, help="directory for the .MF4 files")
+    parser.add_argument("--logs", type=int, default=1, help="number of logs (drives)")
+    parser.add_argument("--duration", type=float, default=60.0, help="seconds per log")
+    parser.add_argument("--bus-load", type=float, default=0.4, help=f"fraction of {BITRATE_BPS} bit/s per bus")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--compression", type=int, choices=[0, 1, 2], default=0, help="MF4 compression level")
+    parser.add_argument("--mf4-layout", choices=MF4_LAYOUTS, default="sorted", help="MF4 data group layout")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s — %(levelname)s — %(message)s")
+    if not 0 < args.bus_load <= 1:
+        parser.error("--bus-load must be in (0, 1]")
+    write_logs(args.out_dir, LogSpec(args.duration, args.bus_load, args.seed, args.compression, args.mf4_layout),
+               args.logs)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,21 +3,44 @@
 src/decode/mf4_to_parquet.py
 
 Decodes all MF4 log files in data/raw/ using all DBCs in config/dbc/.
+Each MF4 is read once; frames are routed to every DBC that defines their ID.
 Outputs per-DBC decoded Parquet files in data/decoded/:
   - Signal names are preserved (no suffixes)
   - time is standardized to pandas datetime (UTC)
   - Columns ordered: [time, arbitration_id, ...signals]
   - Enums handled safely using .value
+  - Frames read in bulk from the memory-mapped MF4 (see mf4_reader.py)
+  - Signals decoded column-wise per arbitration ID (see vector_decode.py)
+  - DBCs come from the compiled registry (see dbc_registry.py); cantools
+    parses them only for the reference engine or when a DBC changed
+  - Streamed to Parquet in fixed-size row groups with a DBC-derived schema:
+    each signal gets the narrowest exact type for its bit length, scaling and
+    signedness (bool, int8…int64, float32, float64; see src/store/signal_types.py)
+  - --layout long writes one dense (time, value) series per signal instead of
+    the sparse wide table (see src/store/long_store.py)
+  - Incremental: (MF4, DBC) pairs whose MF4, DBC and metadata CSV are
+    unchanged since the last run are skipped
+  - read / decode / flatten / sanitize / write are timed on the profiler, and
+    undecodable or unrouted frames counted per arbitration ID
+    (see src/utils/profiling.py)
   - Logging used for traceability
 """
 
+import os
 import sys
+import time
+import argparse
 import logging
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
 
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 import cantools
 import can
+from cantools.database.can import Message
 from cantools.database.can.signal import NamedSignalValue
 
 # ─── Path Bootstrap ─────────────────────────────────────────────
@@ -27,6 +50,13 @@ if str(PROJECT_ROOT) not in sys.path:
     sys.path.insert(0, str(PROJECT_ROOT))
 
 from src.utils.paths import RAW_DIR, DECODED_DIR, DBC_DIR
+from src.utils.manifest import Manifest
+from src.decode.vector_decode import MessageLayout, decode_frames, decode_frames_long, frames_to_payload
+from src.decode.dbc_registry import CompiledDBC, load_compiled_set
+from src.decode.mf4_reader import MF4File, FrameBlock, UnsupportedMF4, zero_padded
+from src.store.long_store import LongWriter, remove_output, replace_output
+from src.store.signal_types import SCHEMA_VERSION, DEFAULT_TYPE, decoded_types, registry_digest, conform, narrow
+from src.utils.profiling import PROFILER
 
 # ─── Logging Setup ──────────────────────────────────────────────
 logging.basicConfig(
@@ -35,6 +65,10 @@ logging.basicConfig(
     handlers=[logging.StreamHandler()]
 )
 
+# ─── Config ─────────────────────────────────────────────────────
+CHUNK_FRAMES = 32_768  # frames decoded per row group when streaming
+STALE_TMP_AGE_S = 24 * 3600  # temp outputs untouched this long are leftovers, whatever their pid
+
 # ─── Helpers ────────────────────────────────────────────────────
 
 def flatten_decoded(decoded: dict) -> dict:
@@ -76,43 +110,481 @@ def sanitize_for_parquet(df: pd.DataFrame) -> pd.DataFrame:
     return df
 
 
-def decode_mf4_with_dbc(mf4_path: Path, dbc_path: Path) -> pd.DataFrame:
+def load_dbc_set(dbc_files: list[Path], engine: str = "vector") -> dict[str, CompiledDBC | cantools.database.Database]:
     """
-    Loads a single MF4 file and decodes it using one DBC file.
-    Returns a DataFrame of decoded messages.
+    Loads every DBC exactly once.
+    engine="vector"   → {dbc_stem: CompiledDBC} from the compiled registry
+    engine="cantools" → {dbc_stem: Database}, parsed by cantools
+    """
+    if engine == "vector":
+        return load_compiled_set(dbc_files)
+    return {dbc_path.stem: cantools.database.load_file(str(dbc_path)) for dbc_path in dbc_files}
+
+
+def build_routing_table(dbcs: dict[str, CompiledDBC | cantools.database.Database]) -> dict[int, list[tuple[str, Message | MessageLayout]]]:
+    """
+    Maps arbitration_id → [(dbc_stem, Message or MessageLayout), ...].
+    An ID can live in several DBCs (e.g. 0x118 in can1-can, can1-party and
+    can1-vehicle); the frame is decoded into every one of them.
+    """
+    routes: dict[int, list[tuple[str, Message | MessageLayout]]] = {}
+    for dbc_name, db in dbcs.items():
+        for message in db.messages:
+            routes.setdefault(message.frame_id, []).append((dbc_name, message))
+    return routes
+
+
+def records_to_frame(records: list[dict]) -> pd.DataFrame:
+    """
+    Turns decoded records into the final [time, arbitration_id, ...signals] frame.
     """
-    db = cantools.database.load_file(str(dbc_path))
-    records = []
+    if not records:
+        return pd.DataFrame()
+
+    df = pd.DataFrame(records)
+    df = force_time_and_order(df)
+    with PROFILER.phase("sanitize", rows=len(df)):
+        return sanitize_for_parquet(df)
+
+
+def iter_frame_chunks(mf4_path: Path, routes: dict[int, list[tuple[str, Message]]],
+                      chunk_frames: int | None = CHUNK_FRAMES,
+                      start: float | None = None, end: float | None = None):
+    """
+    Walks the MF4 once and keeps only frames with a routed arbitration ID
+    (and start <= timestamp < end, in UNIX seconds, when given).
+    Yields (timestamps, arbitration_ids, payload, lengths) NumPy chunks of at
+    most `chunk_frames` frames (None → a single chunk with the whole file).
+    Files the bulk reader cannot parse are read through python-can instead.
+    """
+    try:
+        mf4 = MF4File(mf4_path)
+    except UnsupportedMF4 as e:
+        logging.warning(f"⚠️ {mf4_path.name}: {e} — reading with python-can")
+        yield from _iter_frame_chunks_python_can(mf4_path, routes, chunk_frames, start, end)
+        return
+
+    def _chunk(block: FrameBlock):
+        return block.timestamps, block.arbitration_ids, zero_padded(block.payload, block.lengths), block.lengths
+
+    routed = np.fromiter(routes, dtype=np.int64, count=len(routes))
+    pending: list[FrameBlock] = []
+    n_pending = 0
+    with mf4:
+        for block in mf4.iter_blocks(start, end):
+            keep = np.isin(block.arbitration_ids, routed)
+            if not keep.all():
+                _count_frames("unrouted_frames", block.arbitration_ids[~keep])
+            if not keep.any():
+                continue
+            block = block.select(slice(None) if keep.all() else keep)
+            pending.append(block)
+            n_pending += len(block)
+
+            while chunk_frames and n_pending >= chunk_frames:
+                merged = FrameBlock.concat(pending)
+                yield _chunk(merged.select(slice(0, chunk_frames)))
+                rest = merged.select(slice(chunk_frames, None))
+                pending, n_pending = ([rest], len(rest)) if len(rest) else ([], 0)
+
+        if n_pending:
+            yield _chunk(FrameBlock.concat(pending))
+
+
+def _count_frames(counter: str, arbitration_ids: np.ndarray) -> None:
+    ids, counts = np.unique(arbitration_ids, return_counts=True)
+    for frame_id, n in zip(ids.tolist(), counts.tolist()):
+        PROFILER.count(counter, hex(frame_id), n)
+
+
+def _read_chunks(mf4_path: Path, routes: dict, chunk_frames: int | None = CHUNK_FRAMES):
+    """iter_frame_chunks, timed as the "read" phase (frames, payload bytes)."""
+    return PROFILER.iter_phase("read", iter_frame_chunks(mf4_path, routes, chunk_frames),
+                               rows=lambda chunk: len(chunk[0]), nbytes=lambda chunk: int(chunk[3].sum()))
+
+
+def _iter_frame_chunks_python_can(mf4_path: Path, routes: dict[int, list[tuple[str, Message]]],
+                                  chunk_frames: int | None = CHUNK_FRAMES,
+                                  start: float | None = None, end: float | None = None):
+    """iter_frame_chunks over python-can's per-message MF4Reader."""
+    timestamps, ids, data = [], [], []
+
+    def _flush():
+        payload, lengths = frames_to_payload(data)
+        return np.asarray(timestamps, dtype=np.float64), np.asarray(ids, dtype=np.int64), payload, lengths
+
+    for msg in can.MF4Reader(str(mf4_path)):
+        if msg.arbitration_id not in routes or msg.is_error_frame or msg.is_remote_frame:
+            continue
+        if (start is not None and msg.timestamp < start) or (end is not None and msg.timestamp >= end):
+            continue
+        timestamps.append(msg.timestamp)
+        ids.append(msg.arbitration_id)
+        data.append(bytes(msg.data))
+
+        if chunk_frames and len(ids) >= chunk_frames:
+            yield _flush()
+            timestamps, ids, data = [], [], []
+
+    if ids:
+        yield _flush()
+
+
+def read_frames(mf4_path: Path, routes: dict[int, list[tuple[str, Message]]]):
+    """
+    Reads all routed frames of an MF4 into memory as one chunk.
+    Returns (timestamps, arbitration_ids, payload, lengths) as NumPy arrays.
+    """
+    for chunk in _read_chunks(mf4_path, routes, chunk_frames=None):
+        return chunk
+    empty, lengths = frames_to_payload([])
+    return np.empty(0, dtype=np.float64), np.empty(0, dtype=np.int64), empty, lengths
+
+
+def dbc_schema(db: CompiledDBC) -> pa.Schema:
+    """
+    Output schema fixed up front from the DBC signal list:
+    [time, arbitration_id, ...sorted signals], each signal typed from the
+    DBC metadata registry (float64 for signals it does not know).
+    """
+    types = decoded_types(db.name)
+    return pa.schema(
+        [pa.field("time", pa.timestamp("ns", tz="UTC")), pa.field("arbitration_id", pa.string())]
+        + [pa.field(name, types.get(name, DEFAULT_TYPE)) for name in db.signal_names]
+    )
+
+
+def stream_decode_mf4(mf4_path: Path, dbcs: dict[str, CompiledDBC],
+                      out_paths: dict[str, Path],
+                      routes: dict[int, list[tuple[str, MessageLayout]]] | None = None,
+                      chunk_frames: int = CHUNK_FRAMES) -> dict[str, int]:
+    """
+    Decodes an MF4 in fixed-size frame chunks and appends each chunk as a row
+    group to one ParquetWriter per DBC, so memory stays flat for any log size.
+    Writers are opened lazily; DBCs without decodable frames produce no file.
+    Returns {dbc_stem: rows_written}.
+    """
+    if routes is None:
+        routes = build_routing_table(dbcs)
+    layouts = {dbc_name: db.layouts for dbc_name, db in dbcs.items()}
+    schemas = {dbc_name: dbc_schema(db) for dbc_name, db in dbcs.items()}
+    writers: dict[str, pq.ParquetWriter] = {}
+    rows = {dbc_name: 0 for dbc_name in dbcs}
+
+    try:
+        for timestamps, ids, payload, lengths in _read_chunks(mf4_path, routes, chunk_frames):
+            for dbc_name in dbcs:
+                with PROFILER.phase("decode", rows=len(ids)):
+                    table = decode_frames(timestamps, ids, payload, lengths, layouts[dbc_name])
+                if table.num_rows == 0:
+                    continue
+                with PROFILER.phase("write", rows=table.num_rows, nbytes=table.nbytes):
+                    if dbc_name not in writers:
+                        writers[dbc_name] = pq.ParquetWriter(out_paths[dbc_name], schemas[dbc_name])
+                    writers[dbc_name].write_table(conform(table, schemas[dbc_name]))
+                rows[dbc_name] += table.num_rows
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+    return rows
+
+
+def stream_decode_mf4_long(mf4_path: Path, dbcs: dict[str, CompiledDBC],
+                           out_paths: dict[str, Path],
+                           routes: dict[int, list[tuple[str, MessageLayout]]] | None = None,
+                           chunk_frames: int = CHUNK_FRAMES) -> dict[str, int]:
+    """
+    Long-layout twin of stream_decode_mf4: each chunk is decoded straight into
+    dense per-signal series, written as one partition per signal under out_paths[dbc].
+    Returns {dbc_stem: frames_decoded}.
+    """
+    if routes is None:
+        routes = build_routing_table(dbcs)
+    layouts = {dbc_name: db.layouts for dbc_name, db in dbcs.items()}
+    writers = {dbc_name: LongWriter(out_paths[dbc_name], decoded_types(dbc_name)) for dbc_name in dbcs}
+    rows = {dbc_name: 0 for dbc_name in dbcs}
+
+    for timestamps, ids, payload, lengths in _read_chunks(mf4_path, routes, chunk_frames):
+        for dbc_name in dbcs:
+            with PROFILER.phase("decode", rows=len(ids)):
+                n_frames, series = decode_frames_long(timestamps, ids, payload, lengths, layouts[dbc_name])
+            writers[dbc_name].append(series)
+            rows[dbc_name] += n_frames
+
+    for dbc_name, writer in writers.items():
+        if rows[dbc_name]:
+            with PROFILER.phase("write", rows=rows[dbc_name]):
+                writer.close()
+    return rows
+
+
+def decode_mf4_multi(mf4_path: Path, dbcs: dict[str, CompiledDBC | cantools.database.Database],
+                     routes: dict[int, list[tuple[str, Message]]] | None = None,
+                     engine: str = "vector") -> dict[str, pa.Table]:
+    """
+    Reads a single MF4 file once and decodes every frame with all DBCs that
+    know its arbitration ID.
+    engine="vector"   → columnar NumPy decoding (src/decode/vector_decode.py), CompiledDBCs
+    engine="cantools" → reference per-frame `decode_message` path, cantools Databases
+    Returns {dbc_stem: Table}; DBCs without decodable frames map to an empty Table.
+    """
+    if routes is None:
+        routes = build_routing_table(dbcs)
+
+    if engine == "vector":
+        try:
+            timestamps, ids, payload, lengths = read_frames(mf4_path, routes)
+        except Exception as e:
+            logging.error(f"❌ Could not read MF4: {mf4_path.name} — {e}")
+            return {dbc_name: pa.table({}) for dbc_name in dbcs}
+
+        tables = {}
+        for dbc_name, db in dbcs.items():
+            with PROFILER.phase("decode", rows=len(ids)):
+                tables[dbc_name] = decode_frames(timestamps, ids, payload, lengths, db.layouts)
+        return tables
+
+    records: dict[str, list[dict]] = {dbc_name: [] for dbc_name in dbcs}
 
     try:
         reader = can.MF4Reader(str(mf4_path))
     except Exception as e:
         logging.error(f"❌ Could not read MF4: {mf4_path.name} — {e}")
-        return pd.DataFrame()
+        return {dbc_name: pa.table({}) for dbc_name in dbcs}
+
+    # Per-frame phases are summed locally: a context manager per frame would cost more than flattening
+    decode_s = flatten_s = 0.0
+    decoded_frames = 0
+    dropped: dict[int, int] = {}
+    unrouted: dict[int, int] = {}
 
     for msg in reader:
-        try:
-            decoded = db.decode_message(msg.arbitration_id, msg.data)
+        targets = routes.get(msg.arbitration_id)
+        if not targets:
+            unrouted[msg.arbitration_id] = unrouted.get(msg.arbitration_id, 0) + 1
+            continue  # unknown arbitration_id for every DBC
+
+        for dbc_name, message in targets:
+            start = time.perf_counter()
+            try:
+                decoded = message.decode(msg.data)
+            except Exception:
+                dropped[msg.arbitration_id] = dropped.get(msg.arbitration_id, 0) + 1
+                continue  # undecodable payload, counted per arbitration ID
+            decoded_at = time.perf_counter()
             clean = flatten_decoded(decoded)
+            decode_s += decoded_at - start
+            flatten_s += time.perf_counter() - decoded_at
+            decoded_frames += 1
             record = {
                 "time": msg.timestamp,
                 "arbitration_id": hex(msg.arbitration_id)
             }
             record.update(clean)
-            records.append(record)
-        except Exception:
-            continue  # silently skip unknown arbitration_ids
+            records[dbc_name].append(record)
 
-    if not records:
-        return pd.DataFrame()
+    PROFILER.add("decode", decode_s, rows=decoded_frames)
+    PROFILER.add("flatten", flatten_s, rows=decoded_frames)
+    for frame_id, n in unrouted.items():
+        PROFILER.count("unrouted_frames", hex(frame_id), n)
+    for frame_id, n in dropped.items():
+        PROFILER.count("dropped_frames", hex(frame_id), n)
+    if dropped:
+        worst = ", ".join(f"{hex(i)}×{n}" for i, n in sorted(dropped.items(), key=lambda kv: -kv[1])[:5])
+        logging.warning(f"⚠️ {mf4_path.name}: {sum(dropped.values())} undecodable frames ({worst})")
 
-    df = pd.DataFrame(records)
-    df = force_time_and_order(df)
-    return sanitize_for_parquet(df)
+    return {
+        dbc_name: pa.Table.from_pandas(records_to_frame(recs), preserve_index=False)
+        for dbc_name, recs in records.items()
+    }
+
+
+def decode_mf4_with_dbc(mf4_path: Path, dbc_path: Path, engine: str = "vector") -> pd.DataFrame:
+    """
+    Loads a single MF4 file and decodes it using one DBC file.
+    Returns a DataFrame of decoded messages.
+    """
+    dbcs = load_dbc_set([dbc_path], engine)
+    return decode_mf4_multi(mf4_path, dbcs, engine=engine)[dbc_path.stem].to_pandas()
+
+
+# ─── Jobs ───────────────────────────────────────────────────────
+_WORKER_DBCS: dict[tuple[tuple[Path, ...], str], tuple[dict, dict]] = {}
+
+
+def _worker_dbc_set(dbc_paths: tuple[Path, ...], engine: str = "vector"):
+    """
+    Loads a DBC group once per process and reuses it for later jobs.
+    """
+    key = (dbc_paths, engine)
+    if key not in _WORKER_DBCS:
+        dbcs = load_dbc_set(list(dbc_paths), engine)
+        _WORKER_DBCS[key] = (dbcs, build_routing_table(dbcs))
+    return _WORKER_DBCS[key]
+
+
+def decoded_path(mf4_path: Path, dbc_name: str) -> Path:
+    return DECODED_DIR / f"{mf4_path.stem}_{dbc_name.replace('-', '_')}.parquet"
+
+
+def decode_job(mf4_path: Path, dbc_paths: tuple[Path, ...], engine: str = "vector",
+               layout: str = "wide") -> tuple[dict, float]:
+    """
+    Decodes one (MF4, DBC group) job.
+    layout="long" (vector engine only) writes per-signal partitions instead of a wide file.
+    Outputs are written to temporary files and renamed into data/decoded/ only
+    after the whole file decoded, so a crash never leaves a partial Parquet.
+    Returns ({dbc_stem: rows_written}, seconds).
+    """
+    start = time.perf_counter()
+    dbcs, routes = _worker_dbc_set(dbc_paths, engine)
+
+    out_paths = {dbc_name: decoded_path(mf4_path, dbc_name) for dbc_name in dbcs}
+    tmp_paths = {dbc_name: path.with_name(f".{path.name}.{os.getpid()}.tmp") for dbc_name, path in out_paths.items()}
+    DECODED_DIR.mkdir(parents=True, exist_ok=True)
+
+    try:
+        if layout == "long":
+            if engine != "vector":
+                raise ValueError("layout='long' requires the vector engine")
+            rows = stream_decode_mf4_long(mf4_path, dbcs, tmp_paths, routes)
+        elif engine == "vector":
+            rows = stream_decode_mf4(mf4_path, dbcs, tmp_paths, routes)
+        else:
+            rows = {}
+            for dbc_name, table in decode_mf4_multi(mf4_path, dbcs, routes, engine="cantools").items():
+                if table.num_rows:
+                    table = narrow(table, decoded_types(dbc_name))
+                    with PROFILER.phase("write", rows=table.num_rows, nbytes=table.nbytes):
+                        pq.write_table(table, tmp_paths[dbc_name])
+                rows[dbc_name] = table.num_rows
+
+        for dbc_name, n_rows in rows.items():
+            if n_rows:
+                replace_output(tmp_paths[dbc_name], out_paths[dbc_name])
+            else:
+                remove_output(out_paths[dbc_name])  # drop outputs of a previous DBC version
+    finally:
+        for tmp in tmp_paths.values():
+            remove_output(tmp)
+
+    return rows, time.perf_counter() - start
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def is_stale_tmp(tmp: Path) -> bool:
+    """
+    True for a temp output (.<output>.<pid>.tmp) that no running decode owns:
+    its writer process is gone, or it has not been touched for STALE_TMP_AGE_S.
+    """
+    try:
+        pid = int(tmp.name.rsplit(".", 2)[-2])
+    except ValueError:
+        pid = None
+    if pid is not None and not _pid_alive(pid):
+        return True
+    try:
+        return time.time() - tmp.stat().st_mtime > STALE_TMP_AGE_S
+    except FileNotFoundError:
+        return False  # renamed into place meanwhile
+
+
+def split_dbc_groups(dbc_files: list[Path], n_groups: int) -> list[tuple[Path, ...]]:
+    """
+    Splits DBCs into at most n_groups shards, dealing largest files first
+    so each shard gets a similar parse/decode load.
+    """
+    n_groups = max(1, min(n_groups, len(dbc_files)))
+    groups: list[list[Path]] = [[] for _ in range(n_groups)]
+    for i, dbc_path in enumerate(sorted(dbc_files, key=lambda p: p.stat().st_size, reverse=True)):
+        groups[i % n_groups].append(dbc_path)
+    return [tuple(sorted(group)) for group in groups]
+
+
+def decode_params(engine: str, layout: str) -> dict:
+    """Manifest params of a decode job; a new output schema version re-decodes everything."""
+    return {"engine": engine, "layout": layout, "schema": SCHEMA_VERSION}
+
+
+def _unit(mf4_path: Path, dbc_path: Path) -> str:
+    return f"{mf4_path.name}:{dbc_path.name}"
+
+
+def _inputs(mf4_path: Path, dbc_path: Path) -> list[Path]:
+    return [mf4_path, dbc_path]
+
+
+def _params(params: dict, dbc_path: Path) -> dict:
+    """The bus's metadata rows pick its output types, so changing them re-decodes that bus only."""
+    return {**params, "registry": registry_digest(dbc_path.stem)}
+
+
+def plan_jobs(mf4_files: list[Path], dbc_groups: list[tuple[Path, ...]],
+              manifest: Manifest, params: dict, force: bool = False) -> list[tuple[Path, tuple[Path, ...]]]:
+    """
+    All (MF4, DBC group) jobs whose inputs changed since the last run, largest
+    logs first so one huge file starts early instead of holding up the tail.
+    Each group is narrowed to its stale DBCs: editing one DBC only re-decodes that bus.
+    """
+    jobs = []
+    for mf4_path in mf4_files:
+        for group in dbc_groups:
+            stale = tuple(
+                dbc_path for dbc_path in group
+                if force or not manifest.is_fresh("decode", _unit(mf4_path, dbc_path), _inputs(mf4_path, dbc_path),
+                                                  _params(params, dbc_path))
+            )
+            if stale:
+                jobs.append((mf4_path, stale))
+    return sorted(jobs, key=lambda job: job[0].stat().st_size, reverse=True)
+
+
+def record_job(manifest: Manifest, params: dict, mf4_path: Path, group: tuple[Path, ...]):
+    for dbc_path in group:
+        manifest.record("decode", _unit(mf4_path, dbc_path), _inputs(mf4_path, dbc_path), _params(params, dbc_path),
+                        [decoded_path(mf4_path, dbc_path.stem)])
+    manifest.save()
+
+
+def _job_label(mf4_path: Path, group: tuple[Path, ...]) -> str:
+    return f"{mf4_path.name} × [{', '.join(p.stem for p in group)}]"
+
+
+def _log_job(done: int, total: int, mf4_path: Path, group: tuple[Path, ...], rows: dict, seconds: float):
+    written = {name: n for name, n in rows.items() if n}
+    logging.info(f"✅ [{done}/{total}] {_job_label(mf4_path, group)} — {seconds:.1f}s")
+    for dbc_name in rows:
+        if dbc_name in written:
+            logging.info(f"    ✅ Saved {written[dbc_name]} rows to: {decoded_path(mf4_path, dbc_name)}")
+        else:
+            logging.info(f"    ⚠️ No decodable signals for {dbc_name}.dbc")
 
 
 # ─── Main ───────────────────────────────────────────────────────
 def main():
+    parser = argparse.ArgumentParser(description="Decode MF4 logs to per-DBC Parquet")
+    parser.add_argument("--engine", choices=["vector", "cantools"], default="vector",
+                        help="vector = columnar NumPy decoder, cantools = per-frame reference decoder")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of decode processes (default: 1, in-process)")
+    parser.add_argument("--dbc-groups", type=int, default=1,
+                        help="split the DBC set into N shards decoded as separate jobs (default: 1)")
+    parser.add_argument("--layout", choices=["wide", "long"], default="wide",
+                        help="wide = one row per frame, long = one (time, value) series per signal")
+    parser.add_argument("--force", action="store_true",
+                        help="ignore the manifest and re-decode everything")
+    args = parser.parse_args()
+
     logging.info(f"📂 RAW_DIR={RAW_DIR}")
     logging.info(f"📂 DBC_DIR={DBC_DIR}")
     logging.info(f"📂 DECODED_DIR={DECODED_DIR}")
@@ -127,21 +599,59 @@ def main():
         logging.error("❌ No DBC files found.")
         return
 
-    for mf4_path in mf4_files:
-        logging.info(f"🔍 Processing: {mf4_path.name}")
-        for dbc_path in dbc_files:
-            logging.info(f"  📘 Using DBC: {dbc_path.name}")
-            df = decode_mf4_with_dbc(mf4_path, dbc_path)
+    # Leftovers of killed workers are never valid outputs; other running decodes keep theirs
+    for tmp in DECODED_DIR.glob(".*.tmp"):
+        if is_stale_tmp(tmp):
+            remove_output(tmp)
 
-            if df.empty:
-                logging.info(f"    ⚠️ No decodable signals for {dbc_path.name}")
-                continue
+    # Every job reads its MF4 once for all DBCs of its group
+    manifest = Manifest()
+    if args.layout == "long" and args.engine != "vector":
+        parser.error("--layout long requires --engine vector")
+    params = decode_params(args.engine, args.layout)
+    dbc_groups = split_dbc_groups(dbc_files, args.dbc_groups)
+    jobs = plan_jobs(mf4_files, dbc_groups, manifest, params, args.force)
+    logging.info(f"🧮 {len(jobs)} stale jobs ({len(mf4_files)} MF4 × {len(dbc_groups)} DBC groups), workers={args.workers}")
+    if not jobs:
+        logging.info("✅ Decoded outputs are up to date.")
+        return
 
-            out_file = DECODED_DIR / f"{mf4_path.stem}_{dbc_path.stem.replace('-', '_')}.parquet"
-            df.to_parquet(out_file, index=False)
-            logging.info(f"    ✅ Saved to: {out_file}")
+    run_start = time.perf_counter()
+    failed = 0
+
+    # Compile changed DBCs once here, so pool workers only unpickle the registry
+    if args.engine == "vector":
+        load_compiled_set(sorted({dbc_path for _, group in jobs for dbc_path in group}))
+
+    if args.workers <= 1:
+        for done, (mf4_path, group) in enumerate(jobs, start=1):
+            logging.info(f"🔍 Processing: {_job_label(mf4_path, group)}")
+            try:
+                rows, seconds = decode_job(mf4_path, group, args.engine, args.layout)
+            except Exception as e:
+                failed += 1
+                logging.error(f"❌ [{done}/{len(jobs)}] {_job_label(mf4_path, group)} — {e}")
+                continue
+            _log_job(done, len(jobs), mf4_path, group, rows, seconds)
+            record_job(manifest, params, mf4_path, group)
+    else:
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            futures = {
+                pool.submit(decode_job, mf4_path, group, args.engine, args.layout): (mf4_path, group)
+                for mf4_path, group in jobs
+            }
+            for done, future in enumerate(as_completed(futures), start=1):
+                mf4_path, group = futures[future]
+                try:
+                    rows, seconds = future.result()
+                except Exception as e:
+                    failed += 1
+                    logging.error(f"❌ [{done}/{len(jobs)}] {_job_label(mf4_path, group)} — {e}")
+                    continue
+                _log_job(done, len(jobs), mf4_path, group, rows, seconds)
+                record_job(manifest, params, mf4_path, group)
 
-        logging.info(f"✅ Finished {mf4_path.name}")
+    logging.info(f"🏁 Decoded {len(jobs) - failed}/{len(jobs)} jobs in {time.perf_counter() - run_start:.1f}s")
 
 
 if __name__ == "__main__":
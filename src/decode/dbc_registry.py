@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+src/decode/dbc_registry.py
+
+Compiled DBC registry.
+
+cantools parses a DBC in tens to hundreds of milliseconds (far more for the
+large archive DBCs); the decoders only need the flattened message layouts.
+Every DBC is parsed once into a CompiledDBC (vector_decode MessageLayouts for
+decoding + per-signal metadata for the registry CSV / enum maps) and pickled to
+
+    config/registry/compiled/<dbc stem>-<sha256 prefix>.pkl
+
+keyed by the SHA-256 of the DBC file: editing a DBC compiles a new entry,
+older entries of the same DBC are removed. Loading an entry is a plain
+unpickle, cheap enough to do in every worker of a process pool.
+
+    from src.decode.dbc_registry import load_compiled
+    dbc = load_compiled(DBC_DIR / "can1-vehicle.dbc")
+    dbc.layouts[0x118]      # MessageLayout
+"""
+
+import os
+import sys
+import pickle
+import logging
+from dataclasses import dataclass
+from pathlib import Path
+
+import cantools
+
+# ─── Path Bootstrap ─────────────────────────────────────────────
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from src.utils.paths import DBC_DIR, COMPILED_DBC_DIR
+from src.utils.manifest import sha256_file
+from src.decode.vector_decode import MessageLayout, compile_database
+
+# Bump when CompiledDBC, SignalMeta or the layouts change shape
+REGISTRY_VERSION = 1
+HASH_PREFIX = 16
+
+# ─── Compiled Form ──────────────────────────────────────────────
+
+@dataclass(frozen=True)
+class SignalMeta:
+    """DBC attributes of one signal that are not needed for decoding."""
+    name: str
+    message_name: str
+    frame_id: int
+    unit: str
+    minimum: float | None
+    maximum: float | None
+    scale: float
+    offset: float
+    length: int
+    is_signed: bool
+    is_float: bool
+    is_multiplexer: bool
+    multiplexer_signal: str | None
+    choices: dict[int, str] | None      # raw code → label
+    comment: str | None
+
+
+@dataclass(frozen=True)
+class CompiledDBC:
+    """Everything the pipeline reads from one DBC file."""
+    name: str                           # file stem, e.g. "can1-vehicle"
+    sha256: str
+    layouts: dict[int, MessageLayout]   # frame_id → layout, in DBC message order
+    signals: tuple[SignalMeta, ...]     # in DBC message / signal order
+
+    @property
+    def messages(self):
+        return self.layouts.values()
+
+    @property
+    def signal_names(self) -> list[str]:
+        return sorted({sig.name for sig in self.signals})
+
+
+def compile_dbc(dbc_path: Path, sha256: str | None = None) -> CompiledDBC:
+    """Parses a DBC with cantools and flattens it into a CompiledDBC."""
+    db = cantools.database.load_file(str(dbc_path))
+    signals = tuple(
+        SignalMeta(
+            name=sig.name,
+            message_name=msg.name,
+            frame_id=msg.frame_id,
+            unit=sig.unit or "",
+            minimum=sig.minimum,
+            maximum=sig.maximum,
+            scale=sig.scale,
+            offset=sig.offset,
+            length=sig.length,
+            is_signed=sig.is_signed,
+            is_float=sig.is_float,
+            is_multiplexer=sig.is_multiplexer,
+            multiplexer_signal=sig.multiplexer_signal,
+            choices={int(k): str(v) for k, v in sig.choices.items()} if sig.choices else None,
+            comment=sig.comment,
+        )
+        for msg in db.messages
+        for sig in msg.signals
+    )
+    return CompiledDBC(
+        name=dbc_path.stem,
+        sha256=sha256 or sha256_file(dbc_path),
+        layouts=compile_database(db),
+        signals=signals,
+    )
+
+
+# ─── Registry ───────────────────────────────────────────────────
+_LOADED: dict[tuple[str, str], CompiledDBC] = {}
+
+
+def compiled_path(dbc_path: Path, sha256: str) -> Path:
+    return COMPILED_DBC_DIR / f"{dbc_path.stem}-{sha256[:HASH_PREFIX]}.pkl"
+
+
+def _read(path: Path, sha256: str) -> CompiledDBC | None:
+    try:
+        with open(path, "rb") as f:
+            version, compiled = pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ValueError, TypeError):
+        return None
+    if version != REGISTRY_VERSION or compiled.sha256 != sha256:
+        return None
+    return compiled
+
+
+def _write(path: Path, compiled: CompiledDBC) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp, "wb") as f:
+        pickle.dump((REGISTRY_VERSION, compiled), f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, path)
+
+    # Entries of earlier versions of this DBC
+    for old in path.parent.glob(f"{compiled.name}-*.pkl"):
+        if old != path and old.stem.rsplit("-", 1)[0] == compiled.name:
+            old.unlink(missing_ok=True)
+
+
+def load_compiled(dbc_path: Path) -> CompiledDBC:
+    """
+    Compiled form of a DBC: from this process' memory, else from the
+    registry on disk, else parsed now and stored for every later caller.
+    """
+    sha256 = sha256_file(dbc_path)
+    key = (dbc_path.stem, sha256)
+    if key in _LOADED:
+        return _LOADED[key]
+
+    path = compiled_path(dbc_path, sha256)
+    compiled = _read(path, sha256) if path.exists() else None
+    if compiled is None or compiled.name != dbc_path.stem:
+        compiled = compile_dbc(dbc_path, sha256)
+        _write(path, compiled)
+        logging.info(f"🧩 Compiled {dbc_path.name} → {path.name}")
+
+    _LOADED[key] = compiled
+    return compiled
+
+
+def load_compiled_set(dbc_files: list[Path]) -> dict[str, CompiledDBC]:
+    """{dbc_stem: CompiledDBC}, compiling whatever the registry does not hold yet."""
+    return {dbc_path.stem: load_compiled(dbc_path) for dbc_path in dbc_files}
+
+
+# ─── Main ───────────────────────────────────────────────────────
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s — %(levelname)s — %(message)s")
+    for dbc_path in sorted(DBC_DIR.glob("*.dbc")):
+        compiled = load_compiled(dbc_path)
+        logging.info(f"✅ {dbc_path.name}: {len(compiled.layouts)} messages, {len(compiled.signals)} signals")
+
+
+if __name__ == "__main__":
+    main()
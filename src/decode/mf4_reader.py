@@ -0,0 +1,782 @@
+#!/usr/bin/env python3
+"""
+src/decode/mf4_reader.py
+
+Bulk reader for MDF4 CAN bus logs (ASAM bus logging, as written by CANedge
+loggers and python-can's MF4Writer).
+
+`can.MF4Reader` builds one `can.Message` per frame. This reader memory-maps
+the file, walks the MDF4 block tree itself and returns whole data blocks as
+NumPy arrays: timestamps, arbitration IDs, DLCs, data lengths, bus channels
+and a 2-D uint8 payload. No Python object is created per frame.
+
+  - Uncompressed DT blocks are not copied: records are a strided view into
+    the mapping and the payload is a column slice of it
+  - DZ blocks (deflate, optionally transposed) are inflated one at a time
+  - Sorted data groups are read block by block; blocks outside a requested
+    time range are skipped after reading their first / last timestamp, and
+    the range edges are found by bisection
+  - Unsorted data groups (record IDs, several channel groups) are walked
+    WALK_BYTES at a time; record starts are found with NumPy (pointer
+    doubling over the positions that hold a known record ID), not a Python
+    loop per record
+  - VLSD payloads (SD blocks or VLSD channel groups) are read through a
+    sliding window that only keeps the entries frames still point to, so
+    memory stays bounded for any file size (e.g. the CANedge layout)
+  - Several frame groups (e.g. one per bus) are merged by a k-way merge that
+    holds one block per group
+  - Only CAN_DataFrame groups are read; error and remote frames carry no
+    decodable signals
+
+Files using anything else (unfinalized files, column-oriented 4.2 blocks,
+non-linear time conversions) raise UnsupportedMF4 when opened, so callers
+can fall back to python-can before reading a single frame.
+
+    with MF4File(path) as mf4:
+        for block in mf4.iter_blocks(start=t0, end=t1):
+            block.timestamps, block.arbitration_ids, block.payload, ...
+"""
+
+import mmap
+import struct
+import zlib
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+
+# ─── Config ─────────────────────────────────────────────────────
+BLOCK_RECORDS = 65_536          # frames per FrameBlock
+WALK_BYTES = 4 * 2**20          # unsorted data stream walked per step
+CAN_ID_MASK = 0x1FFFFFFF
+DLC_TO_LENGTH = np.array([0, 1, 2, 3, 4, 5, 6, 7, 8, 12, 16, 20, 24, 32, 48, 64], dtype=np.int64)
+
+_HEADER = struct.Struct("<4s4xQQ")          # block id, length, link count
+_HD_DATA = struct.Struct("<QhhB")           # start_time_ns, tz offset, dst offset, time flags
+_CG_DATA = struct.Struct("<QQH2x4xII")      # record id, cycle count, flags, data bytes, inval bytes
+_CN_DATA = struct.Struct("<BBBBIIII")       # type, sync, data type, bit offset, byte offset, bit count, flags, inval bit
+_CC_DATA = struct.Struct("<BBHHH")          # type, precision, flags, ref count, val count
+_DZ_DATA = struct.Struct("<2sBxIQQ")        # original block type, zip type, zip parameter, original / compressed size
+_DL_DATA = struct.Struct("<B3xI")           # flags, count
+
+_CG_VLSD = 0x01
+_CN_VLSD, _CN_MASTER, _CN_VIRTUAL_MASTER = 1, 2, 3
+_CN_INVAL_BIT_VALID = 0x02
+
+
+class UnsupportedMF4(ValueError):
+    """The file uses an MDF4 feature this reader does not implement."""
+
+
+# ─── Frame Blocks ───────────────────────────────────────────────
+
+@dataclass
+class FrameBlock:
+    """A run of CAN data frames in file (= time) order."""
+    timestamps: np.ndarray          # float64, UNIX seconds
+    arbitration_ids: np.ndarray     # int64, 11/29-bit ID without the IDE flag
+    dlcs: np.ndarray                # uint8
+    lengths: np.ndarray             # int64, payload bytes per frame
+    channels: np.ndarray            # uint8 bus channel (0 if not logged)
+    payload: np.ndarray             # uint8 (n, width); bytes past `lengths` are not meaningful
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def select(self, index) -> "FrameBlock":
+        """Frames at `index` (slice, mask or positions) with the payload trimmed to their longest frame."""
+        lengths = self.lengths[index]
+        width = int(lengths.max()) if len(lengths) else 0
+        payload = self.payload[index, :width] if isinstance(index, slice) else self.payload[:, :width][index]
+        return FrameBlock(self.timestamps[index], self.arbitration_ids[index], self.dlcs[index],
+                          lengths, self.channels[index], payload)
+
+    @staticmethod
+    def concat(blocks: list["FrameBlock"]) -> "FrameBlock":
+        """Joins blocks into one, zero padding payloads to the widest frame."""
+        if len(blocks) == 1:
+            return blocks[0]
+        lengths = np.concatenate([b.lengths for b in blocks])
+        width = int(lengths.max()) if len(lengths) else 0
+        payload = np.zeros((len(lengths), width), dtype=np.uint8)
+        row = 0
+        for b in blocks:
+            w = min(width, b.payload.shape[1])
+            payload[row:row + len(b), :w] = b.payload[:, :w]
+            row += len(b)
+        return FrameBlock(
+            np.concatenate([b.timestamps for b in blocks]),
+            np.concatenate([b.arbitration_ids for b in blocks]),
+            np.concatenate([b.dlcs for b in blocks]),
+            lengths,
+            np.concatenate([b.channels for b in blocks]),
+            payload,
+        )
+
+
+def zero_padded(payload: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """Copy of `payload` with every byte past a frame's length set to 0."""
+    if not payload.size or (lengths == payload.shape[1]).all():
+        return np.ascontiguousarray(payload)
+    return np.where(np.arange(payload.shape[1]) < lengths[:, None], payload, 0).astype(np.uint8)
+
+
+# ─── Channel Fields ─────────────────────────────────────────────
+
+@dataclass(frozen=True)
+class _Field:
+    """Location and encoding of one channel inside a record."""
+    byte_offset: int
+    bit_offset: int
+    bit_count: int
+    data_type: int                          # MDF4 cn_data_type
+    conversion: tuple[float, float] | None  # linear (offset, factor)
+    channel_type: int = 0
+    data: int = 0                           # cn_data link (VLSD source)
+    inval_bit: int | None = None            # invalidation bit position
+
+
+def _read_field(records: np.ndarray, field: _Field) -> np.ndarray:
+    """Values of a numeric channel for every row of a (n, record size) uint8 array."""
+    n_bytes = (field.bit_offset + field.bit_count + 7) // 8
+    cols = records[:, field.byte_offset:field.byte_offset + n_bytes]
+
+    if field.data_type in (4, 5):
+        if field.bit_offset or field.bit_count not in (32, 64):
+            raise UnsupportedMF4(f"{field.bit_count}-bit float channel")
+        dtype = np.dtype(("<" if field.data_type == 4 else ">") + ("f8" if field.bit_count == 64 else "f4"))
+        values = np.ascontiguousarray(cols).view(dtype).ravel().astype(np.float64)
+    elif field.data_type in (0, 1, 2, 3):
+        if n_bytes > 8:
+            raise UnsupportedMF4(f"{field.bit_count}-bit integer channel")
+        order = range(n_bytes) if field.data_type in (0, 2) else range(n_bytes - 1, -1, -1)
+        raw = np.zeros(len(records), dtype=np.uint64)
+        for shift, j in enumerate(order):
+            raw |= cols[:, j].astype(np.uint64) << np.uint64(8 * shift)
+        raw = (raw >> np.uint64(field.bit_offset)) & np.uint64((1 << field.bit_count) - 1)
+        if field.data_type in (2, 3) and field.bit_count < 64:
+            sign = np.int64(1 << (field.bit_count - 1))
+            values = (raw.astype(np.int64) ^ sign) - sign
+        else:
+            values = raw
+    else:
+        raise UnsupportedMF4(f"channel data type {field.data_type}")
+
+    if field.conversion is not None:
+        offset, factor = field.conversion
+        return offset + factor * values.astype(np.float64)
+    return values
+
+
+def _gather(stream: np.ndarray, starts: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """(n, max length) zero padded payload of variable length entries in `stream`."""
+    width = int(lengths.max()) if len(lengths) else 0
+    if width == 0:
+        return np.zeros((len(starts), 0), dtype=np.uint8)
+    cols = np.arange(width)
+    index = np.minimum(starts[:, None] + cols, len(stream) - 1)
+    return np.where(cols < lengths[:, None], stream[index], 0).astype(np.uint8)
+
+
+def _u32(stream: np.ndarray, starts: np.ndarray) -> np.ndarray:
+    cols = stream[starts[:, None] + np.arange(4)].astype(np.int64)
+    return cols[:, 0] | cols[:, 1] << 8 | cols[:, 2] << 16 | cols[:, 3] << 24
+
+
+def _ranges(stream: np.ndarray, starts: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """stream[start:start + length] of every entry, concatenated."""
+    offsets = np.cumsum(lengths) - lengths
+    return stream[np.repeat(starts - offsets, lengths) + np.arange(int(lengths.sum()))]
+
+
+def _record_starts(window: np.ndarray, rec_id_size: int, sizes: dict[int, int]) -> tuple[dict[int, np.ndarray], int]:
+    """
+    Walks the records of an unsorted data stream window from its first byte.
+    Returns ({record id: data start of each record}, stop), where window[stop:]
+    is a record cut by the window end (or nothing).
+
+    Every position holding a known record ID is a candidate record start with
+    a successor (position + ID + size). The records are the successor chain
+    of position 0, collected by pointer doubling: after k rounds the chain
+    holds 2**k records, so a window takes log2(records) vectorized rounds.
+    """
+    n, k = len(window), rec_id_size
+    if n < k:
+        return {}, 0
+    m = n - k + 1
+    ids = window[:m].astype(np.int64)
+    for j in range(1, k):
+        ids |= window[j:j + m].astype(np.int64) << (8 * j)
+    known = np.array(sorted(sizes), dtype=np.int64)
+    if k == 1:
+        lookup = np.zeros(256, dtype=bool)
+        lookup[known] = True
+        cand = np.flatnonzero(lookup[window[:m]])
+    else:
+        cand = np.flatnonzero(np.isin(ids, known))
+    if not len(cand) or cand[0] != 0:
+        raise UnsupportedMF4(f"unknown record id {int(ids[0])}")
+
+    cid = ids[cand]
+    size = np.zeros(len(cand), dtype=np.int64)
+    for record_id, record_size in sizes.items():
+        mask = cid == record_id
+        if record_size >= 0:
+            size[mask] = record_size
+        else:  # VLSD record: uint32 length, then the bytes
+            at = cand[mask] + k
+            whole = at + 4 <= n
+            size[mask] = np.where(whole, 4 + _u32(window, np.minimum(at, n - 4)), n + 1)
+    after = cand + k + size
+    fits = after <= n
+
+    # successor of each candidate as a candidate index; len(cand) ends the chain
+    end = len(cand)
+    successor = np.minimum(np.searchsorted(cand, after), end - 1)
+    jump = np.append(np.where(fits & (cand[successor] == after), successor, end), end)
+    chain = np.zeros(1, dtype=np.int64)
+    while True:
+        step = jump[chain]
+        ahead = step[step < end]
+        chain = np.concatenate([chain, ahead])
+        if len(ahead) < len(step):
+            break
+        jump = jump[jump]
+
+    last = chain[-1]
+    if not fits[last]:
+        chain, stop = chain[:-1], int(cand[last])
+    else:
+        stop = int(after[last])
+        if stop + k <= n:
+            raise UnsupportedMF4(f"unknown record id {int(ids[stop])}")
+    starts, rids = cand[chain] + k, cid[chain]
+    return {record_id: starts[rids == record_id] for record_id in sizes}, stop
+
+
+class _SignalData:
+    """
+    Sliding window over a VLSD signal data stream ([uint32 length][bytes]
+    entries, addressed by byte offset). `blocks` supplies the stream for SD
+    blocks; a VLSD channel group's entries are fed with extend() while its
+    data group is walked. Bytes below the lowest offset frames still point
+    to are released, so only about one block of frames' payload is held.
+    """
+
+    def __init__(self, blocks=None):
+        self.blocks = blocks
+        self.base = 0                           # stream offset of buf[0]
+        self.floor = 0                          # lowest offset still needed
+        self.buf = np.zeros(0, dtype=np.uint8)
+
+    @property
+    def end(self) -> int:
+        return self.base + len(self.buf)
+
+    def extend(self, data: np.ndarray) -> None:
+        drop = min(max(self.floor - self.end, 0), len(data))
+        if drop or not len(self.buf):
+            self.base, self.buf = self.end + drop, data[drop:]
+        else:
+            self.buf = np.concatenate([self.buf, data])
+
+    def release(self, offset: int) -> None:
+        if offset <= self.floor:
+            return
+        self.floor = offset
+        cut = min(offset - self.base, len(self.buf))
+        self.base += cut
+        self.buf = self.buf[cut:] if cut < len(self.buf) else np.zeros(0, dtype=np.uint8)
+
+    def _reaches(self, offset: int) -> bool:
+        while self.end < offset and self.blocks is not None:
+            data = next(self.blocks, None)
+            if data is None:
+                self.blocks = None
+            else:
+                self.extend(data)
+        return self.end >= offset
+
+    def payload(self, pointers: np.ndarray, lengths: np.ndarray) -> tuple[np.ndarray, np.ndarray] | None:
+        """(payload, lengths) of the entries at `pointers`; None while the stream does not reach them yet."""
+        if not len(pointers):
+            return np.zeros((0, 0), dtype=np.uint8), lengths
+        if int(pointers.min()) < self.base:
+            raise UnsupportedMF4("VLSD offsets out of order")
+        if not self._reaches(int(pointers.max()) + 4):
+            return None
+        rel = pointers - self.base
+        entry_lengths = _u32(self.buf, rel)
+        if not self._reaches(int((pointers + 4 + entry_lengths).max())):
+            return None
+        lengths = np.minimum(lengths, entry_lengths)
+        return _gather(self.buf, pointers - self.base + 4, lengths), lengths
+
+
+# ─── Groups ─────────────────────────────────────────────────────
+
+@dataclass
+class _FrameGroup:
+    """One CAN_DataFrame channel group and the fields the reader needs."""
+    dg_address: int
+    record_id: int
+    cycle_count: int
+    record_size: int                # data bytes + invalidation bytes (no record id)
+    time: _Field
+    ids: _Field
+    dlc: _Field | None
+    data_length: _Field | None
+    data_bytes: _Field
+    channel: _Field | None
+    frame: _Field                   # the CAN_DataFrame channel itself (invalidation bit)
+    data_bytes_size: int
+
+
+class MF4File:
+    """Memory-mapped MDF4 file; see the module docstring."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._file = open(self.path, "rb")
+        try:
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # empty file
+            self._file.close()
+            raise UnsupportedMF4("empty file")
+        self._buf = np.frombuffer(self._mm, dtype=np.uint8)
+        try:
+            self._parse()
+        except (struct.error, IndexError, UnicodeDecodeError) as e:
+            self.close()
+            raise UnsupportedMF4(f"malformed block tree ({e})") from e
+        except UnsupportedMF4:
+            self.close()
+            raise
+
+    def __enter__(self) -> "MF4File":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._buf = None
+        try:
+            self._mm.close()
+        except BufferError:
+            pass  # returned blocks still view the mapping; it is released with them
+        self._file.close()
+
+    # ─── Block Tree ───
+
+    def _block(self, address: int) -> tuple[bytes, int, tuple[int, ...], int]:
+        """(block id, length, links, data offset) of the block at `address`."""
+        block_id, length, n_links = _HEADER.unpack_from(self._mm, address)
+        links = struct.unpack_from(f"<{n_links}Q", self._mm, address + 24)
+        return block_id, length, links, address + 24 + 8 * n_links
+
+    def _text(self, address: int) -> str:
+        if not address:
+            return ""
+        _, length, _, data = self._block(address)
+        return self._mm[data:address + length].split(b"\0", 1)[0].decode("utf-8", "replace").strip()
+
+    def _conversion(self, address: int) -> tuple[float, float] | None:
+        if not address:
+            return None
+        _, _, _, data = self._block(address)
+        cc_type, _, _, _, n_values = _CC_DATA.unpack_from(self._mm, data)
+        if cc_type == 0:
+            return None
+        if cc_type == 1:
+            offset, factor = struct.unpack_from("<2d", self._mm, data + _CC_DATA.size + 16)
+            return offset, factor
+        raise UnsupportedMF4(f"conversion type {cc_type} on a frame channel")
+
+    def _channels(self, address: int) -> dict[str, tuple[_Field, int]]:
+        """{name: (field, composition address)} along a cn_cn_next chain."""
+        channels = {}
+        while address:
+            block_id, _, links, data = self._block(address)
+            if block_id != b"##CN":
+                raise UnsupportedMF4(f"{block_id!r} in a channel chain")
+            cn_type, _, data_type, bit_offset, byte_offset, bit_count, flags, inval_bit = _CN_DATA.unpack_from(self._mm, data)
+            field = _Field(byte_offset, bit_offset, bit_count, data_type, self._conversion(links[4]),
+                           cn_type, links[5], inval_bit if flags & _CN_INVAL_BIT_VALID else None)
+            composition = links[1]
+            if composition and self._block(composition)[0] != b"##CN":
+                raise UnsupportedMF4("array / composition channels")
+            channels[self._text(links[2])] = (field, composition)
+            address = links[0]
+        return channels
+
+    def _parse(self) -> None:
+        if self._mm[:3] != b"MDF" or not self._mm[8:9] == b"4":
+            raise UnsupportedMF4("not an MDF4 file")
+        if struct.unpack_from("<H", self._mm, 60)[0]:
+            raise UnsupportedMF4("unfinalized MDF4 file")
+
+        block_id, _, links, data = self._block(64)
+        start_ns, tz_offset, dst_offset, time_flags = _HD_DATA.unpack_from(self._mm, data)
+        # start_ns counts from the UNIX epoch; with the local-time flag it is wall
+        # clock time without a known zone, read as UTC like asammdf does
+        self.start_time = start_ns / 1e9
+
+        self.groups: list[_FrameGroup] = []
+        self._group_sizes: dict[int, tuple[int, dict[int, int], int]] = {}  # dg → (record id size, sizes, data)
+        dg = links[0]
+        while dg:
+            _, _, dg_links, dg_data = self._block(dg)
+            rec_id_size = self._mm[dg_data]
+            if rec_id_size not in (0, 1, 2, 4, 8):
+                raise UnsupportedMF4(f"record id size {rec_id_size}")
+            sizes = {}
+            cg = dg_links[1]
+            while cg:
+                _, _, cg_links, cg_data = self._block(cg)
+                record_id, cycles, cg_flags, data_bytes, inval_bytes = _CG_DATA.unpack_from(self._mm, cg_data)
+                sizes[record_id] = -1 if cg_flags & _CG_VLSD else data_bytes + inval_bytes
+                if not cg_flags & _CG_VLSD:
+                    group = self._frame_group(dg, cg_links[1], record_id, cycles, data_bytes + inval_bytes, data_bytes)
+                    if group is not None:
+                        self.groups.append(group)
+                cg = cg_links[0]
+            self._group_sizes[dg] = (rec_id_size, sizes, dg_links[2])
+            if rec_id_size == 0 and len(sizes) > 1:
+                raise UnsupportedMF4("several channel groups without record ids")
+            dg = dg_links[0]
+
+        for group in self.groups:
+            self._check_data(self._group_sizes[group.dg_address][2])
+            if group.data_bytes.channel_type == _CN_VLSD and self._block(group.data_bytes.data)[0] != b"##CG":
+                self._check_data(group.data_bytes.data)
+
+    def _frame_group(self, dg: int, cn_first: int, record_id: int, cycles: int,
+                     record_size: int, data_bytes: int) -> _FrameGroup | None:
+        top = self._channels(cn_first)
+        if "CAN_DataFrame" not in top:
+            return None
+
+        frame, composition = top["CAN_DataFrame"]
+        children = {name.rsplit(".", 1)[-1]: field for name, (field, _) in self._channels(composition).items()}
+        children.update({name.rsplit(".", 1)[-1]: field for name, (field, _) in top.items()
+                         if name.startswith("CAN_DataFrame.")})
+
+        masters = [f for f, _ in top.values() if f.channel_type in (_CN_MASTER, _CN_VIRTUAL_MASTER)]
+        if not masters:
+            raise UnsupportedMF4("CAN_DataFrame group without a time channel")
+        if "ID" not in children or "DataBytes" not in children:
+            raise UnsupportedMF4("CAN_DataFrame without ID / DataBytes")
+        if "DataLength" not in children and "DLC" not in children:
+            raise UnsupportedMF4("CAN_DataFrame without DataLength / DLC")
+
+        payload = children["DataBytes"]
+        if payload.channel_type not in (0, _CN_VLSD) or payload.data_type != 10:
+            raise UnsupportedMF4("unexpected DataBytes encoding")
+        return _FrameGroup(
+            dg_address=dg, record_id=record_id, cycle_count=cycles, record_size=record_size,
+            time=masters[0], ids=children["ID"], dlc=children.get("DLC"),
+            data_length=children.get("DataLength"), data_bytes=payload,
+            channel=children.get("BusChannel"), frame=frame, data_bytes_size=data_bytes,
+        )
+
+    def _check_data(self, address: int) -> None:
+        """Fails early on data block types the reader cannot inflate."""
+        if not address:
+            return
+        block_id, _, links, data = self._block(address)
+        if block_id in (b"##DT", b"##SD"):
+            return
+        if block_id == b"##DZ":
+            if _DZ_DATA.unpack_from(self._mm, data)[1] not in (0, 1):
+                raise UnsupportedMF4("unknown DZ zip type")
+        elif block_id == b"##DL":
+            while address:
+                _, _, links, data = self._block(address)
+                count = _DL_DATA.unpack_from(self._mm, data)[1]
+                for link in links[1:1 + count]:
+                    self._check_data(link)
+                address = links[0]
+        elif block_id == b"##HL":
+            self._check_data(links[0])
+        else:
+            raise UnsupportedMF4(f"{block_id.decode(errors='replace')} data blocks")
+
+    # ─── Data Streams ───
+
+    def _data_blocks(self, address: int):
+        """Yields the payload of every data block under `address` as a uint8 array."""
+        if not address:
+            return
+        block_id, length, links, data = self._block(address)
+        if block_id in (b"##DT", b"##SD"):
+            yield self._buf[data:address + length]
+        elif block_id == b"##DZ":
+            _, zip_type, zip_parameter, original_size, compressed_size = _DZ_DATA.unpack_from(self._mm, data)
+            start = data + _DZ_DATA.size
+            raw = np.frombuffer(zlib.decompress(self._mm[start:start + compressed_size]), dtype=np.uint8)
+            if zip_type == 1 and zip_parameter:
+                rows = original_size // zip_parameter
+                body = raw[:rows * zip_parameter].reshape(zip_parameter, rows).T.reshape(-1)
+                raw = np.concatenate([body, raw[rows * zip_parameter:]])
+            yield raw
+        elif block_id == b"##DL":
+            while address:
+                _, _, links, data = self._block(address)
+                count = _DL_DATA.unpack_from(self._mm, data)[1]
+                for link in links[1:1 + count]:
+                    yield from self._data_blocks(link)
+                address = links[0]
+        elif block_id == b"##HL":
+            yield from self._data_blocks(links[0])
+
+    def _windows(self, address: int):
+        """_data_blocks, with blocks larger than WALK_BYTES cut into WALK_BYTES slices."""
+        for buf in self._data_blocks(address):
+            for lo in range(0, len(buf), WALK_BYTES):
+                yield buf[lo:lo + WALK_BYTES]
+
+    def _walk(self, dg: int):
+        """
+        Yields (window, {record id: data starts}) over the stream of an
+        unsorted data group; a record cut by a window end is carried over
+        into the next window.
+        """
+        rec_id_size, sizes, data = self._group_sizes[dg]
+        carry = np.zeros(0, dtype=np.uint8)
+        for buf in self._windows(data):
+            window = np.concatenate([carry, buf]) if len(carry) else buf
+            starts, stop = _record_starts(window, rec_id_size, sizes)
+            carry = window[stop:]
+            yield window, starts
+
+    def _record_chunks(self, address: int, size: int, count: int):
+        """Yields (n, size) record arrays; a record split across blocks is stitched."""
+        carry = np.zeros(0, dtype=np.uint8)
+        for buf in self._data_blocks(address):
+            if count <= 0:
+                return
+            if len(carry):
+                head = np.concatenate([carry, buf[:size - len(carry)]])
+                buf = buf[size - len(carry):]
+                if len(head) < size:
+                    carry = head
+                    continue
+                count -= 1
+                yield head.reshape(1, size)
+            n = min(len(buf) // size, count)
+            if n:
+                count -= n
+                yield buf[:n * size].reshape(n, size)
+            carry = buf[n * size:] if count > 0 else carry[:0]
+
+    # ─── Frames ───
+
+    def _time(self, group: _FrameGroup, records: np.ndarray, first_index: int) -> np.ndarray:
+        if group.time.channel_type == _CN_VIRTUAL_MASTER:
+            index = np.arange(first_index, first_index + len(records), dtype=np.float64)
+            offset, factor = group.time.conversion or (0.0, 1.0)
+            return self.start_time + offset + factor * index
+        return self.start_time + _read_field(records, group.time).astype(np.float64)
+
+    def _signal_data(self, group: _FrameGroup) -> _SignalData | None:
+        """The VLSD payload stream of the group's DataBytes; None for fixed-size payloads."""
+        if group.data_bytes.channel_type != _CN_VLSD:
+            return None
+        source = group.data_bytes.data
+        if self._block(source)[0] == b"##CG":
+            return _SignalData()   # entries are fed while the data group is walked
+        return _SignalData(self._windows(source))
+
+    def _unsorted_chunks(self, group: _FrameGroup, signal_data: _SignalData | None):
+        """
+        Yields the group's (n, record size) records window by window, after
+        feeding the window's VLSD channel group entries (if any) to signal_data.
+        """
+        vlsd_id = None
+        if signal_data is not None and self._block(group.data_bytes.data)[0] == b"##CG":
+            _, _, _, cg_data = self._block(group.data_bytes.data)
+            vlsd_id = _CG_DATA.unpack_from(self._mm, cg_data)[0]
+        cols = np.arange(group.record_size)
+        for window, starts in self._walk(group.dg_address):
+            entries = starts.get(vlsd_id, ())
+            if len(entries):
+                signal_data.extend(_ranges(window, entries, 4 + _u32(window, entries)))
+            positions = starts[group.record_id]
+            if len(positions):
+                yield window[positions[:, None] + cols]
+
+    def _frames(self, group: _FrameGroup, records: np.ndarray, first_index: int,
+                signal_data: _SignalData | None) -> FrameBlock | None:
+        """Frames of `records`; None while the VLSD payloads they point to are not read yet."""
+        timestamps = self._time(group, records, first_index)
+        if group.frame.inval_bit is not None:
+            bit = group.frame.inval_bit
+            valid = ((records[:, group.data_bytes_size + bit // 8] >> (bit % 8)) & 1) == 0
+            if not valid.all():
+                records, timestamps = records[valid], timestamps[valid]
+        ids = _read_field(records, group.ids).astype(np.int64) & CAN_ID_MASK
+        dlcs = (_read_field(records, group.dlc).astype(np.uint8) if group.dlc is not None
+                else np.zeros(len(records), dtype=np.uint8))
+        if group.data_length is not None:
+            lengths = _read_field(records, group.data_length).astype(np.int64)
+        else:
+            lengths = DLC_TO_LENGTH[np.minimum(dlcs, 15)]
+        channels = (_read_field(records, group.channel).astype(np.uint8) if group.channel is not None
+                    else np.zeros(len(records), dtype=np.uint8))
+
+        field = group.data_bytes
+        if field.channel_type == _CN_VLSD:
+            # The record holds a uint64 offset into the signal data stream
+            pointers = self._pointers(group, records)
+            resolved = signal_data.payload(pointers, lengths)
+            if resolved is None:
+                return None
+            payload, lengths = resolved
+            if len(pointers):
+                signal_data.release(int(pointers.min()))
+        else:
+            payload = records[:, field.byte_offset:field.byte_offset + field.bit_count // 8]
+            lengths = np.minimum(lengths, payload.shape[1])
+
+        return FrameBlock(timestamps, ids, dlcs, lengths, channels, payload)
+
+    @staticmethod
+    def _pointers(group: _FrameGroup, records: np.ndarray) -> np.ndarray:
+        return _read_field(records, _Field(group.data_bytes.byte_offset, 0, 64, 0, None)).astype(np.int64)
+
+    def _group_blocks(self, group: _FrameGroup, start: float | None, end: float | None):
+        """
+        Yields the group's frames with start <= time < end in blocks of at
+        most BLOCK_RECORDS. Records whose VLSD payload comes later in an
+        unsorted stream wait in `pending` until the walk has read it.
+        """
+        rec_id_size, _, data = self._group_sizes[group.dg_address]
+        signal_data = self._signal_data(group)
+
+        if rec_id_size == 0:
+            chunks = self._record_chunks(data, group.record_size, group.cycle_count)
+        else:
+            chunks = self._unsorted_chunks(group, signal_data)
+
+        first_index = 0
+        pending: list[tuple[np.ndarray, int]] = []
+        finished = False   # past `end`; the walk only goes on for payloads pending records wait for
+        for records in chunks:
+            if finished and not pending:
+                break
+            n = len(records)
+            lo, hi = (n, n) if finished else (0, n)
+            if not finished and (start is not None or end is not None):
+                first = self._row_time(group, records, first_index, 0)
+                last = self._row_time(group, records, first_index, n - 1)
+                if start is not None and last < start:
+                    lo = n
+                elif start is not None and first < start:
+                    lo = self._bisect(group, records, first_index, start)
+                if end is not None and last >= end:
+                    hi = max(lo, self._bisect(group, records, first_index, end))
+                    finished = True
+                if lo and signal_data is not None and not pending:
+                    # skipped records' payloads are never read
+                    signal_data.release(int(self._pointers(group, records[lo - 1:lo])[0]))
+            for i in range(lo, hi, BLOCK_RECORDS):
+                pending.append((records[i:min(i + BLOCK_RECORDS, hi)], first_index + i))
+            first_index += n
+
+            while pending:
+                block = self._frames(group, *pending[0], signal_data)
+                if block is None:
+                    break
+                pending.pop(0)
+                if len(block):
+                    yield block
+
+        for records, index in pending:
+            block = self._frames(group, records, index, signal_data)
+            if block is None:
+                raise UnsupportedMF4("VLSD offsets past the end of the signal data")
+            if len(block):
+                yield block
+
+    def _row_time(self, group: _FrameGroup, records: np.ndarray, first_index: int, row: int) -> float:
+        return float(self._time(group, records[row:row + 1], first_index + row)[0])
+
+    def _bisect(self, group: _FrameGroup, records: np.ndarray, first_index: int, t: float) -> int:
+        """First row with timestamp >= t; reads one record per step."""
+        lo, hi = 0, len(records)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._row_time(group, records, first_index, mid) < t:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def iter_blocks(self, start: float | None = None, end: float | None = None):
+        """
+        Yields FrameBlocks of all CAN data frames with start <= time < end
+        (UNIX seconds, None = unbounded), in time order. Several frame groups
+        (e.g. one per bus) are merged by timestamp, stable in group order.
+        """
+        if len(self.groups) == 1:
+            yield from self._group_blocks(self.groups[0], start, end)
+            return
+        yield from merge_blocks([self._group_blocks(group, start, end) for group in self.groups])
+
+    def read(self, start: float | None = None, end: float | None = None) -> FrameBlock:
+        """All frames of iter_blocks() as one FrameBlock."""
+        blocks = list(self.iter_blocks(start, end))
+        if not blocks:
+            empty = np.zeros(0, dtype=np.int64)
+            return FrameBlock(np.zeros(0), empty, empty.astype(np.uint8), empty,
+                              empty.astype(np.uint8), np.zeros((0, 0), dtype=np.uint8))
+        return FrameBlock.concat(blocks)
+
+
+def merge_blocks(streams: list):
+    """
+    K-way merge of FrameBlock iterators, each in time order, into one time
+    ordered stream; frames with equal timestamps keep stream order. One
+    block per stream is held: every step emits all frames up to the
+    frontier (the earliest last timestamp among the unfinished streams),
+    which empties the block of the stream that set it.
+    """
+    streams = [iter(stream) for stream in streams]
+    heads: list[FrameBlock | None] = [None] * len(streams)
+    live = set(range(len(streams)))
+    while True:
+        for i in sorted(live):
+            while heads[i] is None:
+                block = next(streams[i], None)
+                if block is None:
+                    live.discard(i)
+                    break
+                heads[i] = block if len(block) else None
+        if all(head is None for head in heads):
+            return
+
+        if live:
+            frontier = min(heads[i].timestamps[-1] for i in live)
+            first = min(i for i in live if heads[i].timestamps[-1] == frontier)
+        else:
+            frontier, first = np.inf, len(streams)
+        parts = []
+        for i, head in enumerate(heads):
+            if head is None:
+                continue
+            # a later stream's frames at the frontier wait for the stream that set it
+            k = len(head) if frontier == np.inf else int(
+                np.searchsorted(head.timestamps, frontier, side="right" if i <= first else "left"))
+            if k:
+                parts.append(head.select(slice(0, k)))
+                heads[i] = head.select(slice(k, None)) if k < len(head) else None
+        merged = FrameBlock.concat(parts)
+        yield merged if len(parts) == 1 else merged.select(np.argsort(merged.timestamps, kind="stable"))
+
+
+def read_frames(mf4_path: Path, start: float | None = None, end: float | None = None) -> FrameBlock:
+    """Reads every CAN data frame of an MF4 (optionally a time range) in one call."""
+    with MF4File(mf4_path) as mf4:
+        block = mf4.read(start, end)
+    return block
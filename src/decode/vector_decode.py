@@ -0,0 +1,386 @@
+#!/usr/bin/env python3
+"""
+src/decode/vector_decode.py
+
+Columnar CAN signal decoding engine.
+
+Instead of calling `db.decode_message` once per frame, frames are grouped by
+arbitration ID into contiguous uint8 payload arrays and every signal of a
+message is extracted with a handful of batched NumPy operations
+(bit extraction → sign handling → float reinterpretation → scale/offset).
+
+Output matches cantools `decode_message` + `flatten_decoded` exactly:
+  - Frames shorter than the DBC message length are rejected (longer are trimmed)
+  - Raw values listed in a signal's choices are emitted as the raw code
+    (cantools returns a NamedSignalValue, flattened to `.value`)
+  - Multiplexed signals are only present on frames whose selector matches;
+    frames with an unknown selector value are rejected as a whole
+  - Integer conversions stay integers, everything else is float64
+Rejected frames are counted per arbitration ID ("dropped_frames", see src/utils/profiling.py).
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import cantools
+
+from src.utils.profiling import PROFILER
+
+# ─── Layouts ────────────────────────────────────────────────────
+
+@dataclass(frozen=True)
+class SignalLayout:
+    """Bit layout and conversion of a single DBC signal."""
+    name: str
+    start: int
+    length: int
+    byte_order: str                     # "little_endian" | "big_endian"
+    is_signed: bool
+    is_float: bool
+    scale: float
+    offset: float
+    int_output: bool                    # cantools returns int (identity / integer linear)
+    choices: tuple[int, ...] = ()       # raw codes that decode to NamedSignalValue
+    is_multiplexer: bool = False
+    multiplexer_signal: str | None = None
+    multiplexer_ids: tuple[int, ...] | None = None
+    mux_ids: tuple[int, ...] = ()       # accepted selector values if is_multiplexer
+
+
+@dataclass(frozen=True)
+class MessageLayout:
+    """All signal layouts of one DBC message, multiplexers first."""
+    frame_id: int
+    name: str
+    length: int
+    signals: tuple[SignalLayout, ...]
+
+
+def _is_integer(value) -> bool:
+    return isinstance(value, int) or (hasattr(value, "is_integer") and value.is_integer())
+
+
+def compile_message(message: cantools.database.can.Message) -> MessageLayout:
+    """
+    Flattens a cantools Message into a MessageLayout.
+    Signals are ordered so every multiplexer precedes the signals it selects.
+    """
+    signals = []
+    for sig in message.signals:
+        choices = tuple(sorted(int(k) for k in (sig.choices or {})))
+        int_output = not sig.is_float and _is_integer(sig.scale) and _is_integer(sig.offset)
+
+        mux_ids = ()
+        if sig.is_multiplexer:
+            ids = set(choices)
+            for child in message.signals:
+                if child.multiplexer_signal == sig.name and child.multiplexer_ids is not None:
+                    ids.update(child.multiplexer_ids)
+            mux_ids = tuple(sorted(ids))
+
+        signals.append(SignalLayout(
+            name=sig.name,
+            start=sig.start,
+            length=sig.length,
+            byte_order=sig.byte_order,
+            is_signed=sig.is_signed,
+            is_float=sig.is_float,
+            scale=sig.scale,
+            offset=sig.offset,
+            int_output=int_output,
+            choices=choices,
+            is_multiplexer=sig.is_multiplexer,
+            multiplexer_signal=sig.multiplexer_signal,
+            multiplexer_ids=tuple(sig.multiplexer_ids) if sig.multiplexer_ids is not None else None,
+            mux_ids=mux_ids,
+        ))
+
+    # Topological order: a signal comes after its multiplexer
+    depth = {}
+    by_name = {s.name: s for s in signals}
+
+    def _depth(s: SignalLayout) -> int:
+        if s.name not in depth:
+            parent = by_name.get(s.multiplexer_signal) if s.multiplexer_signal else None
+            depth[s.name] = 0 if parent is None else _depth(parent) + 1
+        return depth[s.name]
+
+    ordered = sorted(signals, key=_depth)
+    return MessageLayout(frame_id=message.frame_id, name=message.name,
+                         length=message.length, signals=tuple(ordered))
+
+
+def compile_database(db: cantools.database.Database) -> dict[int, MessageLayout]:
+    """
+    Returns {frame_id: MessageLayout} for every message in a loaded DBC.
+    """
+    return {message.frame_id: compile_message(message) for message in db.messages}
+
+
+# ─── Bit Extraction ─────────────────────────────────────────────
+
+def _extract_raw(sig: SignalLayout, payload: np.ndarray, words: tuple | None) -> np.ndarray:
+    """
+    Returns the unsigned raw bits of one signal as uint64, one per frame.
+    `words` are the (little, big) endian uint64 views of ≤8 byte payloads.
+    """
+    mask = np.uint64((1 << sig.length) - 1)
+
+    if words is not None:
+        le, be = words
+        if sig.byte_order == "little_endian":
+            return (le >> np.uint64(sig.start)) & mask
+        msb = 8 * (sig.start // 8) + (7 - sig.start % 8)
+        return (be >> np.uint64(64 - msb - sig.length)) & mask
+
+    # Generic path for CAN FD payloads: gather the signal bits MSB-first
+    # into a zero-padded 64-bit row and pack it back into a big-endian word.
+    if sig.byte_order == "little_endian":
+        bits = np.unpackbits(payload, axis=1, bitorder="little")
+        sel = bits[:, sig.start:sig.start + sig.length][:, ::-1]
+    else:
+        bits = np.unpackbits(payload, axis=1, bitorder="big")
+        msb = 8 * (sig.start // 8) + (7 - sig.start % 8)
+        sel = bits[:, msb:msb + sig.length]
+    padded = np.zeros((len(payload), 64), dtype=np.uint8)
+    padded[:, 64 - sig.length:] = sel
+    return np.packbits(padded, axis=1).view(">u8").ravel().astype(np.uint64)
+
+
+def _raw_to_number(sig: SignalLayout, raw: np.ndarray) -> np.ndarray:
+    """
+    Applies sign extension / IEEE reinterpretation to unsigned raw bits.
+    Returns int64 (or uint64 for wide unsigned) for integers, float64 for floats.
+    """
+    if sig.is_float:
+        if sig.length == 64:
+            return raw.view(np.float64)
+        if sig.length == 32:
+            return raw.astype(np.uint32).view(np.float32).astype(np.float64)
+        return raw.astype(np.uint16).view(np.float16).astype(np.float64)
+
+    if sig.is_signed:
+        if sig.length == 64:
+            return raw.view(np.int64)
+        sign = np.int64(1 << (sig.length - 1))
+        return (raw.astype(np.int64) ^ sign) - sign
+
+    return raw.astype(np.int64) if sig.length < 64 else raw
+
+
+def _scale(sig: SignalLayout, number: np.ndarray) -> np.ndarray:
+    """
+    Applies scale/offset the way cantools' conversion classes do.
+    """
+    if sig.is_float:
+        if sig.scale == 1 and sig.offset == 0:
+            return number
+        return number * sig.scale + sig.offset
+    if sig.int_output:
+        if sig.scale == 1 and sig.offset == 0:
+            return number
+        return number * int(sig.scale) + int(sig.offset)
+    return number.astype(np.float64) * sig.scale + sig.offset
+
+
+# ─── Block Decoding ─────────────────────────────────────────────
+
+def decode_block(layout: MessageLayout, payload: np.ndarray, lengths: np.ndarray) -> tuple[np.ndarray, dict]:
+    """
+    Decodes all frames of one message at once.
+
+    payload: uint8 array (n, width), zero padded
+    lengths: actual data length of each frame
+    Returns (valid, signals) where `valid` flags frames cantools would decode and
+    `signals` maps name → (values, present, int_like) over all n frames.
+    """
+    n = len(payload)
+    valid = lengths >= layout.length
+
+    width = payload.shape[1] if payload.ndim == 2 else 0
+    if layout.length <= 8:
+        padded = np.zeros((n, 8), dtype=np.uint8)
+        padded[:, :min(width, 8)] = payload[:, :8]
+        words = (padded.view("<u8").ravel(), padded.view(">u8").ravel())
+        bytes_view = padded
+    else:
+        words = None
+        bytes_view = np.zeros((n, layout.length), dtype=np.uint8)
+        bytes_view[:, :min(width, layout.length)] = payload[:, :layout.length]
+
+    out: dict[str, tuple[np.ndarray, np.ndarray, bool]] = {}
+    mux_values: dict[str, np.ndarray] = {}
+    present_by_name: dict[str, np.ndarray] = {}
+
+    for sig in layout.signals:
+        if sig.multiplexer_signal is None:
+            present = np.ones(n, dtype=bool)
+        elif sig.multiplexer_ids is None or sig.multiplexer_signal not in mux_values:
+            continue
+        else:
+            present = present_by_name[sig.multiplexer_signal] & np.isin(
+                mux_values[sig.multiplexer_signal], sig.multiplexer_ids)
+
+        number = _raw_to_number(sig, _extract_raw(sig, bytes_view, words))
+        scaled = _scale(sig, number)
+
+        int_like = sig.int_output
+        if sig.choices:
+            is_choice = np.isin(number, sig.choices)
+            if is_choice.any():
+                if sig.int_output:
+                    scaled = np.where(is_choice, number, scaled)
+                else:
+                    scaled = np.where(is_choice, number.astype(np.float64), scaled)
+                    int_like = bool(is_choice[present & valid].all()) and bool((present & valid).any())
+        else:
+            is_choice = None
+
+        if sig.is_multiplexer:
+            # cantools resolves the selector from the choice code or int(scaled)
+            if is_choice is not None:
+                mux = np.where(is_choice, number, np.trunc(scaled)).astype(np.int64)
+            else:
+                mux = np.trunc(scaled).astype(np.int64) if scaled.dtype.kind == "f" else scaled.astype(np.int64)
+            valid &= ~present | np.isin(mux, sig.mux_ids)
+            mux_values[sig.name] = mux
+            present_by_name[sig.name] = present
+
+        out[sig.name] = (scaled, present, int_like)
+
+    return valid, out
+
+
+# ─── Frame Table Assembly ───────────────────────────────────────
+
+def _count_dropped(frame_id: int, valid: np.ndarray) -> None:
+    dropped = len(valid) - int(np.count_nonzero(valid))
+    if dropped:
+        PROFILER.count("dropped_frames", hex(int(frame_id)), dropped)
+
+
+def frames_to_payload(data: list[bytes]) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Packs raw frame payloads into a zero padded (n, width) uint8 array plus lengths.
+    """
+    lengths = np.fromiter((len(d) for d in data), dtype=np.int64, count=len(data))
+    width = int(lengths.max()) if len(lengths) else 0
+    if width == 0:
+        return np.zeros((len(data), 0), dtype=np.uint8), lengths
+    if (lengths == width).all():
+        buf = np.frombuffer(b"".join(data), dtype=np.uint8)
+        return buf.reshape(len(data), width), lengths
+    payload = np.zeros((len(data), width), dtype=np.uint8)
+    for i, d in enumerate(data):
+        payload[i, :len(d)] = np.frombuffer(d, dtype=np.uint8)
+    return payload, lengths
+
+
+def decode_frames(timestamps: np.ndarray, arbitration_ids: np.ndarray, payload: np.ndarray,
+                  lengths: np.ndarray, layouts: dict[int, MessageLayout]) -> pa.Table:
+    """
+    Decodes a batch of frames with one DBC and returns the wide table
+    [time, arbitration_id, ...sorted signals], one row per decodable frame,
+    in the original frame order.
+    """
+    arbitration_ids = np.asarray(arbitration_ids, dtype=np.int64)
+    order = np.argsort(arbitration_ids, kind="stable")
+    sorted_ids = arbitration_ids[order]
+    unique_ids, starts = np.unique(sorted_ids, return_index=True)
+    bounds = np.append(starts, len(sorted_ids))
+
+    blocks = []
+    for i, frame_id in enumerate(unique_ids):
+        layout = layouts.get(int(frame_id))
+        if layout is None:
+            continue
+        idx = order[bounds[i]:bounds[i + 1]]
+        valid, signals = decode_block(layout, payload[idx], lengths[idx])
+        _count_dropped(frame_id, valid)
+        if valid.any():
+            blocks.append((idx, valid, signals))
+
+    if not blocks:
+        return pa.table({})
+
+    # Rows are every valid frame, kept in reader order
+    keep = np.zeros(len(arbitration_ids), dtype=bool)
+    for idx, valid, _ in blocks:
+        keep[idx[valid]] = True
+    rows = np.flatnonzero(keep)
+    row_of = np.full(len(arbitration_ids), -1, dtype=np.int64)
+    row_of[rows] = np.arange(len(rows))
+    n_rows = len(rows)
+
+    columns: dict[str, list] = {}
+    for idx, valid, signals in blocks:
+        for name, (values, present, int_like) in signals.items():
+            sel = valid & present
+            if not sel.any():
+                continue
+            columns.setdefault(name, []).append((row_of[idx[sel]], values[sel], int_like))
+
+    arrays = {
+        "time": pa.array(pd.to_datetime(timestamps[rows], unit="s", utc=True)),
+        "arbitration_id": _hex_ids(arbitration_ids[rows]),
+    }
+    for name in sorted(columns):
+        parts = columns[name]
+        filled = sum(len(r) for r, _, _ in parts)
+        if filled == n_rows and all(int_like for _, _, int_like in parts):
+            col = np.empty(n_rows, dtype=np.int64)
+        else:
+            col = np.full(n_rows, np.nan, dtype=np.float64)
+        for r, v, _ in parts:
+            col[r] = v
+        arrays[name] = pa.array(col, from_pandas=True)  # NaN → null, as via pandas
+
+    return pa.table(arrays)
+
+
+def decode_frames_long(timestamps: np.ndarray, arbitration_ids: np.ndarray, payload: np.ndarray,
+                       lengths: np.ndarray, layouts: dict[int, MessageLayout]) -> tuple[int, dict]:
+    """
+    Decodes a batch of frames with one DBC into dense per-signal series,
+    skipping the sparse wide table entirely.
+    Returns (decodable_frames, {signal: (timestamps, float64 values)}) in frame order.
+    """
+    arbitration_ids = np.asarray(arbitration_ids, dtype=np.int64)
+    order = np.argsort(arbitration_ids, kind="stable")
+    sorted_ids = arbitration_ids[order]
+    unique_ids, starts = np.unique(sorted_ids, return_index=True)
+    bounds = np.append(starts, len(sorted_ids))
+
+    n_frames = 0
+    parts: dict[str, list] = {}
+    for i, frame_id in enumerate(unique_ids):
+        layout = layouts.get(int(frame_id))
+        if layout is None:
+            continue
+        idx = order[bounds[i]:bounds[i + 1]]
+        valid, signals = decode_block(layout, payload[idx], lengths[idx])
+        _count_dropped(frame_id, valid)
+        n_frames += int(valid.sum())
+        for name, (values, present, _) in signals.items():
+            sel = valid & present
+            if sel.any():
+                parts.setdefault(name, []).append((idx[sel], values[sel].astype(np.float64)))
+
+    series = {}
+    for name, chunks in parts.items():
+        rows = np.concatenate([r for r, _ in chunks])
+        values = np.concatenate([v for _, v in chunks])
+        if len(chunks) > 1:  # same signal name in several messages
+            keep = np.argsort(rows, kind="stable")
+            rows, values = rows[keep], values[keep]
+        series[name] = (timestamps[rows], values)
+    return n_frames, series
+
+
+def _hex_ids(ids: np.ndarray) -> pa.Array:
+    """hex(arbitration_id) strings, formatted once per unique ID."""
+    unique_ids, inverse = np.unique(ids, return_inverse=True)
+    labels = np.array([hex(int(i)) for i in unique_ids], dtype=object)
+    return pa.array(labels[inverse], type=pa.string())
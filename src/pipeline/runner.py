@@ -0,0 +1,455 @@
+#!/usr/bin/env python3
+"""
+src/pipeline/runner.py
+
+Runs the numbered stage scripts as one DAG on a shared process pool:
+
+    metadata ─────────────────┐
+    decode → downsample → clean → merge → analyze
+           │                   └→ metrics (per drive, then reduced to fleet tables)
+           ├→ pyramid
+           ├→ align (per drive, once every decoded file is in)
+           └→ events (per drive, then one fleet-wide event index)
+
+- decode / pyramid / downsample / clean stream per file: as soon as one MF4 is
+  decoded, its Parquet outputs are pyramided, downsampled and cleaned while
+  other logs still decode
+- the per-file stages wait for metadata, if that stage is selected: decode and
+  downsample read dbc_signals_metadata.csv, clean reads enum_maps.json
+- align, events, merge, metrics and analyze start once every upstream file is done
+- --from / --to select stages along the DAG edges (STAGE_DEPS), --stages an
+  explicit set
+- Units that the pipeline manifest reports as up to date are skipped
+- A per-stage timing summary is logged at the end and written, with the
+  per-phase throughput and counters of src/utils/profiling.py, as a JSON run
+  report in data/catalog/run_reports/ (profile=True adds per-stage pstats dumps)
+"""
+
+import time
+import logging
+import importlib
+from dataclasses import dataclass, field
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from src.utils.paths import RAW_DIR, DBC_DIR, DECODED_DIR, DOWNSAMPLED_DIR, RUN_REPORT_DIR
+from src.utils.manifest import Manifest
+from src.utils.profiling import (Profiler, run_profiled, merge_profiles, peak_rss_bytes,
+                                 profile_report, run_id, write_run_report)
+
+STAGE_ORDER = ["metadata", "decode", "pyramid", "downsample", "clean", "align", "events", "merge", "metrics", "analyze"]
+
+# stage → the stages whose outputs it reads (decode and downsample read the metadata CSV,
+# clean reads enum_maps.json); --from / --to select along these edges
+STAGE_DEPS = {
+    "metadata": [],
+    "decode": ["metadata"],
+    "pyramid": ["decode"],
+    "downsample": ["metadata", "decode"],
+    "clean": ["metadata", "downsample"],
+    "align": ["decode"],
+    "events": ["decode"],
+    "merge": ["clean"],
+    "metrics": ["clean"],
+    "analyze": ["merge"],
+}
+
+STAGE_MODULES = {
+    "metadata": "src.process.01_extract_dbc_metadata",
+    "decode": "src.decode.00_mf4_to_parquet",
+    "pyramid": "src.store.pyramid",
+    "downsample": "src.process.02_downsample_timeseries",
+    "clean": "src.process.03_clean_and_label_timeseries",
+    "align": "src.process.05_align_cross_bus",
+    "events": "src.process.06_index_events",
+    "merge": "src.process.04_merge_by_dbc",
+    "metrics": "src.process.07_compute_fsd_metrics",
+    "analyze": "src.validate.analyze_merged_signals",
+}
+
+
+def stage_module(stage: str):
+    return importlib.import_module(STAGE_MODULES[stage])
+
+
+def _run_unit(stage: str, func_name: str, args: tuple, profile_dir: Path | None = None):
+    """Worker entry point: runs one stage unit, returns (result, unit report)."""
+    return run_profiled(getattr(stage_module(stage), func_name), args,
+                        None if profile_dir is None else profile_dir / stage)
+
+
+# ─── Timing ─────────────────────────────────────────────────────
+@dataclass
+class StageTiming:
+    units: int = 0
+    skipped: int = 0
+    failed: int = 0
+    busy: float = 0.0
+    cpu: float = 0.0
+    peak_rss: int | None = None
+    first_start: float | None = None
+    last_end: float | None = None
+    profile: Profiler = field(default_factory=Profiler)
+
+    @property
+    def wall(self) -> float:
+        if self.first_start is None or self.last_end is None:
+            return 0.0
+        return self.last_end - self.first_start
+
+    def add_unit(self, unit: dict) -> None:
+        self.units += 1
+        self.busy += unit["wall_s"]
+        self.cpu += unit["cpu_s"]
+        if unit["peak_rss_bytes"] is not None:
+            self.peak_rss = max(self.peak_rss or 0, unit["peak_rss_bytes"])
+        self.profile.merge(unit)
+
+    def to_dict(self) -> dict:
+        return {
+            "units": self.units, "skipped": self.skipped, "failed": self.failed,
+            "busy_s": self.busy, "cpu_s": self.cpu, "wall_s": self.wall,
+            "peak_rss_bytes": self.peak_rss,
+            **profile_report(self.profile),
+        }
+
+
+# ─── Runner ─────────────────────────────────────────────────────
+class PipelineRunner:
+    def __init__(self, stages: list[str], workers: int, force: bool = False,
+                 engine: str = "vector", dbc_groups: int = 1, layout: str = "wide", profile: bool = False):
+        self.stages = [s for s in STAGE_ORDER if s in stages]
+        self.workers = max(1, workers)
+        self.force = force
+        self.engine = engine
+        self.dbc_groups = dbc_groups
+        self.layout = layout
+        self.run_id = run_id()
+        self.profile_dir = RUN_REPORT_DIR / self.run_id if profile else None
+        self.report_path: Path | None = None
+
+        self.manifest = Manifest()
+        self.timings = {stage: StageTiming() for stage in self.stages}
+        self.futures = {}
+        self.metadata_ready = "metadata" not in self.stages
+        self.pool = None
+
+    # ─── Scheduling ───
+    def _submit(self, stage: str, func_name: str, args: tuple, on_done):
+        timing = self.timings[stage]
+        if timing.first_start is None:
+            timing.first_start = time.perf_counter()
+        future = self.pool.submit(_run_unit, stage, func_name, args, self.profile_dir)
+        self.futures[future] = (stage, args, on_done)
+
+    def _skip(self, stage: str):
+        self.timings[stage].skipped += 1
+
+    def _unit_failed(self, stage: str):
+        """For units that report failure by return value instead of raising."""
+        self.timings[stage].units -= 1
+        self.timings[stage].failed += 1
+
+    def _drain(self):
+        while self.futures:
+            done, _ = wait(self.futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage, args, on_done = self.futures.pop(future)
+                timing = self.timings[stage]
+                timing.last_end = time.perf_counter()
+                try:
+                    result, unit = future.result()
+                except Exception as e:
+                    timing.failed += 1
+                    logging.error(f"❌ {stage} failed for {args[0] if args else stage}: {e}")
+                    continue
+                timing.add_unit(unit)
+                try:
+                    on_done(result)
+                except Exception as e:   # a broken hand-off must not strand the other futures
+                    self._unit_failed(stage)
+                    logging.error(f"❌ {stage} failed after {args[0] if args else stage}: {e}")
+
+    # ─── Per-file streaming phase ───
+    def _start_metadata(self):
+        def _done(_):
+            self.metadata_ready = True
+            self._start_files()
+
+        self._submit("metadata", "main", (), _done)
+
+    def _start_files(self):
+        """Feeds the first selected per-file stage; runs once the registry files are written."""
+        if "decode" in self.stages:
+            self._start_decode()
+        elif "pyramid" in self.stages or "downsample" in self.stages:
+            for path in sorted(DECODED_DIR.glob("*.parquet")):
+                self._feed_decoded(path)
+        elif "clean" in self.stages:
+            for path in sorted(DOWNSAMPLED_DIR.glob("*.parquet")):
+                self._feed_downsampled(path)
+
+    def _start_decode(self):
+        decode = stage_module("decode")
+        mf4_files = sorted(RAW_DIR.glob("*.MF4"))
+        dbc_files = sorted(DBC_DIR.glob("*.dbc"))
+        if not mf4_files or not dbc_files:
+            logging.warning("⚠️ Nothing to decode (no MF4 or DBC files).")
+            return
+
+        params = decode.decode_params(self.engine, self.layout)
+        groups = decode.split_dbc_groups(dbc_files, self.dbc_groups)
+        jobs = decode.plan_jobs(mf4_files, groups, self.manifest, params, self.force)
+
+        # Compile changed DBCs once here, so pool workers only unpickle the registry
+        if jobs and self.engine == "vector":
+            decode.load_compiled_set(sorted({dbc_path for _, group in jobs for dbc_path in group}))
+
+        # Outputs of up-to-date (MF4, DBC) pairs flow downstream right away
+        stale = {(mf4_path, dbc_path) for mf4_path, group in jobs for dbc_path in group}
+        for mf4_path in mf4_files:
+            for dbc_path in dbc_files:
+                if (mf4_path, dbc_path) in stale:
+                    continue
+                self._skip("decode")
+                out_path = decode.decoded_path(mf4_path, dbc_path.stem)
+                if out_path.exists():
+                    self._feed_decoded(out_path)
+
+        for mf4_path, group in jobs:
+            def _done(result, mf4_path=mf4_path, group=group):
+                rows, _ = result
+                decode.record_job(self.manifest, params, mf4_path, group)
+                logging.info(f"✅ decoded {mf4_path.name} [{', '.join(p.stem for p in group)}]")
+                for dbc_name, n_rows in rows.items():
+                    if n_rows:
+                        self._feed_decoded(decode.decoded_path(mf4_path, dbc_name))
+
+            self._submit("decode", "decode_job", (mf4_path, group, self.engine, self.layout), _done)
+
+    def _feed_decoded(self, path: Path):
+        if "pyramid" in self.stages:
+            self._feed_pyramid(path)
+        if "downsample" not in self.stages:
+            return
+        downsample = stage_module("downsample")
+        out_path = downsample.downsampled_path(path)
+
+        if not self.force and downsample.is_up_to_date(self.manifest, path):
+            self._skip("downsample")
+            self._feed_downsampled(out_path)
+            return
+
+        def _done(ok):
+            if not ok:
+                self._unit_failed("downsample")
+                return
+            downsample.record_done(self.manifest, path)
+            self.manifest.save()
+            self._feed_downsampled(out_path)
+
+        self._submit("downsample", "process_file", (path,), _done)
+
+    def _feed_pyramid(self, path: Path):
+        pyramid = stage_module("pyramid")
+        if not self.force and pyramid.is_up_to_date(self.manifest, path):
+            self._skip("pyramid")
+            return
+
+        def _done(_):
+            pyramid.record_done(self.manifest, path)
+            self.manifest.save()
+
+        self._submit("pyramid", "build_pyramid", (path,), _done)
+
+    def _feed_downsampled(self, path: Path):
+        if "clean" not in self.stages:
+            return
+        clean = stage_module("clean")
+
+        if not self.force and clean.is_up_to_date(self.manifest, path):
+            self._skip("clean")
+            return
+
+        def _done(record):
+            if record is None:
+                self._unit_failed("clean")
+                return
+            clean.record_done(self.manifest, path)
+            self.manifest.save()
+
+        self._submit("clean", "clean_file", (path,), _done)
+
+    # ─── Whole-dataset phase ───
+    def _start_align(self):
+        align = stage_module("align")
+        for drive, paths in align.drive_inputs().items():
+            if not self.force and align.is_up_to_date(self.manifest, drive, paths):
+                self._skip("align")
+                continue
+
+            def _done(_, drive=drive, paths=paths):
+                align.record_done(self.manifest, drive, paths)
+                self.manifest.save()
+
+            self._submit("align", "align_drive", (drive, paths), _done)
+
+    def _start_events(self):
+        events = stage_module("events")
+        for drive, paths in events.drive_inputs(events.load_event_config()).items():
+            if not self.force and events.is_up_to_date(self.manifest, drive, paths):
+                self._skip("events")
+                continue
+
+            def _done(_, drive=drive, paths=paths):
+                events.record_done(self.manifest, drive, paths)
+                self.manifest.save()
+
+            self._submit("events", "index_drive", (drive, paths), _done)
+
+    def _start_merge(self):
+        merge = stage_module("merge")
+        for dbc_name, files in merge.group_processed_files().items():
+            if not files:
+                continue
+            if not self.force and merge.is_up_to_date(self.manifest, dbc_name, files):
+                self._skip("merge")
+                continue
+
+            def _done(_, dbc_name=dbc_name, files=files):
+                merge.record_done(self.manifest, dbc_name, files)
+                self.manifest.save()
+
+            self._submit("merge", "merge_group", (dbc_name, files), _done)
+
+    def _start_metrics(self):
+        metrics = stage_module("metrics")
+        for drive, files in metrics.drive_inputs().items():
+            if not self.force and metrics.is_up_to_date(self.manifest, drive, files):
+                self._skip("metrics")
+                continue
+
+            def _done(_, drive=drive, files=files):
+                metrics.record_done(self.manifest, drive, files)
+                self.manifest.save()
+
+            self._submit("metrics", "compute_drive", (drive,), _done)
+
+    def run(self):
+        started = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            self.pool = pool
+
+            # decode, downsample and clean read the registry files that metadata rewrites
+            if "metadata" in self.stages:
+                self._start_metadata()
+            else:
+                self._start_files()
+            self._drain()
+
+            if not self.metadata_ready:
+                logging.warning("⚠️ Metadata stage failed; continuing with the existing registry files")
+                self.metadata_ready = True
+                self._start_files()
+                self._drain()
+
+            # align and events read decoded files, merge and metrics the cleaned ones: they run side by side
+            if "align" in self.stages:
+                self._start_align()
+            if "events" in self.stages:
+                self._start_events()
+            if "merge" in self.stages:
+                self._start_merge()
+            if "metrics" in self.stages:
+                self._start_metrics()
+            self._drain()
+
+            if "events" in self.stages:
+                self._submit("events", "build_index", (), lambda _: None)
+            if "metrics" in self.stages:
+                self._submit("metrics", "reduce_fleet", (), lambda _: None)
+            if "analyze" in self.stages:
+                self._submit("analyze", "main", (), lambda _: None)
+            self._drain()
+
+        self.log_summary()
+        self.write_report(time.perf_counter() - started)
+
+    @property
+    def failed(self) -> int:
+        """Units that failed over all stages."""
+        return sum(t.failed for t in self.timings.values())
+
+    def log_summary(self):
+        logging.info("⏱️ Stage timing summary")
+        logging.info(f"    {'stage':<12}{'units':>7}{'skipped':>9}{'failed':>8}{'busy s':>10}{'cpu s':>10}"
+                     f"{'wall s':>10}{'peak MB':>9}")
+        for stage in self.stages:
+            t = self.timings[stage]
+            peak = f"{t.peak_rss / 2**20:.0f}" if t.peak_rss else "-"
+            logging.info(f"    {stage:<12}{t.units:>7}{t.skipped:>9}{t.failed:>8}{t.busy:>10.1f}{t.cpu:>10.1f}"
+                         f"{t.wall:>10.1f}{peak:>9}")
+
+    def write_report(self, wall: float) -> Path:
+        stages = {}
+        for stage in self.stages:
+            stages[stage] = self.timings[stage].to_dict()
+            if self.profile_dir is not None:
+                dump = merge_profiles(self.profile_dir / stage, self.profile_dir / f"{stage}.prof")
+                stages[stage]["pstats"] = None if dump is None else str(dump)
+
+        report = {
+            "run_id": self.run_id,
+            "params": {"stages": self.stages, "workers": self.workers, "force": self.force,
+                       "engine": self.engine, "dbc_groups": self.dbc_groups, "layout": self.layout},
+            "wall_s": wall,
+            "runner_peak_rss_bytes": peak_rss_bytes(),
+            "stages": stages,
+        }
+        self.report_path = write_run_report(report, self.run_id)
+        logging.info(f"📊 Run report: {self.report_path}")
+        return self.report_path
+
+
+def _ancestors(stage: str) -> set[str]:
+    found = {stage}
+    for dep in STAGE_DEPS[stage]:
+        found |= _ancestors(dep)
+    return found
+
+
+def select_stages(start: str | None = None, end: str | None = None) -> list[str]:
+    """
+    Stages downstream of `start` that `end` depends on (both inclusive, in
+    STAGE_ORDER): --from decode --to merge runs decode, downsample, clean and
+    merge, not pyramid, align or events. Either bound may be left open.
+    """
+    stages = [s for s in STAGE_ORDER
+              if (start is None or start in _ancestors(s)) and (end is None or s in _ancestors(end))]
+    if not stages:
+        raise ValueError(f"--to {end} does not depend on --from {start}")
+    return stages
+
+
+def resolve_stages(start: str | None = None, end: str | None = None,
+                   stages: list[str] | None = None) -> list[str]:
+    """
+    `stages` (an explicit list), or the stages from `start` to `end` along the
+    DAG (see select_stages); by default every stage. ValueError on bad bounds.
+    """
+    if stages is None:
+        return select_stages(start, end)
+    if start is not None or end is not None:
+        raise ValueError("--stages cannot be combined with --from / --to")
+    unknown = sorted(set(stages) - set(STAGE_ORDER))
+    if unknown:
+        raise ValueError(f"Unknown stages: {', '.join(unknown)}")
+    return stages
+
+
+def run_pipeline(start: str | None = None, end: str | None = None, stages: list[str] | None = None,
+                 **kwargs) -> PipelineRunner:
+    """Runs the stages resolve_stages() selects; failed units are counted, not raised."""
+    runner = PipelineRunner(resolve_stages(start, end, stages), **kwargs)
+    runner.run()
+    return runner
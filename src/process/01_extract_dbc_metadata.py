@@ -1,15 +1,18 @@
 #!/usr/bin/env python3
 """
 Extracts metadata from all DBC files in config/dbc and generates:
-- data/registry/dbc_signals_metadata.csv → Signal-level metadata
+- data/registry/dbc_signals_metadata.csv → Signal-level metadata (bit layout and
+  scaling feed the typed output schemas, see src/store/signal_types.py)
 - data/registry/enum_maps.json → Enum signal mappings (value → name)
+
+DBCs are read through the compiled registry (src/decode/dbc_registry.py),
+so only DBCs that changed since their last compile are parsed by cantools.
 """
 
 from pathlib import Path
+import os
 import json
 import pandas as pd
-import cantools
-from cantools.database.can.signal import NamedSignalValue
 import sys
 
 # ─── Force src/ to be discoverable ─────────────────────────────
@@ -18,6 +21,8 @@ if str(PROJECT_ROOT) not in sys.path:
     sys.path.insert(0, str(PROJECT_ROOT))
 
 from src.utils.paths import DBC_DIR, REGISTRY_DIR, ENUM_MAPS_PATH, DBC_METADATA_PATH
+from src.decode.dbc_registry import load_compiled
+from src.utils.profiling import PROFILER
 
 # ─── Smart Enum Filter ──────────────────────────────────────────
 def normalize_enum_map(choices) -> dict | None:
@@ -43,14 +48,20 @@ def normalize_enum_map(choices) -> dict | None:
         return None
 
 # ─── Extract Metadata ──────────────────────────────────────────
-signal_rows = []
-enum_maps = {}
+def extract_metadata(dbc_files: list[Path] | None = None) -> tuple[pd.DataFrame, dict]:
+    """
+    Parses every DBC and returns (signal metadata rows, enum maps).
+    """
+    if dbc_files is None:
+        dbc_files = sorted(DBC_DIR.glob("*.dbc"))
 
-for dbc_file in sorted(DBC_DIR.glob("*.dbc")):
-    try:
-        db = cantools.database.load_file(str(dbc_file))
-        for msg in db.messages:
-            for sig in msg.signals:
+    signal_rows = []
+    enum_maps = {}
+
+    for dbc_file in dbc_files:
+        try:
+            db = load_compiled(dbc_file)
+            for sig in db.signals:
                 signal_name = sig.name
                 enum_map = normalize_enum_map(sig.choices)
 
@@ -62,7 +73,7 @@ for dbc_file in sorted(DBC_DIR.glob("*.dbc")):
 
                 signal_rows.append({
                     "signal_name": signal_name,
-                    "unit": sig.unit or "",
+                    "unit": sig.unit,
                     "data_type": data_type,
                     "enum_values": json.dumps(enum_map) if enum_map else "",
                     "min_physical": sig.minimum,
@@ -70,10 +81,11 @@ for dbc_file in sorted(DBC_DIR.glob("*.dbc")):
                     "scaling": sig.scale,
                     "offset": sig.offset,
                     "bit_length": sig.length,
+                    "is_signed": sig.is_signed,
                     "is_multiplexer": sig.is_multiplexer,
                     "multiplexer_signal": sig.multiplexer_signal or "",
-                    "message_name": msg.name,
-                    "message_id": hex(msg.frame_id),
+                    "message_name": sig.message_name,
+                    "message_id": hex(sig.frame_id),
                     "dbc_source": dbc_file.name,
                     "notes": sig.comment or ""
                 })
@@ -81,15 +93,33 @@ for dbc_file in sorted(DBC_DIR.glob("*.dbc")):
                 if enum_map and signal_name not in enum_maps:
                     enum_maps[signal_name] = enum_map
 
-    except Exception as e:
-        print(f"⚠️ Failed to load {dbc_file.name}: {e}")
+        except Exception as e:
+            print(f"⚠️ Failed to load {dbc_file.name}: {e}")
+
+    return pd.DataFrame(signal_rows), enum_maps
+
 
 # ─── Save Outputs ──────────────────────────────────────────────
-df = pd.DataFrame(signal_rows)
-df.to_csv(DBC_METADATA_PATH, index=False)
+def main():
+    with PROFILER.phase("extract") as span:
+        df, enum_maps = extract_metadata()
+        span.rows = len(df)
+
+    # Written to temp files and renamed: decode and downsample read both files
+    # while other runs (or this one, before the rename) may be using them
+    with PROFILER.phase("write", rows=len(df)):
+        csv_tmp = DBC_METADATA_PATH.with_name(f".{DBC_METADATA_PATH.name}.{os.getpid()}.tmp")
+        df.to_csv(csv_tmp, index=False)
+        os.replace(csv_tmp, DBC_METADATA_PATH)
+
+        json_tmp = ENUM_MAPS_PATH.with_name(f".{ENUM_MAPS_PATH.name}.{os.getpid()}.tmp")
+        with open(json_tmp, "w") as f:
+            json.dump(enum_maps, f, indent=2)
+        os.replace(json_tmp, ENUM_MAPS_PATH)
+
+    print(f"✅ Metadata CSV saved to: {DBC_METADATA_PATH}")
+    print(f"✅ Enum JSON saved to:  {ENUM_MAPS_PATH}")
 
-with open(ENUM_MAPS_PATH, "w") as f:
-    json.dump(enum_maps, f, indent=2)
 
-print(f"✅ Metadata CSV saved to: {DBC_METADATA_PATH}")
-print(f"✅ Enum JSON saved to:  {ENUM_MAPS_PATH}")
+if __name__ == "__main__":
+    main()
@@ -2,17 +2,32 @@
 """
 src/processing/downsample_timeseries.py
 
-Downsamples all decoded Parquet files in data/decoded/ to 1Hz using aggregation.
-Saves output in data/downsampled/ with *_downsampled.parquet filenames.
+Downsamples all decoded Parquet files in data/decoded/ to every rate in RATES_HZ.
+Saves the TARGET_HZ output in data/downsampled/ with *_downsampled.parquet filenames,
+other rates in data/downsampled/<hz>hz/.
 
 - Assumes time column is datetime64[ns, UTC]
 - Handles malformed time entries gracefully
-- Aggregates numerical signals with mean, others with first
+- Reads wide or long-layout decoded outputs one signal at a time
+  (src/store/long_store.py iter_signals); each signal is binned on its own
+  for every rate, and only its non-empty bins are kept, so memory follows
+  the samples of one signal instead of a dense frame of the whole file
+- Outputs are written GRID_ROWS grid rows at a time (src/process/resample.py)
+- Per-signal aggregation from the DBC metadata (see src/process/resample.py):
+  enums/flags/checksums take the last value, counters the wrapped delta,
+  physical signals the mean
 - Maintains column order: time first, then sorted signals
+- Typed output (src/store/signal_types.py): signals that keep sample values
+  (last/first/min/max/mode) keep their decoded type, counter deltas are int32,
+  means float64
 - Logs all steps and summarizes signals kept per file
+- Skips files whose input, metadata and RATES_HZ are unchanged (pipeline manifest)
 """
+import os
 import sys
-import pandas as pd
+import argparse
+import pyarrow as pa
+import pyarrow.parquet as pq
 from pathlib import Path
 import logging
 
@@ -27,59 +42,115 @@ PROJECT_ROOT = Path(__file__).resolve().parents[2]
 if str(PROJECT_ROOT) not in sys.path:
     sys.path.insert(0, str(PROJECT_ROOT))
     
-from src.utils.paths import DECODED_DIR, DOWNSAMPLED_DIR 
+from src.utils.paths import DECODED_DIR, DOWNSAMPLED_DIR
+from src.utils.manifest import Manifest
+from src.process.resample import Resampled, resample_series, load_policies
+from src.store.long_store import iter_signals
+from src.store.dataset import split_stage_name
+from src.store.signal_types import decoded_types, resampled_type, registry_digest, narrow
+from src.utils.profiling import PROFILER
 
-TARGET_HZ = 1  # Downsample to 1Hz
+RATES_HZ = [50, 10, 1]  # Every rate is produced from one read of the decoded file
+TARGET_HZ = 1  # Primary rate, consumed by the clean stage
 
-# ─── Downsampling Function ─────────────────────────────────────
-def downsample_to_1hz(df: pd.DataFrame) -> pd.DataFrame:
-    if "time" not in df.columns:
-        raise ValueError("Missing required 'time' column.")
-    
-    df = df.copy()
-    df["time"] = pd.to_datetime(df["time"], utc=True, errors='coerce')
-    df = df.dropna(subset=["time"])
-    df = df.set_index("time")
+# ─── File Processor ────────────────────────────────────────────
+MANIFEST_PARAMS = {"rates_hz": RATES_HZ, "target_hz": TARGET_HZ}
 
-    # Choose aggregation based on column dtype
-    aggregation = {
-        col: "mean" if pd.api.types.is_numeric_dtype(df[col]) else "first"
-        for col in df.columns if col != "arbitration_id"
-    }
-    aggregation["arbitration_id"] = "first"  # keep only one id (optional)
 
-    resampled = df.resample("1S").agg(aggregation)
-    resampled = resampled.reset_index()
+def downsampled_path(file_path: Path, hz: float = TARGET_HZ) -> Path:
+    name = file_path.name.replace(".parquet", "_downsampled.parquet")
+    if hz == TARGET_HZ:
+        return DOWNSAMPLED_DIR / name
+    return DOWNSAMPLED_DIR / f"{hz:g}hz" / name
+
+
+def output_types(bus: str, policies: dict[str, tuple[str, int | None]]) -> dict[str, pa.DataType]:
+    """{signal: type after resampling} for the signals of one bus."""
+    return {name: resampled_type(value_type, policies.get(name, ("mean", None))[0])
+            for name, value_type in decoded_types(bus).items()}
+
+
+def _params(file_path: Path) -> dict:
+    """Policies and types come from the bus's own metadata rows, so other DBCs' edits leave it fresh."""
+    return {**MANIFEST_PARAMS, "registry": registry_digest(split_stage_name(file_path.name)[1])}
+
+
+def is_up_to_date(manifest: Manifest, file_path: Path) -> bool:
+    return manifest.is_fresh("downsample", file_path.name, [file_path], _params(file_path))
+
+
+def record_done(manifest: Manifest, file_path: Path) -> None:
+    outputs = [downsampled_path(file_path, hz) for hz in RATES_HZ]
+    manifest.record("downsample", file_path.name, [file_path], _params(file_path), outputs)
+
+
+def write_rate(resampled: Resampled, out_path: Path, types: dict[str, pa.DataType]) -> None:
+    """Writes one rate's grid slice by slice, atomically."""
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = out_path.with_name(f".{out_path.name}.{os.getpid()}.tmp")
+    writer = None
+    try:
+        with PROFILER.phase("write") as span:
+            for table in resampled.tables():
+                table = narrow(table, types)
+                if writer is None:
+                    writer = pq.ParquetWriter(tmp, table.schema)
+                writer.write_table(table)
+                span.rows += table.num_rows
+                span.bytes += table.nbytes
+    finally:
+        if writer is not None:
+            writer.close()
+    os.replace(tmp, out_path)
 
-    # Ensure time is first column
-    cols = ["time"] + sorted([col for col in resampled.columns if col != "time"])
-    return resampled[cols]
 
-# ─── File Processor ────────────────────────────────────────────
 def process_file(file_path: Path):
     try:
-        df = pd.read_parquet(file_path)
-        original_cols = df.columns.tolist()
-        df_down = downsample_to_1hz(df)
+        bus = split_stage_name(file_path.name)[1]
+        policies = load_policies(bus)
+        types = output_types(bus, policies)
 
-        out_path = DOWNSAMPLED_DIR / file_path.name.replace(".parquet", "_downsampled.parquet")
-        df_down.to_parquet(out_path, index=False)
+        resampled = {hz: Resampled(hz) for hz in RATES_HZ}
+        samples = 0
+        for name, time_ns, values in PROFILER.iter_phase("read", iter_signals(file_path),
+                                                         rows=lambda item: len(item[1])):
+            with PROFILER.phase("resample", rows=len(values)):
+                resample_series(resampled, name, time_ns, values, policies)
+            samples += len(values)
 
-        logging.info(f"✅ {file_path.name} → {out_path.name}")
-        logging.info(f"    ⏱️ {len(df)} → {len(df_down)} rows, {len(original_cols)} → {len(df_down.columns)} columns")
+        for hz, res in resampled.items():
+            write_rate(res, downsampled_path(file_path, hz), types)
+            logging.info(f"    ⏱️ {hz:g} Hz: {samples} samples → {res.grid_size} rows, "
+                         f"{len(res.series)} signals")
+
+        logging.info(f"✅ {file_path.name} → {downsampled_path(file_path).name}")
+        return True
     except Exception as e:
         logging.warning(f"⚠️ Failed to process {file_path.name}: {e}")
+        return False
 
 # ─── Main ──────────────────────────────────────────────────────
 def main():
+    parser = argparse.ArgumentParser(description="Downsample decoded Parquet files")
+    parser.add_argument("--force", action="store_true", help="ignore the manifest and rebuild everything")
+    args = parser.parse_args()
+
     parquet_files = sorted(DECODED_DIR.glob("*.parquet"))
     if not parquet_files:
         logging.warning("⚠️ No decoded Parquet files found in data/decoded/")
         return
 
+    manifest = Manifest()
+
     for file in parquet_files:
+        if not args.force and is_up_to_date(manifest, file):
+            logging.info(f"⏭️ Up to date: {file.name}")
+            continue
+
         logging.info(f"🔽 Downsampling {file.name} ...")
-        process_file(file)
+        if process_file(file):
+            record_done(manifest, file)
+            manifest.save()
 
 if __name__ == "__main__":
     main()
@@ -2,12 +2,24 @@
 """
 Cleans and labels downsampled time series:
 - Drops weak signals (>10% nulls or <2 unique if not enum)
-- Applies enum mapping using enum_maps.json
-- Saves filtered Parquet files to data/processed/
+- Applies enum mapping using enum_maps.json as dictionary-encoded categoricals
+  (each label string stored once per signal, not once per row)
+- Physical signals whose enum map is a single special code (e.g.
+  DAS_steeringAngleRequest 16384 "ZERO_ANGLE") are not labelled: the code,
+  which the decoder emits unscaled, becomes its physical value, or NaN for a
+  not-available label (ESP_vehicleSpeed 1023 "ESP_VEHICLE_SPEED_SNA")
+- Saves filtered output to the partitioned dataset in data/processed/
+  (bus=<dbc>/drive=<id>/date=<YYYY-MM-DD>/, see src/store/dataset.py),
+  keeping the downsampled column types; labelled enums are written as
+  dictionary<int, string>, the index sized from the signal's bit length
 - Generates signal cleaning summary report
+- Skips files whose input, enum map, metadata and thresholds are unchanged
 """
+import os
 import sys
+import numpy as np
 import pandas as pd
+import pyarrow.parquet as pq
 import json
 import logging
 from datetime import datetime
@@ -20,10 +32,13 @@ if str(PROJECT_ROOT) not in sys.path:
     sys.path.insert(0, str(PROJECT_ROOT))
 
 from src.utils.paths import DOWNSAMPLED_DIR, PROCESSED_DIR, REGISTRY_DIR, ENUM_MAPS_PATH
+from src.utils.manifest import Manifest
+from src.store.dataset import split_stage_name, drive_dir, write_partitions
+from src.store.signal_types import label_types, special_values, registry_digest, to_pandas
+from src.utils.signal_stats import frame_stats
+from src.utils.profiling import PROFILER
 
 
-PROCESSED_DIR.mkdir(parents=True, exist_ok=True)
-
 # ─── Config ─────────────────────────────────────────────────────
 MAX_NULL_FRAC = 0.10
 MIN_UNIQUE_NON_ENUM = 2
@@ -35,18 +50,91 @@ logging.basicConfig(
 )
 
 # ─── Load Enum Metadata ─────────────────────────────────────────
-with open(ENUM_MAPS_PATH) as f:
-    enum_map = json.load(f)
-enum_signals = set(enum_map.keys())
+def load_enum_map() -> dict:
+    """
+    Reads enum_maps.json fresh on every call, so a metadata rebuild earlier
+    in the same pipeline run is always picked up.
+    """
+    with open(ENUM_MAPS_PATH) as f:
+        return json.load(f)
+
+
+class EnumLookup:
+    """
+    One enum_maps.json entry as lookup arrays: sorted raw codes and, for each,
+    the index of its label in `categories` (labels deduplicated, in code order).
+    """
+
+    def __init__(self, mapping: dict[str, str]):
+        pairs = sorted((int(code), label) for code, label in mapping.items())
+        self.codes = np.array([code for code, _ in pairs], dtype=np.float64)
+        self.categories = list(dict.fromkeys(label for _, label in pairs))
+        position = {label: i for i, label in enumerate(self.categories)}
+        self.index = np.array([position[label] for _, label in pairs], dtype=np.int32)
+
+    def label(self, values: np.ndarray) -> pd.Categorical:
+        """
+        Rounds raw values to codes and maps them to categories in one vectorized
+        lookup. Codes missing from the map become their own "<code>" category;
+        NaN stays missing.
+        """
+        raw = np.round(values.astype(np.float64))
+        valid = ~np.isnan(raw)
+        pos = np.clip(np.searchsorted(self.codes, raw), 0, max(len(self.codes) - 1, 0))
+        hit = valid & (self.codes[pos] == raw) if len(self.codes) else np.zeros(len(raw), dtype=bool)
+
+        out = np.full(len(raw), -1, dtype=np.int32)
+        out[hit] = self.index[pos[hit]]
+        categories = list(self.categories)
+
+        unknown = valid & ~hit
+        if unknown.any():
+            extra, inverse = np.unique(raw[unknown], return_inverse=True)
+            position = {label: i for i, label in enumerate(categories)}
+            extra_index = []
+            for code in extra:
+                label = str(int(code))
+                if label not in position:
+                    position[label] = len(categories)
+                    categories.append(label)
+                extra_index.append(position[label])
+            out[unknown] = np.asarray(extra_index, dtype=np.int32)[inverse]
+
+        return pd.Categorical.from_codes(out, categories=categories)
+
+
+_LOOKUPS: dict[tuple[int, int], dict[str, EnumLookup]] = {}
+
+
+def load_enum_lookups() -> dict[str, EnumLookup]:
+    """
+    Compiled lookups for enum_maps.json, rebuilt only when the file changes
+    (so a metadata rebuild earlier in the same run is still picked up).
+    """
+    stat = os.stat(ENUM_MAPS_PATH)
+    key = (stat.st_mtime_ns, stat.st_size)
+    if key not in _LOOKUPS:
+        _LOOKUPS.clear()
+        _LOOKUPS[key] = {signal: EnumLookup(mapping) for signal, mapping in load_enum_map().items()}
+    return _LOOKUPS[key]
+
+# ─── Special Values ─────────────────────────────────────────────
+def replace_special_values(df: pd.DataFrame, specials: dict[str, tuple[float, float]]) -> pd.DataFrame:
+    """Special codes of physical signals → their values (see signal_types.special_values)."""
+    for col, (code, value) in specials.items():
+        if col in df.columns and pd.api.types.is_numeric_dtype(df[col]):
+            df[col] = df[col].astype(np.float64).mask(df[col] == code, value)
+    return df
 
 # ─── Signal Filtering ───────────────────────────────────────────
-def filter_signals(df: pd.DataFrame, record: dict) -> pd.DataFrame:
+def filter_signals(df: pd.DataFrame, record: dict, enum_signals: set) -> pd.DataFrame:
     keep = ["time"]
+    stats = frame_stats(df).columns
     for col in df.columns:
         if col == "time":
             continue
-        null_frac = df[col].isna().mean()
-        unique_vals = df[col].nunique(dropna=True)
+        null_frac = stats[col].null_fraction
+        unique_vals = stats[col].unique_values
         is_enum = col in enum_signals
 
         if null_frac > MAX_NULL_FRAC:
@@ -63,39 +151,73 @@ def filter_signals(df: pd.DataFrame, record: dict) -> pd.DataFrame:
     return df[keep]
 
 # ─── Enum Labeling ──────────────────────────────────────────────
-def apply_enum_labels(df: pd.DataFrame, enum_map: dict) -> pd.DataFrame:
+def apply_enum_labels(df: pd.DataFrame, lookups: dict[str, EnumLookup], record: dict | None = None) -> pd.DataFrame:
     mapped = 0
 
     for col in df.columns:
-        if col in enum_map:
+        if col in lookups:
             try:
                 if not pd.api.types.is_numeric_dtype(df[col]):
                     raise TypeError("non-numeric")
 
-                # Convert safely to int where possible
-                df[col] = (
-                    df[col]
-                    .round()
-                    .astype("Int64")  # nullable int for safety
-                    .astype(str)
-                    .map(enum_map[col])
-                    .fillna(df[col])
-                )
+                df[col] = lookups[col].label(df[col].to_numpy(dtype=np.float64, na_value=np.nan))
                 mapped += 1
+                if record is not None:
+                    record["enum_mapped"].append(col)
             except Exception as e:
                 logging.warning(f"⚠️ Enum skipped for {col}: {e}")
+                if record is not None:
+                    record["enum_failed"].append((col, str(e)))
 
     logging.info(f"🧠 Enum signals mapped: {mapped}")
     return df
 
 
-# ─── Main Processing ────────────────────────────────────────────
-summary = []
+# ─── File Processor ─────────────────────────────────────────────
+# enum_maps.json is hashed as an input, so editing it counts as a new enum map version
+MANIFEST_PARAMS = {"max_null_frac": MAX_NULL_FRAC, "min_unique_non_enum": MIN_UNIQUE_NON_ENUM}
+
+
+def processed_dir(pq_file: Path) -> Path:
+    """Dataset directory holding every date partition of one (drive, bus)."""
+    return drive_dir(*reversed(split_stage_name(pq_file.name)))
+
 
-for pq_file in sorted(DOWNSAMPLED_DIR.glob("*.parquet")):
+def processed_files(pq_file: Path) -> list[Path]:
+    return sorted(processed_dir(pq_file).glob("date=*/*.parquet"))
+
+
+def _inputs(pq_file: Path) -> list[Path]:
+    return [pq_file, ENUM_MAPS_PATH]
+
+
+def _params(pq_file: Path) -> dict:
+    """Label types and special values come from the bus's own metadata rows."""
+    return {**MANIFEST_PARAMS, "registry": registry_digest(split_stage_name(pq_file.name)[1])}
+
+
+def is_up_to_date(manifest: Manifest, pq_file: Path) -> bool:
+    return manifest.is_fresh("clean", pq_file.name, _inputs(pq_file), _params(pq_file))
+
+
+def record_done(manifest: Manifest, pq_file: Path) -> None:
+    manifest.record("clean", pq_file.name, _inputs(pq_file), _params(pq_file), processed_files(pq_file))
+
+
+def clean_file(pq_file: Path) -> dict | None:
+    """
+    Filters and labels one downsampled file.
+    Returns the cleaning record, or None if the file failed.
+    """
     logging.info(f"🧼 Cleaning & labeling: {pq_file.name}")
     try:
-        df = pd.read_parquet(pq_file)
+        drive, bus = split_stage_name(pq_file.name)
+        specials = special_values(bus)
+        lookups = {signal: lookup for signal, lookup in load_enum_lookups().items() if signal not in specials}
+        with PROFILER.phase("read") as span:
+            table = pq.read_table(pq_file)
+            df = to_pandas(table)
+            span.rows = len(df)
         record = {
             "file": pq_file.name,
             "dropped": [],
@@ -103,14 +225,44 @@ for pq_file in sorted(DOWNSAMPLED_DIR.glob("*.parquet")):
             "enum_mapped": [],
             "enum_failed": [],
         }
-        df = filter_signals(df, record)
-        df = apply_enum_labels(df, enum_map, record)
+        with PROFILER.phase("filter", rows=len(df)):
+            df = replace_special_values(df, specials)
+            df = filter_signals(df, record, set(lookups))
+        with PROFILER.phase("label", rows=len(df)):
+            df = apply_enum_labels(df, lookups, record)
 
-        out_path = PROCESSED_DIR / pq_file.name.replace(".parquet", "_filtered.parquet")
-        df.to_parquet(out_path, index=False)
-        logging.info(f"✅ Saved filtered file: {out_path}")
-        summary.append(record)
+        types = {field.name: field.type for field in table.schema}
+        labels = label_types(bus)
+        types.update({col: labels[col] for col in record["enum_mapped"] if col in labels})
+        with PROFILER.phase("write", rows=len(df)):
+            written = write_partitions(df, bus, drive, types=types)
+        logging.info(f"✅ Saved {len(written)} partition(s) to: {processed_dir(pq_file)}")
+        return record
 
     except Exception as e:
         logging.error(f"❌ Failed to process {pq_file.name}: {e}")
+        return None
+
+
+# ─── Main ───────────────────────────────────────────────────────
+def main():
+    PROCESSED_DIR.mkdir(parents=True, exist_ok=True)
+    manifest = Manifest()
+    summary = []
+
+    for pq_file in sorted(DOWNSAMPLED_DIR.glob("*.parquet")):
+        if is_up_to_date(manifest, pq_file):
+            logging.info(f"⏭️ Up to date: {pq_file.name}")
+            continue
+
+        record = clean_file(pq_file)
+        if record is not None:
+            summary.append(record)
+            record_done(manifest, pq_file)
+            manifest.save()
+
+    return summary
+
 
+if __name__ == "__main__":
+    main()
@@ -1,65 +1,170 @@
 # Best Practice Merge Script for Same-DBC Group
+"""
+Merges every processed drive of one DBC into data/merged/<dbc>.parquet.
+
+- DBC groups come from the files in config/dbc/
+- The output schema is unified once from the input footers, so the compact
+  column types of the processed dataset carry over (see src/store/signal_types.py)
+- Inputs are already time-sorted, so they are streamed in row-group batches
+  and k-way merged by timestamp into a ParquetWriter: memory holds one batch
+  per input, however many drives are merged
+- The output stays one flat file per bus: partition pruning on bus / drive /
+  date is read_dataset() over data/processed (see src/store/dataset.py)
+"""
+import os
 import sys
-import pandas as pd
 from pathlib import Path
 import logging
 
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
 # ─── Force src/ to be discoverable ─────────────────────────────
 PROJECT_ROOT = Path(__file__).resolve().parents[2]
 if str(PROJECT_ROOT) not in sys.path:
     sys.path.insert(0, str(PROJECT_ROOT))
 
-from src.utils.paths import PROCESSED_DIR, MERGED_DIR
+from src.utils.paths import MERGED_DIR, DBC_DIR
+from src.utils.manifest import Manifest
+from src.store.dataset import partition_files, unify_schemas
+from src.store.signal_types import conform
+from src.utils.profiling import PROFILER
 
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s — %(levelname)s — %(message)s")
 
-# Group by DBC name (e.g., "can1-can", "can1-vehicle", ...)
-dbc_groups = {
-    "can1-can": [],
-    "can1-party": [],
-    "can1-vehicle": [],
-    "can9-internal": [],
-}
-
-# Group files by DBC name
-for file in sorted(PROCESSED_DIR.glob("*_filtered.parquet")):
-    name = file.name
-    for group in dbc_groups:
-        if group.replace("-", "_") in name:
-            dbc_groups[group].append(file)
-            break
-
-# Merge each group vertically
-for dbc_name, files in dbc_groups.items():
-    if not files:
-        continue
+BATCH_ROWS = 8_192  # rows buffered per input
+
+
+def dbc_group_names() -> list[str]:
+    return sorted(p.stem for p in DBC_DIR.glob("*.dbc"))
+
+
+def group_processed_files(files: list[Path] | None = None) -> dict[str, list[Path]]:
+    """
+    Groups processed dataset partitions by DBC name (e.g., "can1-can", "can1-vehicle", ...).
+    """
+    if files is None:
+        files = partition_files()
+
+    dbc_groups = {group: [] for group in dbc_group_names()}
+    for file in files:
+        bus = file.parent.parent.parent.name.split("=", 1)[1]
+        if bus in dbc_groups:
+            dbc_groups[bus].append(file)
+    return dbc_groups
+
+
+def merged_path(dbc_name: str) -> Path:
+    return MERGED_DIR / f"{dbc_name}.parquet"
+
+
+def is_up_to_date(manifest: Manifest, dbc_name: str, files: list[Path]) -> bool:
+    return manifest.is_fresh("merge", dbc_name, files, {})
+
+
+def record_done(manifest: Manifest, dbc_name: str, files: list[Path]) -> None:
+    manifest.record("merge", dbc_name, files, {}, [merged_path(dbc_name)])
+
 
+def merged_schema(files: list[Path]) -> pa.Schema:
+    """Union of all input schemas, columns sorted by name (time included)."""
+    schema = unify_schemas([pq.read_schema(path) for path in files])
+    return pa.schema(sorted(schema, key=lambda field: field.name))
+
+
+class _Input:
+    """One time-sorted input, consumed batch by batch."""
+
+    def __init__(self, path: Path, schema: pa.Schema):
+        self.schema = schema
+        self.batches = pq.ParquetFile(path).iter_batches(batch_size=BATCH_ROWS)
+        self.buffer = None
+        self.refill()
+
+    def refill(self):
+        self.buffer = None
+        for batch in self.batches:
+            if batch.num_rows:
+                self.buffer = conform(batch, self.schema)
+                return
+
+    @property
+    def last_time(self):
+        return self.buffer.column("time")[-1]
+
+    def take_until(self, bound) -> pa.Table:
+        """Pops every buffered row with time <= bound."""
+        times = self.buffer.column("time")
+        n = int(pc.sum(pc.less_equal(times, bound)).as_py() or 0)
+        head, self.buffer = self.buffer.slice(0, n), self.buffer.slice(n)
+        if self.buffer.num_rows == 0:
+            self.refill()
+        return head
+
+
+def merge_group(dbc_name: str, files: list[Path]) -> Path:
+    """
+    Streams all processed files of one DBC into data/merged/, k-way merged by time.
+    """
     logging.info(f"🔗 Merging {len(files)} files for {dbc_name} ...")
-    dfs = []
+    schema = merged_schema(files)
+    inputs = [_Input(path, schema) for path in files]
+    inputs = [i for i in inputs if i.buffer is not None]
+
+    out_path = merged_path(dbc_name)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = out_path.with_name(f".{out_path.name}.{os.getpid()}.tmp")
+    rows = 0
+    pending: list[pa.Table] = []
+
+    try:
+        with pq.ParquetWriter(tmp, schema) as writer:
+            while inputs:
+                with PROFILER.phase("merge") as span:
+                    # Rows up to the smallest buffered tail are final: no input can still produce earlier ones
+                    bound = min((i.last_time for i in inputs), key=lambda t: t.value)
+                    parts = [i.take_until(bound) for i in inputs]
+                    inputs = [i for i in inputs if i.buffer is not None]
+
+                    chunk = pa.concat_tables([p for p in parts if p.num_rows])
+                    order = np.argsort(chunk.column("time").cast(pa.int64()).to_numpy(), kind="stable")
+                    pending.append(chunk.take(order))
+                    rows += chunk.num_rows
+                    span.rows = chunk.num_rows
+
+                # Merge steps can be tiny; only write full row groups
+                if sum(t.num_rows for t in pending) >= BATCH_ROWS or not inputs:
+                    table = pa.concat_tables(pending)
+                    with PROFILER.phase("write", rows=table.num_rows, nbytes=table.nbytes):
+                        writer.write_table(table)
+                    pending = []
+        os.replace(tmp, out_path)
+    finally:
+        tmp.unlink(missing_ok=True)
+
+    logging.info(f"✅ Saved: {out_path.name} ({rows} rows)")
+    return out_path
+
 
-    for path in files:
-        df = pd.read_parquet(path)
+def main():
+    manifest = Manifest()
 
-        # Optional: enforce same column order for consistency
-        df = df[sorted(df.columns)]
-        dfs.append(df)
+    # Merge each group vertically
+    for dbc_name, files in group_processed_files().items():
+        if not files:
+            continue
 
-    # Vertically stack (safe since same schema)
-    merged = pd.concat(dfs, axis=0, ignore_index=True)
+        if is_up_to_date(manifest, dbc_name, files):
+            logging.info(f"⏭️ Up to date: {merged_path(dbc_name).name}")
+            continue
 
-    # Sort by time (optional, but highly recommended)
-    if "time" in merged.columns:
-        merged = merged.sort_values("time")
+        merge_group(dbc_name, files)
+        record_done(manifest, dbc_name, files)
+        manifest.save()
 
-    # Optional: cast objects to str or float to avoid ArrowTypeError
-    for col in merged.select_dtypes(include='object'):
-        try:
-            merged[col] = pd.to_numeric(merged[col], errors="raise")
-        except Exception:
-            merged[col] = merged[col].astype(str)
 
-    # Save to merged dir
-    out_path = MERGED_DIR / f"{dbc_name}.parquet"
-    merged.to_parquet(out_path, index=False)
-    logging.info(f"✅ Saved: {out_path.name}")
+if __name__ == "__main__":
+    main()
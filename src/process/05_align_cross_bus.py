@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+src/process/05_align_cross_bus.py
+
+Aligns the signals in ALIGN_SIGNALS from every bus of a drive onto one
+ALIGN_HZ timeline, straight from the decoded per-DBC outputs:
+data/aligned/<drive>_aligned.parquet [time, ...signals].
+
+- Unlike the 1 Hz downsampled/merged data, every value keeps the timing of
+  its own message: as-of joins with TOLERANCE_S, hold-last for enums/flags
+  and linear interpolation for physical signals (see src/process/align.py)
+- Bus timestamps are corrected by BUS_CLOCK_OFFSETS_S; with ESTIMATE_OFFSETS
+  the offsets against REFERENCE_BUS are measured from signals both decoded
+  outputs carry
+- Streams the inputs in batches and writes CHUNK_SECONDS of grid at a time
+- Reads wide or long-layout decoded outputs
+- A name selected on several buses gets one "<bus>.<signal>" column per bus
+- Held columns keep their decoded type (src/store/signal_types.py),
+  interpolated ones are float64
+- Skips drives whose inputs, metadata and settings are unchanged (pipeline manifest)
+"""
+import os
+import sys
+import argparse
+import logging
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# ─── Logging Setup ─────────────────────────────────────────────
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s — %(levelname)s — %(message)s",
+    handlers=[logging.StreamHandler()])
+
+# ─── Force src/ to be discoverable ─────────────────────────────
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from src.utils.paths import DECODED_DIR, ALIGNED_DIR
+from src.utils.manifest import Manifest
+from src.process.align import (SignalBuffer, align_chunks, decoded_sources, edge_lags,
+                               load_methods, time_extent)
+from src.store.dataset import split_stage_name
+from src.store.long_store import decoded_signals, iter_signals
+from src.store.signal_query import resolve_signals
+from src.store.signal_types import DEFAULT_TYPE, decoded_types, registry_digest, conform
+from src.utils.profiling import PROFILER
+
+# ─── Config ─────────────────────────────────────────────────────
+ALIGN_HZ = 100
+TOLERANCE_S = 0.5       # a grid point further than this from its samples stays NaN
+CHUNK_SECONDS = 60      # grid written per step
+
+# bus → signals; FSD engagement, driver inputs and vehicle dynamics
+ALIGN_SIGNALS: dict[str, list[str]] = {
+    "can1-can": ["DI_vehicleSpeed", "DI_brakePedal", "DAS_accState", "DAS_autopilotHandsOnState",
+                 "autopilotStatus", "EPAS_handsOnLevel"],
+    "can1-party": ["DI_accelPedalPos", "EPAS3S_torsionBarTorque", "DI_autopilotRequest"],
+    "can1-vehicle": ["VCLEFT_brakePressed"],
+    "can9-internal": ["AccelerationX", "AccelerationY", "AngularRateZ"],
+}
+
+# bus → seconds its clock runs ahead of the reference (subtracted from its timestamps)
+BUS_CLOCK_OFFSETS_S: dict[str, float] = {}
+REFERENCE_BUS = "can1-vehicle"
+ESTIMATE_OFFSETS = False   # measure offsets from shared signals (overrides BUS_CLOCK_OFFSETS_S)
+MAX_OFFSET_S = 1.0          # largest lag considered when matching value changes
+MAX_OFFSET_SIGNALS = 8      # shared signals read per bus when estimating
+MIN_OFFSET_EDGES = 5        # matched value changes needed to trust an estimate
+
+MANIFEST_PARAMS = {
+    "hz": ALIGN_HZ, "tolerance_s": TOLERANCE_S, "signals": ALIGN_SIGNALS,
+    "offsets_s": BUS_CLOCK_OFFSETS_S, "reference_bus": REFERENCE_BUS, "estimate_offsets": ESTIMATE_OFFSETS,
+}
+
+NS = 1_000_000_000
+
+
+# ─── Layout ─────────────────────────────────────────────────────
+def aligned_path(drive: str) -> Path:
+    return ALIGNED_DIR / f"{drive}_aligned.parquet"
+
+
+def drive_inputs(drives: list[str] | None = None) -> dict[str, dict[str, Path]]:
+    """{drive: {bus: decoded path}} for the buses in ALIGN_SIGNALS."""
+    found: dict[str, dict[str, Path]] = {}
+    for path in sorted(DECODED_DIR.glob("*.parquet")):
+        try:
+            drive, bus = split_stage_name(path.name)
+        except ValueError:
+            continue
+        if bus in ALIGN_SIGNALS and (drives is None or drive in drives):
+            found.setdefault(drive, {})[bus] = path
+    return found
+
+
+def output_columns() -> dict[tuple[str, str], str]:
+    """{(bus, signal): output column}; raises ValueError for signals a bus does not define."""
+    for bus, signals in ALIGN_SIGNALS.items():
+        resolve_signals(signals, [bus])
+    counts: dict[str, int] = {}
+    for signals in ALIGN_SIGNALS.values():
+        for name in signals:
+            counts[name] = counts.get(name, 0) + 1
+    return {(bus, name): name if counts[name] == 1 else f"{bus}.{name}"
+            for bus, signals in ALIGN_SIGNALS.items() for name in signals}
+
+
+def _inputs(paths: dict[str, Path]) -> list[Path]:
+    return sorted(paths.values())
+
+
+def _params(paths: dict[str, Path]) -> dict:
+    """Methods and types come from the metadata rows of the aligned buses only."""
+    return {**MANIFEST_PARAMS, "registry": {bus: registry_digest(bus) for bus in sorted(paths)}}
+
+
+def is_up_to_date(manifest: Manifest, drive: str, paths: dict[str, Path]) -> bool:
+    return manifest.is_fresh("align", drive, _inputs(paths), _params(paths))
+
+
+def record_done(manifest: Manifest, drive: str, paths: dict[str, Path]) -> None:
+    manifest.record("align", drive, _inputs(paths), _params(paths), [aligned_path(drive)])
+
+
+# ─── Clock Offsets ──────────────────────────────────────────────
+def estimate_clock_offsets(paths: dict[str, Path]) -> dict[str, int]:
+    """
+    {bus: offset ns} against REFERENCE_BUS from the value changes of signals
+    both decoded outputs carry; buses without enough matches keep the configured offset.
+    """
+    offsets = {bus: int(BUS_CLOCK_OFFSETS_S.get(bus, 0.0) * NS) for bus in paths}
+    if REFERENCE_BUS not in paths:
+        logging.warning(f"⚠️ No {REFERENCE_BUS} output; keeping configured clock offsets")
+        return offsets
+
+    reference = paths[REFERENCE_BUS]
+    reference_names = set(decoded_signals(reference))
+    for bus, path in paths.items():
+        if bus == REFERENCE_BUS:
+            continue
+        shared = sorted(reference_names & set(decoded_signals(path)))[:MAX_OFFSET_SIGNALS]
+        ref_series = {name: (t, v) for name, t, v in iter_signals(reference, shared)}
+        lags = [edge_lags(*ref_series[name], t, v, int(MAX_OFFSET_S * NS))
+                for name, t, v in iter_signals(path, shared) if name in ref_series]
+        lags = np.concatenate(lags) if lags else np.empty(0)
+        if len(lags) < MIN_OFFSET_EDGES:
+            logging.info(f"    🕒 {bus}: {len(lags)} matched changes, keeping offset {offsets[bus] / NS:+.6f} s")
+            continue
+        offsets[bus] = int(np.median(lags))
+        logging.info(f"    🕒 {bus}: offset {offsets[bus] / NS:+.6f} s from {len(lags)} changes")
+    return offsets
+
+
+# ─── Alignment ──────────────────────────────────────────────────
+def align_drive(drive: str, paths: dict[str, Path]) -> Path:
+    """Aligns one drive's decoded outputs into data/aligned/<drive>_aligned.parquet."""
+    columns = output_columns()
+    by_bus = {bus: load_methods(bus) for bus, _ in columns}
+    methods = {key: by_bus[bus].get(name, "hold") for (bus, name), key in columns.items()}
+
+    if ESTIMATE_OFFSETS:
+        offsets = estimate_clock_offsets(paths)
+    else:
+        offsets = {bus: int(BUS_CLOCK_OFFSETS_S.get(bus, 0.0) * NS) for bus in paths}
+
+    buffers = {key: SignalBuffer() for key in columns.values()}
+    sources, extents = [], []
+    for bus, path in sorted(paths.items()):
+        wanted = {name: key for (b, name), key in columns.items() if b == bus}
+        sources += decoded_sources(path, wanted, buffers, offsets[bus])
+        extent = time_extent(path)
+        if extent is not None:
+            extents.append((extent[0] - offsets[bus], extent[1] - offsets[bus]))
+
+    out_path = aligned_path(drive)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = out_path.with_name(f".{out_path.name}.{os.getpid()}.tmp")
+    types = {key: decoded_types(bus).get(name, DEFAULT_TYPE) if methods[key] == "hold" else pa.float64()
+             for (bus, name), key in columns.items()}
+    schema = pa.schema([("time", pa.timestamp("ns", tz="UTC"))] + [(key, types[key]) for key in buffers])
+    rows = 0
+
+    try:
+        with pq.ParquetWriter(tmp, schema) as writer:
+            if extents:
+                start, end = min(lo for lo, _ in extents), max(hi for _, hi in extents)
+                chunks = align_chunks(sources, buffers, methods, start, end, NS // ALIGN_HZ,
+                                      int(TOLERANCE_S * NS), CHUNK_SECONDS * ALIGN_HZ)
+                for table in PROFILER.iter_phase("align", chunks, rows=lambda t: t.num_rows):
+                    with PROFILER.phase("write", rows=table.num_rows, nbytes=table.nbytes):
+                        writer.write_table(conform(table, schema))
+                    rows += table.num_rows
+        os.replace(tmp, out_path)
+    finally:
+        tmp.unlink(missing_ok=True)
+
+    logging.info(f"✅ {drive}: {len(paths)} buses → {out_path.name} ({rows} rows, {len(buffers)} signals)")
+    return out_path
+
+
+# ─── Main ──────────────────────────────────────────────────────
+def main():
+    parser = argparse.ArgumentParser(description="Align signals of all buses onto one timeline per drive")
+    parser.add_argument("--drives", nargs="+", help="drive IDs (default: all decoded drives)")
+    parser.add_argument("--force", action="store_true", help="ignore the manifest and rebuild everything")
+    args = parser.parse_args()
+
+    inputs = drive_inputs(args.drives)
+    if not inputs:
+        logging.warning("⚠️ No decoded Parquet files found in data/decoded/")
+        return
+
+    manifest = Manifest()
+    for drive, paths in inputs.items():
+        if not args.force and is_up_to_date(manifest, drive, paths):
+            logging.info(f"⏭️ Up to date: {aligned_path(drive).name}")
+            continue
+
+        logging.info(f"🧭 Aligning {drive} ...")
+        align_drive(drive, paths)
+        record_done(manifest, drive, paths)
+        manifest.save()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+src/process/06_index_events.py
+
+Runs the event detectors of config/events/detectors.json (see
+src/process/events.py) over every drive's decoded outputs and builds the
+fleet-wide event index read by src/store/event_index.py.
+
+- Per drive: data/events/<drive>_events.parquet; only the signals the
+  detectors and context columns need are read from the decoded files
+  (wide or long layout)
+- Then all drives: data/catalog/event_index.parquet, sorted by (event, start)
+- A detector whose bus has no decoded output for a drive finds no events there
+- Skips drives whose inputs, detector config, enum maps and DBCs are
+  unchanged (pipeline manifest)
+"""
+import os
+import sys
+import argparse
+import logging
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# ─── Logging Setup ─────────────────────────────────────────────
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s — %(levelname)s — %(message)s",
+    handlers=[logging.StreamHandler()])
+
+# ─── Force src/ to be discoverable ─────────────────────────────
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from src.utils.paths import DECODED_DIR, EVENTS_DIR, EVENT_INDEX_PATH, EVENT_DETECTORS_PATH, ENUM_MAPS_PATH, DBC_DIR
+from src.utils.manifest import Manifest
+from src.process.events import EventConfig, load_event_config, detect, context_at
+from src.store.dataset import split_stage_name
+from src.store.event_index import event_schema
+from src.store.long_store import decoded_signals, iter_signals
+from src.utils.profiling import PROFILER
+
+
+# ─── Layout ─────────────────────────────────────────────────────
+def events_path(drive: str) -> Path:
+    return EVENTS_DIR / f"{drive}_events.parquet"
+
+
+def drive_inputs(config: EventConfig, drives: list[str] | None = None) -> dict[str, dict[str, Path]]:
+    """{drive: {bus: decoded path}} for the buses the detectors and context read."""
+    found: dict[str, dict[str, Path]] = {}
+    for path in sorted(DECODED_DIR.glob("*.parquet")):
+        try:
+            drive, bus = split_stage_name(path.name)
+        except ValueError:
+            continue
+        if bus in config.buses and (drives is None or drive in drives):
+            found.setdefault(drive, {})[bus] = path
+    return found
+
+
+def _inputs(paths: dict[str, Path]) -> list[Path]:
+    """Decoded files, detector config and enum maps, and the DBCs whose choice codes are masked."""
+    dbcs = [DBC_DIR / f"{bus}.dbc" for bus in sorted(paths)]
+    return [*sorted(paths.values()), EVENT_DETECTORS_PATH, ENUM_MAPS_PATH, *[p for p in dbcs if p.exists()]]
+
+
+def is_up_to_date(manifest: Manifest, drive: str, paths: dict[str, Path]) -> bool:
+    return manifest.is_fresh("events", drive, _inputs(paths), {})
+
+
+def record_done(manifest: Manifest, drive: str, paths: dict[str, Path]) -> None:
+    manifest.record("events", drive, _inputs(paths), {}, [events_path(drive)])
+
+
+def _write(table: pa.Table, out_path: Path) -> None:
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = out_path.with_name(f".{out_path.name}.{os.getpid()}.tmp")
+    try:
+        pq.write_table(table, tmp)
+        os.replace(tmp, out_path)
+    finally:
+        tmp.unlink(missing_ok=True)
+
+
+# ─── Detection ──────────────────────────────────────────────────
+def index_drive(drive: str, paths: dict[str, Path]) -> int:
+    """Detects one drive's events into data/events/<drive>_events.parquet; returns the event count."""
+    config = load_event_config()
+
+    series: dict[tuple[str, str], tuple[np.ndarray, np.ndarray]] = {}
+    for bus, path in sorted(paths.items()):
+        available = set(decoded_signals(path))
+        names = [name for name in config.signals(bus) if name in available]
+        with PROFILER.phase("read") as span:
+            for name, time_ns, values in iter_signals(path, names):
+                series[(bus, name)] = (time_ns, values)
+                span.rows += len(time_ns)
+
+    parts = []
+    with PROFILER.phase("detect") as span:
+        for detector in config.detectors:
+            found = series.get((detector.bus, detector.signal))
+            if found is None:
+                continue
+            start, end, value = detect(detector, *found)
+            span.rows += len(found[0])
+            PROFILER.count("events", detector.name, len(start))
+            parts.append((detector.name, start, end, value))
+
+    schema = event_schema(list(config.context))
+    start = np.concatenate([p[1] for p in parts]) if parts else np.empty(0, dtype=np.int64)
+    end = np.concatenate([p[2] for p in parts]) if parts else np.empty(0, dtype=np.int64)
+    columns = {
+        "event": np.concatenate([np.full(len(p[1]), p[0], dtype=object) for p in parts]) if parts else [],
+        "drive": np.full(len(start), drive, dtype=object),
+        "start": start,
+        "end": end,
+        "duration_s": (end - start) / 1e9,
+        "value": np.concatenate([p[3] for p in parts]) if parts else np.empty(0),
+    }
+    for column, key in config.context.items():
+        columns[column] = context_at(start, series.get(key), config.masked[key])
+    table = pa.Table.from_arrays([pa.array(columns[f.name], type=f.type) for f in schema], schema=schema)
+    table = table.sort_by([("event", "ascending"), ("start", "ascending")])
+
+    out_path = events_path(drive)
+    _write(table, out_path)
+    logging.info(f"✅ {drive}: {table.num_rows} events → {out_path.name}")
+    return table.num_rows
+
+
+# ─── Index ──────────────────────────────────────────────────────
+def build_index(drives: list[str] | None = None) -> Path:
+    """Merges the per-drive event files of the current decoded drives into data/catalog/event_index.parquet."""
+    config = load_event_config()
+    schema = event_schema(list(config.context))
+    tables = []
+    for drive in drive_inputs(config, drives):
+        path = events_path(drive)
+        if not path.exists():
+            continue
+        table = pq.read_table(path)
+        if table.schema != schema:
+            logging.warning(f"⚠️ {path.name} predates the detector config; skipped until re-indexed")
+            continue
+        tables.append(table)
+
+    with PROFILER.phase("index") as span:
+        table = pa.concat_tables(tables) if tables else schema.empty_table()
+        table = table.sort_by([("event", "ascending"), ("start", "ascending"), ("drive", "ascending")])
+        _write(table, EVENT_INDEX_PATH)
+        span.rows += table.num_rows
+
+    logging.info(f"🗂️ Event index: {table.num_rows} events from {len(tables)} drives → {EVENT_INDEX_PATH.name}")
+    return EVENT_INDEX_PATH
+
+
+# ─── Main ──────────────────────────────────────────────────────
+def main():
+    parser = argparse.ArgumentParser(description="Detect FSD events per drive and build the event index")
+    parser.add_argument("--drives", nargs="+", help="drive IDs (default: all decoded drives)")
+    parser.add_argument("--force", action="store_true", help="ignore the manifest and rebuild everything")
+    args = parser.parse_args()
+
+    try:
+        config = load_event_config()
+    except ValueError as e:
+        parser.error(str(e))
+    inputs = drive_inputs(config, args.drives)
+    if not inputs:
+        logging.warning("⚠️ No decoded Parquet files found in data/decoded/")
+        return
+
+    manifest = Manifest()
+    for drive, paths in inputs.items():
+        if not args.force and is_up_to_date(manifest, drive, paths):
+            logging.info(f"⏭️ Up to date: {events_path(drive).name}")
+            continue
+
+        logging.info(f"🔎 Indexing events of {drive} ...")
+        index_drive(drive, paths)
+        record_done(manifest, drive, paths)
+        manifest.save()
+
+    build_index()
+
+
+if __name__ == "__main__":
+    main()
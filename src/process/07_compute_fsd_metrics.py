@@ -0,0 +1,430 @@
+#!/usr/bin/env python3
+"""
+src/process/07_compute_fsd_metrics.py
+
+FSD benchmark KPIs per drive and for the fleet. Engagement and distance come
+from the cleaned 1 Hz dataset (data/processed/); steering error and jerk need
+the signals at their logged rate and come from the decoded outputs
+(data/decoded/, wide or long layout):
+
+- engagement time and distance (DistanceTrip increments, Speed × dt where
+  the trip counter is missing), engagements and disengagements per 100 km /
+  per hour of engaged driving
+- steering tracking error |DAS_steeringAngleRequest − SCCM_steeringAngle|
+  at every request sample while engaged (the angle interpolated, the
+  autopilot state held, within STEER_TOLERANCE_S): mean, RMS, p95, max
+- jerk |d(AccelerationX, AccelerationY)/dt| on a JERK_HZ grid the
+  accelerations are interpolated onto: RMS, p95, max
+
+Map-reduce, so a new log only costs its own drive:
+- map (one unit per drive, fanned out over the process pool): the METRIC_SIGNALS
+  columns of the drive are read, joined on time and reduced with NumPy into
+  one row of additive partials (sums, counts, maxima, fixed-bin histograms)
+  → data/metrics/drives/<drive>_partial.parquet, skipped when the drive's
+  partitions and decoded outputs are unchanged (pipeline manifest)
+- reduce: the partial rows alone are summed into
+  data/metrics/drive_metrics.parquet (one row per drive) and
+  data/metrics/fleet_metrics.parquet (one row per date, plus date "all")
+  with the KPIs derived from the summed partials (percentiles from the
+  merged histograms)
+
+Gaps longer than MAX_STEP_S between rows are not integrated: they add
+neither duration nor distance (trip counter increments across a gap
+included), so the per-hour and per-100 km rates share one basis.
+"""
+import os
+import sys
+import json
+import argparse
+import logging
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# ─── Logging Setup ─────────────────────────────────────────────
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s — %(levelname)s — %(message)s",
+    handlers=[logging.StreamHandler()])
+
+# ─── Force src/ to be discoverable ─────────────────────────────
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from src.utils.paths import METRICS_DIR, ENUM_MAPS_PATH, DECODED_DIR
+from src.utils.manifest import Manifest
+from src.process.align import asof_hold, asof_linear
+from src.store.dataset import partition_files, read_dataset, split_stage_name
+from src.store.long_store import decoded_signals, iter_signals
+from src.store.signal_types import special_values, registry_digest
+from src.utils.profiling import PROFILER
+
+# ─── Config ─────────────────────────────────────────────────────
+# role → (bus, signal) in the processed dataset
+METRIC_SIGNALS: dict[str, tuple[str, str]] = {
+    "engaged": ("can1-can", "autopilotStatus"),
+    "distance": ("can9-internal", "DistanceTrip"),
+    "speed": ("can9-internal", "Speed"),
+    "steer_request": ("can1-party", "DAS_steeringAngleRequest"),
+    "steer_angle": ("can1-party", "SCCM_steeringAngle"),
+    "accel_x": ("can9-internal", "AccelerationX"),
+    "accel_y": ("can9-internal", "AccelerationY"),
+}
+ENGAGED_STATES = ["ACTIVE_1", "ACTIVE_2", "ACTIVE_NAVIGATE_ON_AUTOPILOT"]
+DECODED_ROLES = ["engaged", "steer_request", "steer_angle", "accel_x", "accel_y"]   # read at their logged rate
+PROCESSED_ROLES = ["engaged", "distance", "speed"]                                 # read from the 1 Hz dataset
+
+MAX_STEP_S = 2.0                # longer gaps between rows count as logging dropouts
+MAX_SPEED_MPS = 90.0            # trip counter jumps faster than this are glitches (Speed × dt is used)
+STEER_ERR_BIN_DEG = 0.1
+STEER_ERR_BINS = 1_800          # up to 180°; larger errors count in the last bin
+JERK_BIN = 0.05                 # m/s³
+JERK_BINS = 1_000               # up to 50 m/s³
+JERK_HZ = 5                     # accelerations are differentiated on this grid: the IMU message rate of the logs
+STEER_TOLERANCE_S = 0.1         # steering angle samples further than this from a request do not pair
+
+# Bump when drive_partials() computes a partial differently, so drives are recomputed
+PARTIALS_VERSION = 2
+
+MANIFEST_PARAMS = {
+    "version": PARTIALS_VERSION, "signals": METRIC_SIGNALS, "engaged_states": ENGAGED_STATES, "max_step_s": MAX_STEP_S,
+    "max_speed_mps": MAX_SPEED_MPS,
+    "steer_err_bins": [STEER_ERR_BIN_DEG, STEER_ERR_BINS], "jerk_bins": [JERK_BIN, JERK_BINS],
+    "jerk_hz": JERK_HZ, "steer_tolerance_s": STEER_TOLERANCE_S,
+}
+
+# Partial columns and how they combine across drives
+SUM_COLUMNS = ["duration_s", "distance_m", "engaged_s", "engaged_distance_m", "engagements", "disengagements",
+               "steer_err_n", "steer_err_sum", "steer_err_sumsq", "jerk_n", "jerk_sumsq"]
+MAX_COLUMNS = ["steer_err_max", "jerk_max"]
+HIST_COLUMNS = ["steer_err_hist", "jerk_hist"]
+
+NS = 1_000_000_000
+
+
+# ─── Layout ─────────────────────────────────────────────────────
+def partial_path(drive: str) -> Path:
+    return METRICS_DIR / "drives" / f"{drive}_partial.parquet"
+
+
+def drive_metrics_path() -> Path:
+    return METRICS_DIR / "drive_metrics.parquet"
+
+
+def fleet_metrics_path() -> Path:
+    return METRICS_DIR / "fleet_metrics.parquet"
+
+
+def _buses() -> list[str]:
+    return sorted({bus for bus, _ in METRIC_SIGNALS.values()})
+
+
+def decoded_paths(drive: str) -> dict[str, Path]:
+    """{bus: decoded output} of one drive for the METRIC_SIGNALS buses."""
+    found = {}
+    for path in sorted(DECODED_DIR.glob(f"{drive}_*.parquet")):
+        try:
+            _, bus = split_stage_name(path.name)
+        except ValueError:
+            continue
+        if bus in _buses():
+            found[bus] = path
+    return found
+
+
+def drive_inputs(drives: list[str] | None = None) -> dict[str, list[Path]]:
+    """{drive: processed partition files and decoded outputs of the METRIC_SIGNALS buses}."""
+    found: dict[str, list[Path]] = {}
+    for file in partition_files(_buses(), drives):
+        drive = file.parent.parent.name.split("=", 1)[1]
+        found.setdefault(drive, []).append(file)
+    for drive, files in found.items():
+        files += decoded_paths(drive).values()
+    return found
+
+
+def _inputs(files: list[Path]) -> list[Path]:
+    return [*sorted(files), ENUM_MAPS_PATH]
+
+
+def _params() -> dict:
+    """Special values come from the metadata rows of the METRIC_SIGNALS buses only."""
+    return {**MANIFEST_PARAMS, "registry": {bus: registry_digest(bus) for bus in _buses()}}
+
+
+def is_up_to_date(manifest: Manifest, drive: str, files: list[Path]) -> bool:
+    return manifest.is_fresh("metrics", drive, _inputs(files), _params())
+
+
+def record_done(manifest: Manifest, drive: str, files: list[Path]) -> None:
+    manifest.record("metrics", drive, _inputs(files), _params(), [partial_path(drive)])
+
+
+def _write(table: pa.Table, out_path: Path) -> None:
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = out_path.with_name(f".{out_path.name}.{os.getpid()}.tmp")
+    try:
+        pq.write_table(table, tmp)
+        os.replace(tmp, out_path)
+    finally:
+        tmp.unlink(missing_ok=True)
+
+
+# ─── Map: One Drive ─────────────────────────────────────────────
+def read_drive(drive: str) -> pd.DataFrame:
+    """[time, ...PROCESSED_ROLES] of one drive: every bus's columns outer-joined on the 1 Hz grid."""
+    frames = []
+    for bus in _buses():
+        roles = {signal: role for role, (b, signal) in METRIC_SIGNALS.items() if b == bus and role in PROCESSED_ROLES}
+        if not roles:
+            continue
+        df = read_dataset(list(roles), buses=[bus], drives=[drive])
+        frames.append(df[["time", *roles]].rename(columns=roles).set_index("time"))
+    df = pd.concat(frames, axis=1, join="outer").sort_index()
+    return df.reset_index()
+
+
+def read_series(drive: str) -> dict[str, tuple[np.ndarray, np.ndarray]]:
+    """
+    {role: (time ns, values)} of the DECODED_ROLES at their logged rate; the
+    special code of a physical signal (ZERO_ANGLE …) becomes its value.
+    """
+    series = {}
+    for bus, path in decoded_paths(drive).items():
+        roles = {signal: role for role, (b, signal) in METRIC_SIGNALS.items() if b == bus and role in DECODED_ROLES}
+        available = set(decoded_signals(path))
+        specials = special_values(bus)
+        for name, time_ns, values in iter_signals(path, [name for name in roles if name in available]):
+            if name in specials:
+                code, value = specials[name]
+                values = np.where(values == code, value, values)
+            series[roles[name]] = (time_ns, values)
+    return series
+
+
+def _numeric(column: pd.Series) -> np.ndarray:
+    """Float values; in labelled (categorical) columns, codes without a label parse back, labels become NaN."""
+    return pd.to_numeric(column.astype(object), errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+
+
+def _engaged_codes() -> list[float]:
+    with open(ENUM_MAPS_PATH) as f:
+        labels = json.load(f).get(METRIC_SIGNALS["engaged"][1], {})
+    return [float(code) for code, label in labels.items() if label in ENGAGED_STATES]
+
+
+def _engaged(column: pd.Series) -> np.ndarray:
+    """Engaged flag per row; the column holds enum labels, or raw codes if it was not labelled."""
+    if pd.api.types.is_numeric_dtype(column):
+        return np.isin(_numeric(column), _engaged_codes())
+    return column.astype(object).isin(ENGAGED_STATES).to_numpy()
+
+
+def _histogram(values: np.ndarray, bin_width: float, bins: int) -> np.ndarray:
+    idx = np.minimum((values / bin_width).astype(np.int64), bins - 1)
+    return np.bincount(idx, minlength=bins).tolist()
+
+
+def steering_errors(series: dict[str, tuple[np.ndarray, np.ndarray]]) -> np.ndarray:
+    """|request − angle| at every engaged request sample that has an angle within STEER_TOLERANCE_S."""
+    if not {"steer_request", "steer_angle", "engaged"} <= series.keys():
+        return np.empty(0)
+    time_ns, request = series["steer_request"]
+    tolerance = int(STEER_TOLERANCE_S * NS)
+    angle = asof_linear(time_ns, *series["steer_angle"], tolerance)
+    engaged = np.isin(asof_hold(time_ns, *series["engaged"], int(MAX_STEP_S * NS)), _engaged_codes())
+    err = np.abs(request - angle)[engaged]
+    return err[~np.isnan(err)]
+
+
+def jerks(series: dict[str, tuple[np.ndarray, np.ndarray]]) -> np.ndarray:
+    """|d(accel_x, accel_y)/dt| between neighbouring points of the JERK_HZ grid."""
+    if not {"accel_x", "accel_y"} <= series.keys() or not len(series["accel_x"][0]):
+        return np.empty(0)
+    period = NS // JERK_HZ
+    time_ns = series["accel_x"][0]
+    grid = np.arange(time_ns[0] // period * period, time_ns[-1] + 1, period, dtype=np.int64)
+    tolerance = int(MAX_STEP_S * NS)
+    x = asof_linear(grid, *series["accel_x"], tolerance)
+    y = asof_linear(grid, *series["accel_y"], tolerance)
+    jerk = np.hypot(np.diff(x), np.diff(y)) * JERK_HZ
+    return jerk[~np.isnan(jerk)]
+
+
+def drive_partials(df: pd.DataFrame, series: dict[str, tuple[np.ndarray, np.ndarray]]) -> dict:
+    """The additive partial row of one drive's 1 Hz [time, ...PROCESSED_ROLES] frame and decoded series."""
+    time_ns = pd.to_datetime(df["time"], utc=True).astype("int64").to_numpy()
+    n = len(time_ns)
+    dt = np.diff(time_ns) / NS
+    step = dt <= MAX_STEP_S
+    engaged = _engaged(df["engaged"])
+    engaged_step = step & engaged[:-1]
+
+    # Distance per step: the trip counter where both ends are known (resets count as 0), else Speed × dt
+    trip = np.diff(_numeric(df["distance"]))
+    with np.errstate(invalid="ignore"):
+        trip[trip > MAX_SPEED_MPS * np.maximum(dt, 1.0)] = np.nan
+    speed = _numeric(df["speed"])[:-1] * dt
+    moved = np.where(np.isnan(trip), speed, np.maximum(trip, 0.0))
+    moved = np.where(step, np.nan_to_num(moved, nan=0.0), 0.0)   # gaps count for neither time nor distance
+
+    flips = np.diff(engaged.astype(np.int8))
+    out = {
+        "start": int(time_ns[0]) if n else 0,
+        "end": int(time_ns[-1]) if n else 0,
+        "duration_s": float(dt[step].sum()),
+        "distance_m": float(moved.sum()),
+        "engaged_s": float(dt[engaged_step].sum()),
+        "engaged_distance_m": float(moved[engaged_step].sum()),
+        "engagements": int(np.count_nonzero(flips == 1) + (engaged[0] if n else 0)),
+        "disengagements": int(np.count_nonzero(flips == -1)),
+    }
+
+    err = steering_errors(series)
+    out.update({
+        "steer_err_n": len(err), "steer_err_sum": float(err.sum()), "steer_err_sumsq": float((err ** 2).sum()),
+        "steer_err_max": float(err.max()) if len(err) else np.nan,
+        "steer_err_hist": _histogram(err, STEER_ERR_BIN_DEG, STEER_ERR_BINS),
+    })
+
+    jerk = jerks(series)
+    out.update({
+        "jerk_n": len(jerk), "jerk_sumsq": float((jerk ** 2).sum()),
+        "jerk_max": float(jerk.max()) if len(jerk) else np.nan,
+        "jerk_hist": _histogram(jerk, JERK_BIN, JERK_BINS),
+    })
+    return out
+
+
+PARTIAL_SCHEMA = pa.schema(
+    [("drive", pa.string()), ("start", pa.timestamp("ns", tz="UTC")), ("end", pa.timestamp("ns", tz="UTC"))]
+    + [(name, pa.int64() if name in ("engagements", "disengagements", "steer_err_n", "jerk_n") else pa.float64())
+       for name in SUM_COLUMNS]
+    + [(name, pa.float64()) for name in MAX_COLUMNS]
+    + [(name, pa.list_(pa.int64())) for name in HIST_COLUMNS]
+)
+
+
+def compute_drive(drive: str) -> Path:
+    """Map unit: data/metrics/drives/<drive>_partial.parquet for one drive."""
+    with PROFILER.phase("read") as span:
+        df = read_drive(drive)
+        series = read_series(drive)
+        span.rows += len(df) + sum(len(t) for t, _ in series.values())
+    with PROFILER.phase("metrics", rows=span.rows):
+        partials = {"drive": drive, **drive_partials(df, series)}
+    table = pa.Table.from_pylist([partials], schema=PARTIAL_SCHEMA)
+
+    out_path = partial_path(drive)
+    _write(table, out_path)
+    logging.info(f"✅ {drive}: {partials['engaged_s']:.0f} s / {partials['engaged_distance_m'] / 1e3:.1f} km engaged, "
+                 f"{partials['disengagements']} disengagements → {out_path.name}")
+    return out_path
+
+
+# ─── Reduce: Fleet ──────────────────────────────────────────────
+def _percentile(histograms: pd.Series, q: float, bin_width: float) -> float:
+    """Upper edge of the bin holding the q-quantile of the summed histograms."""
+    histogram = np.sum(np.stack(histograms.to_numpy()), axis=0)
+    total = int(histogram.sum())
+    if not total:
+        return np.nan
+    return (int(np.searchsorted(np.cumsum(histogram), q * total)) + 1) * bin_width
+
+
+def combine(partials: pd.DataFrame) -> dict:
+    """One KPI row from any set of partial rows."""
+    totals = partials[SUM_COLUMNS].sum()
+    peaks = partials[MAX_COLUMNS].max()
+    engaged_km = totals["engaged_distance_m"] / 1e3
+    engaged_h = totals["engaged_s"] / 3600
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return {
+            "drives": len(partials),
+            "start": partials["start"].min(),
+            "end": partials["end"].max(),
+            "duration_h": totals["duration_s"] / 3600,
+            "distance_km": totals["distance_m"] / 1e3,
+            "engaged_h": engaged_h,
+            "engaged_km": engaged_km,
+            "engaged_fraction": totals["engaged_s"] / totals["duration_s"] if totals["duration_s"] else np.nan,
+            "engagements": int(totals["engagements"]),
+            "disengagements": int(totals["disengagements"]),
+            "disengagements_per_100km": totals["disengagements"] / engaged_km * 100 if engaged_km else np.nan,
+            "disengagements_per_hour": totals["disengagements"] / engaged_h if engaged_h else np.nan,
+            "steer_err_mean_deg": totals["steer_err_sum"] / totals["steer_err_n"] if totals["steer_err_n"] else np.nan,
+            "steer_err_rms_deg": np.sqrt(totals["steer_err_sumsq"] / totals["steer_err_n"]) if totals["steer_err_n"] else np.nan,
+            "steer_err_p95_deg": min(_percentile(partials["steer_err_hist"], 0.95, STEER_ERR_BIN_DEG), peaks["steer_err_max"]),
+            "steer_err_max_deg": peaks["steer_err_max"],
+            "jerk_rms": np.sqrt(totals["jerk_sumsq"] / totals["jerk_n"]) if totals["jerk_n"] else np.nan,
+            "jerk_p95": min(_percentile(partials["jerk_hist"], 0.95, JERK_BIN), peaks["jerk_max"]),
+            "jerk_max": peaks["jerk_max"],
+        }
+
+
+def reduce_fleet(drives: list[str] | None = None) -> Path:
+    """Reduce: per-drive and fleet KPI tables from the partials of the current processed drives."""
+    partials = []
+    for drive in drive_inputs(drives):
+        path = partial_path(drive)
+        if not path.exists():
+            continue
+        table = pq.read_table(path)
+        if table.schema != PARTIAL_SCHEMA:
+            logging.warning(f"⚠️ {path.name} predates the metric settings; skipped until recomputed")
+            continue
+        partials.append(table)
+    if not partials:
+        logging.warning("⚠️ No drive metrics to reduce")
+        return fleet_metrics_path()
+
+    with PROFILER.phase("reduce") as span:
+        df = pa.concat_tables(partials).to_pandas()
+        span.rows += len(df)
+        per_drive = pd.DataFrame([{"drive": drive, **combine(rows)} for drive, rows in df.groupby("drive", sort=True)])
+        dates = df["start"].dt.strftime("%Y-%m-%d")
+        fleet = pd.DataFrame([{"date": "all", **combine(df)}] +
+                             [{"date": date, **combine(rows)} for date, rows in df.groupby(dates, sort=True)])
+
+    for out, path in ((per_drive, drive_metrics_path()), (fleet, fleet_metrics_path())):
+        _write(pa.Table.from_pandas(out, preserve_index=False), path)
+    total = fleet.iloc[0]
+    logging.info(f"📈 Fleet: {int(total['drives'])} drives, {total['engaged_km']:.1f} km engaged, "
+                 f"{total['disengagements_per_100km']:.2f} disengagements / 100 km → {fleet_metrics_path().name}")
+    return fleet_metrics_path()
+
+
+# ─── Main ──────────────────────────────────────────────────────
+def main():
+    parser = argparse.ArgumentParser(description="Compute per-drive and fleet FSD metrics")
+    parser.add_argument("--drives", nargs="+", help="drive IDs (default: all processed drives)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="process pool size")
+    parser.add_argument("--force", action="store_true", help="ignore the manifest and rebuild everything")
+    args = parser.parse_args()
+
+    inputs = drive_inputs(args.drives)
+    if not inputs:
+        logging.warning("⚠️ No processed partitions found in data/processed/")
+        return
+
+    manifest = Manifest()
+    stale = {drive: files for drive, files in inputs.items()
+             if args.force or not is_up_to_date(manifest, drive, files)}
+    for drive in sorted(inputs.keys() - stale.keys()):
+        logging.info(f"⏭️ Up to date: {partial_path(drive).name}")
+
+    with ProcessPoolExecutor(max_workers=max(1, args.workers)) as pool:
+        for drive, _ in zip(stale, pool.map(compute_drive, stale)):
+            record_done(manifest, drive, stale[drive])
+            manifest.save()
+
+    reduce_fleet()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+src/process/align.py
+
+Cross-bus time alignment engine: puts signals of different buses and
+message periods on one regular timeline without 1 s bucketing.
+
+- Vectorized as-of joins (np.searchsorted) of every signal onto the grid,
+  with a tolerance: a grid point further than `tolerance` from the samples
+  it would use stays NaN instead of holding stale data
+- The join method comes from the DBC metadata, via the same rules as the
+  downsampling policies (see src/process/resample.py):
+    physical signals (policy mean/min/max)      → linear between neighbours
+    enums / flags / counters / checksums        → hold last value
+  METHOD_OVERRIDES can pin any signal to hold/linear
+- Per-bus clock offsets are subtracted before joining; edge_lags() measures
+  them from the value changes of signals both buses carry
+- Inputs are streamed batch by batch and the grid is emitted chunk by chunk:
+  only the samples around the current chunk are held in memory
+"""
+
+import itertools
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from src.utils.paths import DBC_METADATA_PATH
+from src.process.resample import load_policies
+from src.store.long_store import is_long, signal_files
+
+METHODS = {"hold", "linear"}
+
+# signal_name → method, wins over the metadata-derived default
+METHOD_OVERRIDES: dict[str, str] = {}
+
+INTERPOLATED_POLICIES = {"mean", "min", "max"}
+BATCH_ROWS = 65_536
+
+
+# ─── Methods ────────────────────────────────────────────────────
+def load_methods(bus: str, metadata_path: Path = DBC_METADATA_PATH) -> dict[str, str]:
+    """{signal_name: "hold" | "linear"} for the signals of one bus, from the DBC metadata registry."""
+    methods = {}
+    for name, (policy, _) in load_policies(bus, metadata_path).items():
+        methods[name] = METHOD_OVERRIDES.get(name, "linear" if policy in INTERPOLATED_POLICIES else "hold")
+    return methods
+
+
+# ─── As-of Joins ────────────────────────────────────────────────
+def asof_hold(grid: np.ndarray, time: np.ndarray, values: np.ndarray, tolerance: int) -> np.ndarray:
+    """Last sample at or before each grid point, if at most `tolerance` ns old."""
+    prev = np.searchsorted(time, grid, side="right") - 1
+    out = np.full(len(grid), np.nan)
+    ok = prev >= 0
+    ok[ok] = grid[ok] - time[prev[ok]] <= tolerance
+    out[ok] = values[prev[ok]]
+    return out
+
+
+def asof_linear(grid: np.ndarray, time: np.ndarray, values: np.ndarray, tolerance: int) -> np.ndarray:
+    """
+    Linear interpolation between the samples around each grid point when both
+    are within `tolerance` ns; at the edges of the data, the held value.
+    """
+    out = asof_hold(grid, time, values, tolerance)
+    nxt = np.searchsorted(time, grid, side="left")
+    ok = (nxt > 0) & (nxt < len(time))
+    prev, nxt, at = nxt[ok] - 1, nxt[ok], grid[ok]
+    t0, t1 = time[prev], time[nxt]
+    inside = (at - t0 <= tolerance) & (t1 - at <= tolerance)
+    weight = (at - t0) / (t1 - t0)
+    interpolated = values[prev] + weight * (values[nxt] - values[prev])
+    idx = np.flatnonzero(ok)[inside]
+    out[idx] = interpolated[inside]
+    return out
+
+
+JOINS = {"hold": asof_hold, "linear": asof_linear}
+
+
+# ─── Clock Offsets ──────────────────────────────────────────────
+def _edges(time: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """Times at which the value changes."""
+    if len(values) < 2:
+        return np.empty(0, dtype=np.int64)
+    return time[1:][values[1:] != values[:-1]]
+
+
+def edge_lags(ref_time: np.ndarray, ref_values: np.ndarray, time: np.ndarray, values: np.ndarray,
+              max_lag: int) -> np.ndarray:
+    """
+    Lags (ns) between each value change of a signal seen on two buses and the
+    nearest change on the reference bus, keeping those within `max_lag`.
+    Their median is the bus clock offset to subtract.
+    """
+    ref_edges, edges = _edges(ref_time, ref_values), _edges(time, values)
+    if not len(ref_edges) or not len(edges):
+        return np.empty(0, dtype=np.int64)
+    right = np.clip(np.searchsorted(ref_edges, edges), 0, len(ref_edges) - 1)
+    left = np.clip(right - 1, 0, len(ref_edges) - 1)
+    lag_right, lag_left = edges - ref_edges[right], edges - ref_edges[left]
+    lags = np.where(np.abs(lag_left) < np.abs(lag_right), lag_left, lag_right)
+    return lags[np.abs(lags) <= max_lag]
+
+
+# ─── Streaming Inputs ───────────────────────────────────────────
+class SignalBuffer:
+    """Time-sorted samples of one signal around the chunk being aligned."""
+
+    def __init__(self):
+        self.time = np.empty(0, dtype=np.int64)
+        self.values = np.empty(0)
+
+    def push(self, time: np.ndarray, values: np.ndarray) -> None:
+        keep = ~np.isnan(values)
+        time, values = time[keep], values[keep]
+        if not len(time):
+            return
+        time = np.concatenate([self.time, time])
+        values = np.concatenate([self.values, values])
+        if np.any(time[1:] < time[:-1]):  # batch-level jitter in the logger's frame order
+            order = np.argsort(time, kind="stable")
+            time, values = time[order], values[order]
+        self.time, self.values = time, values
+
+    def trim(self, before: int) -> None:
+        """Drops samples older than `before` ns; they can no longer be joined."""
+        cut = np.searchsorted(self.time, before, side="left")
+        self.time, self.values = self.time[cut:], self.values[cut:]
+
+
+def _numeric(column: pa.ChunkedArray | pa.Array) -> np.ndarray:
+    if not (pa.types.is_integer(column.type) or pa.types.is_floating(column.type)
+            or pa.types.is_boolean(column.type)):
+        return np.full(len(column), np.nan)  # labelled text has no value to join
+    return column.cast(pa.float64()).to_numpy(zero_copy_only=False)
+
+
+class DecodedSource:
+    """
+    Batches of one decoded file (wide, or the part files of one long signal
+    partition in order), shifted by the bus clock offset and fanned out to
+    per-signal buffers.
+    """
+
+    def __init__(self, files: list[Path], columns: dict[str, str], buffers: dict[str, SignalBuffer], offset: int):
+        """columns: {column in the files: output signal key}"""
+        self.columns = columns
+        self.buffers = buffers
+        self.offset = offset
+        self.batches = itertools.chain.from_iterable(
+            pq.ParquetFile(file).iter_batches(batch_size=BATCH_ROWS, columns=["time", *columns])
+            for file in files)
+        self.last_time = None
+        self.exhausted = False
+
+    def fill_until(self, horizon: int) -> None:
+        """Reads until a sample past `horizon` ns (corrected clock) has been seen."""
+        while not self.exhausted and (self.last_time is None or self.last_time <= horizon):
+            batch = next(self.batches, None)
+            if batch is None:
+                self.exhausted = True
+                return
+            time = batch.column("time").cast(pa.int64())
+            valid = ~time.is_null().to_numpy(zero_copy_only=False)
+            time = time.fill_null(0).to_numpy()[valid] - self.offset
+            if not len(time):
+                continue
+            for column, key in self.columns.items():
+                self.buffers[key].push(time, _numeric(batch.column(column))[valid])
+            batch_last = int(time.max())
+            self.last_time = batch_last if self.last_time is None else max(self.last_time, batch_last)
+
+
+def decoded_sources(path: Path, columns: dict[str, str], buffers: dict[str, SignalBuffer],
+                    offset: int) -> list[DecodedSource]:
+    """One source for a wide file, one per present signal for a long output."""
+    path = Path(path)
+    if not is_long(path):
+        present = {c: k for c, k in columns.items() if c in set(pq.read_schema(path).names)}
+        return [DecodedSource([path], present, buffers, offset)] if present else []
+    return [DecodedSource(signal_files(path, column), {"value": key}, buffers, offset)
+            for column, key in columns.items() if signal_files(path, column)]
+
+
+def _file_extent(file: Path) -> tuple[int, int] | None:
+    meta = pq.ParquetFile(file).metadata
+    column = meta.schema.names.index("time")
+    stats = [meta.row_group(rg).column(column).statistics for rg in range(meta.num_row_groups)]
+    if all(s is not None and s.has_min_max for s in stats):
+        if not stats:
+            return None
+        return min(pd.Timestamp(s.min).value for s in stats), max(pd.Timestamp(s.max).value for s in stats)
+    times = pq.read_table(file, columns=["time"]).column("time").drop_null().cast(pa.int64()).to_numpy()
+    return (int(times.min()), int(times.max())) if len(times) else None
+
+
+def time_extent(path: Path) -> tuple[int, int] | None:
+    """(first, last) time ns of a decoded output, from the Parquet footer statistics when present."""
+    path = Path(path)
+    files = sorted(path.rglob("*.parquet")) if is_long(path) else [path]
+    extents = [e for e in map(_file_extent, files) if e is not None]
+    if not extents:
+        return None
+    return min(lo for lo, _ in extents), max(hi for _, hi in extents)
+
+
+# ─── Alignment ──────────────────────────────────────────────────
+def align_chunks(sources: list[DecodedSource], buffers: dict[str, SignalBuffer], methods: dict[str, str],
+                 start: int, end: int, period: int, tolerance: int, chunk_points: int):
+    """
+    Yields pa.Tables [time, ...signals] on the grid of multiples of `period`
+    ns covering [start, end], `chunk_points` grid points at a time. Rows where
+    every signal is NaN (logging gaps) are dropped.
+    """
+    grid_start = start // period * period
+    names = list(buffers)
+    for chunk_start in range(grid_start, end + 1, period * chunk_points):
+        grid = np.arange(chunk_start, min(chunk_start + period * chunk_points, end + 1), period, dtype=np.int64)
+        for source in sources:
+            source.fill_until(int(grid[-1]) + tolerance)
+
+        columns = [JOINS[methods[name]](grid, buffers[name].time, buffers[name].values, tolerance)
+                   for name in names]
+        next_start = int(grid[-1]) + period
+        for buffer in buffers.values():
+            buffer.trim(next_start - tolerance)
+
+        keep = np.zeros(len(grid), dtype=bool)
+        for values in columns:
+            keep |= ~np.isnan(values)
+        if not keep.any():
+            continue
+        arrays = [pa.array(grid[keep]).cast(pa.timestamp("ns", tz="UTC"))]
+        arrays += [pa.array(values[keep], from_pandas=True) for values in columns]   # NaN → null
+        yield pa.table(arrays, names=["time", *names])
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+src/process/events.py
+
+Vectorized event detectors over decoded signal series, declared in
+config/events/detectors.json:
+
+    {
+      "context":   {"speed_kph": {"bus": "can1-party", "signal": "DI_vehicleSpeed"}},
+      "detectors": {
+        "acc_disengaged": {"kind": "edge", "bus": "can1-can", "signal": "DAS_accState",
+                           "from": ["ACC_ON", "ACC_HOLD"], "to": ["ACC_CANCEL_GENERIC"]},
+        "hard_braking":   {"kind": "threshold", "bus": "can9-internal", "signal": "AccelerationX",
+                           "below": -4.0, "bias_window_s": 30.0, "min_duration_s": 0.2, "max_duration_s": 10.0}
+      }
+    }
+
+- edge: the signal takes one of the `to` values (enum labels from
+  enum_maps.json or raw codes); with `from`, only when the sample before
+  held one of those
+- threshold: the signal is above `above` and/or below `below`. With
+  bias_window_s, the signal minus its rolling median over that many seconds
+  (centred) is compared instead: a constant offset such as gravity on a
+  tilted IMU axis does not count as acceleration
+- Threshold and context signals are readings: the raw codes the DBC lists as
+  choices of the signal (e.g. DI_vehicleSpeed 4095 "SNA"), which the decoder
+  emits unscaled, are masked to NaN first. Edge detectors match those codes
+- An event runs from its first matching sample to the first sample that no
+  longer matches (the last sample if the drive ends first); events shorter
+  than min_duration_s or longer than max_duration_s are dropped
+- Each event carries the value of every context signal at its start (as-of,
+  within CONTEXT_TOLERANCE_S), so queries can filter on speed etc. without
+  reading signal data
+"""
+
+import json
+from dataclasses import dataclass, replace
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.utils.paths import EVENT_DETECTORS_PATH, ENUM_MAPS_PATH, DBC_DIR
+from src.decode.dbc_registry import load_compiled
+from src.process.align import asof_hold
+from src.store.signal_query import resolve_signals
+
+KINDS = {"edge", "threshold"}
+CONTEXT_TOLERANCE_S = 1.0   # a context sample older than this at the event start counts as missing
+
+NS = 1_000_000_000
+
+
+# ─── Config ─────────────────────────────────────────────────────
+@dataclass(frozen=True)
+class Detector:
+    name: str
+    kind: str
+    bus: str
+    signal: str
+    to: tuple[float, ...] = ()
+    after: tuple[float, ...] = ()     # "from" in the config
+    above: float | None = None
+    below: float | None = None
+    min_duration_s: float = 0.0
+    max_duration_s: float | None = None
+    bias_window_s: float | None = None
+    masked: tuple[float, ...] = ()    # choice codes of a threshold signal
+
+    def readings(self, time_ns: np.ndarray, values: np.ndarray) -> np.ndarray:
+        """What the detector compares: choice codes masked, minus the rolling median when bias_window_s is set."""
+        if self.kind == "edge":
+            return values
+        values = mask_codes(values, self.masked)
+        if self.bias_window_s is None:
+            return values
+        series = pd.Series(values, index=pd.to_datetime(time_ns))
+        bias = series.rolling(pd.Timedelta(seconds=self.bias_window_s), center=True).median()
+        return values - bias.to_numpy()
+
+    def matches(self, values: np.ndarray) -> np.ndarray:
+        if self.kind == "edge":
+            return np.isin(values, self.to)
+        out = np.ones(len(values), dtype=bool)
+        if self.above is not None:
+            out &= values > self.above
+        if self.below is not None:
+            out &= values < self.below
+        return out
+
+
+@dataclass(frozen=True)
+class EventConfig:
+    detectors: tuple[Detector, ...]
+    context: dict[str, tuple[str, str]]   # column → (bus, signal)
+    masked: dict[tuple[str, str], tuple[float, ...]]   # (bus, signal) → choice codes of the context signals
+
+    @property
+    def buses(self) -> set[str]:
+        return {d.bus for d in self.detectors} | {bus for bus, _ in self.context.values()}
+
+    def signals(self, bus: str) -> list[str]:
+        """Signals of one bus that the detectors and context read."""
+        names = {d.signal for d in self.detectors if d.bus == bus}
+        names |= {signal for b, signal in self.context.values() if b == bus}
+        return sorted(names)
+
+
+def _codes(values: list, signal: str, labels: dict[str, str], where: str) -> tuple[float, ...]:
+    """Enum labels / raw codes → float codes."""
+    by_label = {label: float(code) for code, label in labels.items()}
+    out = []
+    for value in values:
+        if isinstance(value, str):
+            if value not in by_label:
+                raise ValueError(f"{where}: {signal} has no value {value!r} (see {ENUM_MAPS_PATH.name})")
+            out.append(by_label[value])
+        else:
+            out.append(float(value))
+    return tuple(out)
+
+
+def choice_codes(bus: str, signal: str) -> tuple[float, ...]:
+    """Raw codes that the DBC of `bus` lists as choices of `signal` (SNA, …), including those enum_maps.json drops."""
+    dbc = load_compiled(DBC_DIR / f"{bus}.dbc")
+    return tuple(sorted({float(code) for sig in dbc.signals if sig.name == signal for code in sig.choices or {}}))
+
+
+def load_event_config(path: Path = EVENT_DETECTORS_PATH, enum_maps_path: Path = ENUM_MAPS_PATH) -> EventConfig:
+    """Parses and validates the detector config; raises ValueError on mistakes."""
+    with open(path) as f:
+        raw = json.load(f)
+    enum_maps = {}
+    if Path(enum_maps_path).exists():
+        with open(enum_maps_path) as f:
+            enum_maps = json.load(f)
+
+    detectors = []
+    for name, spec in raw.get("detectors", {}).items():
+        where = f"{Path(path).name}: {name}"
+        kind = spec.get("kind")
+        if kind not in KINDS:
+            raise ValueError(f"{where}: kind must be one of {', '.join(sorted(KINDS))}")
+        if "bus" not in spec or "signal" not in spec:
+            raise ValueError(f"{where}: needs a bus and a signal")
+        labels = enum_maps.get(spec["signal"], {})
+        detector = Detector(
+            name=name, kind=kind, bus=spec["bus"], signal=spec["signal"],
+            to=_codes(spec.get("to", []), spec["signal"], labels, where),
+            after=_codes(spec.get("from", []), spec["signal"], labels, where),
+            above=spec.get("above"), below=spec.get("below"),
+            min_duration_s=float(spec.get("min_duration_s", 0.0)),
+            max_duration_s=spec.get("max_duration_s"),
+            bias_window_s=spec.get("bias_window_s"),
+        )
+        if kind == "edge" and not detector.to:
+            raise ValueError(f"{where}: an edge detector needs `to` values")
+        if kind == "threshold" and detector.above is None and detector.below is None:
+            raise ValueError(f"{where}: a threshold detector needs `above` and/or `below`")
+        if kind == "threshold" and detector.after:
+            raise ValueError(f"{where}: `from` only applies to edge detectors")
+        if kind == "edge" and detector.bias_window_s is not None:
+            raise ValueError(f"{where}: `bias_window_s` only applies to threshold detectors")
+        if detector.bias_window_s is not None and detector.bias_window_s <= 0:
+            raise ValueError(f"{where}: `bias_window_s` must be positive")
+        if detector.max_duration_s is not None and detector.max_duration_s < detector.min_duration_s:
+            raise ValueError(f"{where}: `max_duration_s` is below `min_duration_s`")
+        detectors.append(detector)
+
+    context = {column: (spec["bus"], spec["signal"]) for column, spec in raw.get("context", {}).items()}
+
+    # Every (bus, signal) must exist in the DBCs
+    for bus in sorted({d.bus for d in detectors} | {bus for bus, _ in context.values()}):
+        wanted = [d.signal for d in detectors if d.bus == bus] + [s for b, s in context.values() if b == bus]
+        resolve_signals(sorted(set(wanted)), [bus])
+
+    detectors = [replace(d, masked=choice_codes(d.bus, d.signal)) if d.kind == "threshold" else d
+                 for d in detectors]
+    masked = {key: choice_codes(*key) for key in set(context.values())}
+    return EventConfig(tuple(detectors), context, masked)
+
+
+# ─── Detection ──────────────────────────────────────────────────
+def mask_codes(values: np.ndarray, codes: tuple[float, ...]) -> np.ndarray:
+    """`values` with the choice codes replaced by NaN."""
+    if not codes:
+        return values
+    return np.where(np.isin(values, codes), np.nan, values)
+
+
+def runs(active: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """(first, stop) sample indices of every run of True; stop is one past the run."""
+    edges = np.diff(np.r_[0, active.astype(np.int8), 0])
+    return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+
+def detect(detector: Detector, time_ns: np.ndarray, values: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(start ns, end ns, value at start) of the detector's events in one time-sorted series."""
+    if not len(time_ns):
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, np.empty(0)
+    values = detector.readings(time_ns, values)
+    first, stop = runs(detector.matches(values))
+    if detector.after:
+        keep = first > 0
+        keep[keep] = np.isin(values[first[keep] - 1], detector.after)
+        first, stop = first[keep], stop[keep]
+
+    start = time_ns[first]
+    end = time_ns[np.minimum(stop, len(time_ns) - 1)]
+    keep = end - start >= int(detector.min_duration_s * NS)
+    if detector.max_duration_s is not None:
+        keep &= end - start <= int(detector.max_duration_s * NS)
+    return start[keep], end[keep], values[first[keep]]
+
+
+def context_at(start_ns: np.ndarray, series: tuple[np.ndarray, np.ndarray] | None,
+               masked: tuple[float, ...] = ()) -> np.ndarray:
+    """Held value of one context signal at each event start (NaN when missing, stale or a choice code)."""
+    if series is None:
+        return np.full(len(start_ns), np.nan)
+    time_ns, values = series
+    return asof_hold(start_ns, time_ns, mask_codes(values, masked), int(CONTEXT_TOLERANCE_S * NS))
@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""
+src/process/resample.py
+
+Multi-rate downsampling engine with per-signal aggregation policies.
+
+- Bin boundaries are computed once per rate from the sorted time array and
+  reused for every column (np.*.reduceat over segment starts)
+- Every requested rate (e.g. 50 Hz, 10 Hz, 1 Hz) comes out of one call
+- downsample_multi() takes a wide frame; resample_series() takes one
+  (time, values) series at a time on its own bins, keeps only the non-empty
+  bins and lays the grid out a slice at a time (Resampled), so memory
+  follows the samples of one signal rather than the whole file
+- The aggregation of each signal is derived from dbc_signals_metadata.csv:
+    enum                        → last   (codes must never be averaged)
+    *Counter                    → delta  (wrap-aware increments per bin)
+    *Checksum / *CRC            → last
+    small unit-less int (flags) → last
+    everything else (physical)  → mean
+  POLICY_OVERRIDES can pin any signal to last/first/mode/mean/min/max/delta
+"""
+
+import re
+import logging
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from src.utils.paths import DBC_METADATA_PATH
+
+POLICIES = {"last", "first", "mode", "mean", "min", "max", "delta"}
+
+# signal_name → policy, wins over the metadata-derived default
+POLICY_OVERRIDES: dict[str, str] = {}
+
+COUNTER_RE = re.compile(r"(counter|_cnt)$", re.IGNORECASE)
+CHECKSUM_RE = re.compile(r"(checksum|crc)$", re.IGNORECASE)
+MAX_FLAG_BITS = 8
+GRID_ROWS = 65_536   # output grid rows laid out per table by Resampled.tables()
+
+# ─── Policies ───────────────────────────────────────────────────
+
+def load_policies(bus: str, metadata_path: Path = DBC_METADATA_PATH) -> dict[str, tuple[str, int | None]]:
+    """
+    Returns {signal_name: (policy, counter_modulus)} for the signals of one bus
+    (DBC stem) from the DBC metadata registry. A name defined by several DBCs
+    can be an enum on one and physical on another (DAS_steeringAngleRequest),
+    or differ in scaling / bit length, so each bus uses its own rows; within
+    one DBC the first occurrence of a signal name wins.
+    """
+    meta = pd.read_csv(metadata_path)
+    meta = meta[meta["dbc_source"] == f"{bus}.dbc"].drop_duplicates("signal_name", keep="first")
+
+    policies = {}
+    for row in meta.itertuples(index=False):
+        name = row.signal_name
+        unit = row.unit if isinstance(row.unit, str) else ""
+        bits = int(row.bit_length)
+
+        if name in POLICY_OVERRIDES:
+            policy = POLICY_OVERRIDES[name]
+        elif row.data_type == "enum":
+            policy = "last"
+        elif COUNTER_RE.search(name):
+            policy = "delta"
+        elif CHECKSUM_RE.search(name):
+            policy = "last"
+        elif (row.data_type == "int" and not unit and bits <= MAX_FLAG_BITS
+              and row.scaling == 1 and row.offset == 0):
+            policy = "last"
+        else:
+            policy = "mean"
+
+        policies[name] = (policy, 1 << bits if policy == "delta" else None)
+    return policies
+
+
+# ─── Bins ───────────────────────────────────────────────────────
+
+class Bins:
+    """
+    Segment boundaries of a sorted int64 ns time array for one period.
+    `starts` index the first sample of every non-empty bin; `slots` place each
+    non-empty bin on the continuous output grid [first_bin, last_bin].
+    """
+
+    def __init__(self, time_ns: np.ndarray, period_ns: int):
+        bins = time_ns // period_ns
+        self.origin = int(bins[0])
+        self.n = len(time_ns)
+        self.index = np.arange(self.n)
+        self.starts = np.flatnonzero(np.r_[True, bins[1:] != bins[:-1]])
+        self.slots = bins[self.starts] - bins[0]
+        self.grid_size = int(bins[-1] - bins[0] + 1)
+        self.grid_time_ns = (bins[0] + np.arange(self.grid_size, dtype=np.int64)) * period_ns
+
+    @property
+    def segment_of(self) -> np.ndarray:
+        """Bin number of every sample."""
+        return np.repeat(np.arange(len(self.starts)), np.diff(np.r_[self.starts, self.n]))
+
+
+# ─── Aggregations ───────────────────────────────────────────────
+
+def _count(valid: np.ndarray, b: Bins) -> np.ndarray:
+    return np.add.reduceat(valid.astype(np.int64), b.starts)
+
+
+def _edge_index(valid: np.ndarray, b: Bins, last: bool) -> np.ndarray:
+    """Index of the last (or first) valid sample per bin, -1 if none."""
+    idx = b.index
+    if last:
+        pos = np.maximum.reduceat(np.where(valid, idx, -1), b.starts)
+        return np.where(pos >= b.starts, pos, -1)
+    pos = np.minimum.reduceat(np.where(valid, idx, b.n), b.starts)
+    ends = np.r_[b.starts[1:], b.n]
+    return np.where(pos < ends, pos, -1)
+
+
+def _mode(values: np.ndarray, valid: np.ndarray, b: Bins) -> np.ndarray:
+    """Most frequent value per bin (smallest value on ties)."""
+    out = np.full(len(b.starts), np.nan)
+    seg = b.segment_of[valid]
+    vals = values[valid]
+    if not len(vals):
+        return out
+    order = np.lexsort((vals, seg))
+    seg, vals = seg[order], vals[order]
+    run_start = np.flatnonzero(np.r_[True, (seg[1:] != seg[:-1]) | (vals[1:] != vals[:-1])])
+    run_len = np.diff(np.r_[run_start, len(vals)])
+    run_seg = seg[run_start]
+    # Longest run per segment: sort runs by (segment, -length, value)
+    best = np.lexsort((vals[run_start], -run_len, run_seg))
+    first_of_seg = best[np.r_[True, run_seg[best][1:] != run_seg[best][:-1]]]
+    out[run_seg[first_of_seg]] = vals[run_start][first_of_seg]
+    return out
+
+
+def _delta(values: np.ndarray, valid: np.ndarray, b: Bins, modulus: int) -> np.ndarray:
+    """Counter increments per bin, unwrapped modulo 2**bit_length."""
+    steps = np.zeros(b.n)
+    pos = np.flatnonzero(valid)
+    if len(pos) > 1:
+        steps[pos[1:]] = np.mod(np.diff(values[pos]), modulus)
+    return np.add.reduceat(steps, b.starts)
+
+
+def aggregate(values: np.ndarray, b: Bins, policy: str, modulus: int | None = None) -> np.ndarray:
+    """
+    Aggregates one column over precomputed bins.
+    Returns one value per non-empty bin (NaN / None where the bin had no data).
+    """
+    if values.dtype.kind not in "fiub":
+        valid = pd.notna(values)
+        idx = _edge_index(valid, b, last=policy != "first")
+        out = np.full(len(idx), None, dtype=object)
+        out[idx >= 0] = values[idx[idx >= 0]]
+        return out
+
+    values = values.astype(np.float64, copy=False)
+    valid = ~np.isnan(values)
+    counts = _count(valid, b)
+
+    if policy == "mean":
+        sums = np.add.reduceat(np.where(valid, values, 0.0), b.starts)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(counts > 0, sums / counts, np.nan)
+    if policy == "min":
+        return np.fmin.reduceat(values, b.starts)
+    if policy == "max":
+        return np.fmax.reduceat(values, b.starts)
+    if policy in ("last", "first"):
+        idx = _edge_index(valid, b, last=policy == "last")
+        return np.where(idx >= 0, values[np.maximum(idx, 0)], np.nan)
+    if policy == "mode":
+        return _mode(values, valid, b)
+    if policy == "delta":
+        if modulus is None:
+            raise ValueError("delta policy needs a counter modulus")
+        return np.where(counts > 0, _delta(values, valid, b, modulus), np.nan)
+    raise ValueError(f"Unknown aggregation policy: {policy}")
+
+
+# ─── Engine ─────────────────────────────────────────────────────
+
+def _policy(col: str, values: np.ndarray, policies: dict[str, tuple[str, int | None]]) -> tuple[str, int | None]:
+    if col == "arbitration_id":
+        return "first", None
+    if col in policies:
+        return policies[col]
+    return ("mean" if values.dtype.kind in "fiub" else "first"), None
+
+
+def downsample_multi(df: pd.DataFrame, rates_hz: list[float],
+                     policies: dict[str, tuple[str, int | None]] | None = None) -> dict[float, pd.DataFrame]:
+    """
+    Downsamples one decoded frame to every rate in one pass.
+    Returns {rate_hz: DataFrame[time, ...sorted signals]} on a continuous grid.
+    `policies` are those of the frame's bus (load_policies(bus)); signals
+    missing from them fall back to mean (numeric) / first (other).
+    """
+    if "time" not in df.columns:
+        raise ValueError("Missing required 'time' column.")
+    if policies is None:
+        policies = {}
+
+    time = pd.to_datetime(df["time"], utc=True, errors="coerce")
+    keep = time.notna().to_numpy()
+    time_ns = time[keep].astype("int64").to_numpy()
+    order = None if np.all(time_ns[1:] >= time_ns[:-1]) else np.argsort(time_ns, kind="stable")
+    if order is not None:
+        time_ns = time_ns[order]
+
+    columns = {}
+    for col in sorted(c for c in df.columns if c != "time"):
+        values = df[col].to_numpy()[keep]
+        if values.dtype.kind in "iub":
+            values = values.astype(np.float64)  # once, not once per rate
+        columns[col] = values if order is None else values[order]
+
+    if not len(time_ns):
+        return {hz: pd.DataFrame(columns=["time", *columns]) for hz in rates_hz}
+
+    results = {}
+    for hz in rates_hz:
+        bins = Bins(time_ns, int(round(1e9 / hz)))
+        out = {"time": pd.to_datetime(bins.grid_time_ns, utc=True)}
+
+        for col, values in columns.items():
+            per_bin = aggregate(values, bins, *_policy(col, values, policies))
+            grid = np.full(bins.grid_size, None if per_bin.dtype == object else np.nan,
+                           dtype=per_bin.dtype)
+            grid[bins.slots] = per_bin
+            out[col] = grid
+
+        results[hz] = pd.DataFrame(out)
+        logging.debug(f"resampled {len(time_ns)} rows → {bins.grid_size} @ {hz} Hz")
+
+    return results
+
+
+class Resampled:
+    """
+    One rate's output, kept per signal as (bin numbers, value per non-empty
+    bin) with bin = time_ns // period_ns. A sparse signal costs its own bins,
+    not the whole grid; tables() lays the continuous grid out in slices.
+    """
+
+    def __init__(self, hz: float):
+        self.hz = hz
+        self.period_ns = int(round(1e9 / hz))
+        self.series: dict[str, tuple[np.ndarray, np.ndarray]] = {}
+
+    def add(self, name: str, bins: np.ndarray, values: np.ndarray) -> None:
+        self.series[name] = (bins, values)
+
+    @property
+    def extent(self) -> tuple[int, int] | None:
+        """(first, last) bin over all signals; None when no signal has data."""
+        spans = [(bins[0], bins[-1]) for bins, _ in self.series.values() if len(bins)]
+        if not spans:
+            return None
+        return int(min(s for s, _ in spans)), int(max(e for _, e in spans))
+
+    @property
+    def grid_size(self) -> int:
+        extent = self.extent
+        return 0 if extent is None else extent[1] - extent[0] + 1
+
+    def tables(self, rows: int = GRID_ROWS):
+        """Yields [time, ...sorted signals] tables of at most `rows` grid rows, nulls where a bin is empty."""
+        names = sorted(self.series)
+        time_type = pa.timestamp("ns", tz="UTC")
+        extent = self.extent
+        if extent is None:
+            yield pa.table({"time": pa.array([], time_type), **{name: pa.array([], pa.float64()) for name in names}})
+            return
+        for lo in range(extent[0], extent[1] + 1, rows):
+            hi = min(lo + rows, extent[1] + 1)
+            columns = {"time": pa.array(np.arange(lo, hi, dtype=np.int64) * self.period_ns, time_type)}
+            for name in names:
+                bins, values = self.series[name]
+                a, b = np.searchsorted(bins, [lo, hi])
+                grid = np.full(hi - lo, np.nan)
+                grid[bins[a:b] - lo] = values[a:b]
+                columns[name] = pa.array(grid, from_pandas=True)
+            yield pa.table(columns)
+
+
+def resample_series(results: dict[float, Resampled], name: str, time_ns: np.ndarray, values: np.ndarray,
+                    policies: dict[str, tuple[str, int | None]]) -> None:
+    """
+    Bins one series, as long_store.iter_signals() yields it (sorted, NaNs
+    dropped), at every rate of `results` ({rate_hz: Resampled}); policies as
+    for downsample_multi(). The caller can drop the series afterwards.
+    """
+    policy, modulus = _policy(name, values, policies)
+    for res in results.values():
+        if not len(time_ns):
+            res.add(name, np.empty(0, dtype=np.int64), np.empty(0))
+            continue
+        bins = Bins(time_ns, res.period_ns)
+        res.add(name, bins.origin + bins.slots, aggregate(values, bins, policy, modulus))
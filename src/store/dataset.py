@@ -0,0 +1,255 @@
+# src/store/dataset.py
+
+"""
+Hive-partitioned Parquet dataset for cleaned time series.
+
+The clean stage writes every (drive, bus) output into data/processed/ as
+
+    bus=can1-vehicle/drive=00000010/date=2024-05-02/part-0.parquet
+
+- Rows are sorted by time inside each file
+- Row groups hold ROW_GROUP_ROWS rows with min/max statistics, so a time-range
+  filter skips whole row groups
+- A drive crossing midnight (UTC) lands in one partition per date
+- Columns keep the compact types of the stages before (bool / int8 … /
+  float32, dictionary<string> for labelled enums, see src/store/signal_types.py)
+
+Flat per-file outputs of the clean stage from before this layout
+(<drive>_<bus>_downsampled_filtered.parquet) are ignored with a warning;
+`python -m src.store.dataset --migrate` moves them into their partitions.
+
+The merged per-bus files (data/merged/<dbc>.parquet) stay flat: they hold
+the same rows as bus=<dbc>/ here, merged over drives by time, and partition
+pruning on bus / drive / date is served by this dataset.
+
+read_dataset() prunes partitions on bus / drive / date, pushes the time range
+down to row-group statistics and reads only the requested columns:
+
+    from src.store.dataset import read_dataset
+    df = read_dataset(columns=signals, buses=["can1-vehicle"], drives=["00000010"],
+                      start="2024-05-02 14:00", end="2024-05-02 15:00")
+"""
+
+import os
+import sys
+import argparse
+import logging
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+# ─── Force src/ to be discoverable ─────────────────────────────
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from src.utils.paths import PROCESSED_DIR, DBC_DIR
+from src.store.signal_types import narrow, to_pandas
+
+PARTITIONS = ("bus", "drive", "date")
+PARTITION_SCHEMA = pa.schema([(name, pa.string()) for name in PARTITIONS])
+PART_NAME = "part-0.parquet"
+ROW_GROUP_ROWS = 3_600  # one hour of 1 Hz rows per row group
+LEGACY_GLOB = "*_filtered.parquet"  # flat clean-stage outputs from before the partitioned layout
+
+_warned_legacy: set[Path] = set()
+
+
+# ─── Layout ─────────────────────────────────────────────────────
+def split_stage_name(file_name: str) -> tuple[str, str]:
+    """
+    '00000010_can1_vehicle_downsampled.parquet' → ('00000010', 'can1-vehicle')
+    The bus is matched against the DBC file names in config/dbc/.
+    """
+    drive, rest = file_name.split("_", 1)
+    for dbc_path in sorted(DBC_DIR.glob("*.dbc"), key=lambda p: len(p.stem), reverse=True):
+        if rest.startswith(dbc_path.stem.replace("-", "_")):
+            return drive, dbc_path.stem
+    raise ValueError(f"No DBC in {DBC_DIR} matches {file_name}")
+
+
+def drive_dir(bus: str, drive: str, root: Path = PROCESSED_DIR) -> Path:
+    return root / f"bus={bus}" / f"drive={drive}"
+
+
+def partition_file(bus: str, drive: str, date: str, root: Path = PROCESSED_DIR) -> Path:
+    return drive_dir(bus, drive, root) / f"date={date}" / PART_NAME
+
+
+def partition_files(buses: list[str] | None = None, drives: list[str] | None = None,
+                    root: Path = PROCESSED_DIR) -> list[Path]:
+    """All partition files, optionally narrowed by bus and drive, in path order."""
+    _warn_legacy(root)
+    bus_glob = [f"bus={b}" for b in buses] if buses else ["bus=*"]
+    drive_glob = [f"drive={d}" for d in drives] if drives else ["drive=*"]
+    files = set()
+    for b in bus_glob:
+        for d in drive_glob:
+            files.update(root.glob(f"{b}/{d}/date=*/{PART_NAME}"))
+    return sorted(files)
+
+
+def legacy_files(root: Path = PROCESSED_DIR) -> list[Path]:
+    return sorted(Path(root).glob(LEGACY_GLOB))
+
+
+def _warn_legacy(root: Path) -> None:
+    """Once per process and root: flat files the dataset readers do not see."""
+    if root in _warned_legacy:
+        return
+    _warned_legacy.add(root)
+    legacy = legacy_files(root)
+    if legacy:
+        logging.warning(f"⚠️ Ignoring {len(legacy)} flat files in {root} from before the partitioned "
+                        f"layout; move them into partitions with `python -m src.store.dataset --migrate`")
+
+
+# ─── Writing ────────────────────────────────────────────────────
+def write_partitions(df: pd.DataFrame, bus: str, drive: str, root: Path = PROCESSED_DIR,
+                     types: dict[str, pa.DataType] | None = None) -> list[Path]:
+    """
+    Writes one cleaned (drive, bus) frame into its date partitions, replacing
+    whatever that drive had before; columns named in `types` are cast to
+    their type. Returns the written files.
+    """
+    df = df.sort_values("time", kind="stable", ignore_index=True)
+    dates = pd.to_datetime(df["time"], utc=True).dt.strftime("%Y-%m-%d")
+
+    # Convert every partition first: a type error must not leave half a drive behind
+    tables = {date: narrow(pa.Table.from_pandas(part, preserve_index=False), types or {})
+              for date, part in df.groupby(dates, sort=True)}
+
+    written = []
+    for date, table in tables.items():
+        out_path = partition_file(bus, drive, date, root)
+        out_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = out_path.with_name(f".{out_path.name}.{os.getpid()}.tmp")
+        pq.write_table(table, tmp, row_group_size=ROW_GROUP_ROWS, write_statistics=True)
+        os.replace(tmp, out_path)
+        written.append(out_path)
+
+    # Dates the drive no longer covers
+    for old in drive_dir(bus, drive, root).glob(f"date=*/{PART_NAME}"):
+        if old not in written:
+            old.unlink()
+            old.parent.rmdir()
+    return written
+
+
+# ─── Reading ────────────────────────────────────────────────────
+def _utc(ts) -> pd.Timestamp:
+    ts = pd.Timestamp(ts)
+    return ts.tz_localize("UTC") if ts.tzinfo is None else ts.tz_convert("UTC")
+
+
+def unify_schemas(schemas: list[pa.Schema]) -> pa.Schema:
+    """
+    Permissive schema union; a column whose types cannot be promoted
+    (e.g. enum labels on one bus, raw codes on another) is read as string.
+    """
+    try:
+        return pa.unify_schemas(schemas, promote_options="permissive")
+    except (pa.ArrowTypeError, pa.ArrowInvalid):
+        pass
+    fields: dict[str, pa.DataType] = {}
+    for schema in schemas:
+        for field in schema:
+            seen = fields.setdefault(field.name, field.type)
+            if seen != field.type:
+                try:
+                    fields[field.name] = pa.unify_schemas(
+                        [pa.schema([(field.name, seen)]), pa.schema([field])], promote_options="permissive"
+                    ).field(field.name).type
+                except (pa.ArrowTypeError, pa.ArrowInvalid):
+                    fields[field.name] = pa.string()
+    return pa.schema(list(fields.items()))
+
+
+def _in_dates(file: Path, start: pd.Timestamp | None, end: pd.Timestamp | None) -> bool:
+    date = file.parent.name.split("=", 1)[1]
+    if start is not None and date < start.strftime("%Y-%m-%d"):
+        return False
+    if end is not None and date > end.strftime("%Y-%m-%d"):
+        return False
+    return True
+
+
+def read_dataset(columns: list[str] | None = None, buses: list[str] | None = None,
+                 drives: list[str] | None = None, start=None, end=None,
+                 root: Path = PROCESSED_DIR) -> pd.DataFrame:
+    """
+    Reads [time, bus, drive, ...columns] for time in [start, end).
+    Partitions outside bus / drive / date are never opened; inside the
+    remaining files, row groups outside the time range are skipped.
+    Columns missing from a partition (dropped by the clean stage) come back null.
+    """
+    start = None if start is None else _utc(start)
+    end = None if end is None else _utc(end)
+    files = [f for f in partition_files(buses, drives, root) if _in_dates(f, start, end)]
+    if not files:
+        return pd.DataFrame(columns=["time", "bus", "drive", *(columns or [])])
+
+    # Only the footers of surviving files are read to unify their schemas
+    schema = unify_schemas([pq.read_schema(f) for f in files])
+    schema = pa.unify_schemas([schema, PARTITION_SCHEMA])
+    dataset = ds.dataset([str(f) for f in files], schema=schema, format="parquet",
+                         partitioning=ds.partitioning(PARTITION_SCHEMA, flavor="hive"),
+                         partition_base_dir=str(root))
+
+    condition = None
+    time_type = schema.field("time").type
+    if start is not None:
+        condition = ds.field("time") >= pa.scalar(start, time_type)
+    if end is not None:
+        bound = ds.field("time") < pa.scalar(end, time_type)
+        condition = bound if condition is None else condition & bound
+
+    wanted = [c for c in (columns or schema.names) if c not in ("time", *PARTITIONS)]
+    missing = [c for c in wanted if c not in schema.names]
+    table = dataset.to_table(columns=["time", "bus", "drive", *[c for c in wanted if c not in missing]],
+                             filter=condition)
+
+    df = to_pandas(table)
+    for col in missing:
+        df[col] = pd.NA
+    return df.sort_values(["time", "bus", "drive"], kind="stable", ignore_index=True)
+
+
+# ─── Migration ──────────────────────────────────────────────────
+def migrate_legacy(root: Path = PROCESSED_DIR) -> list[Path]:
+    """
+    Rewrites every flat clean-stage output of `root` into its (bus, drive)
+    partitions, then deletes it. Columns keep the types they had. Returns
+    the partition files written.
+    """
+    written = []
+    for legacy in legacy_files(root):
+        drive, bus = split_stage_name(legacy.name)
+        written += write_partitions(pq.read_table(legacy).to_pandas(), bus, drive, root)
+        legacy.unlink()
+        logging.info(f"✅ {legacy.name} → bus={bus}/drive={drive}/")
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Partitioned dataset of cleaned time series")
+    parser.add_argument("--migrate", action="store_true",
+                        help="move flat *_filtered.parquet outputs into their partitions")
+    args = parser.parse_args()
+
+    if args.migrate:
+        written = migrate_legacy()
+        logging.info(f"✅ Migrated into {len(written)} partition files")
+    for file in partition_files():
+        print(file.relative_to(PROCESSED_DIR))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s — %(levelname)s — %(message)s",
+        handlers=[logging.StreamHandler()])
+    main()
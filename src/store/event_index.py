@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+src/store/event_index.py
+
+Fleet-wide index of the FSD events found by the events stage
+(src/process/06_index_events.py), one row per event:
+
+    data/catalog/event_index.parquet
+        event       string                  detector name, e.g. acc_disengaged
+        drive       string
+        start, end  timestamp[ns, UTC]
+        duration_s  float64
+        value       float64                 detected signal at the start
+        ...         float64                 context signals at the start (speed_kph, ...)
+
+Rows are sorted by (event, start), so a time-range lookup is a binary search
+inside each event's slice. The file is small (a handful of columns per
+event, not per sample) and is loaded once per process, then re-read only
+when it changes:
+
+    from src.store.event_index import query_events
+    df = query_events(["acc_disengaged"], where=[("speed_kph", ">", 60)])
+
+CLI:
+    python main.py events acc_disengaged --where "speed_kph>60"
+"""
+
+import os
+import re
+import sys
+import time
+import argparse
+import logging
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# ─── Force src/ to be discoverable ─────────────────────────────
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from src.utils.paths import EVENT_INDEX_PATH
+from src.process.events import load_event_config
+
+BASE_SCHEMA = pa.schema([
+    ("event", pa.string()),
+    ("drive", pa.string()),
+    ("start", pa.timestamp("ns", tz="UTC")),
+    ("end", pa.timestamp("ns", tz="UTC")),
+    ("duration_s", pa.float64()),
+    ("value", pa.float64()),
+])
+
+OPS = {">": np.greater, ">=": np.greater_equal, "<": np.less, "<=": np.less_equal,
+       "==": np.equal, "!=": np.not_equal}
+CONDITION = re.compile(r"^\s*(\w+)\s*(>=|<=|==|!=|>|<)\s*(\S+)\s*$")
+
+
+def event_schema(context_columns: list[str]) -> pa.Schema:
+    return pa.schema([*BASE_SCHEMA, *[(name, pa.float64()) for name in context_columns]])
+
+
+def _utc_ns(ts) -> int:
+    ts = pd.Timestamp(ts)
+    return (ts.tz_localize("UTC") if ts.tzinfo is None else ts.tz_convert("UTC")).value
+
+
+# ─── Index ──────────────────────────────────────────────────────
+class EventIndex:
+    """The event index held as numpy columns, with per-event slices for range lookups."""
+
+    def __init__(self, table: pa.Table):
+        self.table = table
+        self.start = table.column("start").cast(pa.int64()).to_numpy()
+        self.end = table.column("end").cast(pa.int64()).to_numpy()
+        self.drive = table.column("drive").to_numpy(zero_copy_only=False).astype(str)
+        self.columns = {name: table.column(name).to_numpy() for name in table.column_names
+                        if pa.types.is_floating(table.schema.field(name).type)}
+
+        events = table.column("event").to_numpy(zero_copy_only=False).astype(str)
+        names, first = np.unique(events, return_index=True)
+        order = np.argsort(first)
+        bounds = np.r_[first[order], len(events)]
+        self.slices = {names[i]: (bounds[k], bounds[k + 1]) for k, i in enumerate(order)}
+        # longest event per type: how far back a range lookup has to start to catch overlaps
+        self.longest = {name: int((self.end[lo:hi] - self.start[lo:hi]).max()) for name, (lo, hi) in self.slices.items()}
+
+    def __len__(self) -> int:
+        return self.table.num_rows
+
+    @property
+    def events(self) -> list[str]:
+        return sorted(self.slices)
+
+    def counts(self) -> dict[str, int]:
+        return {name: int(hi - lo) for name, (lo, hi) in sorted(self.slices.items())}
+
+    def query(self, events: list[str] | None = None, start=None, end=None, drives: list[str] | None = None,
+              min_duration_s: float | None = None, where: list[tuple[str, str, float]] | None = None,
+              known: list[str] | None = None) -> pd.DataFrame:
+        """
+        Events of the given types (default: all) overlapping [start, end),
+        sorted by start. `where` holds (column, op, value) conditions on the
+        numeric columns, e.g. ("speed_kph", ">", 60); NaN never matches.
+        `known` are the event types that may be asked for (default: the
+        indexed ones); a known type without indexed events matches nothing.
+        """
+        names = self.events if events is None else list(events)
+        known = sorted(set(self.slices) | set(known or []))
+        unknown = sorted(set(names) - set(known))
+        if unknown:
+            raise ValueError(f"Unknown events: {', '.join(unknown)} (configured: {', '.join(known) or 'none'})")
+        for column, op, _ in where or []:
+            if column not in self.columns:
+                raise ValueError(f"Unknown column {column!r} (numeric columns: {', '.join(self.columns)})")
+            if op not in OPS:
+                raise ValueError(f"Unknown operator {op!r} (use {' '.join(OPS)})")
+        start_ns = None if start is None else _utc_ns(start)
+        end_ns = None if end is None else _utc_ns(end)
+
+        rows = []
+        for name in names:
+            if name not in self.slices:
+                continue
+            lo, hi = self.slices[name]
+            starts = self.start[lo:hi]
+            a = lo if start_ns is None else lo + np.searchsorted(starts, start_ns - self.longest[name], "left")
+            b = hi if end_ns is None else lo + np.searchsorted(starts, end_ns, "left")
+            rows.append(np.arange(a, b))
+        idx = np.concatenate(rows) if rows else np.empty(0, dtype=np.int64)
+
+        keep = np.ones(len(idx), dtype=bool)
+        if start_ns is not None:
+            keep &= (self.end[idx] > start_ns) | (self.start[idx] >= start_ns)
+        if drives is not None:
+            keep &= np.isin(self.drive[idx], list(drives))
+        if min_duration_s is not None:
+            keep &= self.columns["duration_s"][idx] >= min_duration_s
+        for column, op, value in where or []:
+            keep &= OPS[op](self.columns[column][idx], float(value))
+
+        idx = idx[keep]
+        idx = idx[np.argsort(self.start[idx], kind="stable")]
+        return self.table.take(pa.array(idx, type=pa.int64())).to_pandas()
+
+
+_LOADED: dict[tuple[str, int, int], EventIndex] = {}
+
+
+def load_index(path: Path = EVENT_INDEX_PATH) -> EventIndex:
+    """The index at `path`, cached until the file changes."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        raise ValueError(f"No event index at {path}; run the events stage first") from None
+    key = (str(path), stat.st_mtime_ns, stat.st_size)
+    if key not in _LOADED:
+        _LOADED.clear()
+        _LOADED[key] = EventIndex(pq.read_table(path))
+    return _LOADED[key]
+
+
+def configured_events() -> list[str]:
+    """Detector names of config/events/detectors.json."""
+    return [detector.name for detector in load_event_config().detectors]
+
+
+def query_events(events: list[str] | None = None, start=None, end=None, drives: list[str] | None = None,
+                 min_duration_s: float | None = None, where: list[tuple[str, str, float]] | None = None,
+                 path: Path = EVENT_INDEX_PATH) -> pd.DataFrame:
+    return load_index(path).query(events, start, end, drives, min_duration_s, where, configured_events())
+
+
+# ─── CLI ────────────────────────────────────────────────────────
+def parse_condition(text: str) -> tuple[str, str, float]:
+    """'speed_kph>60' → ("speed_kph", ">", 60.0)"""
+    match = CONDITION.match(text)
+    if match is None:
+        raise ValueError(f"Bad condition {text!r} (expected e.g. 'speed_kph>60')")
+    column, op, value = match.groups()
+    try:
+        return column, op, float(value)
+    except ValueError:
+        raise ValueError(f"Bad condition {text!r}: {value!r} is not a number") from None
+
+
+def add_events_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("events", nargs="*", help="event types (default: all)")
+    parser.add_argument("--drives", nargs="+", help="drive IDs (default: all)")
+    parser.add_argument("--start", help="range start, UTC (e.g. '2025-03-08 08:05')")
+    parser.add_argument("--end", help="range end (exclusive), UTC")
+    parser.add_argument("--min-duration", type=float, help="shortest event, in seconds")
+    parser.add_argument("--where", action="append", default=[],
+                        help="condition on a numeric column, e.g. 'speed_kph>60' (repeatable)")
+    parser.add_argument("--counts", action="store_true", help="only list the configured event types and counts")
+    parser.add_argument("--out", type=Path, help="write .csv or .parquet instead of printing")
+
+
+def run_events(args: argparse.Namespace) -> pd.DataFrame:
+    index = load_index()
+    configured = configured_events()
+    if args.counts:
+        counts = {name: 0 for name in configured} | index.counts()
+        df = pd.DataFrame(sorted(counts.items()), columns=["event", "count"])
+        print(df.to_string(index=False))
+        return df
+
+    where = [parse_condition(text) for text in args.where]
+    started = time.perf_counter()
+    df = index.query(args.events or None, args.start, args.end, args.drives, args.min_duration, where, configured)
+    logging.info(f"🔎 {len(df)} of {len(index)} events in {(time.perf_counter() - started) * 1e3:.1f} ms")
+
+    if args.out is None:
+        with pd.option_context("display.width", 200, "display.max_columns", 20):
+            print(df)
+    elif args.out.suffix == ".parquet":
+        df.to_parquet(args.out, index=False)
+    else:
+        df.to_csv(args.out, index=False)
+    if args.out is not None:
+        logging.info(f"✅ {len(df)} events → {args.out}")
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the FSD event index")
+    add_events_arguments(parser)
+    args = parser.parse_args()
+    try:
+        run_events(args)
+    except ValueError as e:
+        parser.error(str(e))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s — %(levelname)s — %(message)s",
+        handlers=[logging.StreamHandler()])
+    main()
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+src/store/ipc_cache.py
+
+Opt-in local cache of stage outputs as uncompressed Arrow IPC (Feather v2)
+files, opened memory-mapped:
+
+    from src.store.ipc_cache import read_table
+    table = read_table(MERGED_DIR / "can1-can.parquet", columns=["time", "DI_vehicleSpeed"])
+    df = table.to_pandas()
+
+- The first read of a Parquet output (file, or directory dataset such as the
+  long layout) streams it batch by batch into data/catalog/ipc_cache/;
+  later reads map that file with pa.memory_map: no decompression, no copy,
+  and the pages are shared by every kernel / process reading the same output
+- A directory is read on the schema unified over all of its files
+  (src/store/dataset.py), and dictionary columns are re-encoded against one
+  dictionary per column: an IPC file cannot replace a dictionary between
+  batches the way Parquet files and row groups do
+- Entries are keyed by the source path plus its size and mtime (newest file
+  for directories), so a rewritten output is converted again and its
+  previous entry dropped
+- The cache is capped at IPC_CACHE_BYTES; least recently opened entries
+  (mtime, touched on every read) are evicted first. Outputs larger than the
+  budget (uncompressed size from the Parquet footers, or a conversion that
+  overran it, remembered per source version) are read straight from
+  Parquet. An evicted entry stays valid for readers that still have it mapped
+- Nothing reads through the cache unless asked: callers use read_table(),
+  and FSD_IPC_CACHE=1 makes the analyze stage use it
+
+CLI:
+    python src/store/ipc_cache.py                  # list entries
+    python src/store/ipc_cache.py --warm           # convert every merged output
+    python src/store/ipc_cache.py --clear
+"""
+
+import os
+import sys
+import hashlib
+import argparse
+import logging
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+
+# ─── Force src/ to be discoverable ─────────────────────────────
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from src.utils.paths import IPC_CACHE_DIR, MERGED_DIR
+from src.utils.profiling import PROFILER
+from src.store.dataset import unify_schemas
+
+# ─── Config ─────────────────────────────────────────────────────
+IPC_CACHE_BYTES = 16 * 2**30
+BATCH_ROWS = 65_536             # rows per record batch while converting
+ENABLE_ENV = "FSD_IPC_CACHE"    # "1" lets the pipeline stages read through the cache
+SUFFIX = ".arrow"
+
+
+def cache_enabled() -> bool:
+    return os.environ.get(ENABLE_ENV, "").lower() in ("1", "true", "yes")
+
+
+def _fingerprint(source: Path) -> tuple:
+    """(path, size, mtime_ns) of a file; total size and newest mtime for a directory dataset."""
+    if not source.is_dir():
+        stat = source.stat()
+        return str(source), stat.st_size, stat.st_mtime_ns
+    stats = [p.stat() for p in source.rglob("*.parquet")]
+    return str(source), sum(s.st_size for s in stats), max((s.st_mtime_ns for s in stats), default=0)
+
+
+def _digest(value) -> str:
+    return hashlib.sha256(repr(value).encode()).hexdigest()[:16]
+
+
+def _parquet_files(source: Path) -> list[Path]:
+    source = Path(source)
+    return sorted(source.rglob("*.parquet")) if source.is_dir() else [source]
+
+
+def _parquet_bytes(source: Path) -> int:
+    """Uncompressed size of `source` from its footers: about the size of its IPC file."""
+    total = 0
+    for file in _parquet_files(source):
+        meta = pq.read_metadata(file)
+        total += sum(meta.row_group(rg).total_byte_size for rg in range(meta.num_row_groups))
+    return total
+
+
+# ─── Conversion ─────────────────────────────────────────────────
+def _dataset(source: Path) -> ds.Dataset:
+    """
+    `source` as one dataset, on the schema unified over all of its files
+    (the first file alone may hold labels where another holds numbers).
+    """
+    files = _parquet_files(source)
+    schema = unify_schemas([pq.read_schema(f) for f in files])
+    if not Path(source).is_dir():
+        return ds.dataset(str(source), schema=schema, format="parquet")
+    partitioning = ds.dataset(str(source), format="parquet", partitioning="hive").partitioning
+    schema = pa.unify_schemas([schema, partitioning.schema])
+    return ds.dataset(str(source), schema=schema, format="parquet", partitioning="hive")
+
+
+def _index_type(index_type: pa.DataType, size: int) -> pa.DataType:
+    """`index_type`, or the narrowest wider one that can address `size` values."""
+    for wider in (pa.int8(), pa.int16(), pa.int32(), pa.int64()):
+        if wider.bit_width >= index_type.bit_width and size <= np.iinfo(wider.to_pandas_dtype()).max:
+            return wider
+    return pa.int64()
+
+
+def _unified_dictionaries(dataset: ds.Dataset) -> dict[str, pa.Array]:
+    """
+    {dictionary column: union of its dictionaries over every batch}. An IPC
+    file holds a single dictionary per column, while each Parquet file and
+    row group brings its own.
+    """
+    names = [f.name for f in dataset.schema if pa.types.is_dictionary(f.type)]
+    if not names:
+        return {}
+    seen: dict[str, list[pa.Array]] = {name: [] for name in names}
+    for batch in dataset.to_batches(columns=names, batch_size=BATCH_ROWS):
+        for name in names:
+            seen[name].append(batch.column(name).dictionary)
+    return {name: pc.unique(pa.chunked_array(chunks, dataset.schema.field(name).type.value_type))
+            for name, chunks in seen.items()}
+
+
+def _with_dictionaries(schema: pa.Schema, dictionaries: dict[str, pa.Array]) -> pa.Schema:
+    """`schema`, its index types widened where a unified dictionary outgrows them."""
+    for name, dictionary in dictionaries.items():
+        i = schema.get_field_index(name)
+        field_type = schema.field(i).type
+        schema = schema.set(i, schema.field(i).with_type(
+            pa.dictionary(_index_type(field_type.index_type, len(dictionary)), field_type.value_type, field_type.ordered)))
+    return schema
+
+
+def _remap_batch(batch: pa.RecordBatch, schema: pa.Schema, dictionaries: dict[str, pa.Array]) -> pa.RecordBatch:
+    """Re-encodes the dictionary columns of `batch` against the unified dictionaries."""
+    if not dictionaries:
+        return batch
+    columns = []
+    for field, column in zip(schema, batch.columns):
+        dictionary = dictionaries.get(field.name)
+        if dictionary is not None:
+            indices = pc.index_in(column.dictionary, value_set=dictionary).take(column.indices)
+            column = pa.DictionaryArray.from_arrays(indices.cast(field.type.index_type), dictionary,
+                                                    ordered=field.type.ordered)
+        columns.append(column)
+    return pa.RecordBatch.from_arrays(columns, schema=schema)
+
+
+# ─── Cache ──────────────────────────────────────────────────────
+class IpcCache:
+    """Directory of <source digest>-<version digest>.arrow files, bounded by total bytes."""
+
+    def __init__(self, cache_dir: Path = IPC_CACHE_DIR, max_bytes: int = IPC_CACHE_BYTES):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.hits = self.misses = 0
+        self.over_budget: set[tuple] = set()   # fingerprints of sources too large to cache
+
+    def entry(self, source: Path) -> Path:
+        source = Path(source).resolve()
+        return self.cache_dir / f"{_digest(str(source))}-{_digest(_fingerprint(source))}{SUFFIX}"
+
+    def path_for(self, source: Path) -> Path | None:
+        """The up-to-date IPC file of `source`, converting it first if needed; None if over budget."""
+        file = self.entry(source)
+        try:
+            os.utime(file)   # mark as recently used
+            self.hits += 1
+            return file
+        except FileNotFoundError:
+            pass
+
+        self.misses += 1
+        fingerprint = _fingerprint(Path(source).resolve())
+        if fingerprint in self.over_budget or _parquet_bytes(source) > self.max_bytes:
+            self.over_budget.add(fingerprint)
+            return None
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp = file.with_name(f".{file.name}.{os.getpid()}.tmp")
+        try:
+            with PROFILER.phase("ipc_convert") as span:
+                dataset = _dataset(source)
+                dictionaries = _unified_dictionaries(dataset)
+                schema = _with_dictionaries(dataset.schema, dictionaries)
+                with ipc.new_file(str(tmp), schema) as writer:
+                    for batch in dataset.to_batches(batch_size=BATCH_ROWS):
+                        writer.write_batch(_remap_batch(batch, schema, dictionaries))
+                        span.rows += batch.num_rows
+                span.bytes += tmp.stat().st_size
+            if tmp.stat().st_size > self.max_bytes:
+                self.over_budget.add(fingerprint)
+                return None
+            os.replace(tmp, file)
+        finally:
+            tmp.unlink(missing_ok=True)
+
+        # Previous versions of the same source
+        prefix = file.name.split("-", 1)[0]
+        for old in self.cache_dir.glob(f"{prefix}-*{SUFFIX}"):
+            if old != file:
+                old.unlink(missing_ok=True)
+        self._evict(keep=file)
+        return file
+
+    def read(self, source: Path, columns: list[str] | None = None) -> pa.Table:
+        """`source` as a memory-mapped table (plain Parquet read when it does not fit the budget)."""
+        file = self.path_for(source)
+        if file is None:
+            return _dataset(source).to_table(columns=columns)
+        with pa.memory_map(str(file), "r") as mapped:
+            table = ipc.open_file(mapped).read_all()
+        return table if columns is None else table.select(columns)
+
+    def entries(self) -> list[tuple[Path, int, int]]:
+        """[(file, size, mtime_ns)] from least to most recently used."""
+        out = []
+        for file in self.cache_dir.glob(f"*{SUFFIX}"):
+            try:
+                stat = file.stat()
+            except FileNotFoundError:
+                continue   # evicted by another process
+            out.append((file, stat.st_size, stat.st_mtime_ns))
+        return sorted(out, key=lambda e: e[2])
+
+    def _evict(self, keep: Path) -> None:
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for file, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            if file == keep:
+                continue
+            file.unlink(missing_ok=True)
+            total -= size
+
+    def clear(self) -> None:
+        for file, _, _ in self.entries():
+            file.unlink(missing_ok=True)
+
+
+_CACHE = IpcCache()
+
+
+def read_table(source: Path, columns: list[str] | None = None, cache: IpcCache | None = None) -> pa.Table:
+    return (cache or _CACHE).read(source, columns)
+
+
+# ─── CLI ────────────────────────────────────────────────────────
+def main():
+    parser = argparse.ArgumentParser(description="Memory-mapped Arrow IPC cache of stage outputs")
+    parser.add_argument("--warm", nargs="*", type=Path, metavar="PATH",
+                        help="convert these outputs (default: every merged output)")
+    parser.add_argument("--clear", action="store_true", help="delete every cache entry")
+    args = parser.parse_args()
+
+    if args.clear:
+        _CACHE.clear()
+        logging.info(f"🧹 Cleared {IPC_CACHE_DIR}")
+    if args.warm is not None:
+        for source in args.warm or sorted(MERGED_DIR.glob("*.parquet")):
+            file = _CACHE.path_for(source)
+            logging.info(f"✅ {source.name} → {file.name if file else 'over budget, not cached'}")
+
+    entries = _CACHE.entries()
+    for file, size, _ in reversed(entries):
+        print(f"{file.name}  {size / 2**20:10.1f} MB")
+    print(f"{len(entries)} entries, {sum(s for _, s, _ in entries) / 2**30:.2f} of "
+          f"{IPC_CACHE_BYTES / 2**30:.0f} GB")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s — %(levelname)s — %(message)s",
+        handlers=[logging.StreamHandler()])
+    main()
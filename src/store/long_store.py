@@ -0,0 +1,248 @@
+# src/store/long_store.py
+
+"""
+Long/narrow layout for decoded CAN signals.
+
+The wide layout stores one row per frame with a column for every signal of the
+DBC, so each row is mostly nulls (worse with multiplexed messages). The long
+layout stores one dense (time, value) series per signal instead, as a
+Hive-partitioned directory that keeps the decoded file name:
+
+    data/decoded/00000010_can1_can.parquet/
+        signal=DI_vehicleSpeed/part-0.parquet     time  timestamp[ns, UTC]
+        signal=DI_vehicleSpeed/part-1.parquet     value the signal's decoded type
+        signal=DI_gear/part-0.parquet                   (see src/store/signal_types.py)
+        ...
+
+A signal is split into several parts, in time order, when the decoder had
+to write it out before the end of the log (see LongWriter).
+
+Readers never need to know which layout a decoded path has:
+  - read_decoded(path, columns)  → wide DataFrame [time, ...signals]
+  - iter_signals(path, columns)  → (name, time_ns, values) per signal
+Only the partitions of the requested signals are opened; both hand values
+back as float64.
+"""
+
+import os
+import re
+import shutil
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from src.store.signal_types import DEFAULT_TYPE, cast_column, to_pandas
+
+LONG_SCHEMA = pa.schema([
+    ("time", pa.timestamp("ns", tz="UTC")),
+    ("value", pa.float64()),
+])
+
+PARTITION_KEY = "signal"
+PART_RE = re.compile(r"part-(\d+)\.parquet")
+WIDE_ONLY_COLUMNS = ("time", "arbitration_id")
+
+FLUSH_ROWS = 262_144        # buffered samples of one signal written out as a part
+BUFFER_ROWS = 4_194_304     # buffered samples of all signals (~64 MB); past it the largest are written out
+
+
+# ─── Layout ─────────────────────────────────────────────────────
+def is_long(path: Path) -> bool:
+    return Path(path).is_dir()
+
+
+def signal_dir(path: Path, signal: str) -> Path:
+    return Path(path) / f"{PARTITION_KEY}={signal}"
+
+
+def signal_files(path: Path, signal: str) -> list[Path]:
+    """Part files of one signal in time order; empty if the signal is absent."""
+    parts = []
+    if signal_dir(path, signal).is_dir():
+        for file in signal_dir(path, signal).iterdir():
+            match = PART_RE.fullmatch(file.name)
+            if match:
+                parts.append((int(match.group(1)), file))
+    return [file for _, file in sorted(parts)]
+
+
+def decoded_signals(path: Path) -> list[str]:
+    """Signal names stored in a decoded output of either layout."""
+    path = Path(path)
+    if is_long(path):
+        prefix = f"{PARTITION_KEY}="
+        return sorted(p.name[len(prefix):] for p in path.iterdir() if p.name.startswith(prefix))
+    return [name for name in pq.read_schema(path).names if name not in WIDE_ONLY_COLUMNS]
+
+
+def remove_output(path: Path) -> None:
+    """Deletes a decoded output of either layout."""
+    path = Path(path)
+    if is_long(path):
+        shutil.rmtree(path)
+    else:
+        path.unlink(missing_ok=True)
+
+
+def replace_output(tmp: Path, path: Path) -> None:
+    """Moves a finished output into place, whatever layout the previous one had."""
+    if is_long(tmp) or is_long(path):
+        remove_output(path)
+    os.replace(tmp, path)
+
+
+# ─── Writing ────────────────────────────────────────────────────
+class LongWriter:
+    """
+    Collects dense per-signal series chunk by chunk and writes them as part
+    files under signal=<name>/, values cast to types[signal] (float64 if
+    absent). A signal is written out once it has FLUSH_ROWS samples
+    buffered. When all buffers together pass BUFFER_ROWS, the largest are
+    written out. Memory therefore stays bounded for any log length, and
+    only decoded values are held, never the null-padded wide rows.
+    """
+
+    def __init__(self, out_dir: Path, types: dict[str, pa.DataType] | None = None):
+        self.out_dir = Path(out_dir)
+        self.types = types or {}
+        self.chunks: dict[str, list[tuple[np.ndarray, np.ndarray]]] = {}
+        self.buffered: dict[str, int] = {}
+        self.total = 0
+        self.parts: dict[str, int] = {}
+
+    def append(self, series: dict[str, tuple[np.ndarray, np.ndarray]]) -> None:
+        """series: {signal: (unix seconds float64, values float64)}"""
+        for name, (seconds, values) in series.items():
+            self.chunks.setdefault(name, []).append((seconds, values))
+            self.buffered[name] = self.buffered.get(name, 0) + len(values)
+            self.total += len(values)
+            if self.buffered[name] >= FLUSH_ROWS:
+                self.flush(name)
+        if self.total > BUFFER_ROWS:
+            for name in sorted(self.buffered, key=self.buffered.get, reverse=True):
+                if self.total <= BUFFER_ROWS // 2:
+                    break
+                self.flush(name)
+
+    def flush(self, name: str) -> None:
+        """Writes the buffered samples of one signal as its next part file."""
+        chunks = self.chunks.pop(name)
+        self.total -= self.buffered.pop(name)
+        seconds = np.concatenate([t for t, _ in chunks])
+        values = np.concatenate([v for _, v in chunks])
+        value_type = self.types.get(name, DEFAULT_TYPE)
+        table = pa.table(
+            [pa.array(pd.to_datetime(seconds, unit="s", utc=True)),
+             cast_column(pa.array(values), value_type, name)],
+            schema=LONG_SCHEMA.set(1, pa.field("value", value_type)),
+        )
+        part = self.parts.get(name, 0)
+        out_path = signal_dir(self.out_dir, name) / f"part-{part}.parquet"
+        out_path.parent.mkdir(parents=True, exist_ok=True)
+        # Timestamps are monotonic: delta encoding stores them in a few bits each
+        pq.write_table(table, out_path, use_dictionary=["value"],
+                       column_encoding={"time": "DELTA_BINARY_PACKED"})
+        self.parts[name] = part + 1
+
+    def close(self) -> int:
+        """Writes what is still buffered; returns the number of signals written."""
+        for name in list(self.chunks):
+            self.flush(name)
+        written = len(self.parts)
+        self.parts = {}
+        return written
+
+
+# ─── Reading ────────────────────────────────────────────────────
+def _utc_scalar(ts) -> pa.Scalar:
+    ts = pd.Timestamp(ts)
+    ts = ts.tz_localize("UTC") if ts.tzinfo is None else ts.tz_convert("UTC")
+    return pa.scalar(ts, LONG_SCHEMA.field("time").type)
+
+
+def read_long(path: Path, signals: list[str] | None = None, start=None, end=None) -> pd.DataFrame:
+    """
+    Long DataFrame [time, signal, value] with signal and time-range filters
+    pushed down to the partitions / row groups.
+    """
+    dataset = ds.dataset(str(path), schema=LONG_SCHEMA.append(pa.field(PARTITION_KEY, pa.string())),
+                         format="parquet", partitioning="hive")
+    condition = None
+    if signals is not None:
+        condition = ds.field(PARTITION_KEY).isin(list(signals))
+    if start is not None:
+        bound = ds.field("time") >= _utc_scalar(start)
+        condition = bound if condition is None else condition & bound
+    if end is not None:
+        bound = ds.field("time") < _utc_scalar(end)
+        condition = bound if condition is None else condition & bound
+
+    df = dataset.to_table(columns=["time", PARTITION_KEY, "value"], filter=condition).to_pandas()
+    return df.sort_values(["time", PARTITION_KEY], kind="stable", ignore_index=True)
+
+
+def iter_signals(path: Path, columns: list[str] | None = None):
+    """
+    Yields (signal, time_ns int64, values float64) for every numeric signal,
+    sorted by time, NaNs dropped. Works on both layouts; a wide file is read
+    one column at a time, so only the time column and one signal are held.
+    """
+    path = Path(path)
+    names = decoded_signals(path) if columns is None else [c for c in columns if c not in WIDE_ONLY_COLUMNS]
+
+    if is_long(path):
+        for name in names:
+            files = signal_files(path, name)
+            if not files:
+                continue
+            table = pa.concat_tables([pq.read_table(file) for file in files])
+            time_ns = table.column("time").cast(pa.int64()).to_numpy()
+            values = table.column("value").cast(pa.float64()).to_numpy()
+            order = np.argsort(time_ns, kind="stable")
+            keep = ~np.isnan(values[order])
+            yield name, time_ns[order][keep], values[order][keep]
+        return
+
+    file = pq.ParquetFile(path)
+    time = pd.to_datetime(to_pandas(file.read(columns=["time"]))["time"], utc=True, errors="coerce")
+    time_ns = time.astype("int64").to_numpy()
+    order = np.argsort(time_ns, kind="stable")
+    order = order[time.notna().to_numpy()[order]]
+    time_ns = time_ns[order]
+    for name in names:
+        column = to_pandas(file.read(columns=[name]))[name]
+        if not pd.api.types.is_numeric_dtype(column):
+            continue
+        values = column.to_numpy(dtype=np.float64, na_value=np.nan)[order]
+        keep = ~np.isnan(values)
+        yield name, time_ns[keep], values[keep]
+
+
+def read_decoded(path: Path, columns: list[str] | None = None) -> pd.DataFrame:
+    """
+    Decoded output as a wide DataFrame [time, ...sorted signals], whichever
+    layout it was written in. Long outputs are pivoted on time: frames that
+    share a timestamp share a row, as in the wide layout.
+    """
+    path = Path(path)
+    if not is_long(path):
+        return to_pandas(pq.read_table(path, columns=None if columns is None else ["time", *columns]))
+
+    signals = None if columns is None else [c for c in columns if c not in WIDE_ONLY_COLUMNS]
+    df = read_long(path, signals)
+    if df.empty:
+        return pd.DataFrame(columns=["time", *(signals or [])])
+
+    time_ns = df["time"].astype("int64").to_numpy()
+    grid, row = np.unique(time_ns, return_inverse=True)
+    names, col = np.unique(df[PARTITION_KEY].to_numpy(dtype=object), return_inverse=True)
+    wide = np.full((len(grid), len(names)), np.nan)
+    wide[row, col] = df["value"].to_numpy()
+
+    out = pd.DataFrame(wide, columns=names)
+    out.insert(0, "time", pd.to_datetime(grid, utc=True))
+    return out
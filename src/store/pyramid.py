@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+src/store/pyramid.py
+
+Multi-resolution pyramid store for zoomable time-series plots.
+
+Built from the decoded outputs in data/decoded/ (wide or long layout),
+one file per bus per drive holding every signal:
+
+    data/pyramid/<bus>/<drive>.parquet
+        level   int8                    bucket width = 2**(LEVEL0_SHIFT + level) ns
+        top     int8                    coarsest level these buckets also stand for
+        signal  string
+        time    timestamp[ns, UTC]      bucket start
+        min, max, mean  float64
+        count   int64                   samples in the bucket
+
+- Level 0 buckets are ~8 ms (2**23 ns), about the period of the fastest CAN
+  messages (10 ms), so level 0 rarely holds more buckets than samples
+- Every level halves the previous one, up to MAX_LEVEL (2**50 ns ≈ 13 days).
+  A level that merges no buckets is not stored: the finer buckets stand for
+  it (rows with level <= L <= top), and a signal stops at its first
+  single-bucket level
+- Rows are sorted by (level, signal, time), so a query touches only the
+  footers plus the row groups of one signal and level inside the window
+  (filter pushdown)
+
+Query:
+    from src.store.pyramid import query
+    df = query("VehicleSpeed", start, end, width_px=1200)
+
+returns the finest level with at most ~2 buckets per pixel over [start, end).
+"""
+
+import os
+import sys
+import json
+import argparse
+import logging
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+# ─── Force src/ to be discoverable ─────────────────────────────
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from src.utils.paths import DECODED_DIR, PYRAMID_DIR
+from src.utils.manifest import Manifest
+from src.utils.profiling import PROFILER
+from src.store.long_store import iter_signals
+
+# ─── Config ─────────────────────────────────────────────────────
+LEVEL0_SHIFT = 23            # level 0 bucket = 2**23 ns ≈ 8.4 ms
+MAX_LEVEL = 27               # coarsest bucket = 2**50 ns ≈ 13 days
+ROW_GROUP_ROWS = 65_536      # rows per row group
+BUCKETS_PER_PIXEL = 2        # query resolution target
+SIGNALS_KEY = b"pyramid.signals"   # footer metadata: JSON list of the signals in a file
+
+PYRAMID_SCHEMA = pa.schema([
+    ("level", pa.int8()),
+    ("top", pa.int8()),
+    ("signal", pa.string()),
+    ("time", pa.timestamp("ns", tz="UTC")),
+    ("min", pa.float64()),
+    ("max", pa.float64()),
+    ("mean", pa.float64()),
+    ("count", pa.int64()),
+])
+
+MANIFEST_PARAMS = {"level0_shift": LEVEL0_SHIFT, "max_level": MAX_LEVEL, "layout": "bus-drive"}
+
+
+# ─── Layout ─────────────────────────────────────────────────────
+def split_decoded_name(decoded_file: Path) -> tuple[str, str]:
+    """'00000010_can1_can.parquet' → ('00000010', 'can1_can')"""
+    drive, bus = decoded_file.stem.split("_", 1)
+    return drive, bus
+
+
+def pyramid_path(bus: str, drive: str) -> Path:
+    return PYRAMID_DIR / bus / f"{drive}.parquet"
+
+
+def bucket_ns(level: int) -> int:
+    return 1 << (LEVEL0_SHIFT + level)
+
+
+# ─── Build ──────────────────────────────────────────────────────
+def build_levels(time_ns: np.ndarray, values: np.ndarray) -> dict[str, np.ndarray]:
+    """
+    Builds the pyramid levels of one signal from sorted int64 ns timestamps
+    and float64 values (NaNs already dropped). Returns {column: array} without
+    the signal column; levels that merge no buckets are folded into `top`.
+    """
+    buckets = time_ns >> LEVEL0_SHIFT
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    keys = buckets[starts]
+    mins = np.minimum.reduceat(values, starts)
+    maxs = np.maximum.reduceat(values, starts)
+    sums = np.add.reduceat(values, starts)
+    counts = np.diff(np.r_[starts, len(values)]).astype(np.int64)
+
+    levels = [[0, 0, keys, mins, maxs, sums, counts]]   # [level, top, keys, ...]
+    for level in range(1, MAX_LEVEL + 1):
+        if len(keys) == 1:
+            break
+        # Merge bucket pairs into the next level
+        parents = keys >> 1
+        starts = np.flatnonzero(np.r_[True, parents[1:] != parents[:-1]])
+        if len(starts) == len(keys):
+            levels[-1][1] = level   # same buckets, only wider: the finer level stands for this one
+            keys = parents
+            continue
+        keys = parents[starts]
+        mins = np.minimum.reduceat(mins, starts)
+        maxs = np.maximum.reduceat(maxs, starts)
+        sums = np.add.reduceat(sums, starts)
+        counts = np.add.reduceat(counts, starts)
+        levels.append([level, level, keys, mins, maxs, sums, counts])
+    levels[-1][1] = MAX_LEVEL
+
+    columns = {name: [] for name in PYRAMID_SCHEMA.names if name != "signal"}
+    for level, top, keys, mins, maxs, sums, counts in levels:
+        columns["level"].append(np.full(len(keys), level, dtype=np.int8))
+        columns["top"].append(np.full(len(keys), top, dtype=np.int8))
+        columns["time"].append(keys << (LEVEL0_SHIFT + level))
+        columns["min"].append(mins)
+        columns["max"].append(maxs)
+        columns["mean"].append(sums / counts)
+        columns["count"].append(counts)
+    return {name: np.concatenate(parts) for name, parts in columns.items()}
+
+
+def pyramid_table(signals: dict[str, dict[str, np.ndarray]]) -> pa.Table:
+    """One table of all signals' levels, sorted by (level, signal, time)."""
+    names = sorted(signals)
+    columns = {name: np.concatenate([signals[s][name] for s in names]) for name in signals[names[0]]}
+    codes = np.repeat(np.arange(len(names), dtype=np.int32), [len(signals[s]["level"]) for s in names])
+    # Each signal's rows are already in (level, time) order and signals in name order
+    order = np.argsort(columns["level"], kind="stable")
+    columns["signal"] = pa.DictionaryArray.from_arrays(codes[order], pa.array(names)).cast(pa.string())
+    table = pa.table(
+        [columns["signal"] if f.name == "signal" else pa.array(columns[f.name][order]).cast(f.type)
+         for f in PYRAMID_SCHEMA],
+        schema=PYRAMID_SCHEMA,
+    )
+    return table.replace_schema_metadata({SIGNALS_KEY: json.dumps(names).encode()})
+
+
+def write_pyramid(table: pa.Table, out_path: Path) -> None:
+    """
+    Writes rows sorted by (level, signal, time) atomically. Row-group min/max
+    stats on `level`, `signal` and `time` then let a query skip every other
+    level, signal and time range. Bucket starts are delta-encoded (as in
+    long_store.py) and pages zstd-compressed: about half the default size.
+    """
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = out_path.with_name(f".{out_path.name}.{os.getpid()}.tmp")
+    pq.write_table(table, tmp, row_group_size=ROW_GROUP_ROWS, compression="zstd",
+                   use_dictionary=[name for name in table.schema.names if name != "time"],
+                   column_encoding={"time": "DELTA_BINARY_PACKED"})
+    os.replace(tmp, out_path)
+
+
+def pyramid_outputs(decoded_file: Path) -> list[Path]:
+    drive, bus = split_decoded_name(decoded_file)
+    return [pyramid_path(bus, drive)]
+
+
+def build_pyramid(decoded_file: Path) -> int:
+    """Builds the pyramid of every signal in one decoded file. Returns signals written."""
+    drive, bus = split_decoded_name(decoded_file)
+    out_path = pyramid_path(bus, drive)
+
+    signals = {}
+    samples = PROFILER.iter_phase("read", iter_signals(decoded_file), rows=lambda item: len(item[1]))
+    for signal, time_ns, values in samples:
+        if len(values):
+            with PROFILER.phase("build", rows=len(values)):
+                signals[signal] = build_levels(time_ns, values)
+
+    if not signals:
+        out_path.unlink(missing_ok=True)
+        return 0
+    with PROFILER.phase("write") as span:
+        table = pyramid_table(signals)
+        write_pyramid(table, out_path)
+        span.rows, span.bytes = table.num_rows, table.nbytes
+
+    logging.info(f"✅ {decoded_file.name} → {len(signals)} signal pyramids")
+    return len(signals)
+
+
+def is_up_to_date(manifest: Manifest, decoded_file: Path) -> bool:
+    return manifest.is_fresh("pyramid", decoded_file.name, [decoded_file], MANIFEST_PARAMS)
+
+
+def record_done(manifest: Manifest, decoded_file: Path) -> None:
+    manifest.record("pyramid", decoded_file.name, [decoded_file], MANIFEST_PARAMS, pyramid_outputs(decoded_file))
+
+
+# ─── Query ──────────────────────────────────────────────────────
+def _to_ns(ts) -> int:
+    """Naive timestamps are taken as UTC, like the decoded time column."""
+    ts = pd.Timestamp(ts)
+    return (ts.tz_localize("UTC") if ts.tzinfo is None else ts).value
+
+
+def choose_level(start_ns: int, end_ns: int, width_px: int) -> int:
+    """Finest level whose bucket count over the window stays within BUCKETS_PER_PIXEL * width_px."""
+    target = max(end_ns - start_ns, 1) / max(width_px * BUCKETS_PER_PIXEL, 1)
+    level = int(np.ceil(np.log2(max(target, 1)))) - LEVEL0_SHIFT
+    return min(max(level, 0), MAX_LEVEL)
+
+
+def file_signals(path: Path) -> list[str]:
+    """Signals of one pyramid file, from its footer."""
+    metadata = pq.read_schema(path).metadata or {}
+    return json.loads(metadata.get(SIGNALS_KEY, b"[]"))
+
+
+def signal_files(signal: str, bus: str | None = None) -> list[Path]:
+    """Pyramid files (one per drive) holding `signal`, all on one bus."""
+    buses = [PYRAMID_DIR / bus] if bus is not None else sorted(p for p in PYRAMID_DIR.glob("*") if p.is_dir())
+    found = {}
+    for bus_dir in buses:
+        files = [f for f in sorted(bus_dir.glob("*.parquet")) if signal in file_signals(f)]
+        if files:
+            found[bus_dir.name] = files
+    if not found:
+        raise FileNotFoundError(f"No pyramid for signal {signal}" + (f" on {bus}" if bus else ""))
+    if len(found) > 1:
+        raise ValueError(f"{signal} exists on several buses ({', '.join(found)}); pass bus=")
+    return next(iter(found.values()))
+
+
+def query(signal: str, start, end, width_px: int = 1000, bus: str | None = None,
+          drives: list[str] | None = None) -> pd.DataFrame:
+    """
+    Returns [time, min, max, mean, count] buckets of `signal` over [start, end)
+    at the best resolution for a plot `width_px` pixels wide. The chosen
+    level and bucket width are in df.attrs; where that level merges no
+    buckets, the finer buckets standing for it are returned.
+    """
+    start_ns, end_ns = _to_ns(start), _to_ns(end)
+    level = choose_level(start_ns, end_ns, width_px)
+    files = signal_files(signal, bus)
+    if drives:
+        files = [f for f in files if f.stem in set(drives)]
+
+    # A bucket starting before the window may still overlap it
+    lo = pa.scalar(start_ns - bucket_ns(level) + 1, pa.timestamp("ns", tz="UTC"))
+    hi = pa.scalar(end_ns, pa.timestamp("ns", tz="UTC"))
+    dataset = ds.dataset([str(f) for f in files], schema=PYRAMID_SCHEMA, format="parquet")
+
+    table = dataset.to_table(
+        columns=["time", "min", "max", "mean", "count"],
+        filter=((ds.field("level") <= level) & (ds.field("top") >= level) & (ds.field("signal") == signal)
+                & (ds.field("time") >= lo) & (ds.field("time") < hi)),
+    )
+    df = table.to_pandas().sort_values("time", ignore_index=True)
+    df.attrs.update(level=level, bucket_ns=bucket_ns(level))
+    return df
+
+
+# ─── Main ──────────────────────────────────────────────────────
+def main():
+    parser = argparse.ArgumentParser(description="Build signal pyramids from decoded Parquet files")
+    parser.add_argument("--force", action="store_true", help="ignore the manifest and rebuild everything")
+    args = parser.parse_args()
+
+    decoded_files = sorted(DECODED_DIR.glob("*.parquet"))
+    if not decoded_files:
+        logging.warning("⚠️ No decoded Parquet files found in data/decoded/")
+        return
+
+    manifest = Manifest()
+    for file in decoded_files:
+        if not args.force and is_up_to_date(manifest, file):
+            logging.info(f"⏭️ Up to date: {file.name}")
+            continue
+        build_pyramid(file)
+        record_done(manifest, file)
+        manifest.save()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s — %(levelname)s — %(message)s",
+        handlers=[logging.StreamHandler()])
+    main()
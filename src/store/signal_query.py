@@ -0,0 +1,429 @@
+#!/usr/bin/env python3
+"""
+src/store/signal_query.py
+
+On-demand signal queries straight from raw and decoded logs, without
+running the decode → downsample → clean → merge chain.
+
+    from src.store.signal_query import query_signals
+    df = query_signals(["DI_brakePedal", "DAS_accState"], drives=["00000003"],
+                       start="2025-03-08 08:05", end="2025-03-08 08:10")
+
+returns a long DataFrame [time, drive, bus, signal, value], sorted by time.
+
+- Each signal is resolved to its (bus, message IDs) through
+  config/registry/dbc_signals_metadata.csv; a name defined on several buses
+  is returned once per bus (narrow with buses=[...])
+- Per (drive, bus) the source is the decoded Parquet when it is newer than
+  the MF4 and the DBC (wide or long layout, with time-range pushdown),
+  otherwise the MF4 itself: only the routed arbitration IDs in the window
+  are read (see mf4_reader.py) and only the requested signals (plus their
+  multiplexers) are decoded
+- Results are cached per (source file, bus, signal, window) in an LRU
+  bounded by bytes, in memory and on disk (data/catalog/query_cache/), so
+  repeated ad-hoc queries are served without touching the logs
+
+CLI:
+    python src/store/signal_query.py DI_brakePedal DAS_accState --drives 00000003 \\
+        --start "2025-03-08 08:05" --end "2025-03-08 08:10" --out brake.csv
+"""
+
+import os
+import sys
+import hashlib
+import argparse
+import importlib
+import logging
+from collections import OrderedDict
+from dataclasses import replace
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+# ─── Force src/ to be discoverable ─────────────────────────────
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from src.utils.paths import RAW_DIR, DECODED_DIR, DBC_DIR, DBC_METADATA_PATH, QUERY_CACHE_DIR
+from src.decode.dbc_registry import load_compiled
+from src.decode.vector_decode import MessageLayout, decode_frames_long
+from src.store.long_store import is_long, decoded_signals, read_long
+from src.store.dataset import split_stage_name
+
+# ─── Config ─────────────────────────────────────────────────────
+MEMORY_CACHE_BYTES = 512 * 2**20
+DISK_CACHE_BYTES = 2 * 2**30
+CHUNK_FRAMES = 262_144          # routed frames decoded per batch
+
+RESULT_COLUMNS = ["time", "drive", "bus", "signal", "value"]
+
+
+# ─── Byte-Bounded LRU ───────────────────────────────────────────
+def frame_bytes(df: pd.DataFrame) -> int:
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+class QueryCache:
+    """
+    LRU of per-signal result frames, bounded by total bytes: an in-memory
+    tier (DataFrame memory size) backed by a directory of Parquet files
+    (file size, recency = mtime). Entries larger than a tier are not kept in it.
+    """
+
+    def __init__(self, memory_bytes: int = MEMORY_CACHE_BYTES, disk_bytes: int = DISK_CACHE_BYTES,
+                 disk_dir: Path | None = QUERY_CACHE_DIR):
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self.disk_dir = Path(disk_dir) if disk_dir is not None and disk_bytes > 0 else None
+        self.entries: OrderedDict[str, tuple[pd.DataFrame, int]] = OrderedDict()
+        self.used = 0
+        self.hits = self.misses = 0
+
+    @staticmethod
+    def key(*parts) -> str:
+        return hashlib.sha256(repr(parts).encode()).hexdigest()
+
+    def _disk_file(self, key: str) -> Path:
+        return self.disk_dir / f"{key}.parquet"
+
+    def get(self, key: str) -> pd.DataFrame | None:
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return self.entries[key][0]
+        if self.disk_dir is not None:
+            file = self._disk_file(key)
+            try:
+                df = pd.read_parquet(file)
+                os.utime(file)  # mark as recently used
+            except (OSError, ValueError, pa.ArrowException):
+                df = None
+            if df is not None:
+                self.hits += 1
+                self._remember(key, df)
+                return df
+        self.misses += 1
+        return None
+
+    def put(self, key: str, df: pd.DataFrame) -> None:
+        self._remember(key, df)
+        if self.disk_dir is not None:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+            file = self._disk_file(key)
+            tmp = file.with_name(f".{file.name}.{os.getpid()}.tmp")
+            df.to_parquet(tmp, index=False)
+            if tmp.stat().st_size > self.disk_bytes:
+                tmp.unlink()
+                return
+            os.replace(tmp, file)
+            self._evict_disk()
+
+    def _remember(self, key: str, df: pd.DataFrame) -> None:
+        size = frame_bytes(df)
+        if size > self.memory_bytes:
+            return
+        if key in self.entries:
+            self.used -= self.entries.pop(key)[1]
+        self.entries[key] = (df, size)
+        self.used += size
+        while self.used > self.memory_bytes:
+            _, (_, evicted) = self.entries.popitem(last=False)
+            self.used -= evicted
+
+    def _evict_disk(self) -> None:
+        files = []
+        for file in self.disk_dir.glob("*.parquet"):
+            try:
+                stat = file.stat()
+            except FileNotFoundError:
+                continue  # evicted by another process
+            files.append((stat.st_mtime_ns, stat.st_size, file))
+        total = sum(size for _, size, _ in files)
+        for _, size, file in sorted(files):
+            if total <= self.disk_bytes:
+                break
+            file.unlink(missing_ok=True)
+            total -= size
+
+    def clear(self) -> None:
+        self.entries.clear()
+        self.used = 0
+        if self.disk_dir is not None:
+            for file in self.disk_dir.glob("*.parquet"):
+                file.unlink(missing_ok=True)
+
+
+_CACHE = QueryCache()
+
+
+# ─── Signal Resolution ──────────────────────────────────────────
+_INDEX: dict[tuple[int, int], pd.DataFrame] = {}
+
+
+def signal_index() -> pd.DataFrame:
+    """[signal_name, bus, frame_id] rows of dbc_signals_metadata.csv, re-read when it changes."""
+    stat = os.stat(DBC_METADATA_PATH)
+    key = (stat.st_mtime_ns, stat.st_size)
+    if key not in _INDEX:
+        meta = pd.read_csv(DBC_METADATA_PATH, usecols=["signal_name", "message_id", "dbc_source"])
+        _INDEX.clear()
+        _INDEX[key] = pd.DataFrame({
+            "signal_name": meta["signal_name"],
+            "bus": meta["dbc_source"].str.removesuffix(".dbc"),
+            "frame_id": meta["message_id"].map(lambda h: int(h, 16)),
+        }).drop_duplicates()
+    return _INDEX[key]
+
+
+def resolve_signals(signals: list[str], buses: list[str] | None = None) -> dict[str, dict[str, set[int]]]:
+    """
+    {bus: {signal: frame IDs}} for the requested signals.
+    Raises ValueError for names no DBC (of the selected buses) defines.
+    """
+    index = signal_index()
+    index = index[index["signal_name"].isin(signals)]
+    if buses is not None:
+        index = index[index["bus"].isin(buses)]
+
+    unknown = sorted(set(signals) - set(index["signal_name"]))
+    if unknown:
+        raise ValueError(f"Unknown signals: {', '.join(unknown)} (see {DBC_METADATA_PATH.name})")
+
+    resolved: dict[str, dict[str, set[int]]] = {}
+    for row in index.itertuples(index=False):
+        resolved.setdefault(row.bus, {}).setdefault(row.signal_name, set()).add(row.frame_id)
+    return resolved
+
+
+def narrow_layout(layout: MessageLayout, signals: set[str]) -> MessageLayout:
+    """The message layout reduced to `signals` and the multiplexers selecting them."""
+    by_name = {sig.name: sig for sig in layout.signals}
+    keep = set()
+    for name in signals & by_name.keys():
+        while name is not None and name not in keep:
+            keep.add(name)
+            name = by_name[name].multiplexer_signal
+    return replace(layout, signals=tuple(sig for sig in layout.signals if sig.name in keep))
+
+
+# ─── Sources ────────────────────────────────────────────────────
+def available_drives() -> list[str]:
+    drives = {path.stem for path in RAW_DIR.glob("*.MF4")}
+    for path in DECODED_DIR.glob("*.parquet"):
+        try:
+            drives.add(split_stage_name(path.name)[0])
+        except ValueError:
+            continue
+    return sorted(drives)
+
+
+def _newest_mtime(path: Path) -> int:
+    if not is_long(path):
+        return path.stat().st_mtime_ns
+    return max(p.stat().st_mtime_ns for p in [path, *path.rglob("*.parquet")])
+
+
+def choose_source(drive: str, bus: str, source: str = "auto") -> tuple[str, Path] | None:
+    """
+    ("decoded" | "raw", path) for one drive and bus, or None if neither exists.
+    auto → the decoded output if it is newer than both the MF4 and the DBC.
+    """
+    decoded = DECODED_DIR / f"{drive}_{bus.replace('-', '_')}.parquet"
+    raw = RAW_DIR / f"{drive}.MF4"
+
+    if source == "decoded":
+        return ("decoded", decoded) if decoded.exists() else None
+    if source == "raw":
+        return ("raw", raw) if raw.exists() else None
+
+    if decoded.exists():
+        inputs = [p.stat().st_mtime_ns for p in (raw, DBC_DIR / f"{bus}.dbc") if p.exists()]
+        if not raw.exists() or _newest_mtime(decoded) >= max(inputs):
+            return "decoded", decoded
+    return ("raw", raw) if raw.exists() else None
+
+
+def _fingerprint(path: Path) -> tuple:
+    if not is_long(path):
+        stat = path.stat()
+        return str(path), stat.st_size, stat.st_mtime_ns
+    return str(path), _newest_mtime(path)
+
+
+def _utc(ts) -> pd.Timestamp | None:
+    if ts is None:
+        return None
+    ts = pd.Timestamp(ts)
+    return ts.tz_localize("UTC") if ts.tzinfo is None else ts.tz_convert("UTC")
+
+
+def _series_frame(time, values) -> pd.DataFrame:
+    return pd.DataFrame({"time": time, "value": np.asarray(values, dtype=np.float64)})
+
+
+def read_decoded_signals(path: Path, signals: list[str], start=None, end=None) -> dict[str, pd.DataFrame]:
+    """{signal: [time, value]} from a decoded output of either layout."""
+    out = {name: _series_frame(pd.to_datetime([], utc=True), []) for name in signals}
+    available = [name for name in signals if name in set(decoded_signals(path))]
+    if not available:
+        return out
+
+    if is_long(path):
+        df = read_long(path, available, start, end)
+        for name, part in df.groupby("signal", sort=False):
+            out[name] = _series_frame(part["time"].to_numpy(), part["value"]).reset_index(drop=True)
+        return out
+
+    dataset = ds.dataset(str(path), format="parquet")
+    time_type = dataset.schema.field("time").type
+    condition = None
+    if start is not None:
+        condition = ds.field("time") >= pa.scalar(start, time_type)
+    if end is not None:
+        bound = ds.field("time") < pa.scalar(end, time_type)
+        condition = bound if condition is None else condition & bound
+    table = dataset.to_table(columns=["time", *available], filter=condition)
+    time = table.column("time").to_pandas()
+    for name in available:
+        column = table.column(name)
+        if not (pa.types.is_integer(column.type) or pa.types.is_floating(column.type)
+                or pa.types.is_boolean(column.type)):
+            continue  # labelled text columns have no numeric value
+        values = column.cast(pa.float64()).to_numpy(zero_copy_only=False)
+        keep = ~np.isnan(values)
+        out[name] = _series_frame(time[keep].to_numpy(), values[keep])
+    return out
+
+
+def decode_raw_signals(mf4_path: Path, bus: str, wanted: dict[str, set[int]],
+                       start=None, end=None) -> dict[str, pd.DataFrame]:
+    """{signal: [time, value]} decoded from the MF4, reading only the routed IDs in the window."""
+    stage = importlib.import_module("src.decode.00_mf4_to_parquet")
+    compiled = load_compiled(DBC_DIR / f"{bus}.dbc")
+
+    names = set(wanted)
+    layouts = {
+        frame_id: narrow_layout(compiled.layouts[frame_id], names)
+        for frame_id in set().union(*wanted.values()) if frame_id in compiled.layouts
+    }
+    routes = {frame_id: [] for frame_id in layouts}
+    t0 = None if start is None else start.value / 1e9
+    t1 = None if end is None else end.value / 1e9
+
+    parts: dict[str, list] = {name: [] for name in names}
+    for timestamps, ids, payload, lengths in stage.iter_frame_chunks(mf4_path, routes, CHUNK_FRAMES, t0, t1):
+        _, series = decode_frames_long(timestamps, ids, payload, lengths, layouts)
+        for name in names & series.keys():
+            parts[name].append(series[name])
+
+    out = {}
+    for name, chunks in parts.items():
+        seconds = np.concatenate([t for t, _ in chunks]) if chunks else np.empty(0)
+        values = np.concatenate([v for _, v in chunks]) if chunks else np.empty(0)
+        out[name] = _series_frame(pd.to_datetime(seconds, unit="s", utc=True), values)
+    return out
+
+
+# ─── Query ──────────────────────────────────────────────────────
+def query_signals(signals: list[str], drives: list[str] | None = None, start=None, end=None,
+                  buses: list[str] | None = None, source: str = "auto",
+                  cache: QueryCache | None = None) -> pd.DataFrame:
+    """
+    Long DataFrame [time, drive, bus, signal, value] for the signals over
+    [start, end) (UTC; None = unbounded) on the given drives (None = all).
+    source: "auto" | "decoded" | "raw"; cache: None = the module cache.
+    """
+    cache = _CACHE if cache is None else cache
+    start, end = _utc(start), _utc(end)
+    resolved = resolve_signals(list(dict.fromkeys(signals)), buses)
+    drives = available_drives() if drives is None else drives
+
+    frames = []
+    for drive in drives:
+        for bus, wanted in resolved.items():
+            chosen = choose_source(drive, bus, source)
+            if chosen is None:
+                continue
+            kind, path = chosen
+            fingerprint = _fingerprint(path)
+            if kind == "raw":
+                fingerprint += (load_compiled(DBC_DIR / f"{bus}.dbc").sha256,)
+
+            keys = {name: QueryCache.key(fingerprint, kind, bus, name, start, end) for name in wanted}
+            results = {name: cache.get(key) for name, key in keys.items()}
+            missing = {name: wanted[name] for name, df in results.items() if df is None}
+            if missing:
+                logging.info(f"🔎 {drive} {bus}: {len(missing)} signal(s) from {kind} {path.name}")
+                if kind == "raw":
+                    fresh = decode_raw_signals(path, bus, missing, start, end)
+                else:
+                    fresh = read_decoded_signals(path, list(missing), start, end)
+                for name, df in fresh.items():
+                    cache.put(keys[name], df)
+                    results[name] = df
+
+            for name, df in results.items():
+                if len(df):
+                    frames.append(df.assign(drive=drive, bus=bus, signal=name))
+
+    if not frames:
+        return pd.DataFrame({"time": pd.to_datetime([], utc=True), "drive": [], "bus": [],
+                             "signal": [], "value": np.empty(0)})
+    out = pd.concat(frames, ignore_index=True)[RESULT_COLUMNS]
+    return out.sort_values(["time", "drive", "bus", "signal"], kind="stable", ignore_index=True)
+
+
+# ─── CLI ────────────────────────────────────────────────────────
+def add_query_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("signals", nargs="+", help="signal names as in the DBCs")
+    parser.add_argument("--drives", nargs="+", help="drive IDs (MF4 stems); default: all")
+    parser.add_argument("--buses", nargs="+", help="restrict to these DBCs, e.g. can1-vehicle")
+    parser.add_argument("--start", help="window start, UTC (e.g. '2025-03-08 08:05')")
+    parser.add_argument("--end", help="window end (exclusive), UTC")
+    parser.add_argument("--source", choices=["auto", "decoded", "raw"], default="auto",
+                        help="auto = decoded output when fresh, else the MF4")
+    parser.add_argument("--wide", action="store_true", help="one column per signal instead of long rows")
+    parser.add_argument("--out", type=Path, help="write .csv or .parquet instead of printing")
+    parser.add_argument("--no-cache", action="store_true", help="bypass the query cache")
+
+
+def run_query(args: argparse.Namespace) -> pd.DataFrame:
+    cache = QueryCache(disk_bytes=0) if args.no_cache else None
+    df = query_signals(args.signals, args.drives, args.start, args.end, args.buses, args.source, cache)
+    if args.wide:
+        df = df.pivot_table(index=["time", "drive"], columns="signal", values="value", aggfunc="last").reset_index()
+        df.columns.name = None
+
+    if args.out is None:
+        with pd.option_context("display.width", 200, "display.max_columns", 20):
+            print(df)
+    elif args.out.suffix == ".parquet":
+        df.to_parquet(args.out, index=False)
+    else:
+        df.to_csv(args.out, index=False)
+    if args.out is not None:
+        logging.info(f"✅ {len(df)} rows → {args.out}")
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query signals from raw / decoded logs")
+    add_query_arguments(parser)
+    args = parser.parse_args()
+    try:
+        run_query(args)
+    except ValueError as e:
+        parser.error(str(e))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s — %(levelname)s — %(message)s",
+        handlers=[logging.StreamHandler()])
+    main()
@@ -0,0 +1,260 @@
+# src/store/signal_types.py
+
+"""
+Compact, exact Arrow types for decoded signals, derived from the DBC
+registry (config/registry/dbc_signals_metadata.csv).
+
+A decoded value is raw * scaling + offset, where the raw value has
+bit_length bits (sign-extended if is_signed). A raw code listed in the
+signal's choices is emitted unscaled. The narrowest type holding every
+possible value exactly is chosen:
+
+    1-bit unsigned flag, scaling 1, offset 0    → bool
+    integer scaling and offset                  → int8 / int16 / int32 / int64
+    IEEE float32 / float16, scaling 1, offset 0 → float32
+    power-of-two scaling and offset, ≤ 24 bits  → float32 (e.g. 0.5 °C steps)
+    anything else (0.1, 0.05 … steps)           → float64
+
+Values are the same as with float64 everywhere. A value that does not fit
+its type raises ValueError when it is cast, which happens when the metadata
+is older than the DBC.
+
+Writers cast their tables with conform(). The pipeline stages use:
+  - decoded_types(bus)      → value types of the decode stage
+  - resampled_type(t, p)    → a mean over a bin needs float64; last/min/… keep t
+  - label_type(bits)        → dictionary<int, string> for labelled enum columns
+  - special_values(bus)     → physical signals whose only choice is a special
+                              code, and the value that code stands for
+  - registry_digest(bus)    → hash of the bus's metadata rows, for manifest
+                              params (editing one DBC only rebuilds that bus)
+Readers that hand data to NumPy code use to_pandas(), which gives the same
+float64 / NaN columns as before wherever a narrow column holds nulls.
+"""
+
+import os
+import re
+import json
+import hashlib
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from src.utils.paths import DBC_METADATA_PATH
+
+# Bump when the type rules change, so decoded outputs are rebuilt
+SCHEMA_VERSION = 1
+
+DEFAULT_TYPE = pa.float64()          # signals missing from the metadata
+INT_TYPES = (pa.int8(), pa.int16(), pa.int32(), pa.int64())
+FLOAT32_EXACT_BITS = 24              # float32 significand
+VALUE_POLICIES = {"last", "first", "mode", "min", "max"}   # resampling that keeps sample values
+NOT_AVAILABLE_RE = re.compile(r"(^|_)(SNA|N/A|UNKNOWN|UNDEFINED)$", re.IGNORECASE)
+
+
+# ─── Type Rules ─────────────────────────────────────────────────
+def _raw_range(bit_length: int, is_signed: bool | None) -> tuple[int, int]:
+    """Raw value bounds; unknown signedness (metadata without is_signed) covers both."""
+    lo = -(1 << (bit_length - 1)) if is_signed is not False else 0
+    hi = (1 << bit_length) - 1 if is_signed is not True else (1 << (bit_length - 1)) - 1
+    return lo, hi
+
+
+def _int_type(lo: int, hi: int) -> pa.DataType:
+    for t in INT_TYPES:
+        info = np.iinfo(t.to_pandas_dtype())
+        if info.min <= lo and hi <= info.max:
+            return t
+    return pa.uint64()
+
+
+def _quantum(scaling: float, offset: float) -> float | None:
+    """Largest 2**-k of which scaling and offset are both integer multiples."""
+    for k in range(64):
+        q = 2.0 ** -k
+        if (scaling / q).is_integer() and (offset / q).is_integer():
+            return q
+    return None
+
+
+def arrow_type(data_type: str, bit_length: int, scaling: float, offset: float,
+               is_signed: bool | None = None) -> pa.DataType:
+    """Narrowest Arrow type holding every decoded value of one signal exactly."""
+    bit_length = int(bit_length)
+    scaling, offset = float(scaling), float(offset)
+    if data_type == "float":
+        return pa.float32() if bit_length <= 32 and scaling == 1 and offset == 0 else pa.float64()
+
+    lo, hi = _raw_range(bit_length, is_signed)
+    if scaling.is_integer() and offset.is_integer():
+        if bit_length == 1 and lo == 0 and scaling == 1 and offset == 0:
+            return pa.bool_()
+        ends = (lo * int(scaling) + int(offset), hi * int(scaling) + int(offset))
+        return _int_type(min(lo, *ends), max(hi, *ends))
+
+    q = _quantum(scaling, offset)
+    largest = max(abs(lo * scaling + offset), abs(hi * scaling + offset))
+    if q is not None and bit_length <= FLOAT32_EXACT_BITS and largest / q <= 2 ** FLOAT32_EXACT_BITS:
+        return pa.float32()
+    return pa.float64()
+
+
+def label_type(bit_length: int) -> pa.DataType:
+    """Labelled enum column: room for every code, labelled or not, plus every label."""
+    return pa.dictionary(_int_type(0, (1 << (int(bit_length) + 1)) - 1), pa.string())
+
+
+def resampled_type(value_type: pa.DataType, policy: str) -> pa.DataType:
+    """Type of a signal after per-bin aggregation (see src/process/resample.py)."""
+    if policy in VALUE_POLICIES:
+        return value_type
+    if policy == "delta" and (pa.types.is_integer(value_type) or pa.types.is_boolean(value_type)):
+        return pa.int32()   # increments per bin, may exceed the counter modulus
+    return pa.float64()
+
+
+def common_type(a: pa.DataType, b: pa.DataType) -> pa.DataType:
+    """Type holding the values of both (same signal name in several messages)."""
+    if a == b:
+        return a
+    kinds = {a, b}
+    if all(pa.types.is_integer(t) or pa.types.is_boolean(t) for t in kinds):
+        return max((t for t in kinds if pa.types.is_integer(t)), key=lambda t: t.bit_width)
+    if kinds <= {pa.float32(), pa.bool_(), pa.int8(), pa.int16()}:
+        return pa.float32()
+    return pa.float64()
+
+
+# ─── Registry ───────────────────────────────────────────────────
+_TYPES: dict[tuple[str, int, int], dict[str, dict[str, tuple[pa.DataType, int]]]] = {}
+_DIGESTS: dict[tuple[str, int, int], dict[str, str]] = {}
+
+
+def _load(metadata_path: Path) -> dict[str, dict[str, tuple[pa.DataType, int]]]:
+    """{bus: {signal: (value type, bit_length)}}, re-read when the CSV changes."""
+    stat = os.stat(metadata_path)
+    key = (str(metadata_path), stat.st_mtime_ns, stat.st_size)
+    if key not in _TYPES:
+        meta = pd.read_csv(metadata_path)
+        signed = meta["is_signed"] if "is_signed" in meta.columns else pd.Series(None, index=meta.index)
+        by_bus: dict[str, dict[str, tuple[pa.DataType, int]]] = {}
+        for row, is_signed in zip(meta.itertuples(index=False), signed):
+            t = arrow_type(row.data_type, row.bit_length, row.scaling, row.offset,
+                           None if pd.isna(is_signed) else bool(is_signed))
+            signals = by_bus.setdefault(row.dbc_source.removesuffix(".dbc"), {})
+            if row.signal_name in signals:
+                seen, bits = signals[row.signal_name]
+                t, bits = common_type(seen, t), max(bits, int(row.bit_length))
+            else:
+                bits = int(row.bit_length)
+            signals[row.signal_name] = (t, bits)
+        _TYPES.clear()
+        _TYPES[key] = by_bus
+    return _TYPES[key]
+
+
+def registry_digest(bus: str, metadata_path: Path = DBC_METADATA_PATH) -> str | None:
+    """
+    SHA-256 of one bus's rows of the metadata CSV. Its types, resampling
+    policies and special values all derive from those rows, so stages put
+    the digest in their manifest params instead of hashing the whole CSV.
+    None without a metadata CSV or rows for the bus.
+    """
+    if not Path(metadata_path).exists():
+        return None
+    stat = os.stat(metadata_path)
+    key = (str(metadata_path), stat.st_mtime_ns, stat.st_size)
+    if key not in _DIGESTS:
+        meta = pd.read_csv(metadata_path, dtype=str, keep_default_na=False)
+        _DIGESTS.clear()
+        _DIGESTS[key] = {
+            source.removesuffix(".dbc"): hashlib.sha256(rows.to_csv(index=False).encode()).hexdigest()
+            for source, rows in meta.groupby("dbc_source", sort=False)
+        }
+    return _DIGESTS[key].get(bus)
+
+
+def decoded_types(bus: str, metadata_path: Path = DBC_METADATA_PATH) -> dict[str, pa.DataType]:
+    """{signal: decoded value type} of one bus (DBC stem); empty without a metadata CSV."""
+    if not Path(metadata_path).exists():
+        return {}
+    return {name: t for name, (t, _) in _load(metadata_path).get(bus, {}).items()}
+
+
+def label_types(bus: str, metadata_path: Path = DBC_METADATA_PATH) -> dict[str, pa.DataType]:
+    """{signal: dictionary type} for the signals of one bus, should they be labelled."""
+    if not Path(metadata_path).exists():
+        return {}
+    return {name: label_type(bits) for name, (_, bits) in _load(metadata_path).get(bus, {}).items()}
+
+
+def special_values(bus: str, metadata_path: Path = DBC_METADATA_PATH) -> dict[str, tuple[float, float]]:
+    """
+    {signal: (raw code, value)} for the physical signals of one bus (a unit,
+    or a scaling / offset) whose enum map is a single special code, e.g.
+    DAS_steeringAngleRequest 16384 "ZERO_ANGLE". Such a signal is no enum:
+    the code, emitted unscaled, stands for its physical value (0.05°), or for
+    no value under a not-available label (ESP_vehicleSpeed 1023 "…_SNA").
+    """
+    if not Path(metadata_path).exists():
+        return {}
+    meta = pd.read_csv(metadata_path, usecols=["signal_name", "unit", "data_type", "enum_values",
+                                               "scaling", "offset", "dbc_source"])
+    meta = meta[(meta["dbc_source"] == f"{bus}.dbc") & (meta["data_type"] == "enum")]
+    specials = {}
+    for row in meta.drop_duplicates("signal_name").itertuples(index=False):
+        unit = row.unit.strip() if isinstance(row.unit, str) else ""
+        enum_map = json.loads(row.enum_values)
+        if len(enum_map) != 1 or not (unit or row.scaling != 1 or row.offset != 0):
+            continue
+        (code, label), = enum_map.items()
+        value = np.nan if NOT_AVAILABLE_RE.search(label.strip()) else int(code) * row.scaling + row.offset
+        specials[row.signal_name] = (float(code), value)
+    return specials
+
+
+# ─── Casting ────────────────────────────────────────────────────
+def cast_column(column: pa.Array | pa.ChunkedArray, target: pa.DataType, name: str):
+    """Exact cast; ValueError when a value does not fit `target`."""
+    if column.type == target:
+        return column
+    if pa.types.is_boolean(target) and not pa.types.is_boolean(column.type):
+        bounds = pc.min_max(column)
+        if bounds["min"].is_valid and (bounds["min"].as_py() < 0 or bounds["max"].as_py() > 1):
+            raise ValueError(f"{name}: values outside 0/1 do not fit bool "
+                             f"(is {DBC_METADATA_PATH.name} older than the DBC?)")
+    try:
+        return column.cast(target)
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError) as e:
+        raise ValueError(f"{name}: {e} (is {DBC_METADATA_PATH.name} older than the DBC?)") from None
+
+
+def conform(table: pa.Table | pa.RecordBatch, schema: pa.Schema) -> pa.Table:
+    """`table` cast onto `schema`; columns it lacks become nulls, extra columns are dropped."""
+    columns = []
+    for field in schema:
+        if field.name in table.schema.names:
+            columns.append(cast_column(table.column(field.name), field.type, field.name))
+        else:
+            columns.append(pa.nulls(table.num_rows, type=field.type))
+    return pa.Table.from_arrays(columns, schema=schema)
+
+
+def narrow(table: pa.Table, types: dict[str, pa.DataType]) -> pa.Table:
+    """Casts the columns of `table` that `types` names; column order and the rest are kept."""
+    fields = [pa.field(f.name, types.get(f.name, f.type)) for f in table.schema]
+    return conform(table, pa.schema(fields))
+
+
+def to_pandas(table: pa.Table) -> pd.DataFrame:
+    """
+    DataFrame with NumPy dtypes: integer and bool columns that hold nulls
+    come back as float64 with NaN, as the float64 columns did.
+    """
+    for i, field in enumerate(table.schema):
+        if pa.types.is_boolean(field.type) and table.column(i).null_count:
+            table = table.set_column(i, field.name, table.column(i).cast(pa.float64()))
+    return table.to_pandas()
+
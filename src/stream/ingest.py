@@ -0,0 +1,383 @@
+#!/usr/bin/env python3
+"""
+src/stream/ingest.py
+
+Streaming ingest: decodes CAN traffic as it arrives and appends rolling
+window aggregates of the final_signals.txt signals to Parquet.
+
+    python main.py stream --bus socketcan:can0 --bus socketcan:can1 --tail /var/log/can/can9.log
+
+- One asyncio task per source (src/stream/sources.py), so many buses are
+  served from one process; frames are decoded in blocks by the vector decoder,
+  with the DBC layouts narrowed to the selected signals
+- Every signal is read from the first DBC (by name) that defines it
+- Tumbling windows of WINDOWS_S seconds per source (src/stream/windows.py),
+  aggregated with the signal's resample policy; state is bounded per open window
+- The watermark is the newest frame time plus the wall time since it
+  arrived, minus ALLOWED_LATENESS_S: idle buses still close their windows,
+  and replayed logs use their own clock
+- Every TICK_S, closed windows are written as Parquet part files:
+
+    data/stream/source=<name>/window=<n>s/date=<YYYY-MM-DD>/part-<first window ns>.parquet
+
+  A part is visible (atomic rename) within LATENCY_TARGET_S of its window
+  closing; once a SEGMENT_S segment is complete, its parts are compacted
+  into one segment-<start ns>.parquet
+- On shutdown every open window is flushed and a report with latencies,
+  throughput and dropped-sample counters is written to data/catalog/run_reports/
+"""
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# ─── Force src/ to be discoverable ─────────────────────────────
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from src.utils.paths import DBC_DIR, STREAM_DIR, FINAL_SIGNALS_PATH
+from src.decode.dbc_registry import load_compiled
+from src.decode.mf4_reader import FrameBlock
+from src.decode.vector_decode import decode_frames_long
+from src.process.resample import load_policies
+from src.store.signal_query import narrow_layout, resolve_signals
+from src.stream.sources import BusSource, TailSource
+from src.stream.windows import StreamWindows
+from src.utils.profiling import PROFILER, profile_report, run_id, write_run_report
+
+# ─── Config ─────────────────────────────────────────────────────
+WINDOWS_S = [1, 10]
+ALLOWED_LATENESS_S = 0.05   # frames may arrive this much out of order
+TICK_S = 0.02               # how often closed windows are written
+LATENCY_TARGET_S = 0.1      # window close → part visible
+SEGMENT_S = 600             # parts of a complete segment are compacted into one file (divides a day)
+LATENCY_BIN_S = 0.001       # resolution of the latency histogram (bounded, however long the run)
+LATENCY_BINS = 1_000        # latencies beyond the last bin count in it
+
+NS = 1_000_000_000
+
+
+def load_final_signals(path: Path = FINAL_SIGNALS_PATH) -> list[str]:
+    with open(path) as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+
+
+# ─── Decoding ───────────────────────────────────────────────────
+class StreamDecoder:
+    """Decodes FrameBlocks into {signal: (time ns, values)} for a fixed signal list."""
+
+    def __init__(self, signals: list[str], buses: list[str] | None = None):
+        resolved = resolve_signals(signals, buses)
+        owner: dict[str, str] = {}
+        for bus in sorted(resolved):
+            for name in resolved[bus]:
+                owner.setdefault(name, bus)
+
+        self.layouts = {}
+        for bus in sorted(set(owner.values())):
+            names = {name for name, b in owner.items() if b == bus}
+            compiled = load_compiled(DBC_DIR / f"{bus}.dbc")
+            ids = set().union(*(resolved[bus][name] for name in names))
+            self.layouts[bus] = {fid: narrow_layout(compiled.layouts[fid], names)
+                                 for fid in ids if fid in compiled.layouts}
+        self.owner = owner   # signal → the bus it is decoded from
+        self.routed = np.array(sorted({fid for layouts in self.layouts.values() for fid in layouts}), dtype=np.int64)
+        self.signals = sorted(owner)
+
+    def decode(self, block: FrameBlock) -> dict[str, tuple[np.ndarray, np.ndarray]]:
+        keep = np.isin(block.arbitration_ids, self.routed)
+        if not keep.any():
+            return {}
+        block = block.select(keep)
+        t_ns = np.round(block.timestamps * NS).astype(np.int64)
+        out = {}
+        for layouts in self.layouts.values():
+            _, series = decode_frames_long(t_ns, block.arbitration_ids, block.payload, block.lengths, layouts)
+            for name, value in series.items():
+                out.setdefault(name, value)
+        return out
+
+
+# ─── Output ─────────────────────────────────────────────────────
+def window_dir(source: str, period_s: float, root: Path = STREAM_DIR) -> Path:
+    return root / f"source={source}" / f"window={period_s:g}s"
+
+
+def _date(start_ns: int) -> str:
+    return datetime.fromtimestamp(start_ns / NS, tz=timezone.utc).strftime("%Y-%m-%d")
+
+
+def _atomic_write(table: pa.Table, out_path: Path) -> None:
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = out_path.with_name(f".{out_path.name}.{os.getpid()}.tmp")
+    pq.write_table(table, tmp)
+    os.replace(tmp, out_path)
+
+
+def write_parts(table: pa.Table, directory: Path) -> list[int]:
+    """Writes closed windows as one part per segment; returns the segments written to."""
+    starts = table.column("time").cast(pa.int64()).to_numpy()
+    segments = starts // (SEGMENT_S * NS)
+    written = []
+    for segment in np.unique(segments).tolist():
+        rows = np.flatnonzero(segments == segment)
+        first = int(starts[rows[0]])
+        _atomic_write(table.take(rows), directory / f"date={_date(first)}" / f"part-{first}.parquet")
+        written.append(segment)
+    return written
+
+
+def compact_segment(directory: Path, segment: int) -> Path | None:
+    """Merges the parts of one complete segment into segment-<start ns>.parquet."""
+    start = segment * SEGMENT_S * NS
+    date_dir = directory / f"date={_date(start)}"
+    parts = sorted(p for p in date_dir.glob("part-*.parquet")
+                   if int(p.stem.split("-", 1)[1]) // (SEGMENT_S * NS) == segment)
+    if not parts:
+        return None
+    out_path = date_dir / f"segment-{start}.parquet"
+    tables = [pq.read_table(p) for p in parts]
+    if out_path.exists():
+        tables.insert(0, pq.read_table(out_path))
+    table = pa.concat_tables(tables)
+    table = table.take(np.argsort(table.column("time").cast(pa.int64()).to_numpy(), kind="stable"))
+    _atomic_write(table, out_path)
+    for p in parts:
+        p.unlink()
+    return out_path
+
+
+# ─── Streams ────────────────────────────────────────────────────
+def _percentile(histogram: np.ndarray, q: float) -> float | None:
+    """Upper edge of the latency bin holding the q-quantile."""
+    total = int(histogram.sum())
+    if not total:
+        return None
+    return (int(np.searchsorted(np.cumsum(histogram), q * total)) + 1) * LATENCY_BIN_S
+
+
+@dataclass
+class StreamState:
+    name: str
+    source: object
+    windows: StreamWindows
+    frames: int = 0
+    samples: int = 0
+    newest_ns: int | None = None        # newest frame time
+    arrival: float = 0.0                # wall clock (time.time) when it arrived
+    segments: dict[float, set] = field(default_factory=dict)   # window length → segments with parts
+    latencies: np.ndarray = field(default_factory=lambda: np.zeros(LATENCY_BINS, dtype=np.int64))
+    latency_max: float = 0.0
+    windows_written: int = 0
+    late_windows: int = 0
+
+    def watermark(self, now: float) -> int | None:
+        if self.newest_ns is None:
+            return None
+        return self.newest_ns + int((now - self.arrival) * NS) - int(ALLOWED_LATENESS_S * NS)
+
+    def wall_of(self, t_ns: int) -> float:
+        """Wall-clock time at which the frame clock reached t_ns (the source's clock offset applied)."""
+        return self.arrival + (t_ns - self.newest_ns) / NS
+
+
+class StreamIngest:
+    """Serves any number of sources from one event loop."""
+
+    def __init__(self, sources: list, signals: list[str] | None = None, windows_s: list[float] = WINDOWS_S,
+                 buses: list[str] | None = None, out_dir: Path = STREAM_DIR):
+        names = [source.name for source in sources]
+        if len(set(names)) != len(names):
+            raise ValueError(f"Source names must be unique: {names}")
+        self.decoder = StreamDecoder(signals if signals is not None else load_final_signals(), buses)
+        self.out_dir = Path(out_dir)
+        self.windows_s = list(windows_s)
+        by_bus = {bus: load_policies(bus) for bus in set(self.decoder.owner.values())}
+        policies = {name: by_bus[bus][name] for name, bus in self.decoder.owner.items() if name in by_bus[bus]}
+        lateness_ns = int(ALLOWED_LATENESS_S * NS)
+        self.streams = [StreamState(source.name, source,
+                                    StreamWindows(self.decoder.signals, self.windows_s, policies, lateness_ns))
+                        for source in sources]
+        self.started = None
+
+    # ─── Tasks ───
+    async def _consume(self, stream: StreamState) -> None:
+        try:
+            async for block in stream.source.blocks():
+                with PROFILER.phase("decode", rows=len(block)):
+                    series = self.decoder.decode(block)
+                    stream.samples += stream.windows.add(series)
+                stream.frames += len(block)
+                newest = int(round(float(block.timestamps.max()) * NS))
+                if stream.newest_ns is None or newest >= stream.newest_ns:
+                    stream.newest_ns, stream.arrival = newest, time.time()
+                await asyncio.sleep(0)   # let the other sources and the ticker run
+        except Exception as e:
+            # one failing bus must not stop the others
+            logging.error(f"❌ {stream.name}: source failed: {e}")
+
+    def _flush(self, stream: StreamState, tables: dict[float, pa.Table], final: bool) -> None:
+        """Writes closed windows, then compacts complete segments (runs in a worker thread)."""
+        watermark = stream.windows.watermark_ns
+        for period_s, table in tables.items():
+            directory = window_dir(stream.name, period_s, self.out_dir)
+            with PROFILER.phase("write", rows=table.num_rows, nbytes=table.nbytes):
+                stream.segments.setdefault(period_s, set()).update(write_parts(table, directory))
+
+            # window close → visible, on the source's clock
+            if stream.newest_ns is not None:
+                done = time.time()
+                ends = table.column("time").cast(pa.int64()).to_numpy() + int(period_s * NS)
+                latency = done - np.array([stream.wall_of(int(end)) for end in ends]) - ALLOWED_LATENESS_S
+                if not final:
+                    latency = np.maximum(latency, 0.0)
+                    bins = np.minimum((latency / LATENCY_BIN_S).astype(np.int64), LATENCY_BINS - 1)
+                    np.add.at(stream.latencies, bins, 1)
+                    stream.latency_max = max(stream.latency_max, float(latency.max()))
+                    stream.late_windows += int(np.count_nonzero(latency > LATENCY_TARGET_S))
+            stream.windows_written += table.num_rows
+
+        for period_s, segments in stream.segments.items():
+            complete = {s for s in segments if final or (s + 1) * SEGMENT_S * NS <= watermark}
+            for segment in sorted(complete):
+                with PROFILER.phase("compact"):
+                    compact_segment(window_dir(stream.name, period_s, self.out_dir), segment)
+            segments -= complete
+
+    async def _tick(self, stream: StreamState, final: bool = False) -> None:
+        if not final:
+            watermark = stream.watermark(time.time())
+            if watermark is None:
+                return
+            stream.windows.advance(watermark)
+        tables = stream.windows.close(final)
+        if tables or final:
+            await asyncio.to_thread(self._flush, stream, tables, final)
+
+    async def _ticker(self, stop: asyncio.Event) -> None:
+        # Stopped, not cancelled: a cancelled tick would leave its flush thread running
+        while not stop.is_set():
+            await asyncio.gather(*(self._tick(stream) for stream in self.streams))
+            try:
+                await asyncio.wait_for(stop.wait(), TICK_S)
+            except asyncio.TimeoutError:
+                pass
+
+    async def run(self, duration_s: float | None = None) -> dict:
+        """
+        Runs until every source ends, `duration_s` passes or the task is cancelled;
+        then flushes all open windows. Returns the stream report.
+        """
+        self.started = time.time()
+        PROFILER.reset()
+        consumers = [asyncio.create_task(self._consume(stream)) for stream in self.streams]
+        stop = asyncio.Event()
+        ticker = asyncio.create_task(self._ticker(stop))
+        logging.info(f"📡 Streaming {len(self.decoder.signals)} signals from "
+                     f"{', '.join(s.name for s in self.streams)} (windows {self.windows_s} s)")
+        try:
+            await asyncio.wait_for(asyncio.gather(*consumers), timeout=duration_s)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            for task in consumers:
+                task.cancel()
+            await asyncio.gather(*consumers, return_exceptions=True)
+            stop.set()
+            await asyncio.gather(ticker, return_exceptions=True)
+            for stream in self.streams:
+                await self._tick(stream)
+                await self._tick(stream, final=True)
+        return self.report()
+
+    # ─── Report ───
+    def report(self) -> dict:
+        wall = time.time() - self.started
+        streams = {}
+        for stream in self.streams:
+            streams[stream.name] = {
+                "frames": stream.frames,
+                "samples": stream.samples,
+                "frames_per_s": stream.frames / wall if wall > 0 else None,
+                "windows_written": stream.windows_written,
+                "latency_p50_s": _percentile(stream.latencies, 0.50),
+                "latency_p99_s": _percentile(stream.latencies, 0.99),
+                "latency_max_s": stream.latency_max if stream.latencies.any() else None,
+                "windows_over_target": stream.late_windows,
+            }
+        return {"wall_s": wall, "signals": len(self.decoder.signals), "windows_s": self.windows_s,
+                "latency_target_s": LATENCY_TARGET_S, "streams": streams, **profile_report(PROFILER)}
+
+
+# ─── CLI ────────────────────────────────────────────────────────
+def parse_bus(spec: str) -> BusSource:
+    """"interface:channel" (e.g. "socketcan:can0", "virtual:vcan0") → BusSource named after the channel."""
+    interface, sep, channel = spec.partition(":")
+    if not sep or not interface or not channel:
+        raise ValueError(f"--bus expects interface:channel, got {spec!r}")
+    return BusSource(channel, interface=interface, channel=channel)
+
+
+def add_stream_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--bus", action="append", default=[], metavar="INTERFACE:CHANNEL",
+                        help="python-can bus to read, e.g. socketcan:can0 (repeatable)")
+    parser.add_argument("--tail", action="append", default=[], type=Path, metavar="LOG",
+                        help="candump-format log to follow (repeatable)")
+    parser.add_argument("--from-start", action="store_true", help="read tailed logs from their start")
+    parser.add_argument("--signals", nargs="+", help=f"signals (default: {FINAL_SIGNALS_PATH.name})")
+    parser.add_argument("--buses", nargs="+", help="DBC names to decode with (default: all)")
+    parser.add_argument("--windows", nargs="+", type=float, default=WINDOWS_S, help="window lengths in seconds")
+    parser.add_argument("--duration", type=float, help="stop after this many seconds (default: run until Ctrl-C)")
+
+
+def run_stream(args: argparse.Namespace) -> dict:
+    sources = [parse_bus(spec) for spec in args.bus]
+    sources += [TailSource(path, from_start=args.from_start) for path in args.tail]
+    if not sources:
+        raise ValueError("Nothing to stream: give --bus and/or --tail")
+    if any(w <= 0 for w in args.windows):
+        raise ValueError("--windows must be positive")
+
+    ingest = StreamIngest(sources, args.signals, args.windows, args.buses)
+    try:
+        report = asyncio.run(ingest.run(args.duration))
+    except KeyboardInterrupt:
+        report = ingest.report()
+
+    for name, stats in report["streams"].items():
+        p99 = stats["latency_p99_s"]
+        logging.info(f"📊 {name}: {stats['frames']} frames, {stats['windows_written']} windows, "
+                     f"p99 latency {p99 * 1000:.0f} ms" if p99 is not None else
+                     f"📊 {name}: {stats['frames']} frames, {stats['windows_written']} windows")
+        if stats["windows_over_target"]:
+            logging.warning(f"⚠️ {name}: {stats['windows_over_target']} windows written later than "
+                            f"{LATENCY_TARGET_S * 1000:.0f} ms")
+    path = write_run_report(report, f"stream-{run_id()}")
+    logging.info(f"📊 Stream report: {path}")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream CAN traffic into rolling window aggregates")
+    add_stream_arguments(parser)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s — %(levelname)s — %(message)s")
+    try:
+        run_stream(args)
+    except ValueError as e:
+        parser.error(str(e))
+
+
+if __name__ == "__main__":
+    main()
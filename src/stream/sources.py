@@ -0,0 +1,153 @@
+# src/stream/sources.py
+
+"""
+Live frame sources for the streaming ingest.
+
+A source is an async iterator of FrameBlocks (src/decode/mf4_reader.py), so
+the decoders see the same arrays as in the batch pipeline:
+
+- BusSource: a python-can bus (socketcan, virtual, ...) via a Notifier on the
+  running event loop; frames that arrived together are batched, up to
+  BATCH_FRAMES per block
+- TailSource: follows a candump-format log file (`(ts) can0 123#DEADBEEF`,
+  as written by `candump -L` and can.CanutilsLogWriter) like `tail -F`:
+  complete lines are parsed as they are appended, truncation and
+  replacement (log rotation) reopen the file from the start
+
+Error and remote frames carry no signals and are skipped.
+"""
+
+import io
+import os
+import asyncio
+from pathlib import Path
+
+import numpy as np
+import can
+
+from src.decode.mf4_reader import FrameBlock
+from src.decode.vector_decode import frames_to_payload
+from src.utils.profiling import PROFILER
+
+BATCH_FRAMES = 4_096        # frames per block at most
+POLL_S = 0.01               # TailSource: wait between reads at end of file
+
+
+def frames_from_messages(messages: list[can.Message]) -> FrameBlock:
+    """Packs data frames into a FrameBlock; error / remote frames are dropped."""
+    data = [m for m in messages if not m.is_error_frame and not m.is_remote_frame]
+    payload, lengths = frames_to_payload([bytes(m.data) for m in data])
+    return FrameBlock(
+        timestamps=np.fromiter((m.timestamp for m in data), dtype=np.float64, count=len(data)),
+        arbitration_ids=np.fromiter((m.arbitration_id for m in data), dtype=np.int64, count=len(data)),
+        dlcs=np.fromiter((m.dlc for m in data), dtype=np.int64, count=len(data)),
+        lengths=lengths,
+        channels=np.zeros(len(data), dtype=np.int64),
+        payload=payload,
+    )
+
+
+class BusSource:
+    """
+    Frames from a python-can bus. Pass either the Bus arguments
+    (interface="socketcan", channel="can0", ...) or an open `bus`, which is
+    then left open.
+    """
+
+    def __init__(self, name: str, bus: can.BusABC | None = None, **bus_kwargs):
+        self.name = name
+        self.bus = bus
+        self.bus_kwargs = bus_kwargs
+
+    async def blocks(self):
+        bus = self.bus if self.bus is not None else can.Bus(**self.bus_kwargs)
+        reader = can.AsyncBufferedReader()
+        notifier = can.Notifier(bus, [reader], timeout=0.1, loop=asyncio.get_running_loop())
+        try:
+            while True:
+                batch = [await reader.get_message()]
+                while len(batch) < BATCH_FRAMES and not reader.buffer.empty():
+                    batch.append(reader.buffer.get_nowait())
+                block = frames_from_messages(batch)
+                if len(block):
+                    yield block
+        finally:
+            notifier.stop()
+            if self.bus is None:
+                bus.shutdown()
+
+
+class TailSource:
+    """
+    Frames appended to a candump-format log. With from_start, lines already
+    in the file are read first; with follow=False the source ends at end of file.
+    """
+
+    def __init__(self, path: Path, name: str | None = None, from_start: bool = False, follow: bool = True):
+        self.path = Path(path)
+        self.name = name or self.path.stem
+        self.from_start = from_start
+        self.follow = follow
+
+    def _parse(self, lines: list[str]) -> FrameBlock:
+        try:
+            return frames_from_messages(list(can.CanutilsLogReader(io.StringIO("".join(lines)))))
+        except (ValueError, IndexError):
+            pass
+        # Some line is malformed: parse one by one and skip the bad ones
+        messages = []
+        for line in lines:
+            try:
+                messages += list(can.CanutilsLogReader(io.StringIO(line)))
+            except (ValueError, IndexError):
+                PROFILER.count("stream_dropped", "bad_lines")
+        return frames_from_messages(messages)
+
+    async def blocks(self):
+        f, inode, pending = None, None, b""
+        try:
+            while True:
+                if f is None:
+                    try:
+                        f = open(self.path, "rb")
+                    except FileNotFoundError:
+                        if not self.follow:
+                            return
+                        self.from_start = True   # whatever the file gets once created is new
+                        await asyncio.sleep(POLL_S)
+                        continue
+                    inode = os.fstat(f.fileno()).st_ino
+                    if not self.from_start:
+                        f.seek(0, os.SEEK_END)
+                    self.from_start = True   # a reopened (rotated) file is read from its start
+
+                chunk = f.read(1 << 20)
+                if chunk:
+                    lines = (pending + chunk).split(b"\n")
+                    pending = lines.pop()     # an unfinished last line waits for its newline
+                    lines = [line.decode("ascii", "replace") + "\n" for line in lines if line.strip()]
+                    for i in range(0, len(lines), BATCH_FRAMES):
+                        block = self._parse(lines[i:i + BATCH_FRAMES])
+                        if len(block):
+                            yield block
+                    continue
+
+                if not self.follow:
+                    if pending.strip():
+                        block = self._parse([pending.decode("ascii", "replace") + "\n"])
+                        if len(block):
+                            yield block
+                    return
+                try:
+                    stat = os.stat(self.path)
+                    rotated = stat.st_ino != inode or stat.st_size < f.tell()
+                except FileNotFoundError:
+                    rotated = False   # wait for the replacement to appear
+                if rotated:
+                    f.close()
+                    f, pending = None, b""
+                    continue
+                await asyncio.sleep(POLL_S)
+        finally:
+            if f is not None:
+                f.close()
@@ -0,0 +1,246 @@
+# src/stream/windows.py
+
+"""
+Bounded tumbling-window aggregation for the streaming ingest.
+
+A StreamWindows keeps, per window length, one accumulator per open window:
+fixed-size arrays over the signal list (count, sum, min, max, first / last
+value and time, counter increments), so state grows with the number of open
+windows and signals, never with the frame rate. Windows are aligned to
+multiples of their length since the epoch, like the downsample grid.
+
+Samples arrive in batches of (signal index, time ns, value). Each window
+emits one value per signal with the signal's resample policy
+(src/process/resample.py): mean, min, max, first, last, mode or the wrapped
+counter delta. A window is emitted once the watermark passes its end;
+samples older than the watermark are late and dropped, so every window
+length sees the same samples.
+"""
+
+import numpy as np
+import pyarrow as pa
+
+from src.utils.profiling import PROFILER
+
+MAX_MODE_VALUES = 64        # distinct values tracked per (window, signal) for the mode policy
+MAX_OPEN_WINDOWS = 1_024    # per window length; samples that would open more are dropped
+
+_INT_MIN, _INT_MAX = np.iinfo(np.int64).min, np.iinfo(np.int64).max
+
+
+class _Window:
+    """Accumulators of one window over all signals."""
+    __slots__ = ("count", "sum", "min", "max", "first", "first_t", "last", "last_t", "delta", "modes")
+
+    def __init__(self, n: int):
+        self.count = np.zeros(n, dtype=np.int64)
+        self.sum = np.zeros(n)
+        self.min = np.full(n, np.inf)
+        self.max = np.full(n, -np.inf)
+        self.first = np.full(n, np.nan)
+        self.first_t = np.full(n, _INT_MAX, dtype=np.int64)
+        self.last = np.full(n, np.nan)
+        self.last_t = np.full(n, _INT_MIN, dtype=np.int64)
+        self.delta = np.zeros(n)
+        self.modes: dict[int, dict[float, int]] = {}
+
+
+class WindowAggregator:
+    """Tumbling windows of one length."""
+
+    def __init__(self, period_ns: int, policies: list[str], mode_signals: np.ndarray):
+        self.period_ns = period_ns
+        self.policies = policies
+        self.mode_signals = mode_signals
+        self.windows: dict[int, _Window] = {}
+
+    def add(self, sig: np.ndarray, t: np.ndarray, values: np.ndarray, steps: np.ndarray) -> None:
+        """Folds one batch of samples into the open windows."""
+        n_signals = len(self.policies)
+        win = t // self.period_ns
+
+        known = np.isin(win, list(self.windows)) if self.windows else np.zeros(len(win), dtype=bool)
+        new = np.unique(win[~known])
+        room = MAX_OPEN_WINDOWS - len(self.windows)
+        if len(new) > room:
+            rejected = new[max(room, 0):]
+            drop = np.isin(win, rejected)
+            PROFILER.count("stream_dropped", "too_many_windows", int(drop.sum()))
+            keep = ~drop
+            sig, t, values, steps, win = sig[keep], t[keep], values[keep], steps[keep], win[keep]
+            new = new[:max(room, 0)]
+        for w in new.tolist():
+            self.windows[w] = _Window(n_signals)
+        if not len(t):
+            return
+
+        order = np.lexsort((t, sig, win))
+        sig, t, values, steps, win = sig[order], t[order], values[order], steps[order], win[order]
+        starts = np.flatnonzero(np.r_[True, (win[1:] != win[:-1]) | (sig[1:] != sig[:-1])])
+        ends = np.r_[starts[1:], len(t)] - 1
+
+        g_win, g_sig = win[starts], sig[starts]
+        g_count = np.diff(np.r_[starts, len(t)])
+        g_sum = np.add.reduceat(values, starts)
+        g_min = np.minimum.reduceat(values, starts)
+        g_max = np.maximum.reduceat(values, starts)
+        g_delta = np.add.reduceat(steps, starts)
+
+        for w in np.unique(g_win).tolist():
+            state = self.windows[w]
+            sel = np.flatnonzero(g_win == w)
+            s = g_sig[sel]
+            state.count[s] += g_count[sel]
+            state.sum[s] += g_sum[sel]
+            state.min[s] = np.minimum(state.min[s], g_min[sel])
+            state.max[s] = np.maximum(state.max[s], g_max[sel])
+            state.delta[s] += g_delta[sel]
+
+            first_i, last_i = starts[sel], ends[sel]
+            earlier = t[first_i] < state.first_t[s]
+            state.first_t[s[earlier]] = t[first_i[earlier]]
+            state.first[s[earlier]] = values[first_i[earlier]]
+            later = t[last_i] >= state.last_t[s]
+            state.last_t[s[later]] = t[last_i[later]]
+            state.last[s[later]] = values[last_i[later]]
+
+        if len(self.mode_signals):
+            self._add_modes(sig, values, win)
+
+    def _add_modes(self, sig: np.ndarray, values: np.ndarray, win: np.ndarray) -> None:
+        rows = np.flatnonzero(np.isin(sig, self.mode_signals))
+        if not len(rows):
+            return
+        keys = np.stack([win[rows], sig[rows]], axis=1)
+        (pairs, inverse) = np.unique(np.c_[keys, values[rows].view(np.int64)], axis=0, return_inverse=True)
+        counts = np.bincount(inverse.ravel())
+        for (w, s, bits), n in zip(pairs.tolist(), counts.tolist()):
+            modes = self.windows[w].modes.setdefault(s, {})
+            value = float(np.int64(bits).view(np.float64))
+            if value in modes or len(modes) < MAX_MODE_VALUES:
+                modes[value] = modes.get(value, 0) + n
+            else:
+                PROFILER.count("stream_dropped", "mode_values", n)
+
+    def _values(self, state: _Window) -> list[np.ndarray]:
+        """One value per signal of a closed window."""
+        out = []
+        empty = state.count == 0
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = state.sum / state.count
+        for i, policy in enumerate(self.policies):
+            if empty[i]:
+                out.append(np.nan)
+            elif policy == "mean":
+                out.append(mean[i])
+            elif policy == "min":
+                out.append(state.min[i])
+            elif policy == "max":
+                out.append(state.max[i])
+            elif policy == "first":
+                out.append(state.first[i])
+            elif policy == "delta":
+                out.append(state.delta[i])
+            elif policy == "mode":
+                modes = state.modes.get(i)
+                # most frequent, smallest value on ties (as in resample._mode)
+                out.append(min(modes.items(), key=lambda kv: (-kv[1], kv[0]))[0] if modes else state.last[i])
+            else:
+                out.append(state.last[i])
+        return out
+
+    def close(self, watermark_ns: int | None) -> list[tuple[int, list]]:
+        """Pops every window ending at or before the watermark (all if None): [(start ns, values)]."""
+        done = sorted(w for w in self.windows
+                      if watermark_ns is None or (w + 1) * self.period_ns <= watermark_ns)
+        return [(w * self.period_ns, self._values(self.windows.pop(w))) for w in done]
+
+
+class StreamWindows:
+    """
+    Every window length of one stream over a fixed signal list, plus the
+    state shared by all of them: the watermark and the last value of each
+    counter (for the wrapped delta across batches and windows).
+    """
+
+    def __init__(self, signals: list[str], periods_s: list[float],
+                 policies: dict[str, tuple[str, int | None]], lateness_ns: int):
+        self.signals = list(signals)
+        self.index = {name: i for i, name in enumerate(self.signals)}
+        resolved = [policies.get(name, ("mean", None)) for name in self.signals]
+        self.policies = [policy for policy, _ in resolved]
+        self.moduli = np.array([modulus or 0 for _, modulus in resolved], dtype=np.float64)
+        self.is_delta = np.array([policy == "delta" for policy in self.policies])
+        self.prev = np.full(len(self.signals), np.nan)
+        self.prev_t = np.full(len(self.signals), _INT_MIN, dtype=np.int64)
+        mode_signals = np.flatnonzero([policy == "mode" for policy in self.policies])
+        self.aggregators = {p: WindowAggregator(int(round(p * 1e9)), self.policies, mode_signals)
+                            for p in periods_s}
+        self.lateness_ns = lateness_ns
+        self.watermark_ns = _INT_MIN
+        self.schema = pa.schema([("time", pa.timestamp("ns", tz="UTC"))] +
+                                [(name, pa.float64()) for name in self.signals])
+
+    @property
+    def open_windows(self) -> int:
+        return sum(len(a.windows) for a in self.aggregators.values())
+
+    def _steps(self, sig: np.ndarray, t: np.ndarray, values: np.ndarray) -> np.ndarray:
+        """Counter increments (modulo 2**bits) of the delta signals, 0 for every other sample."""
+        steps = np.zeros(len(values))
+        rows = np.flatnonzero(self.is_delta[sig])
+        if not len(rows):
+            return steps
+        rows = rows[np.lexsort((t[rows], sig[rows]))]
+        s, v = sig[rows], values[rows]
+        starts = np.r_[True, s[1:] != s[:-1]]
+        previous = np.where(starts, self.prev[s], np.r_[np.nan, v[:-1]])
+        steps[rows] = np.where(np.isnan(previous), 0.0, np.mod(v - previous, self.moduli[s]))
+
+        ends = np.flatnonzero(np.r_[s[1:] != s[:-1], True])
+        newer = t[rows[ends]] >= self.prev_t[s[ends]]
+        self.prev[s[ends][newer]] = v[ends][newer]
+        self.prev_t[s[ends][newer]] = t[rows[ends]][newer]
+        return steps
+
+    def add(self, series: dict[str, tuple[np.ndarray, np.ndarray]]) -> int:
+        """
+        Folds decoded {signal: (time ns, values)} into every window length.
+        Returns the number of samples accepted (late ones are dropped).
+        """
+        parts = [(self.index[name], t, v) for name, (t, v) in series.items() if name in self.index and len(t)]
+        if not parts:
+            return 0
+        sig = np.concatenate([np.full(len(t), i, dtype=np.int64) for i, t, _ in parts])
+        t = np.concatenate([t for _, t, _ in parts]).astype(np.int64)
+        values = np.concatenate([v for _, _, v in parts]).astype(np.float64)
+
+        keep = ~np.isnan(values) & (t >= self.watermark_ns)
+        late = int(np.count_nonzero(~np.isnan(values) & ~keep))
+        if late:
+            PROFILER.count("stream_dropped", "late", late)
+        sig, t, values = sig[keep], t[keep], values[keep]
+        if not len(t):
+            return 0
+
+        steps = self._steps(sig, t, values)
+        for aggregator in self.aggregators.values():
+            aggregator.add(sig, t, values, steps)
+        return len(t)
+
+    def advance(self, watermark_ns: int) -> None:
+        self.watermark_ns = max(self.watermark_ns, watermark_ns)
+
+    def close(self, final: bool = False) -> dict[float, pa.Table]:
+        """{window length s: table of the windows closed by the watermark} (all windows if final)."""
+        out = {}
+        for period_s, aggregator in self.aggregators.items():
+            rows = aggregator.close(None if final else self.watermark_ns)
+            if not rows:
+                continue
+            columns = [pa.array(np.array([start for start, _ in rows], dtype="datetime64[ns]"),
+                                type=pa.timestamp("ns", tz="UTC"))]
+            values = np.array([v for _, v in rows], dtype=np.float64).reshape(len(rows), len(self.signals))
+            columns += [pa.array(values[:, i], from_pandas=True) for i in range(len(self.signals))]
+            out[period_s] = pa.Table.from_arrays(columns, schema=self.schema)
+        return out
@@ -0,0 +1,143 @@
+# src/utils/manifest.py
+
+"""
+Content-hash manifest for incremental pipeline runs.
+
+Every stage records, per unit of work (one MF4 × DBC, one decoded file, ...):
+  - the SHA-256 of each input file
+  - the stage parameters that shape the output (TARGET_HZ, MAX_NULL_FRAC, ...)
+  - the outputs it produced, with their hashes
+
+On the next run a unit is skipped when inputs, params and outputs all still
+match. File hashes are memoized by (size, mtime_ns) so unchanged multi-GB
+logs are not re-read just to prove they did not change. Directory outputs
+(long-layout decoded data) hash as the sorted list of their files.
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+
+from src.utils.paths import PROJECT_ROOT, MANIFEST_PATH
+
+HASH_CHUNK = 8 * 1024 * 1024
+
+
+def sha256_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(HASH_CHUNK):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _dir_files(path: Path) -> list[Path]:
+    return sorted(p for p in Path(path).rglob("*") if p.is_file())
+
+
+def sha256_path(path: Path) -> str:
+    """sha256_file, extended to directories as the hash of (relative name, file hash) pairs."""
+    if not Path(path).is_dir():
+        return sha256_file(path)
+    digest = hashlib.sha256()
+    for file in _dir_files(path):
+        digest.update(f"{file.relative_to(path).as_posix()}\0{sha256_file(file)}\n".encode())
+    return digest.hexdigest()
+
+
+def _stat(path: Path) -> tuple[int, int]:
+    """(size, mtime_ns); for directories the total size and the newest mtime."""
+    if not Path(path).is_dir():
+        stat = os.stat(path)
+        return stat.st_size, stat.st_mtime_ns
+    stats = [os.stat(p) for p in [path, *_dir_files(path)]]
+    return sum(st.st_size for st in stats[1:]), max(st.st_mtime_ns for st in stats)
+
+
+def _key(path: Path) -> str:
+    """Project-relative POSIX path, so the manifest survives checkout moves."""
+    path = Path(path).resolve()
+    try:
+        return path.relative_to(PROJECT_ROOT).as_posix()
+    except ValueError:
+        return path.as_posix()
+
+
+class Manifest:
+    """
+    JSON manifest at data/catalog/pipeline_manifest.json:
+    {
+      "files":  {path: {"size", "mtime_ns", "sha256"}},
+      "stages": {stage: {unit: {"inputs": {path: sha}, "params": {...}, "outputs": {path: sha}}}}
+    }
+    """
+
+    def __init__(self, path: Path = MANIFEST_PATH):
+        self.path = Path(path)
+        self.data = {"files": {}, "stages": {}}
+        if self.path.exists():
+            try:
+                with open(self.path) as f:
+                    self.data = json.load(f)
+            except (OSError, json.JSONDecodeError):
+                pass  # corrupt manifest → rebuild everything
+        self.data.setdefault("files", {})
+        self.data.setdefault("stages", {})
+
+    # ─── Hashing ───
+    def hash(self, path: Path) -> str:
+        size, mtime_ns = _stat(path)
+        key = _key(path)
+        cached = self.data["files"].get(key)
+        if cached and cached["size"] == size and cached["mtime_ns"] == mtime_ns:
+            return cached["sha256"]
+
+        digest = sha256_path(path)
+        self.data["files"][key] = {"size": size, "mtime_ns": mtime_ns, "sha256": digest}
+        return digest
+
+    def _hashes(self, paths) -> dict[str, str]:
+        return {_key(p): self.hash(p) for p in paths}
+
+    # ─── Freshness ───
+    def is_fresh(self, stage: str, unit: str, inputs, params: dict) -> bool:
+        """
+        True when `unit` of `stage` was built from identical inputs and params
+        and all of its recorded outputs are still on disk, unchanged.
+        """
+        entry = self.data["stages"].get(stage, {}).get(unit)
+        if entry is None or entry["params"] != _jsonable(params):
+            return False
+
+        try:
+            if entry["inputs"] != self._hashes(inputs):
+                return False
+            for out_key, digest in entry["outputs"].items():
+                out_path = PROJECT_ROOT / out_key
+                if not out_path.exists() or self.hash(out_path) != digest:
+                    return False
+        except FileNotFoundError:
+            return False
+        return True
+
+    def record(self, stage: str, unit: str, inputs, params: dict, outputs) -> None:
+        """Stores a completed unit; outputs that were not produced are left out."""
+        self.data["stages"].setdefault(stage, {})[unit] = {
+            "inputs": self._hashes(inputs),
+            "params": _jsonable(params),
+            "outputs": self._hashes([p for p in outputs if Path(p).exists()]),
+        }
+
+    def save(self) -> None:
+        """Atomically rewrites the manifest file."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(f".{self.path.name}.{os.getpid()}.tmp")
+        with open(tmp, "w") as f:
+            json.dump(self.data, f, indent=2, sort_keys=True)
+        os.replace(tmp, self.path)
+
+
+def _jsonable(params: dict) -> dict:
+    """Round-trips params through JSON so comparisons match what is stored."""
+    return json.loads(json.dumps(params, sort_keys=True, default=str))
@@ -1,20 +1,38 @@
 # src/utils/paths.py
 
+import os
 from pathlib import Path
 
 PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
 
-DATA_DIR            = PROJECT_ROOT / "data"
+# FSD_DATA_DIR points a run at another data tree (the benchmark suite uses scratch trees)
+DATA_DIR            = Path(os.environ.get("FSD_DATA_DIR") or PROJECT_ROOT / "data").resolve()
 RAW_DIR             = DATA_DIR / "raw"
 DECODED_DIR         = DATA_DIR / "decoded"
 DOWNSAMPLED_DIR       = DATA_DIR / "downsampled"
 PROCESSED_DIR       = DATA_DIR / "processed"
 MERGED_DIR          = DATA_DIR / "merged"
 CATALOG_DIR         = DATA_DIR / "catalog"
+PYRAMID_DIR         = DATA_DIR / "pyramid"
+ALIGNED_DIR         = DATA_DIR / "aligned"
+BENCHMARK_DIR       = DATA_DIR / "benchmark"
+STREAM_DIR          = DATA_DIR / "stream"
+EVENTS_DIR          = DATA_DIR / "events"
+METRICS_DIR         = DATA_DIR / "metrics"
 
 CONFIG_DIR     = PROJECT_ROOT / "config"
 DBC_DIR        = CONFIG_DIR / "dbc"
 REGISTRY_DIR   = CONFIG_DIR / "registry"
+COMPILED_DBC_DIR = REGISTRY_DIR / "compiled"
+BENCHMARK_BASELINE_PATH = CONFIG_DIR / "benchmark" / "baseline.json"
+EVENT_DETECTORS_PATH = CONFIG_DIR / "events" / "detectors.json"
 
 ENUM_MAPS_PATH = REGISTRY_DIR / "enum_maps.json"
-DBC_METADATA_PATH = REGISTRY_DIR / "dbc_signals_metadata.csv"
\ No newline at end of file
+DBC_METADATA_PATH = REGISTRY_DIR / "dbc_signals_metadata.csv"
+MANIFEST_PATH = CATALOG_DIR / "pipeline_manifest.json"
+FOOTER_INDEX_PATH = CATALOG_DIR / "footer_index.json"
+QUERY_CACHE_DIR = CATALOG_DIR / "query_cache"
+IPC_CACHE_DIR = CATALOG_DIR / "ipc_cache"
+RUN_REPORT_DIR = CATALOG_DIR / "run_reports"
+FINAL_SIGNALS_PATH = CATALOG_DIR / "final_signals.txt"
+EVENT_INDEX_PATH = CATALOG_DIR / "event_index.parquet"
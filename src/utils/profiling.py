@@ -0,0 +1,249 @@
+# src/utils/profiling.py
+
+"""
+Built-in instrumentation for the pipeline stages.
+
+Hot paths mark their phases on the per-process PROFILER:
+
+    with PROFILER.phase("decode") as span:
+        table = decode_frames(...)
+        span.rows += table.num_rows
+    PROFILER.count("dropped_frames", "0x118")
+
+Per phase it accumulates calls, wall and CPU seconds, rows and bytes, from
+which the run report derives rows/s and MB/s. Counters hold per-key event
+counts (frames dropped per arbitration ID, ...).
+
+The runner takes one snapshot per unit in the worker that ran it and merges
+them per stage with the unit's wall / CPU time and the worker's peak RSS
+while the unit ran (the largest over the stage's units) into
+data/catalog/run_reports/<run>.json. With profiling on, every unit also runs
+under cProfile and the dumps are merged into one pstats file per stage
+(<run>/<stage>.prof: snakeviz, `python -m pstats`, ...).
+"""
+
+import cProfile
+import json
+import os
+import pstats
+import sys
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, asdict
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # not on Windows
+    resource = None
+
+from src.utils.paths import RUN_REPORT_DIR
+
+REPORT_VERSION = 1
+
+
+# ─── Phases & Counters ──────────────────────────────────────────
+@dataclass
+class PhaseStats:
+    calls: int = 0
+    wall_s: float = 0.0
+    cpu_s: float = 0.0
+    rows: int = 0
+    bytes: int = 0
+
+    def merge(self, other: "PhaseStats") -> None:
+        self.calls += other.calls
+        self.wall_s += other.wall_s
+        self.cpu_s += other.cpu_s
+        self.rows += other.rows
+        self.bytes += other.bytes
+
+    def to_dict(self) -> dict:
+        out = asdict(self)
+        out["rows_per_s"] = self.rows / self.wall_s if self.wall_s > 0 else None
+        out["mb_per_s"] = self.bytes / 1e6 / self.wall_s if self.wall_s > 0 else None
+        return out
+
+
+class Span:
+    """Rows / bytes a phase handled; set inside the `with` block."""
+    __slots__ = ("rows", "bytes")
+
+    def __init__(self, rows: int = 0, nbytes: int = 0):
+        self.rows = rows
+        self.bytes = nbytes
+
+
+class Profiler:
+    def __init__(self):
+        self.phases: dict[str, PhaseStats] = {}
+        self.counters: dict[str, dict[str, int]] = {}
+
+    @contextmanager
+    def phase(self, name: str, rows: int = 0, nbytes: int = 0):
+        span = Span(rows, nbytes)
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield span
+        finally:
+            self.add(name, time.perf_counter() - wall, time.process_time() - cpu, span.rows, span.bytes)
+
+    def add(self, name: str, wall_s: float, cpu_s: float | None = None, rows: int = 0, nbytes: int = 0,
+            calls: int = 1) -> None:
+        """Records time measured elsewhere (cpu_s defaults to wall_s, for single-threaded Python loops)."""
+        stats = self.phases.setdefault(name, PhaseStats())
+        stats.merge(PhaseStats(calls, wall_s, wall_s if cpu_s is None else cpu_s, int(rows), int(nbytes)))
+
+    def iter_phase(self, name: str, iterable, rows=None, nbytes=None):
+        """Yields from `iterable`, timing every step as `name`; rows / nbytes map an item to its size."""
+        iterator = iter(iterable)
+        while True:
+            wall, cpu = time.perf_counter(), time.process_time()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            self.add(name, time.perf_counter() - wall, time.process_time() - cpu,
+                     rows(item) if rows else 0, nbytes(item) if nbytes else 0)
+            yield item
+
+    def count(self, counter: str, key: str, n: int = 1) -> None:
+        keys = self.counters.setdefault(counter, {})
+        keys[key] = keys.get(key, 0) + int(n)
+
+    # ─── Snapshots ───
+    def snapshot(self) -> dict:
+        return {
+            "phases": {name: asdict(stats) for name, stats in self.phases.items()},
+            "counters": {name: dict(keys) for name, keys in self.counters.items()},
+        }
+
+    def reset(self) -> None:
+        self.phases = {}
+        self.counters = {}
+
+    def take(self) -> dict:
+        """Snapshot, then reset: what happened since the last take()."""
+        snapshot = self.snapshot()
+        self.reset()
+        return snapshot
+
+    def merge(self, snapshot: dict) -> None:
+        for name, stats in snapshot["phases"].items():
+            self.phases.setdefault(name, PhaseStats()).merge(PhaseStats(**stats))
+        for name, keys in snapshot["counters"].items():
+            for key, n in keys.items():
+                self.count(name, key, n)
+
+
+PROFILER = Profiler()
+
+
+def peak_rss_bytes() -> int | None:
+    """Peak resident set size over the lifetime of this process."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024  # KiB on Linux
+
+
+def reset_peak_rss() -> bool:
+    """
+    Restarts the kernel's peak RSS mark (VmHWM) at the current RSS, so
+    window_peak_rss_bytes() covers only what runs next. Linux only; False
+    where it is not supported.
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def window_peak_rss_bytes() -> int | None:
+    """Peak RSS since the last reset_peak_rss() (VmHWM), None without /proc."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+# ─── Units ──────────────────────────────────────────────────────
+_PROFILED_UNITS = 0
+
+
+def run_profiled(func, args: tuple, profile_dir: Path | None = None) -> tuple[object, dict]:
+    """
+    Runs func(*args) on a clean PROFILER and returns (result, unit report):
+    wall / CPU seconds, the worker's peak RSS while the unit ran (None where
+    the peak cannot be reset, see reset_peak_rss) and the phases and
+    counters it recorded.
+    With profile_dir, the call also runs under cProfile, dumped to a unique file there.
+    """
+    global _PROFILED_UNITS
+    PROFILER.reset()
+    profiler = None
+    if profile_dir is not None:
+        profiler = cProfile.Profile()
+    rss_reset = reset_peak_rss()
+    wall, cpu = time.perf_counter(), time.process_time()
+    try:
+        if profiler is not None:
+            profiler.enable()
+        result = func(*args)
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            _PROFILED_UNITS += 1
+            Path(profile_dir).mkdir(parents=True, exist_ok=True)
+            profiler.dump_stats(Path(profile_dir) / f"{os.getpid()}-{_PROFILED_UNITS}.prof")
+    unit = {
+        "wall_s": time.perf_counter() - wall,
+        "cpu_s": time.process_time() - cpu,
+        "peak_rss_bytes": window_peak_rss_bytes() if rss_reset else None,
+        **PROFILER.take(),
+    }
+    return result, unit
+
+
+def merge_profiles(unit_dir: Path, out_path: Path) -> Path | None:
+    """Merges the per-unit cProfile dumps of one stage into a single pstats file."""
+    files = sorted(Path(unit_dir).glob("*.prof"))
+    if not files:
+        return None
+    stats = pstats.Stats(*map(str, files))
+    stats.dump_stats(out_path)
+    for file in files:
+        file.unlink()
+    Path(unit_dir).rmdir()
+    return out_path
+
+
+# ─── Run Reports ────────────────────────────────────────────────
+def profile_report(profile: Profiler) -> dict:
+    """Phases with throughput, and counters with the largest counts first."""
+    return {
+        "phases": {name: stats.to_dict() for name, stats in sorted(profile.phases.items())},
+        "counters": {name: dict(sorted(keys.items(), key=lambda kv: -kv[1]))
+                     for name, keys in sorted(profile.counters.items())},
+    }
+
+
+def run_id() -> str:
+    return time.strftime("%Y%m%d-%H%M%S")
+
+
+def write_run_report(report: dict, name: str, out_dir: Path = RUN_REPORT_DIR) -> Path:
+    """Atomically writes <out_dir>/<name>.json."""
+    out_dir.mkdir(parents=True, exist_ok=True)
+    out_path = out_dir / f"{name}.json"
+    tmp = out_path.with_name(f".{out_path.name}.{os.getpid()}.tmp")
+    with open(tmp, "w") as f:
+        json.dump({"version": REPORT_VERSION, **report}, f, indent=2)
+    os.replace(tmp, out_path)
+    return out_path
@@ -0,0 +1,290 @@
+# src/utils/signal_stats.py
+
+"""
+Single-pass, mergeable signal-quality statistics.
+
+Parquet files are read in record batches; every batch updates one partial
+per column, and columns are processed in parallel threads (the heavy work is
+NumPy / pandas hashing, which releases the GIL).
+
+Per column:
+  - rows, nulls (NaN counts as null, like pandas)      exact
+  - min, max, mean (numeric columns)                   exact
+  - distinct values                                    exact up to EXACT_DISTINCT,
+                                                       HyperLogLog beyond
+  - quantiles (numeric columns)                        t-digest
+
+Every partial merges with another one of the same column, so per-file or
+per-drive results combine into fleet-wide statistics without re-reading data:
+
+    stats = scan_parquet(path_a)
+    stats.merge(scan_parquet(path_b))
+    report = stats.to_frame()
+"""
+
+import math
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# ─── Config ─────────────────────────────────────────────────────
+BATCH_ROWS = 65_536
+EXACT_DISTINCT = 4_096       # distinct values tracked exactly before switching to HLL
+HLL_PRECISION = 12           # 4096 registers, ~1.6% standard error
+TDIGEST_DELTA = 200          # compression, ~delta/2 centroids
+QUANTILES = (0.05, 0.5, 0.95)
+
+
+# ─── Sketches ───────────────────────────────────────────────────
+def _bit_length(x: np.ndarray) -> np.ndarray:
+    """Exact bit length of every uint64 (float log2 is off near powers of two)."""
+    x = x.copy()
+    n = np.zeros(len(x), dtype=np.int64)
+    for shift in (32, 16, 8, 4, 2, 1):
+        big = x >= np.uint64(1 << shift)
+        n += big * shift
+        x = np.where(big, x >> np.uint64(shift), x)
+    return n + (x > 0)
+
+
+class HyperLogLog:
+    def __init__(self, precision: int = HLL_PRECISION):
+        self.p = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def add(self, hashes: np.ndarray) -> None:
+        if not len(hashes):
+            return
+        index = (hashes >> np.uint64(64 - self.p)).astype(np.int64)
+        rest = hashes << np.uint64(self.p)
+        rank = np.where(rest == 0, 64 - self.p + 1, 64 - _bit_length(rest) + 1).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def merge(self, other: "HyperLogLog") -> None:
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def estimate(self) -> float:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * m and zeros:
+            return m * math.log(m / zeros)  # linear counting for small cardinalities
+        return float(raw)
+
+
+class TDigest:
+    """Merging t-digest with the arcsine scale function (k1)."""
+
+    def __init__(self, delta: int = TDIGEST_DELTA):
+        self.delta = delta
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+
+    def add(self, values: np.ndarray, weights: np.ndarray | None = None) -> None:
+        if not len(values):
+            return
+        if weights is None:
+            weights = np.ones(len(values))
+        means = np.concatenate([self.means, values])
+        weights = np.concatenate([self.weights, weights])
+        order = np.argsort(means, kind="stable")
+        means, weights = means[order], weights[order]
+
+        q = (np.cumsum(weights) - weights / 2) / weights.sum()
+        k = np.floor(self.delta / (2 * np.pi) * np.arcsin(2 * q - 1))
+        starts = np.flatnonzero(np.r_[True, k[1:] != k[:-1]])
+        self.weights = np.add.reduceat(weights, starts)
+        self.means = np.add.reduceat(means * weights, starts) / self.weights
+
+    def merge(self, other: "TDigest") -> None:
+        self.add(other.means, other.weights)
+
+    def quantile(self, q: float, lo: float, hi: float) -> float:
+        if not len(self.means):
+            return np.nan
+        mid = (np.cumsum(self.weights) - self.weights / 2) / self.weights.sum()
+        return float(np.interp(q, np.r_[0.0, mid, 1.0], np.r_[lo, self.means, hi]))
+
+
+# ─── Column Partials ────────────────────────────────────────────
+def _pandas_dtype(arrow_type: pa.DataType) -> str:
+    """dtype name pandas would give the column (matches the old report)."""
+    if pa.types.is_dictionary(arrow_type):
+        return "category"
+    try:
+        return str(np.dtype(arrow_type.to_pandas_dtype()))
+    except (NotImplementedError, TypeError):
+        return "object"
+
+
+class ColumnStats:
+    def __init__(self, name: str, dtype: str):
+        self.name = name
+        self.dtype = dtype
+        self.rows = 0
+        self.nulls = 0
+        self.count = 0
+        self.total = 0.0
+        self.min = np.nan
+        self.max = np.nan
+        self.numeric = dtype not in ("object", "category")
+        self.exact: np.ndarray | None = np.empty(0, dtype=np.uint64)
+        self.hll = HyperLogLog()
+        self.digest = TDigest() if self.numeric else None
+
+    def _add_hashes(self, hashes: np.ndarray) -> None:
+        self.hll.add(hashes)
+        if self.exact is not None:
+            self.exact = np.union1d(self.exact, np.unique(hashes))
+            if len(self.exact) > EXACT_DISTINCT:
+                self.exact = None
+
+    def update(self, array: pa.Array | pa.ChunkedArray) -> "ColumnStats":
+        self.rows += len(array)
+        if isinstance(array, pa.ChunkedArray):
+            array = array.combine_chunks()
+
+        if pa.types.is_dictionary(array.type):
+            self.nulls += array.null_count
+            valid = array.indices.drop_null().to_numpy()
+            dictionary = array.dictionary.to_numpy(zero_copy_only=False).astype(object)
+            self._add_hashes(pd.util.hash_array(dictionary)[valid] if len(dictionary) else np.empty(0, np.uint64))
+            return self
+
+        if not self.numeric:
+            values = array.drop_null().to_numpy(zero_copy_only=False)
+            self.nulls += array.null_count
+            self._add_hashes(pd.util.hash_array(values.astype(object)))
+            return self
+
+        values = array.cast(pa.float64()).to_numpy(zero_copy_only=False)  # nulls → NaN
+        values = values[~np.isnan(values)] + 0.0  # -0.0 == 0.0, as in nunique
+        self.nulls += len(array) - len(values)
+        if len(values):
+            self.count += len(values)
+            self.total += float(values.sum())
+            self.min = np.fmin(self.min, values.min())
+            self.max = np.fmax(self.max, values.max())
+            self.digest.add(values)
+            self._add_hashes(pd.util.hash_array(values))
+        return self
+
+    def merge(self, other: "ColumnStats") -> "ColumnStats":
+        self.rows += other.rows
+        self.nulls += other.nulls
+        self.count += other.count
+        self.total += other.total
+        self.min = np.fmin(self.min, other.min)
+        self.max = np.fmax(self.max, other.max)
+        self.hll.merge(other.hll)
+        if self.exact is not None and other.exact is not None:
+            self.exact = np.union1d(self.exact, other.exact)
+            if len(self.exact) > EXACT_DISTINCT:
+                self.exact = None
+        else:
+            self.exact = None
+        if self.digest is not None and other.digest is not None:
+            self.digest.merge(other.digest)
+        return self
+
+    @property
+    def null_fraction(self) -> float:
+        return self.nulls / self.rows if self.rows else np.nan
+
+    @property
+    def unique_values(self) -> int:
+        if self.exact is not None:
+            return len(self.exact)
+        return int(round(self.hll.estimate()))
+
+    def result(self) -> dict:
+        row = {
+            "signal_name": self.name,
+            "null_fraction": self.null_fraction,
+            "unique_values": self.unique_values,
+            "unique_exact": self.exact is not None,
+            "dtype": self.dtype,
+            "min": self.min if self.numeric and self.count else None,
+            "max": self.max if self.numeric and self.count else None,
+            "mean": self.total / self.count if self.numeric and self.count else None,
+        }
+        for q in QUANTILES:
+            row[f"p{int(q * 100):02d}"] = (
+                self.digest.quantile(q, self.min, self.max) if self.numeric and self.count else None
+            )
+        return row
+
+
+# ─── Tables ─────────────────────────────────────────────────────
+class TableStats:
+    """Column partials of one or more tables; merge() combines files / drives."""
+
+    def __init__(self):
+        self.columns: dict[str, ColumnStats] = {}
+
+    def update(self, table: pa.Table | pa.RecordBatch, pool: ThreadPoolExecutor | None = None,
+               exclude=("time",)) -> "TableStats":
+        names = [n for n in table.schema.names if n not in exclude]
+        for name in names:
+            if name not in self.columns:
+                self.columns[name] = ColumnStats(name, _pandas_dtype(table.schema.field(name).type))
+        work = [(self.columns[n], table.column(n)) for n in names]
+        if pool is None:
+            for stats, column in work:
+                stats.update(column)
+        else:
+            list(pool.map(lambda item: item[0].update(item[1]), work))
+        return self
+
+    def merge(self, other: "TableStats") -> "TableStats":
+        for name, stats in other.columns.items():
+            if name in self.columns:
+                self.columns[name].merge(stats)
+            else:
+                self.columns[name] = stats
+        return self
+
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame([stats.result() for stats in self.columns.values()])
+
+
+def scan_parquet(path: Path, columns: list[str] | None = None, workers: int = 4,
+                 batch_rows: int = BATCH_ROWS) -> TableStats:
+    """Statistics of one Parquet file in one streaming pass."""
+    stats = TableStats()
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=batch_rows, columns=columns):
+            stats.update(batch, pool)
+    return stats
+
+
+def scan_table(table: pa.Table, columns: list[str] | None = None, workers: int = 4,
+               batch_rows: int = BATCH_ROWS) -> TableStats:
+    """Statistics of an Arrow table (e.g. memory-mapped from the IPC cache), batch by batch."""
+    if columns is not None:
+        table = table.select(columns)
+    stats = TableStats()
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for batch in table.to_batches(max_chunksize=batch_rows):
+            stats.update(batch, pool)
+    return stats
+
+
+def frame_stats(df: pd.DataFrame, workers: int = 4) -> TableStats:
+    """Statistics of an in-memory DataFrame (same engine, one pass per column)."""
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        return TableStats().update(table, pool)
+
+
+def scan_files(paths: list[Path], columns: list[str] | None = None, workers: int = 4) -> TableStats:
+    """Fleet-wide statistics: per-file partials merged into one."""
+    stats = TableStats()
+    for path in paths:
+        stats.merge(scan_parquet(path, columns, workers))
+    return stats
@@ -1,45 +1,49 @@
 #!/usr/bin/env python3
 """
 Evaluates signal quality from merged/*.parquet files.
+- Streams each file in record batches through the mergeable statistics
+  engine (src/utils/signal_stats.py); no file is loaded whole
+- With FSD_IPC_CACHE=1 the files are read memory-mapped from the Arrow IPC
+  cache (src/store/ipc_cache.py) instead of being decompressed on every run
 - Outputs quality report CSV and selected_signals.txt
 """
 
+import sys
 import pandas as pd
 from pathlib import Path
 import pyarrow.parquet as pq
 
 # ─── Paths ─────────────────────────────────────────────────────
 PROJECT_ROOT = Path(__file__).resolve().parents[2]
-MERGED_DIR = PROJECT_ROOT / "data" / "merged"
-CATALOG_DIR = PROJECT_ROOT / "data" / "catalog"
-CATALOG_DIR.mkdir(exist_ok=True)
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from src.utils.paths import MERGED_DIR, CATALOG_DIR
+from src.utils.signal_stats import scan_parquet, scan_table
+from src.store.ipc_cache import cache_enabled, read_table
+from src.utils.profiling import PROFILER
+
+CATALOG_DIR.mkdir(parents=True, exist_ok=True)
 
 OUTPUT_CSV = CATALOG_DIR / "merged_signal_quality.csv"
 SELECTED_TXT = CATALOG_DIR / "selected_signals.txt"
 
 # ─── Analyze Each Merged File ──────────────────────────────────
-rows = []
-for pq_path in sorted(MERGED_DIR.glob("*.parquet")):
-    try:
-        df = pd.read_parquet(pq_path)
-        for col in df.columns:
-            if col == "time":
-                continue
-            series = df[col]
-            rows.append({
-                "file": pq_path.name,
-                "signal_name": col,
-                "null_fraction": series.isna().mean(),
-                "unique_values": series.nunique(dropna=True),
-                "dtype": str(series.dtype),
-                "min": series.min() if pd.api.types.is_numeric_dtype(series) else None,
-                "max": series.max() if pd.api.types.is_numeric_dtype(series) else None,
-                "mean": series.mean() if pd.api.types.is_numeric_dtype(series) else None,
-            })
-    except Exception as e:
-        print(f"⚠️ Error reading {pq_path.name}: {e}")
-
-df_quality = pd.DataFrame(rows)
+def analyze_merged() -> pd.DataFrame:
+    reports = []
+    use_cache = cache_enabled()
+    for pq_path in sorted(MERGED_DIR.glob("*.parquet")):
+        try:
+            with PROFILER.phase("scan") as span:
+                stats = scan_table(read_table(pq_path)) if use_cache else scan_parquet(pq_path)
+                span.rows = pq.ParquetFile(pq_path).metadata.num_rows
+            report = stats.to_frame()
+            report.insert(0, "file", pq_path.name)
+            reports.append(report)
+        except Exception as e:
+            print(f"⚠️ Error reading {pq_path.name}: {e}")
+
+    return pd.concat(reports, ignore_index=True) if reports else pd.DataFrame()
 
 # ─── Classify Quality ──────────────────────────────────────────
 def assess_quality(row):
@@ -49,13 +53,23 @@ def assess_quality(row):
         return "constant"
     return "good"
 
-df_quality["quality"] = df_quality.apply(assess_quality, axis=1)
-
 # ─── Export ─────────────────────────────────────────────────────
-df_quality.to_csv(OUTPUT_CSV, index=False)
+def main():
+    df_quality = analyze_merged()
+    if df_quality.empty:
+        print("⚠️ No merged files to analyze")
+        return
+    df_quality["quality"] = df_quality.apply(assess_quality, axis=1)
+
+    with PROFILER.phase("write", rows=len(df_quality)):
+        df_quality.to_csv(OUTPUT_CSV, index=False)
+
+        selected = df_quality[df_quality["quality"] == "good"]["signal_name"].drop_duplicates()
+        selected.to_csv(SELECTED_TXT, index=False, header=False)
+
+    print(f"✅ Saved: {OUTPUT_CSV.name}")
+    print(f"✅ Saved: {SELECTED_TXT.name}")
 
-selected = df_quality[df_quality["quality"] == "good"]["signal_name"].drop_duplicates()
-selected.to_csv(SELECTED_TXT, index=False, header=False)
 
-print(f"✅ Saved: {OUTPUT_CSV.name}")
-print(f"✅ Saved: {SELECTED_TXT.name}")
+if __name__ == "__main__":
+    main()
@@ -9,22 +9,31 @@ Outputs detailed CSV and Markdown reports to: data/catalog/
 Includes:
 - Total signals in each stage
 - Dropped and added signals
+- Per-signal row and null counts on both sides (signal_null_report.csv)
 - Clean visual layout with newlines
+
+Works from Parquet footers only (schema, row counts, row-group null counts);
+no data pages are read. Footers are cached in data/catalog/footer_index.json
+and re-read only for files whose size or mtime changed.
 """
+import os
 import sys
+import json
 import pandas as pd
 from pathlib import Path
 import logging
 import pyarrow.parquet as pq
-import os
 
 # ─── Force src/ to be discoverable ─────────────────────────────
 PROJECT_ROOT = Path(__file__).resolve().parents[2]
 if str(PROJECT_ROOT) not in sys.path:
     sys.path.insert(0, str(PROJECT_ROOT))
 
-CATALOG_DIR = PROJECT_ROOT / "data" / "catalog"
-CATALOG_DIR.mkdir(parents=True, exist_ok=True)
+from src.utils.paths import (
+    DATA_DIR, CATALOG_DIR, DECODED_DIR, DOWNSAMPLED_DIR, PROCESSED_DIR, MERGED_DIR, FOOTER_INDEX_PATH,
+)
+from src.store.dataset import split_stage_name
+from src.store.long_store import is_long, PARTITION_KEY
 
 STAGES = [
     ("decoded", "downsampled"),
@@ -34,86 +43,200 @@ STAGES = [
 
 CSV_PATH = CATALOG_DIR / "signal_diff_report.csv"
 MD_PATH = CATALOG_DIR / "signal_diff_report.md"
+NULLS_CSV_PATH = CATALOG_DIR / "signal_null_report.csv"
 
 logging.basicConfig(
     level=logging.INFO,
     format="%(asctime)s — %(levelname)s — %(message)s"
 )
 
-# ─── Helpers ───
-def list_parquet_signals(path: Path) -> set:
-    try:
-        cols = pq.read_table(path).schema.names
-        return set(cols) - {"time"}
-    except Exception as e:
-        logging.error(f"❌ Failed reading {path.name}: {e}")
-        return set()
-
-# ─── Comparison Logic ───
-records = []
-md_lines = ["# Signal Comparison Report\n"]
-
-for src_stage, dst_stage in STAGES:
-    src_dir = PROJECT_ROOT / "data" / src_stage
-    dst_dir = PROJECT_ROOT / "data" / dst_stage
-
-    src_files = sorted(src_dir.glob("*.parquet"))
-    if not src_files:
-        logging.warning(f"⚠️ No files found in: {src_dir.name}")
-        continue
-
-    for src_path in src_files:
-        stem = src_path.stem
-
-        if dst_stage == "processed":
-            dst_filename = stem + "_filtered.parquet"
-        elif dst_stage == "merged":
-            parts = stem.split("_")
-            dst_filename = f"{parts[1]}-{parts[2]}.parquet"
+# ─── Footer Index ───
+class FooterIndex:
+    """
+    {path relative to the data tree: {"size", "mtime_ns", "rows", "nulls": {column: count | None}}}
+    A null count is None when a row group carries no statistics for it.
+    """
+
+    def __init__(self, path: Path = FOOTER_INDEX_PATH):
+        self.path = path
+        self.entries = {}
+        self.dirty = False
+        if path.exists():
+            try:
+                with open(path) as f:
+                    self.entries = json.load(f)
+            except (OSError, json.JSONDecodeError):
+                pass  # rebuild
+
+    def footer(self, file: Path) -> dict:
+        key = file.resolve().relative_to(DATA_DIR).as_posix()   # FSD_DATA_DIR may lie outside the repo
+        stat = file.stat()
+        entry = self.entries.get(key)
+        if entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+            return entry
+
+        meta = pq.read_metadata(file)
+        names = meta.schema.to_arrow_schema().names
+        nulls = {name: 0 for name in names}
+        leaf = {meta.schema.column(i).path.split(".")[0]: i for i in range(meta.num_columns)}
+        for rg in range(meta.num_row_groups):
+            row_group = meta.row_group(rg)
+            for name in names:
+                if nulls[name] is None or name not in leaf:
+                    nulls[name] = None
+                    continue
+                stats = row_group.column(leaf[name]).statistics
+                nulls[name] = nulls[name] + stats.null_count if stats is not None and stats.has_null_count else None
+
+        entry = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "rows": meta.num_rows, "nulls": nulls}
+        self.entries[key] = entry
+        self.dirty = True
+        return entry
+
+    def save(self):
+        if not self.dirty:
+            return
+        # Forget files that no longer exist
+        self.entries = {k: v for k, v in self.entries.items() if (DATA_DIR / k).exists()}
+        tmp = self.path.with_name(f".{self.path.name}.{os.getpid()}.tmp")
+        with open(tmp, "w") as f:
+            json.dump(self.entries, f)
+        os.replace(tmp, self.path)
+
+
+# ─── Stage Units ───
+def stage_units(stage: str) -> dict[str, list[Path]]:
+    """
+    {unit: files} for one stage. Units are '<drive>_<bus>' per drive, or the
+    bus name for merged files; a unit may span several files (date partitions,
+    long-layout signal partitions).
+    """
+    units: dict[str, list[Path]] = {}
+    if stage == "decoded":
+        for path in sorted(DECODED_DIR.glob("*.parquet")):
+            drive, bus = split_stage_name(path.name)
+            units[f"{drive}_{bus}"] = sorted(path.glob(f"{PARTITION_KEY}=*/*.parquet")) if is_long(path) else [path]
+    elif stage == "downsampled":
+        for path in sorted(DOWNSAMPLED_DIR.glob("*.parquet")):
+            drive, bus = split_stage_name(path.name)
+            units[f"{drive}_{bus}"] = [path]
+    elif stage == "processed":
+        for path in sorted(PROCESSED_DIR.glob("bus=*/drive=*/date=*/*.parquet")):
+            bus = path.parents[2].name.split("=", 1)[1]
+            drive = path.parents[1].name.split("=", 1)[1]
+            units.setdefault(f"{drive}_{bus}", []).append(path)
+    elif stage == "merged":
+        for path in sorted(MERGED_DIR.glob("*.parquet")):
+            units[path.stem] = [path]
+    return units
+
+
+def unit_signals(index: FooterIndex, files: list[Path]) -> dict[str, list]:
+    """{signal: [rows, nulls]} summed over the files of one unit."""
+    signals: dict[str, list] = {}
+    for file in files:
+        footer = index.footer(file)
+        if file.parent.name.startswith(f"{PARTITION_KEY}="):
+            # Long layout: one dense (time, value) series per signal file
+            name = file.parent.name.split("=", 1)[1]
+            columns = {name: footer["nulls"].get("value")}
         else:
-            dst_filename = stem + ".parquet"
+            columns = {c: n for c, n in footer["nulls"].items() if c not in ("time", "arbitration_id")}
+        for name, nulls in columns.items():
+            rows_nulls = signals.setdefault(name, [0, 0])
+            rows_nulls[0] += footer["rows"]
+            rows_nulls[1] = None if rows_nulls[1] is None or nulls is None else rows_nulls[1] + nulls
+    return signals
+
+
+def destination_unit(unit: str, dst_stage: str) -> str:
+    if dst_stage == "merged":
+        return unit.split("_", 1)[1]  # '<drive>_<bus>' → '<bus>'
+    return unit
 
-        dst_path = dst_dir / dst_filename
-        if not dst_path.exists():
-            logging.warning(f"⚠️ Missing {src_stage} → {dst_stage} match for {src_path.name}")
-            continue
 
-        src_signals = list_parquet_signals(src_path)
-        dst_signals = list_parquet_signals(dst_path)
-        if not src_signals or not dst_signals:
+# ─── Comparison Logic ───
+def compare(index: FooterIndex) -> tuple[list[dict], list[dict], list[str]]:
+    records, null_rows = [], []
+    md_lines = ["# Signal Comparison Report\n"]
+    units = {stage: stage_units(stage) for stage in ("decoded", "downsampled", "processed", "merged")}
+
+    for src_stage, dst_stage in STAGES:
+        if not units[src_stage]:
+            logging.warning(f"⚠️ No files found in: {src_stage}")
             continue
 
-        dropped = sorted(src_signals - dst_signals)
-        added = sorted(dst_signals - src_signals)
-        kept = sorted(src_signals & dst_signals)
-
-        records.append({
-            "Stage": f"{src_stage} → {dst_stage}",
-            "File": stem,
-            "# Source Signals": len(src_signals),
-            "# Destination Signals": len(dst_signals),
-            "# Kept": len(kept),
-            "# Dropped": len(dropped),
-            "# Added": len(added),
-            "Dropped Signals": "; ".join(dropped),
-            "Added Signals": "; ".join(added),
-        })
-
-        md_lines.append(f"## {src_stage} → {dst_stage}: `{stem}`\n")
-        md_lines.append(f"**Dropped ({len(dropped)}):**")
-        md_lines.extend([f"- {s}" for s in dropped])
-        md_lines.append(f"\n**Added ({len(added)}):**")
-        md_lines.extend([f"- {s}" for s in added])
-        md_lines.append("\n---\n")
-
-        logging.info(f"🔍 Compared: {stem} ({src_stage} → {dst_stage}) — Dropped: {len(dropped)}, Added: {len(added)}")
+        for unit, src_files in units[src_stage].items():
+            dst_unit = destination_unit(unit, dst_stage)
+            if dst_unit not in units[dst_stage]:
+                logging.warning(f"⚠️ Missing {src_stage} → {dst_stage} match for {unit}")
+                continue
+
+            src_signals = unit_signals(index, src_files)
+            dst_signals = unit_signals(index, units[dst_stage][dst_unit])
+            if not src_signals or not dst_signals:
+                continue
+
+            dropped = sorted(src_signals.keys() - dst_signals.keys())
+            added = sorted(dst_signals.keys() - src_signals.keys())
+            kept = sorted(src_signals.keys() & dst_signals.keys())
+
+            records.append({
+                "Stage": f"{src_stage} → {dst_stage}",
+                "File": unit,
+                "# Source Signals": len(src_signals),
+                "# Destination Signals": len(dst_signals),
+                "# Kept": len(kept),
+                "# Dropped": len(dropped),
+                "# Added": len(added),
+                "Dropped Signals": "; ".join(dropped),
+                "Added Signals": "; ".join(added),
+            })
+            for signal in sorted(src_signals.keys() | dst_signals.keys()):
+                src_rows, src_nulls = src_signals.get(signal, (None, None))
+                dst_rows, dst_nulls = dst_signals.get(signal, (None, None))
+                null_rows.append({
+                    "Stage": f"{src_stage} → {dst_stage}",
+                    "File": unit,
+                    "Signal": signal,
+                    "Source Rows": src_rows,
+                    "Source Nulls": src_nulls,
+                    "Destination Rows": dst_rows,
+                    "Destination Nulls": dst_nulls,
+                })
+
+            md_lines.append(f"## {src_stage} → {dst_stage}: `{unit}`\n")
+            md_lines.append(f"**Dropped ({len(dropped)}):**")
+            md_lines.extend([f"- {s}" for s in dropped])
+            md_lines.append(f"\n**Added ({len(added)}):**")
+            md_lines.extend([f"- {s}" for s in added])
+            md_lines.append("\n---\n")
+
+            logging.info(f"🔍 Compared: {unit} ({src_stage} → {dst_stage}) — Dropped: {len(dropped)}, Added: {len(added)}")
+
+    return records, null_rows, md_lines
+
 
 # ─── Save Reports ───
-if records:
-    pd.DataFrame(records).to_csv(CSV_PATH, index=False)
-    with open(MD_PATH, "w", encoding="utf-8") as f:
-        f.write("\n".join(md_lines))
-    logging.info(f"✅ Saved CSV: {CSV_PATH}")
-    logging.info(f"✅ Saved Markdown: {MD_PATH}")
-else:
-    logging.warning("⚠️ No comparisons completed.")
\ No newline at end of file
+def main():
+    CATALOG_DIR.mkdir(parents=True, exist_ok=True)
+    index = FooterIndex()
+    records, null_rows, md_lines = compare(index)
+    index.save()
+
+    if records:
+        pd.DataFrame(records).to_csv(CSV_PATH, index=False)
+        pd.DataFrame(null_rows).astype({"Source Rows": "Int64", "Source Nulls": "Int64",
+                                        "Destination Rows": "Int64", "Destination Nulls": "Int64"}) \
+            .to_csv(NULLS_CSV_PATH, index=False)
+        with open(MD_PATH, "w", encoding="utf-8") as f:
+            f.write("\n".join(md_lines))
+        logging.info(f"✅ Saved CSV: {CSV_PATH}")
+        logging.info(f"✅ Saved CSV: {NULLS_CSV_PATH}")
+        logging.info(f"✅ Saved Markdown: {MD_PATH}")
+    else:
+        logging.warning("⚠️ No comparisons completed.")
+
+
+if __name__ == "__main__":
+    main()